@@ -8,10 +8,21 @@ import sys
 import asyncio
 import aiohttp
 import json
+import math
 import re
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, AsyncIterator, List, Tuple
 from bs4 import BeautifulSoup
 from scrapers.base import Listing
+from scrapers.http_cassette import RecordingSession, ReplaySession, get_cassette
+from utils.parse_pool import run_parse
+from config import AI_PRERANK_TOP_K, AI_SELECT_PROMPT_TOKENS, AI_STREAM_ENABLED, AI_VALUATION_CONCURRENCY
+from utils.inspection_cache import inspection_cache, inspection_version
+from utils.llm_scheduler import current_llm_user, estimate_tokens, get_llm_scheduler, usage_tokens
+from utils.llm_stream import TopOffersParser, read_completion, report_progress
+from utils.prerank import prerank_listings, prerank_stats
+from utils.selection_cache import selection_cache
+from utils.tokens import count_message_tokens, count_tokens, observe_usage
+from utils.valuation_cache import valuation_cache
 
 # Добавляем путь для импорта error_logger
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -33,11 +44,26 @@ except ImportError:
 # Получить API ключ: https://console.groq.com/keys
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+# Для тестов и бенчмарков - локальная замена tools/fake_llm_api.py
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
 GROQ_VISION_MODEL = None  # Vision модель недоступна
 GROQ_FALLBACK_MODEL = "mixtral-8x7b-32768"
 
+# Версия промпта оценки (часть ключа кэша оценок utils/valuation_cache.py):
+# увеличивайте при изменении _prepare_prompt или системного промпта valuate_groq
+VALUATION_PROMPT_VERSION = "1"
+
+# Версия промптов подбора (часть ключа кэша подборов utils/selection_cache.py):
+# увеличивайте при изменении _prepare_selection_prompt_detailed или _prepare_final_comparison_prompt
+SELECTION_PROMPT_VERSION = "2"
+
+# Системный промпт запросов подбора (учитывается при наборе батчей по бюджету токенов)
+SELECTION_SYSTEM_PROMPT = (
+    "Ты экспертный помощник по анализу рынка недвижимости Беларуси. Анализируй объявления тщательно, "
+    "сравнивай между собой и выбирай самые выгодные варианты. Отвечай строго в JSON формате."
+)
+
 
 # ========== ВАРИАНТ 3: Hugging Face Inference API ==========
 # Бесплатно: ограниченное количество запросов
@@ -56,6 +82,168 @@ HF_API_URL = "https://api-inference.huggingface.co/models/meta-llama/Meta-Llama-
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
 
 
+# Ключевые слова для центра Барановичей
+_CENTER_KEYWORDS = [
+    'советская', 'брестская', 'центральная', 'ленина', 'мир', 'кирова',
+    'комсомольская', 'пионерская', 'горького', 'пушкина', 'машерова'
+]
+
+
+def extract_listing_page(html, url: str, address: str) -> Dict[str, Any]:
+    """
+    Извлекает описание, фото, таблицу параметров и адрес со страницы объявления
+    
+    Выполняется в пуле процессов (utils/parse_pool.py), поэтому принимает
+    HTML (bytes или str) и возвращает только простые типы.
+    """
+    if isinstance(html, bytes):
+        html = html.decode("utf-8", errors="replace")
+    page = {
+        "full_description": "",
+        "all_photos": [],
+        "photos_found": 0,
+        "detailed_info": {},
+        "address_details": "",
+    }
+    
+    soup = BeautifulSoup(html, 'lxml')
+
+    # Извлекаем полное описание
+    description_selectors = [
+        'div.description', 'div[class*="description"]', 
+        'div[class*="text"]', 'div.content', 'p.description',
+        'div[itemprop="description"]', 'meta[property="og:description"]'
+    ]
+    for selector in description_selectors:
+        desc_elem = soup.select_one(selector)
+        if desc_elem:
+            page["full_description"] = desc_elem.get_text(strip=True)
+            if len(page["full_description"]) > 100:
+                break
+
+    # Если не нашли через селекторы, ищем в мета-тегах
+    if not page["full_description"]:
+        meta_desc = soup.find('meta', property='og:description')
+        if meta_desc:
+            page["full_description"] = meta_desc.get('content', '')
+
+    # Извлекаем фото объявления (только из галереи/фото объявления)
+    photo_urls = set()
+
+    # Стратегия 1: Ищем контейнеры галереи/фото объявления
+    gallery_selectors = [
+        'div[class*="gallery"]', 'div[class*="photos"]', 'div[class*="images"]',
+        'div[class*="slider"]', 'div[class*="carousel"]', 'div[class*="photo"]',
+        'section[class*="gallery"]', 'section[class*="photos"]',
+        '[data-gallery]', '[data-photos]', '[id*="gallery"]', '[id*="photos"]'
+    ]
+
+    gallery_container = None
+    for selector in gallery_selectors:
+        gallery_container = soup.select_one(selector)
+        if gallery_container:
+            log_info("ai_inspect", f"Найден контейнер галереи: {selector}")
+            break
+
+    # Стратегия 2: Если не нашли галерею, ищем по специфичным паттернам URL
+    if gallery_container:
+        # Ищем фото только в контейнере галереи
+        img_tags = gallery_container.find_all('img', src=True)
+    else:
+        # Если галереи нет, ищем все img, но с очень строгой фильтрацией
+        img_tags = soup.find_all('img', src=True)
+
+    for img in img_tags:
+        img_src = img.get('src') or img.get('data-src') or img.get('data-lazy') or img.get('data-original')
+        if not img_src:
+            continue
+
+        img_src_lower = img_src.lower()
+
+        # Строгая фильтрация служебных изображений
+        skip_patterns = [
+            'logo', 'icon', 'sprite', 'placeholder', 'no-photo', 'blank',
+            'footer', 'header', 'arrow', 'button', 'badge', 'pay', 'mastercard',
+            'visa', 'belkart', 'svg', 'favicon', 'social', 'facebook', 'instagram',
+            'telegram', 'viber', 'whatsapp', 'youtube', 'twitter', 'rewar',  # reward/награда
+            'static/frontend', 'static/img', 'static/images', 'cdn', 'assets'
+        ]
+
+        # Пропускаем если содержит служебные паттерны
+        if any(p in img_src_lower for p in skip_patterns):
+            continue
+
+        # Для Kufar: только фото из gallery или list_thumbs (но не маленькие превью)
+        if 'kufar.by' in img_src_lower:
+            if 'gallery' in img_src_lower or 'list_thumbs_2x' in img_src_lower:
+                # Пропускаем очень маленькие превью
+                if '120x100' in img_src_lower or 'thumb' in img_src_lower:
+                    if 'list_thumbs_2x' not in img_src_lower:  # list_thumbs_2x - это нормальные фото
+                        continue
+            elif 'content.kufar.by' in img_src_lower:
+                # Пропускаем статический контент (логотипы, иконки)
+                continue
+            else:
+                # Пропускаем другие изображения с kufar.by
+                continue
+
+        # Для Etagi: только фото объявлений
+        if 'etagi.com' in img_src_lower:
+            if 'realty' not in img_src_lower and 'object' not in img_src_lower:
+                continue
+
+        # Пропускаем очень маленькие изображения (меньше 200px)
+        if re.search(r'/\d+x\d+/', img_src_lower):
+            size_match = re.search(r'/(\d+)x(\d+)/', img_src_lower)
+            if size_match:
+                width = int(size_match.group(1))
+                height = int(size_match.group(2))
+                if width < 200 or height < 200:
+                    continue
+
+        # Нормализуем URL
+        if not img_src.startswith('http'):
+            if img_src.startswith('//'):
+                img_src = f"https:{img_src}"
+            else:
+                base_url = '/'.join(url.split('/')[:3])
+                img_src = f"{base_url}{img_src}"
+
+        photo_urls.add(img_src)
+
+    # Сортируем фото по размеру (приоритет большим) и берем до 10
+    photo_list = list(photo_urls)
+    # Сортируем: сначала большие фото (gallery, list_thumbs_2x), потом остальные
+    photo_list.sort(key=lambda x: (
+        0 if 'gallery' in x.lower() or 'list_thumbs_2x' in x.lower() else 1,
+        -len(x)  # Длиннее URL обычно = больше фото
+    ))
+    page["all_photos"] = photo_list[:10]  # Максимум 10 фото
+    page["photos_found"] = len(photo_list)
+
+    # Извлекаем детальную информацию
+    # Ищем таблицы с параметрами
+    for table in soup.find_all(['table', 'dl', 'ul', 'div']):
+        text = table.get_text()
+        if any(keyword in text.lower() for keyword in ['площадь', 'этаж', 'год', 'комнат', 'постройки', 'строительства']):
+            page["detailed_info"]["params_table"] = text[:500]
+
+    # Извлекаем дополнительные детали адреса из страницы
+    address_selectors = [
+        'div[class*="address"]', 'div[class*="location"]', 'div[class*="street"]',
+        'span[class*="address"]', 'p[class*="address"]', '[itemprop="address"]'
+    ]
+    for selector in address_selectors:
+        addr_elem = soup.select_one(selector)
+        if addr_elem:
+            addr_text = addr_elem.get_text(strip=True)
+            if len(addr_text) > len(address):
+                page["address_details"] = addr_text
+                break
+
+    return page
+
+
 class AIValuator:
     """ИИ-оценщик квартир"""
     
@@ -68,23 +256,48 @@ class AIValuator:
         """
         self.provider = provider.lower()
         self.session: Optional[aiohttp.ClientSession] = None
+        # Сессия для страниц объявлений: в режиме кассет - запись/воспроизведение
+        # (scrapers/http_cassette.py), запросы к API провайдера всегда идут через self.session
+        self.page_session = None
+        # Сколько блоков "async with" сейчас используют сессию (оценки идут параллельно)
+        self._session_users = 0
     
     async def start_session(self):
         """Создает HTTP сессию"""
         if self.session is None or self.session.closed:
             self.session = aiohttp.ClientSession()
+            mode, cassette = get_cassette()
+            if mode == "replay":
+                self.page_session = ReplaySession(cassette)
+            elif mode == "record":
+                self.page_session = RecordingSession(self.session, cassette)
+            else:
+                self.page_session = self.session
     
     async def close_session(self):
         """Закрывает HTTP сессию"""
         if self.session and not self.session.closed:
             await self.session.close()
     
+    @property
+    def model_name(self) -> str:
+        """Модель провайдера (часть ключа кэша оценок)"""
+        if self.provider == "groq":
+            return GROQ_MODEL
+        if self.provider == "huggingface":
+            return "huggingface:" + HF_API_URL.rsplit("/models/", 1)[-1]
+        return f"{self.provider}:llama3"
+    
     async def __aenter__(self):
+        self._session_users += 1
         await self.start_session()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.close_session()
+        # Сессия общая для одновременных оценок: закрывает ее последний пользователь
+        self._session_users = max(0, self._session_users - 1)
+        if self._session_users == 0:
+            await self.close_session()
     
     def _prepare_prompt(self, listing: Listing, inspection: Optional[Dict[str, Any]] = None) -> str:
         """Подготавливает промпт для ИИ"""
@@ -391,173 +604,43 @@ JSON ответ:
         try:
             log_info("ai_inspect", f"Инспектирую страницу: {listing.url}")
             
-            # Загружаем HTML страницы
-            async with self.session.get(listing.url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    html = await resp.text()
-                    soup = BeautifulSoup(html, 'lxml')
-                    
-                    # Извлекаем полное описание
-                    description_selectors = [
-                        'div.description', 'div[class*="description"]', 
-                        'div[class*="text"]', 'div.content', 'p.description',
-                        'div[itemprop="description"]', 'meta[property="og:description"]'
-                    ]
-                    for selector in description_selectors:
-                        desc_elem = soup.select_one(selector)
-                        if desc_elem:
-                            inspection_data["full_description"] = desc_elem.get_text(strip=True)
-                            if len(inspection_data["full_description"]) > 100:
-                                break
-                    
-                    # Если не нашли через селекторы, ищем в мета-тегах
-                    if not inspection_data["full_description"]:
-                        meta_desc = soup.find('meta', property='og:description')
-                        if meta_desc:
-                            inspection_data["full_description"] = meta_desc.get('content', '')
-                    
-                    # Извлекаем фото объявления (только из галереи/фото объявления)
-                    photo_urls = set()
-                    
-                    # Стратегия 1: Ищем контейнеры галереи/фото объявления
-                    gallery_selectors = [
-                        'div[class*="gallery"]', 'div[class*="photos"]', 'div[class*="images"]',
-                        'div[class*="slider"]', 'div[class*="carousel"]', 'div[class*="photo"]',
-                        'section[class*="gallery"]', 'section[class*="photos"]',
-                        '[data-gallery]', '[data-photos]', '[id*="gallery"]', '[id*="photos"]'
-                    ]
-                    
-                    gallery_container = None
-                    for selector in gallery_selectors:
-                        gallery_container = soup.select_one(selector)
-                        if gallery_container:
-                            log_info("ai_inspect", f"Найден контейнер галереи: {selector}")
-                            break
-                    
-                    # Стратегия 2: Если не нашли галерею, ищем по специфичным паттернам URL
-                    if gallery_container:
-                        # Ищем фото только в контейнере галереи
-                        img_tags = gallery_container.find_all('img', src=True)
-                    else:
-                        # Если галереи нет, ищем все img, но с очень строгой фильтрацией
-                        img_tags = soup.find_all('img', src=True)
-                    
-                    for img in img_tags:
-                        img_src = img.get('src') or img.get('data-src') or img.get('data-lazy') or img.get('data-original')
-                        if not img_src:
-                            continue
-                        
-                        img_src_lower = img_src.lower()
-                        
-                        # Строгая фильтрация служебных изображений
-                        skip_patterns = [
-                            'logo', 'icon', 'sprite', 'placeholder', 'no-photo', 'blank',
-                            'footer', 'header', 'arrow', 'button', 'badge', 'pay', 'mastercard',
-                            'visa', 'belkart', 'svg', 'favicon', 'social', 'facebook', 'instagram',
-                            'telegram', 'viber', 'whatsapp', 'youtube', 'twitter', 'rewar',  # reward/награда
-                            'static/frontend', 'static/img', 'static/images', 'cdn', 'assets'
-                        ]
-                        
-                        # Пропускаем если содержит служебные паттерны
-                        if any(p in img_src_lower for p in skip_patterns):
-                            continue
-                        
-                        # Для Kufar: только фото из gallery или list_thumbs (но не маленькие превью)
-                        if 'kufar.by' in img_src_lower:
-                            if 'gallery' in img_src_lower or 'list_thumbs_2x' in img_src_lower:
-                                # Пропускаем очень маленькие превью
-                                if '120x100' in img_src_lower or 'thumb' in img_src_lower:
-                                    if 'list_thumbs_2x' not in img_src_lower:  # list_thumbs_2x - это нормальные фото
-                                        continue
-                            elif 'content.kufar.by' in img_src_lower:
-                                # Пропускаем статический контент (логотипы, иконки)
-                                continue
-                            else:
-                                # Пропускаем другие изображения с kufar.by
-                                continue
-                        
-                        # Для Etagi: только фото объявлений
-                        if 'etagi.com' in img_src_lower:
-                            if 'realty' not in img_src_lower and 'object' not in img_src_lower:
-                                continue
-                        
-                        # Пропускаем очень маленькие изображения (меньше 200px)
-                        if re.search(r'/\d+x\d+/', img_src_lower):
-                            size_match = re.search(r'/(\d+)x(\d+)/', img_src_lower)
-                            if size_match:
-                                width = int(size_match.group(1))
-                                height = int(size_match.group(2))
-                                if width < 200 or height < 200:
-                                    continue
-                        
-                        # Нормализуем URL
-                        if not img_src.startswith('http'):
-                            if img_src.startswith('//'):
-                                img_src = f"https:{img_src}"
-                            else:
-                                base_url = '/'.join(listing.url.split('/')[:3])
-                                img_src = f"{base_url}{img_src}"
-                        
-                        photo_urls.add(img_src)
-                    
-                    # Сортируем фото по размеру (приоритет большим) и берем до 10
-                    photo_list = list(photo_urls)
-                    # Сортируем: сначала большие фото (gallery, list_thumbs_2x), потом остальные
-                    photo_list.sort(key=lambda x: (
-                        0 if 'gallery' in x.lower() or 'list_thumbs_2x' in x.lower() else 1,
-                        -len(x)  # Длиннее URL обычно = больше фото
-                    ))
-                    inspection_data["all_photos"] = photo_list[:10]  # Максимум 10 фото
-                    
-                    if len(photo_list) > 0:
-                        log_info("ai_inspect", f"Найдено {len(photo_list)} фото объявления (первые 3: {[p[:50] for p in photo_list[:3]]})")
-                    else:
-                        log_warning("ai_inspect", "Фото объявления не найдены, возможно неправильные селекторы")
-                    
-                    # Извлекаем детальную информацию
-                    # Ищем таблицы с параметрами
-                    for table in soup.find_all(['table', 'dl', 'ul', 'div']):
-                        text = table.get_text()
-                        if any(keyword in text.lower() for keyword in ['площадь', 'этаж', 'год', 'комнат', 'постройки', 'строительства']):
-                            inspection_data["detailed_info"]["params_table"] = text[:500]
-                    
-                    # Используем год постройки из API (если есть)
-                    # Не ищем год на странице - используем только данные из API
-                    if listing.year_built:
-                        inspection_data["detailed_info"]["year_built"] = listing.year_built
-                        log_info("ai_inspect", f"Использую год постройки из API: {listing.year_built}")
-                    
-                    # Анализируем адрес для определения центра и района
-                    address_text = listing.address.lower()
-                    
-                    # Ключевые слова для центра Барановичей
-                    center_keywords = [
-                        'советская', 'брестская', 'центральная', 'ленина', 'мир', 'кирова',
-                        'комсомольская', 'пионерская', 'горького', 'пушкина', 'машерова'
-                    ]
-                    inspection_data["is_center"] = any(keyword in address_text for keyword in center_keywords)
-                    
-                    # Извлекаем дополнительные детали адреса из страницы
-                    address_selectors = [
-                        'div[class*="address"]', 'div[class*="location"]', 'div[class*="street"]',
-                        'span[class*="address"]', 'p[class*="address"]', '[itemprop="address"]'
-                    ]
-                    for selector in address_selectors:
-                        addr_elem = soup.select_one(selector)
-                        if addr_elem:
-                            addr_text = addr_elem.get_text(strip=True)
-                            if len(addr_text) > len(listing.address):
-                                inspection_data["address_details"] = addr_text
-                                # Обновляем is_center на основе детального адреса
-                                if not inspection_data["is_center"]:
-                                    inspection_data["is_center"] = any(keyword in addr_text.lower() for keyword in center_keywords)
-                                break
-                    
-                    # Если не нашли через селекторы, используем исходный адрес
-                    if not inspection_data["address_details"]:
-                        inspection_data["address_details"] = listing.address
-                    
-                    log_info("ai_inspect", f"Найдено: {len(inspection_data['all_photos'])} фото, описание: {len(inspection_data['full_description'])} символов")
+            # Страница из кэша инспекций или загрузка (условная, если страница уже была);
+            # разбор страницы (1-2 МБ) - в пуле процессов, чтобы не блокировать event loop
+            page = await inspection_cache.get_page(
+                self.page_session,
+                listing.url,
+                inspection_version(listing),
+                lambda html: run_parse(extract_listing_page, html, listing.url, listing.address),
+            )
+            if page is not None:
+                inspection_data["full_description"] = page["full_description"]
+                inspection_data["all_photos"] = list(page["all_photos"])
+                inspection_data["detailed_info"].update(page["detailed_info"])
+                
+                if page["photos_found"] > 0:
+                    log_info("ai_inspect", f"Найдено {page['photos_found']} фото объявления (первые 3: {[p[:50] for p in page['all_photos'][:3]]})")
+                else:
+                    log_warning("ai_inspect", "Фото объявления не найдены, возможно неправильные селекторы")
+                
+                # Используем год постройки из API (если есть)
+                # Не ищем год на странице - используем только данные из API
+                if listing.year_built:
+                    inspection_data["detailed_info"]["year_built"] = listing.year_built
+                    log_info("ai_inspect", f"Использую год постройки из API: {listing.year_built}")
+                
+                # Анализируем адрес для определения центра и района
+                inspection_data["is_center"] = any(keyword in listing.address.lower() for keyword in _CENTER_KEYWORDS)
+                
+                # Детали адреса со страницы, если они подробнее исходного адреса
+                if page["address_details"]:
+                    inspection_data["address_details"] = page["address_details"]
+                    # Обновляем is_center на основе детального адреса
+                    if not inspection_data["is_center"]:
+                        inspection_data["is_center"] = any(keyword in page["address_details"].lower() for keyword in _CENTER_KEYWORDS)
+                else:
+                    inspection_data["address_details"] = listing.address
+                
+                log_info("ai_inspect", f"Найдено: {len(inspection_data['all_photos'])} фото, описание: {len(inspection_data['full_description'])} символов")
                     
         except Exception as e:
             log_warning("ai_inspect", f"Ошибка инспекции страницы {listing.url}: {e}")
@@ -655,6 +738,8 @@ JSON ответ:
             "temperature": 0.2,  # Снижена для более точных оценок
             "max_tokens": 800  # Увеличено для детальных ответов с инспекцией
         }
+        if AI_STREAM_ENABLED:
+            payload.update(stream=True, stream_options={"include_usage": True})
         
         headers = {
             "Authorization": f"Bearer {GROQ_API_KEY}",
@@ -663,50 +748,54 @@ JSON ответ:
         
         try:
             timeout = aiohttp.ClientTimeout(total=10)  # 10 секунд таймаут
-            async with self.session.post(GROQ_API_URL, json=payload, headers=headers, timeout=timeout) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    content = data["choices"][0]["message"]["content"]
-                    log_info("ai_groq", f"Получен ответ от Groq: {content[:100]}...")
-                    # Парсим JSON из ответа
-                    result = self._parse_ai_response(content)
-                    if result:
-                        fair_price = result.get('fair_price_usd', 0)
-                        has_renovation = 'renovation_state' in result and result.get('renovation_state')
-                        has_recommendations = 'recommendations' in result and result.get('recommendations')
-                        has_value_score = 'value_score' in result and result.get('value_score', 0) > 0
+            scheduler = get_llm_scheduler("groq", model_to_use)
+            async with scheduler.slot(estimate_tokens(payload["messages"]), payload["max_tokens"]) as slot:
+                async with self.session.post(GROQ_API_URL, json=payload, headers=headers, timeout=timeout) as resp:
+                    slot.observe(resp.status, resp.headers)
+                    if resp.status == 200:
+                        data = await read_completion(resp)
+                        slot.settle(usage_tokens(data, payload["messages"]))
+                        observe_usage(payload["messages"], data)
+                        content = data["choices"][0]["message"]["content"]
+                        log_info("ai_groq", f"Получен ответ от Groq: {content[:100]}...")
+                        # Парсим JSON из ответа
+                        result = self._parse_ai_response(content)
+                        if result:
+                            # Токены оценки: столько экономит каждое попадание в кэш оценок
+                            result["tokens_used"] = usage_tokens(data, payload["messages"])
+                            fair_price = result.get('fair_price_usd', 0)
+                            has_renovation = 'renovation_state' in result and result.get('renovation_state')
+                            has_recommendations = 'recommendations' in result and result.get('recommendations')
+                            has_value_score = 'value_score' in result and result.get('value_score', 0) > 0
                         
-                        log_info("ai_groq", f"Успешная оценка: ${fair_price:,}")
-                        if has_renovation:
-                            log_info("ai_groq", f"  - Состояние ремонта: {result.get('renovation_state')}")
-                        if has_recommendations:
-                            log_info("ai_groq", f"  - Рекомендации: {result.get('recommendations')[:50]}...")
-                        if has_value_score:
-                            log_info("ai_groq", f"  - Оценка: {result.get('value_score')}/10")
-                    return result
-                elif resp.status == 400:
-                    # Если модель недоступна, пробуем резервную
-                    error_text = await resp.text()
-                    log_warning("ai_groq", f"Groq API вернул статус {resp.status}: {error_text[:200]}")
-                    if "decommissioned" in error_text.lower() or "not found" in error_text.lower():
-                        log_info("ai_groq", f"Пробую резервную модель: {GROQ_FALLBACK_MODEL}")
-                        payload["model"] = GROQ_FALLBACK_MODEL
-                        async with self.session.post(GROQ_API_URL, json=payload, headers=headers, timeout=timeout) as resp2:
-                            if resp2.status == 200:
-                                data = await resp2.json()
-                                content = data["choices"][0]["message"]["content"]
-                                return self._parse_ai_response(content)
-                elif resp.status == 429:
-                    # Rate limit - ждем и пробуем еще раз
-                    error_text = await resp.text()
-                    log_warning("ai_groq", f"Rate limit достигнут. Жду 5 секунд...")
-                    await asyncio.sleep(5)
-                    # Пробуем еще раз с меньшим промптом или пропускаем
-                    log_info("ai_groq", "Пропускаю ИИ-оценку из-за rate limit")
-                    return None
-                else:
-                    error_text = await resp.text()
-                    log_warning("ai_groq", f"Groq API вернул статус {resp.status}: {error_text[:200]}")
+                            log_info("ai_groq", f"Успешная оценка: ${fair_price:,}")
+                            if has_renovation:
+                                log_info("ai_groq", f"  - Состояние ремонта: {result.get('renovation_state')}")
+                            if has_recommendations:
+                                log_info("ai_groq", f"  - Рекомендации: {result.get('recommendations')[:50]}...")
+                            if has_value_score:
+                                log_info("ai_groq", f"  - Оценка: {result.get('value_score')}/10")
+                        return result
+                    elif resp.status == 400:
+                        # Если модель недоступна, пробуем резервную
+                        error_text = await resp.text()
+                        log_warning("ai_groq", f"Groq API вернул статус {resp.status}: {error_text[:200]}")
+                        if "decommissioned" in error_text.lower() or "not found" in error_text.lower():
+                            log_info("ai_groq", f"Пробую резервную модель: {GROQ_FALLBACK_MODEL}")
+                            payload["model"] = GROQ_FALLBACK_MODEL
+                            async with self.session.post(GROQ_API_URL, json=payload, headers=headers, timeout=timeout) as resp2:
+                                if resp2.status == 200:
+                                    data = await read_completion(resp2)
+                                    content = data["choices"][0]["message"]["content"]
+                                    return self._parse_ai_response(content)
+                    elif resp.status == 429:
+                        # Rate limit: планировщик уже остановил выдачу запросов до retry-after
+                        error_text = await resp.text()
+                        log_warning("ai_groq", f"Rate limit достигнут, пропускаю ИИ-оценку: {error_text[:200]}")
+                        return None
+                    else:
+                        error_text = await resp.text()
+                        log_warning("ai_groq", f"Groq API вернул статус {resp.status}: {error_text[:200]}")
         except asyncio.TimeoutError:
             log_warning("ai_groq", "Таймаут запроса к Groq API")
         except Exception as e:
@@ -1000,7 +1089,11 @@ JSON ответ:
                 if resp.status == 200:
                     data = await resp.json()
                     content = data["response"]
-                    return self._parse_ai_response(content)
+                    result = self._parse_ai_response(content)
+                    if result:
+                        # Токены оценки (prompt_eval_count + eval_count) - для метрик кэша оценок
+                        result["tokens_used"] = int(data.get("prompt_eval_count") or 0) + int(data.get("eval_count") or 0)
+                    return result
         except Exception as e:
             print(f"[AI] Ollama ошибка: {e}")
         
@@ -1164,8 +1257,18 @@ JSON ответ:
         
         return []
     
-    async def _select_best_groq_detailed(self, prompt: str, inspected_listings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Выбирает лучшие варианты через Groq API с детальным анализом"""
+    async def _select_best_groq_detailed(
+        self,
+        prompt: str,
+        inspected_listings: List[Dict[str, Any]],
+        final: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Выбирает лучшие варианты через Groq API с детальным анализом
+
+        При потоковом ответе каждый выбранный вариант сразу передается в
+        report_progress (final - выбор финального сравнения, иначе - батча).
+        """
         if not GROQ_API_KEY:
             return []
         
@@ -1175,63 +1278,72 @@ JSON ответ:
         }
         
         payload = {
-            "messages": [
-                {"role": "system", "content": "Ты экспертный помощник по анализу рынка недвижимости Беларуси. Анализируй объявления тщательно, сравнивай между собой и выбирай самые выгодные варианты. Отвечай строго в JSON формате."},
-                {"role": "user", "content": prompt}
-            ],
+            "messages": _selection_messages(prompt),
             "model": GROQ_MODEL,
             "temperature": 0.4,
             "max_tokens": 3000  # Больше токенов для детального анализа
         }
+        if AI_STREAM_ENABLED:
+            payload.update(stream=True, stream_options={"include_usage": True})
+        
+        # Бюджет TPM/RPM общий для всех запросов процесса (utils/llm_scheduler.py)
+        scheduler = get_llm_scheduler("groq", GROQ_MODEL)
+        estimated_tokens = estimate_tokens(payload["messages"])
         
-        # Retry логика для обработки rate limit (429)
+        # Retry логика для ошибок (429 ждет в планировщике до retry-after)
         max_retries = 3
         retry_delay = 10  # Начальная задержка 10 секунд
         
         for attempt in range(max_retries):
             try:
                 timeout = aiohttp.ClientTimeout(total=60)
-                async with self.session.post(GROQ_API_URL, json=payload, headers=headers, timeout=timeout) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        content = data["choices"][0]["message"]["content"]
-                        log_info("ai_select", f"Ответ от Groq: {content[:300]}...")
-                        
-                        selected_with_reasons = self._parse_selection_response_detailed(content, inspected_listings)
-                        return selected_with_reasons
-                    elif resp.status == 429:
-                        # Rate limit - ждем и пробуем еще раз
-                        error_text = await resp.text()
-                        log_warning("ai_select", f"Groq API вернул статус 429 (Rate limit). Попытка {attempt + 1}/{max_retries}. Жду {retry_delay} секунд...")
+                async with scheduler.slot(estimated_tokens, payload["max_tokens"]) as slot:
+                    async with self.session.post(GROQ_API_URL, json=payload, headers=headers, timeout=timeout) as resp:
+                        slot.observe(resp.status, resp.headers)
+                        if resp.status == 200:
+                            parser = TopOffersParser()
+
+                            async def on_text(text: str) -> None:
+                                for offer in parser.feed(text):
+                                    await _report_pick(offer, inspected_listings, final)
+
+                            data = await read_completion(resp, on_text)
+                            slot.settle(usage_tokens(data, payload["messages"]))
+                            observe_usage(payload["messages"], data)
+                            content = data["choices"][0]["message"]["content"]
+                            log_info("ai_select", f"Ответ от Groq: {content[:300]}...")
                         
-                        # Извлекаем информацию о лимите из ошибки (если доступна)
-                        if "tokens per minute" in error_text.lower():
-                            log_info("ai_select", f"Детали ошибки: {error_text[:300]}")
+                            selected_with_reasons = self._parse_selection_response_detailed(content, inspected_listings)
+                            return selected_with_reasons
+                        elif resp.status == 429:
+                            # Rate limit: следующая попытка ждет в планировщике до retry-after
+                            error_text = await resp.text()
+                            log_warning("ai_select", f"Groq API вернул статус 429 (Rate limit). Попытка {attempt + 1}/{max_retries}")
                         
-                        # Увеличиваем задержку с каждой попыткой (exponential backoff)
-                        await asyncio.sleep(retry_delay)
-                        retry_delay = min(retry_delay * 2, 60)  # Максимум 60 секунд
+                            # Извлекаем информацию о лимите из ошибки (если доступна)
+                            if "tokens per minute" in error_text.lower():
+                                log_info("ai_select", f"Детали ошибки: {error_text[:300]}")
                         
-                        if attempt < max_retries - 1:
-                            continue  # Пробуем еще раз
+                            if attempt < max_retries - 1:
+                                continue  # Пробуем еще раз
+                            else:
+                                log_error("ai_select", f"Превышено количество попыток для Groq API (429). Возвращаю пустой результат.")
+                                return []
+                        elif resp.status == 413:
+                            # Request too large - промпт слишком большой
+                            error_text = await resp.text()
+                            log_error("ai_select", f"Groq API вернул статус 413: {error_text[:300]}")
+                            # Возвращаем специальный код ошибки для обработки на уровне выше
+                            raise ValueError("REQUEST_TOO_LARGE")
                         else:
-                            log_error("ai_select", f"Превышено количество попыток для Groq API (429). Возвращаю пустой результат.")
+                            error_text = await resp.text()
+                            log_error("ai_select", f"Groq API вернул статус {resp.status}: {error_text[:200]}")
+                            # Для других ошибок тоже пробуем retry
+                            if attempt < max_retries - 1:
+                                await asyncio.sleep(retry_delay)
+                                retry_delay = min(retry_delay * 2, 60)
+                                continue
                             return []
-                    elif resp.status == 413:
-                        # Request too large - промпт слишком большой
-                        error_text = await resp.text()
-                        log_error("ai_select", f"Groq API вернул статус 413: {error_text[:300]}")
-                        # Возвращаем специальный код ошибки для обработки на уровне выше
-                        raise ValueError("REQUEST_TOO_LARGE")
-                    else:
-                        error_text = await resp.text()
-                        log_error("ai_select", f"Groq API вернул статус {resp.status}: {error_text[:200]}")
-                        # Для других ошибок тоже пробуем retry
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(retry_delay)
-                            retry_delay = min(retry_delay * 2, 60)
-                            continue
-                        return []
             except asyncio.TimeoutError:
                 log_warning("ai_select", f"Таймаут запроса к Groq API (попытка {attempt + 1}/{max_retries})")
                 if attempt < max_retries - 1:
@@ -1353,6 +1465,7 @@ JSON ответ:
                             if inspected["listing"].id == listing_id:
                                 result_list.append({
                                     "listing": inspected["listing"],
+                                    "inspection": inspected.get("inspection", {}),
                                     "reason": extended_reason,
                                     "score": final_score,
                                     "title": title
@@ -1556,13 +1669,59 @@ def get_valuator() -> Optional[AIValuator]:
 
 
 async def valuate_listing(listing: Listing) -> Optional[Dict[str, Any]]:
-    """Оценивает объявление"""
+    """Оценивает объявление (одна оценка на версию объявления, см. utils/valuation_cache.py)"""
     valuator = get_valuator()
     if not valuator:
         return None
     
+    async def valuate(item: Listing) -> Optional[Dict[str, Any]]:
+        async with valuator:
+            return await valuator.valuate(item)
+    
+    return await valuation_cache.get_or_valuate(listing, valuator.model_name, VALUATION_PROMPT_VERSION, valuate)
+
+
+async def valuate_listings(
+    listings: List[Listing],
+    concurrency: Optional[int] = None,
+) -> AsyncIterator[Tuple[Listing, Optional[Dict[str, Any]]]]:
+    """
+    Оценивает объявления пулом из concurrency (AI_VALUATION_CONCURRENCY) задач с общей сессией оценщика
+
+    Результаты (объявление, оценка или None) выдаются в порядке готовности.
+    Запросы к Groq идут в бюджете планировщика (utils/llm_scheduler.py),
+    страницы - в пределах AI_INSPECT_PER_HOST_LIMIT; ошибка оценки одного
+    объявления не прерывает остальные.
+    """
+    valuator = get_valuator()
+    if not valuator or not listings:
+        return
+    
+    semaphore = asyncio.Semaphore(max(1, concurrency or AI_VALUATION_CONCURRENCY))
+    
+    async def valuate(item: Listing) -> Optional[Dict[str, Any]]:
+        return await valuator.valuate(item)
+    
+    async def run(listing: Listing) -> Tuple[Listing, Optional[Dict[str, Any]]]:
+        async with semaphore:
+            try:
+                result = await valuation_cache.get_or_valuate(
+                    listing, valuator.model_name, VALUATION_PROMPT_VERSION, valuate
+                )
+            except Exception as e:
+                log_error("ai", f"Ошибка оценки объявления {listing.id}", e)
+                result = None
+            return listing, result
+    
     async with valuator:
-        return await valuator.valuate(listing)
+        tasks = [asyncio.ensure_future(run(listing)) for listing in listings]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            # Потребитель прервал перебор - оставшиеся оценки не нужны
+            for task in tasks:
+                task.cancel()
 
 
 async def select_best_listings(
@@ -1574,14 +1733,20 @@ async def select_best_listings(
     ИИ анализирует объявления по ссылкам и выбирает лучшие варианты.
     Возвращает список словарей с listing и описанием почему вариант хороший.
     Использует fallback: сначала Groq, при ошибке - Gemini.
+    
+    Результат общий для пользователей с теми же кандидатами и фильтром,
+    пересекающиеся пользователи ранжируют только дельту (utils/selection_cache.py).
     """
     if not listings:
         return []
+    
+    # Запросы подбора идут в справедливую очередь планировщика от имени пользователя
+    current_llm_user.set(user_filters.get("telegram_id") or user_filters.get("user_id"))
         
         # Формируем список для промпта (только базовые данные + ссылки)
         # Исключаем объявления без цены (договорная, 0, None)
     # Лимит объявлений зависит от размера промпта, обычно до 100 OK
-    listings_to_inspect = []
+    candidates = []
     
     for listing in listings[:100]:  # Максимум 100 объявлений для анализа
         # Пропускаем объявления без цены
@@ -1589,7 +1754,53 @@ async def select_best_listings(
             log_info("ai_select", f"Пропускаю объявление {listing.id}: цена не указана или равна 0")
             continue
         
-        listings_to_inspect.append(listing)
+        candidates.append(listing)
+    
+    if not GROQ_API_KEY:
+        # Без ИИ результат ("ИИ недоступен") не кэшируется
+        return await _select_best_uncached(candidates, user_filters, max_results)
+    
+    async def select(pool: List[Listing]) -> List[Dict[str, Any]]:
+        return await _select_best_uncached(pool, user_filters, max_results)
+    
+    return await selection_cache.get_or_select(candidates, user_filters, max_results, SELECTION_PROMPT_VERSION, select)
+
+
+async def _select_best_uncached(
+    listings_to_inspect: List[Listing],
+    user_filters: Dict[str, Any],
+    max_results: int
+) -> List[Dict[str, Any]]:
+    """Турнир ИИ-подбора: пре-ранжирование, инспекция, батчи, раунды и финальное сравнение"""
+    if not listings_to_inspect:
+        return []
+    
+    # Пре-ранжирование: доминируемые по цене за м², году и площади отбрасываются,
+    # в LLM (и на инспекцию) уходят только AI_PRERANK_TOP_K лучших по оценке выгодности
+    prerank_ids: List[str] = []
+    if AI_PRERANK_TOP_K > 0 and listings_to_inspect:
+        candidates = listings_to_inspect
+        # Недоминируемых может оказаться меньше нужного: добираем лучшими из остальных
+        ranked = prerank_listings(candidates, min_count=max(max_results, AI_PRERANK_TOP_K))
+        listings_to_inspect = ranked[:AI_PRERANK_TOP_K]
+        prerank_ids = [listing.id for listing in listings_to_inspect]
+        full_batches, full_tokens = _selection_plan(candidates, user_filters)
+        _, sent_tokens = _selection_plan(listings_to_inspect, user_filters)
+        avoided = prerank_stats.record_run(
+            len(candidates), len(candidates) - len(ranked), len(listings_to_inspect), max_results,
+            full_tokens - sent_tokens, batch_size=math.ceil(len(candidates) / full_batches),
+        )
+        log_info(
+            "ai_select",
+            f"Пре-ранжирование: {len(candidates)} кандидатов, доминируемых {len(candidates) - len(ranked)}, "
+            f"в ИИ {len(listings_to_inspect)}; сэкономлено запросов {avoided['llm_calls']}, "
+            f"токенов промптов ~{avoided['tokens']}"
+        )
+    
+    def record_picks(results: List[Dict[str, Any]]) -> None:
+        """Сравнивает выбор ИИ с верхом пре-ранжирования (метрики utils/prerank.py)"""
+        picked_ids = [result["listing"].id for result in results if result.get("listing")]
+        prerank_stats.record_picks(prerank_ids, picked_ids)
     
     # Инициализируем список для промпта до блока try
     listings_for_prompt = []
@@ -1601,7 +1812,9 @@ async def select_best_listings(
     await valuator.start_session()
     
     try:
-        # Инспектируем параллельно (но ограничиваем количество для скорости и размера промпта)
+        # Инспектируем параллельно (но ограничиваем количество для скорости и размера промпта);
+        # страницы, уже инспектированные в прошлых прогонах, берутся из кэша инспекций,
+        # одновременных загрузок с одного сайта - не больше AI_INSPECT_PER_HOST_LIMIT
         # Ограничиваем до 20 для уменьшения размера промпта (Groq API лимит ~6000 токенов)
         inspect_limit = min(20, len(listings_to_inspect))  # Максимум 20 объявлений для инспекции
         inspection_tasks = []
@@ -1642,23 +1855,11 @@ async def select_best_listings(
     
     log_info("ai_select", f"Подготавливаю {len(listings_for_prompt)} объявлений для анализа...")
     
-    # Динамический батчинг: разбиваем объявления на батчи и отправляем несколько запросов
-    # Размер батча зависит от количества объявлений
-    total_listings = len(listings_for_prompt)
+    # Батчи набираются по бюджету токенов промпта (AI_SELECT_PROMPT_TOKENS),
+    # а не фиксированным числом объявлений: компактные строки таблицы вмещают больше
+    batches = _pack_batches(listings_for_prompt, user_filters)
     
-    # Определяем размер батча (10-15 объявлений на батч для оптимального размера промпта)
-    if total_listings <= 15:
-        # Если объявлений мало - отправляем одним запросом
-        batch_size = total_listings
-        batches = [listings_for_prompt]
-    else:
-        # Разбиваем на батчи по 12 объявлений (оптимально для промпта ~3000-4000 токенов)
-        batch_size = 12
-        batches = []
-        for i in range(0, total_listings, batch_size):
-            batches.append(listings_for_prompt[i:i + batch_size])
-    
-    log_info("ai_select", f"Разбито на {len(batches)} батч(ей) по ~{batch_size} объявлений")
+    log_info("ai_select", f"Разбито на {len(batches)} батч(ей) в бюджете {AI_SELECT_PROMPT_TOKENS} токенов промпта")
     
     # Список провайдеров для fallback (в порядке приоритета)
     providers_to_try = []
@@ -1687,8 +1888,7 @@ async def select_best_listings(
         # Потом все лучшие из батчей будут сравниваться отдельным запросом к ИИ
         batch_max_results = 2  # Два лучших объявления из каждого батча
         prompt = _prepare_selection_prompt_detailed(batch_listings, user_filters, batch_max_results)
-        prompt_length = len(prompt)
-        estimated_tokens = prompt_length // 4
+        estimated_tokens = count_message_tokens(_selection_messages(prompt))
         
         log_info("ai_select", f"Батч {batch_num + 1}/{len(batches)}: {len(batch_listings)} объявлений, промпт ~{estimated_tokens} токенов")
         
@@ -1724,25 +1924,11 @@ async def select_best_listings(
         log_warning("ai_select", f"Батч {batch_num + 1}: не удалось получить результат")
         return []
     
-    # Обрабатываем батчи последовательно или с минимальной параллельностью для избежания rate limit
-    # Groq API имеет лимит 6000 токенов/минуту (TPM), поэтому обрабатываем по 1-2 батча за раз
-    log_info("ai_select", f"Обрабатываю {len(batches)} батч(ей) с ограничением параллельности...")
+    # Батчи запускаются сразу: запрос уходит, как только его токены помещаются
+    # в минутный бюджет Groq (TPM/RPM, utils/llm_scheduler.py)
+    log_info("ai_select", f"Обрабатываю {len(batches)} батч(ей) в пределах бюджета Groq...")
     
-    # Уменьшаем параллельность до 1 батча одновременно для избежания rate limit
-    # Groq API: лимит 6000 TPM, каждый батч использует ~1200-1800 токенов
-    semaphore = asyncio.Semaphore(1)
-    
-    async def process_batch_with_semaphore(batch_listings, batch_num):
-        async with semaphore:
-            # Задержка между батчами для избежания rate limit (Groq: 6000 TPM)
-            # Каждый батч использует ~1500 токенов, поэтому нужна задержка ~15 секунд между батчами
-            if batch_num > 0:
-                delay = 15  # 15 секунд между батчами для соблюдения лимита 6000 TPM
-                log_info("ai_select", f"Жду {delay} секунд перед обработкой батча {batch_num + 1}...")
-                await asyncio.sleep(delay)
-            return await process_batch(batch_listings, batch_num)
-    
-    batch_tasks = [process_batch_with_semaphore(batch, i) for i, batch in enumerate(batches)]
+    batch_tasks = [process_batch(batch, i) for i, batch in enumerate(batches)]
     batch_results = await asyncio.gather(*batch_tasks, return_exceptions=True)
     
     # Собираем все результаты
@@ -1772,6 +1958,7 @@ async def select_best_listings(
     # Если у нас только одно объявление или меньше max_results, возвращаем как есть
     if len(unique_results) <= max_results:
         log_info("ai_select", f"Вариантов меньше или равно {max_results}, возвращаю без финального сравнения")
+        record_picks(unique_results[:max_results])
         return unique_results[:max_results]
     
     # Функция для извлечения score из результата
@@ -1788,17 +1975,14 @@ async def select_best_listings(
         return 0
     
     # Если получилось больше 12 вариантов, делаем дополнительные раунды батчей
-    # Каждый раунд обрабатывает результаты предыдущего раунда через батчи по 12
+    # Каждый раунд обрабатывает результаты предыдущего раунда батчами в том же бюджете токенов
     current_round_results = unique_results
     round_num = 1
     
     while len(current_round_results) > 12:
         log_info("ai_select", f"Раунд {round_num}: получено {len(current_round_results)} вариантов, делаю дополнительный раунд батчей...")
         
-        # Разбиваем на батчи по 12
-        round_batches = []
-        for i in range(0, len(current_round_results), 12):
-            round_batches.append(current_round_results[i:i + 12])
+        round_batches = _pack_batches(current_round_results, user_filters)
         
         log_info("ai_select", f"Раунд {round_num}: разбито на {len(round_batches)} батч(ей)")
         
@@ -1810,8 +1994,7 @@ async def select_best_listings(
             # Используем те же параметры что и в основном батче
             batch_max_results = 2  # Два лучших объявления из каждого батча
             prompt = _prepare_selection_prompt_detailed(batch_listings, user_filters, batch_max_results)
-            prompt_length = len(prompt)
-            estimated_tokens = prompt_length // 4
+            estimated_tokens = count_message_tokens(_selection_messages(prompt))
             
             log_info("ai_select", f"Раунд {round_num}, батч {batch_num + 1}/{len(round_batches)}: {len(batch_listings)} объявлений, промпт ~{estimated_tokens} токенов")
             
@@ -1846,18 +2029,8 @@ async def select_best_listings(
             log_warning("ai_select", f"Раунд {round_num}, батч {batch_num + 1}: не удалось получить результат")
             return []
         
-        # Обрабатываем батчи последовательно с задержками
-        semaphore = asyncio.Semaphore(1)
-        
-        async def process_round_batch_with_semaphore(batch_listings, batch_num):
-            async with semaphore:
-                if batch_num > 0:
-                    delay = 15  # 15 секунд между батчами
-                    log_info("ai_select", f"Раунд {round_num}: жду {delay} секунд перед обработкой батча {batch_num + 1}...")
-                    await asyncio.sleep(delay)
-                return await process_round_batch(batch_listings, batch_num)
-        
-        round_batch_tasks = [process_round_batch_with_semaphore(batch, i) for i, batch in enumerate(round_batches)]
+        # Паузы между батчами задает бюджет планировщика
+        round_batch_tasks = [process_round_batch(batch, i) for i, batch in enumerate(round_batches)]
         round_batch_results = await asyncio.gather(*round_batch_tasks, return_exceptions=True)
         
         # Собираем результаты раунда
@@ -1883,6 +2056,13 @@ async def select_best_listings(
             current_round_results = unique_round_results
             break
         
+        # Раунд не сократил число вариантов - новые раунды тоже не сократят,
+        # в финальное сравнение идут лучшие 12 по оценке
+        if len(unique_round_results) >= len(current_round_results):
+            log_warning("ai_select", f"Раунд {round_num} не сократил число вариантов ({len(unique_round_results)}), перехожу к финальному сравнению")
+            current_round_results = unique_round_results
+            break
+        
         # Иначе продолжаем с новыми результатами
         current_round_results = unique_round_results
         round_num += 1
@@ -1896,9 +2076,6 @@ async def select_best_listings(
     # Если у нас несколько лучших вариантов из разных батчей, делаем финальное сравнение через ИИ
     log_info("ai_select", f"Делаю финальное сравнение {len(top_12_for_final)} лучших вариантов из батчей...")
     
-    # Задержка перед финальным сравнением для соблюдения rate limit
-    await asyncio.sleep(15)
-    
     # Подготавливаем данные для финального сравнения
     # Формат должен соответствовать тому, что ожидает _select_best_groq_detailed
     final_comparison_listings = []
@@ -1936,7 +2113,9 @@ async def select_best_listings(
                     # Retry логика для финального сравнения
                     for final_attempt in range(max_final_retries):
                         try:
-                            final_selected = await valuator._select_best_groq_detailed(current_prompt, current_listings_for_final)
+                            final_selected = await valuator._select_best_groq_detailed(
+                                current_prompt, current_listings_for_final, final=True
+                            )
                             
                             if final_selected and len(final_selected) > 0:
                                 log_info("ai_select", f"✅ Финальное сравнение: выбрано {len(final_selected)} вариантов")
@@ -2024,12 +2203,87 @@ async def select_best_listings(
             return 0
         
         unique_results.sort(key=get_score, reverse=True)
+        record_picks(unique_results[:max_results])
         return unique_results[:max_results]
     
     log_info("ai_select", f"Финальное сравнение завершено, возвращаю топ-3")
+    record_picks(final_selected[:3])
     return final_selected[:3]
 
 
+async def _report_pick(offer: Dict[str, Any], inspected_listings: List[Dict[str, Any]], final: bool) -> None:
+    """Промежуточный результат подбора: вариант, выбранный LLM, как только он получен из потока"""
+    listing_id = offer.get("offer_id", offer.get("id", ""))
+    for inspected in inspected_listings:
+        if inspected["listing"].id == listing_id:
+            await report_progress({
+                "listing": inspected["listing"],
+                "score": offer.get("final_score", 0),
+                "title": offer.get("title", ""),
+                "final": final,
+            })
+            return
+
+
+def _selection_messages(prompt: str) -> List[Dict[str, str]]:
+    """Сообщения запроса подбора (системный промпт и промпт батча)"""
+    return [
+        {"role": "system", "content": SELECTION_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+# Минимум объявлений в батче подбора (из батча выбираются 2 лучших)
+_MIN_SELECT_BATCH_ROWS = 3
+
+
+def _pack_batches(
+    items: List[Dict[str, Any]],
+    user_filters: Dict[str, Any],
+    budget_tokens: int = AI_SELECT_PROMPT_TOKENS,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Разбивает объявления на батчи подбора по бюджету токенов промпта
+
+    Токены строк таблицы складываются (utils/tokens.py), поэтому промпт
+    целиком собирается только один раз - без объявлений, для служебной части.
+    В батче не меньше _MIN_SELECT_BATCH_ROWS объявлений даже сверх бюджета:
+    из батча выбираются 2 лучших, и раунд турнира должен сокращать число вариантов.
+    """
+    overhead = count_message_tokens(_selection_messages(_prepare_selection_prompt_detailed([], user_filters, 2)))
+    batches: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    used = overhead
+    for item in items:
+        row_tokens = count_tokens(_listing_row(item, log_hints=False) + "\n")
+        if len(current) >= _MIN_SELECT_BATCH_ROWS and used + row_tokens > budget_tokens:
+            batches.append(current)
+            current, used = [], overhead
+        current.append(item)
+        used += row_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _selection_plan(listings: List[Listing], user_filters: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    Батчей и токенов промптов первого раунда подбора для listings (без инспекций)
+
+    Returns:
+        (число батчей, токенов промптов)
+    """
+    if not listings:
+        return 0, 0
+    items = [{"listing": listing, "inspection": {}} for listing in listings]
+    batches = _pack_batches(items, user_filters)
+    tokens = sum(
+        count_message_tokens(_selection_messages(_prepare_selection_prompt_detailed(batch, user_filters, 2)))
+        for batch in batches
+    )
+    return len(batches), tokens
+
+
 def _prepare_final_comparison_prompt(
     best_from_batches: List[Dict[str, Any]], 
     user_filters: Dict[str, Any], 
@@ -2043,60 +2297,8 @@ def _prepare_final_comparison_prompt(
     max_rooms = user_filters.get("max_rooms", 4)
     city = user_filters.get("city", "Минск").title()
     
-    # Формируем список лучших вариантов из батчей с их оценками
-    listings_text = []
-    
-    for i, item in enumerate(best_from_batches, 1):
-        listing = item["listing"]
-        batch_score = item.get("batch_score", 0)
-        batch_reason = item.get("batch_reason", "")
-        
-        # Цена в USD
-        price_usd = listing.price_usd if listing.price_usd else (
-            int(listing.price_byn / 2.95) if listing.price_byn else (
-                int(listing.price / 2.95) if listing.currency == "BYN" else listing.price
-            )
-        )
-        price_text = f"${price_usd:,}" if price_usd > 0 else "?"
-        
-        # Цена за м²
-        price_per_sqm = ""
-        if listing.area > 0 and price_usd > 0:
-            price_per_sqm = f" (${int(price_usd / listing.area)}/м²)"
-        
-        # Компактный формат параметров
-        compact_params = _format_listing_compact(listing)
-        
-        # Адрес (сокращен до 40 символов)
-        address_short = listing.address[:40] if listing.address else ""
-        
-        # Название (сокращено до 80 символов)
-        title_text = listing.title[:80] if listing.title else ""
-        
-        # Описание (сокращено до 400 символов для оптимизации размера промпта)
-        inspection = item.get("inspection", {})
-        full_description = inspection.get("full_description", "") if inspection else ""
-        description_text = full_description[:400] if full_description else (listing.description[:400] if listing.description else "")
-        
-        # Логируем для отладки проверки на долю/часть дома
-        if description_text and ("часть дома" in description_text.lower() or "квартира в частном доме" in description_text.lower()):
-            log_info("ai_select", f"⚠️ Обнаружена потенциальная 'часть дома' в описании для {listing.id}: {description_text[:100]}...")
-        
-        # Формируем информацию об объявлении в компактном формате
-        listing_info = f"{i}. ID:{listing.id} | {compact_params} | {price_text}{price_per_sqm} | Адр:{address_short}"
-        if title_text:
-            listing_info += f"\n   📌 Название: {title_text}"
-        if description_text:
-            listing_info += f"\n   📝 Описание: {description_text}"
-        else:
-            listing_info += f"\n   📝 Описание: [не указано - проверь по ссылке]"
-        listing_info += f"\n   🔗 Ссылка: {listing.url}"
-        if batch_score > 0:
-            listing_info += f"\n   ⭐ Предварительная оценка из батча: {batch_score}/10"
-        if batch_reason:
-            listing_info += f"\n   💭 Обоснование из батча: {batch_reason[:150]}"
-        listing_info += "\n"
-        listings_text.append(listing_info)
+    # Лучшие варианты из батчей - таблицей с предварительной оценкой и обоснованием
+    table = "\n".join(_listing_row(item, batch_columns=True, description_limit=300) for item in best_from_batches)
     
     # Определяем рыночные данные для города
     market_info = ""
@@ -2193,8 +2395,9 @@ def _prepare_final_comparison_prompt(
 
 Выбери ТОП-{max_results} ЛУЧШИХ из этих вариантов (ТОЛЬКО ЦЕЛЫЕ КВАРТИРЫ!), учитывая их преимущества НА ФОНЕ ТЕКУЩЕГО РЫНКА {city.upper()}!
 
-ЛУЧШИЕ ВАРИАНТЫ ИЗ БАТЧЕЙ ДЛЯ ФИНАЛЬНОГО СРАВНЕНИЯ:
-{''.join(listings_text)}
+ЛУЧШИЕ ВАРИАНТЫ ИЗ БАТЧЕЙ ДЛЯ ФИНАЛЬНОГО СРАВНЕНИЯ ({_TABLE_LEGEND}; Балл и Обоснование - из батча):
+{_TABLE_HEADER}|Балл|Обоснование
+{table}
 
 ФОРМАТ ОТВЕТА (строго JSON):
 {{
@@ -2215,49 +2418,116 @@ def _prepare_final_comparison_prompt(
     return prompt
 
 
-def _format_listing_compact(listing: Listing) -> str:
-    """Форматирует объявление в компактном формате для промптов"""
-    parts = []
+# Колонки таблицы объявлений в промптах подбора и их расшифровка
+_TABLE_HEADER = "ID|К|Пл(ж/к)|Эт|Год|$|$/м²|Адрес|Дом|Балк|Су|Рем|Прод|Описание"
+_TABLE_LEGEND = (
+    "К - комнат, Пл - площадь м² (жилая/кухня), Эт - этаж/этажность, $ - цена USD, "
+    "Дом - тип дома, Балк - балкон, Су - санузел, Рем - ремонт, "
+    "Прод - С собственник/А агентство, \"-\" - нет данных"
+)
+
+# Признаки доли/комнаты/части дома и параметры качества - по ним отбираются
+# предложения описания, когда оно не помещается целиком
+_SHARE_WORDS = (
+    "доля", "долю", "1/2", "1/3", "1/4", "половин", "комната в", "комнату в",
+    "коммунал", "общежит", "часть дома", "частном доме", "часть квартиры",
+)
+_QUALITY_WORDS = (
+    "ремонт", "балкон", "лоджи", "санузел", "кухн", "кирпич", "монолит", "панел",
+    "лифт", "мебел", "техник", "окн", "торг", "собственник", "центр", "парков", "школ", "отоплен",
+)
+_SENTENCE_RE = re.compile(r"(?<=[.!?;])\s+|\n+")
+
+
+def _relevant_excerpt(text: str, limit: int) -> str:
+    """
+    Описание, сокращенное до limit символов по релевантности
+
+    Сначала предложения с признаками доли/комнаты/части дома, затем - с
+    параметрами качества (ремонт, балкон, тип дома...); порядок предложений сохраняется.
+    """
+    if len(" ".join(text.split())) <= limit:
+        return " ".join(text.split())
+    sentences = [" ".join(part.split()) for part in _SENTENCE_RE.split(text) if part.strip()]
+
+    def relevance(sentence: str) -> int:
+        lower = sentence.lower()
+        return 3 * any(word in lower for word in _SHARE_WORDS) + sum(word in lower for word in _QUALITY_WORDS)
+
+    order = sorted(range(len(sentences)), key=lambda i: (-relevance(sentences[i]), i))
+    chosen, used = [], 0
+    for i in order:
+        if used + len(sentences[i]) + 1 <= limit:
+            chosen.append(i)
+            used += len(sentences[i]) + 1
+    if not chosen:
+        return sentences[order[0]][:limit] if sentences else ""
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+
+def _table_cell(value: Any) -> str:
+    text = " ".join(str(value).replace("|", "/").split()) if value not in (None, "") else ""
+    return text or "-"
+
+
+def _listing_row(
+    item: Dict[str, Any],
+    batch_columns: bool = False,
+    description_limit: int = 240,
+    log_hints: bool = True,
+) -> str:
+    """
+    Строка таблицы объявлений (_TABLE_HEADER) для промптов подбора
+
+    Args:
+        item: {"listing": Listing, "inspection": {...}} (в финале - и batch_score/batch_reason)
+        batch_columns: Добавить колонки оценки и обоснования из батча
+        description_limit: Максимум символов описания (_relevant_excerpt)
+        log_hints: Логировать признаки части дома (не нужно при подсчете токенов)
+    """
+    listing = item["listing"]
     
-    # Основные параметры
-    main = f"К:{listing.rooms}, Пл:{listing.area}м²"
-    if listing.living_area > 0 and listing.living_area != listing.area:
-        main += f"(ж:{listing.living_area})"
-    if listing.kitchen_area > 0:
-        main += f"(к:{listing.kitchen_area})"
+    # Цена в USD
+    price_usd = listing.price_usd if listing.price_usd else (
+        int(listing.price_byn / 2.95) if listing.price_byn else (
+            int(listing.price / 2.95) if listing.currency == "BYN" else listing.price
+        )
+    )
+    price_per_sqm = int(price_usd / listing.area) if listing.area > 0 and price_usd > 0 else ""
+    
+    area = f"{listing.area:g}" if listing.area else ""
+    if listing.living_area > 0 or listing.kitchen_area > 0:
+        living = f"{listing.living_area:g}" if listing.living_area > 0 else "-"
+        kitchen = f"{listing.kitchen_area:g}" if listing.kitchen_area > 0 else "-"
+        area += f"({living}/{kitchen})"
     
     # Этаж и этажность
-    floor_info = listing.floor if listing.floor else "?"
-    # Если этаж не содержит "/" и есть информация об этажности, добавляем её
-    if listing.total_floors and "/" not in str(floor_info) and floor_info != "?":
+    floor_info = str(listing.floor) if listing.floor else "?"
+    if listing.total_floors and "/" not in floor_info:
         floor_info = f"{floor_info}/{listing.total_floors}"
-    elif listing.total_floors and floor_info == "?":
-        # Если этаж неизвестен, но есть этажность, показываем только этажность
-        floor_info = f"?/{listing.total_floors}"
-    
-    # Дополнительные параметры
-    extras = []
-    if listing.house_type:
-        house_type_short = listing.house_type[:10] if len(listing.house_type) > 10 else listing.house_type
-        extras.append(f"Тип:{house_type_short}")
-    if listing.balcony:
-        balcony_short = listing.balcony[:5] if len(listing.balcony) > 5 else listing.balcony
-        extras.append(f"Б:{balcony_short}")
-    if listing.bathroom:
-        bathroom_short = listing.bathroom[:8] if len(listing.bathroom) > 8 else listing.bathroom
-        extras.append(f"С:{bathroom_short}")
-    if listing.renovation_state:
-        renovation_short = listing.renovation_state[:10] if len(listing.renovation_state) > 10 else listing.renovation_state
-        extras.append(f"Р:{renovation_short}")
-    if listing.is_company is not None:
-        extras.append("Пр:Агентство" if listing.is_company else "Пр:Собственник")
-    
-    year_info = listing.year_built if listing.year_built else "?"
-    result = f"{main}, Эт:{floor_info}, Г:{year_info}"
-    if extras:
-        result += f", {', '.join(extras)}"
-    
-    return result
+    
+    seller = "" if listing.is_company is None else ("А" if listing.is_company else "С")
+    
+    inspection = item.get("inspection") or {}
+    description = inspection.get("full_description") or listing.description or ""
+    
+    # Логируем для отладки проверки на долю/часть дома
+    if log_hints and ("часть дома" in description.lower() or "квартира в частном доме" in description.lower()):
+        log_info("ai_select", f"⚠️ Обнаружена потенциальная 'часть дома' в описании для {listing.id}: {description[:100]}...")
+    
+    # Название часто содержит признаки комнаты/доли - идет первым предложением
+    text = f"{listing.title[:80]}. {description}" if listing.title else description
+    
+    cells = [
+        listing.id, listing.rooms or "", area, floor_info, listing.year_built,
+        price_usd if price_usd > 0 else "", price_per_sqm, (listing.address or "")[:40],
+        (listing.house_type or "")[:10], (listing.balcony or "")[:8], (listing.bathroom or "")[:10],
+        (listing.renovation_state or "")[:12], seller, _relevant_excerpt(text, description_limit),
+    ]
+    if batch_columns:
+        batch_score = item.get("batch_score", 0)
+        cells += [batch_score if batch_score and batch_score > 0 else "", (item.get("batch_reason") or "")[:150]]
+    return "|".join(_table_cell(cell) for cell in cells)
 
 
 def _prepare_selection_prompt_detailed(
@@ -2273,56 +2543,9 @@ def _prepare_selection_prompt_detailed(
     max_rooms = user_filters.get("max_rooms", 4)
     city = user_filters.get("city", "Минск").title()
     
-    # Формируем список объявлений с деталями
-    # Ограничиваем количество для предотвращения ошибки "Request too large"
-    # Groq API имеет лимит ~6000 токенов для llama-3.1-8b-instant
-    listings_text = []
-    listings_to_process = inspected_listings[:20]  # Уменьшено до 20 объявлений для уменьшения размера промпта
-    
-    for i, item in enumerate(listings_to_process, 1):
-        listing = item["listing"]
-        
-        # Цена в USD
-        price_usd = listing.price_usd if listing.price_usd else (
-            int(listing.price_byn / 2.95) if listing.price_byn else (
-                int(listing.price / 2.95) if listing.currency == "BYN" else listing.price
-            )
-        )
-        price_text = f"${price_usd:,}" if price_usd > 0 else "?"
-        
-        # Цена за м²
-        price_per_sqm = ""
-        if listing.area > 0 and price_usd > 0:
-            price_per_sqm = f" (${int(price_usd / listing.area)}/м²)"
-        
-        # Компактный формат параметров
-        compact_params = _format_listing_compact(listing)
-        
-        # Адрес (сокращен до 40 символов)
-        address_short = listing.address[:40] if listing.address else ""
-        
-        # Название (сокращено до 80 символов)
-        title_text = listing.title[:80] if listing.title else ""
-        
-        # Описание (сокращено до 400 символов для оптимизации размера промпта)
-        inspection = item.get("inspection", {})
-        full_description = inspection.get("full_description", "") if inspection else ""
-        description_text = full_description[:400] if full_description else (listing.description[:400] if listing.description else "")
-        
-        # Логируем для отладки проверки на долю/часть дома
-        if description_text and ("часть дома" in description_text.lower() or "квартира в частном доме" in description_text.lower()):
-            log_info("ai_select", f"⚠️ Обнаружена потенциальная 'часть дома' в описании для {listing.id}: {description_text[:100]}...")
-        
-        # Формируем информацию об объявлении в компактном формате
-        listing_info = f"{i}. ID:{listing.id} | {compact_params} | {price_text}{price_per_sqm} | Адр:{address_short}"
-        if title_text:
-            listing_info += f"\n   📌 Название: {title_text}"
-        if description_text:
-            listing_info += f"\n   📝 Описание: {description_text}"
-        else:
-            listing_info += f"\n   📝 Описание: [не указано - проверь по ссылке]"
-        listing_info += f"\n   🔗 Ссылка: {listing.url}\n"
-        listings_text.append(listing_info)
+    # Объявления - таблицей с фиксированными колонками; размер батча задает
+    # бюджет токенов (_pack_batches), а не число объявлений
+    table = "\n".join(_listing_row(item) for item in inspected_listings)
     
     # Оптимизированный промпт (сокращен для уменьшения размера)
     prompt = f"""Эксперт по недвижимости Беларуси. Анализируй объявления и выбирай лучшие.
@@ -2357,8 +2580,9 @@ def _prepare_selection_prompt_detailed(
 
 Выбери ТОП-{max_results} лучших (ТОЛЬКО ЦЕЛЫЕ КВАРТИРЫ!)
 
-ОБЪЯВЛЕНИЯ ДЛЯ АНАЛИЗА:
-{''.join(listings_text)}
+ОБЪЯВЛЕНИЯ ДЛЯ АНАЛИЗА ({_TABLE_LEGEND}):
+{_TABLE_HEADER}
+{table}
 
 ФОРМАТ ОТВЕТА (строго JSON):
 {{
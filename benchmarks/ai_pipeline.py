@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк ИИ-режима: select_best_listings и evaluate_and_compare_new_listings
+поверх локальной замены LLM (tools/fake_llm_api.py)
+
+Все внешние зависимости локальные:
+- объявления: записанные ответы Kufar (kufar_raw_run_*.json в корне
+  репозитория); страницы объявлений для инспекции - кассеты replay
+  (scrapers/http_cassette.py) с описанием из записи
+- Groq: FakeLLMAPI (GROQ_API_URL) с задержкой, лимитами --rpm/--tpm
+  в окне --window-seconds и 429 на каждый --rate-limit-every-й запрос;
+  планировщик utils/llm_scheduler.py получает те же лимиты и окно
+  (--scheduler-rpm/--scheduler-tpm 0 - без бюджета на стороне клиента,
+  только заголовки лимитов и retry-after из ответов 429)
+- Telegram: tools/fake_telegram_api.py (сообщения evaluate_and_compare)
+
+K пользователей ИИ-режима с разными бюджетами (--users) одновременно
+запускают подбор по записанным объявлениям, затем оценку --new последних
+подходящих под фильтр объявлений как новых со сравнением с выбранными (объявления, которые локальное
+сравнение utils/similarity.py считает не лучше выбранных, в LLM не идут;
+--no-local-compare - оценивать все).
+
+Отчет по этапам: время, время до первого промежуточного результата подбора
+(потоковые ответы, --no-stream - без них), запросов к LLM (и ответов 429),
+токены по usage провайдера, ожидание бюджета в планировщике (суммарно и максимум).
+
+Использование:
+    python benchmarks/ai_pipeline.py
+    python benchmarks/ai_pipeline.py --users 5 --latency-ms 800 --tpm 6000 --rpm 30
+    python benchmarks/ai_pipeline.py --window-seconds 6 --rate-limit-every 7 --scheduler-tpm 0
+    python benchmarks/ai_pipeline.py --no-stream
+    python benchmarks/ai_pipeline.py --valuation-concurrency 1
+    python benchmarks/ai_pipeline.py --no-local-compare
+"""
+import argparse
+import asyncio
+import html
+import json
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+import ai_valuator
+import config
+from bot.services import ai_service, telegram_api
+from scrapers.http_cassette import Cassette, configure_cassette
+from scrapers.kufar import KufarScraper
+from tools.fake_llm_api import FakeLLMAPI
+from tools.fake_telegram_api import FakeTelegramAPI
+from utils import llm_scheduler
+from utils.llm_stream import current_llm_progress
+from utils.selection_cache import selection_cache
+from utils.similarity import listing_features, local_comparator
+from utils.valuation_cache import valuation_cache
+
+FIRST_USER_ID = 200_000_000
+
+
+def load_listings(copies: int) -> list:
+    """Объявления из записанных прогонов Kufar (копии - с отдельными id)"""
+    scraper = KufarScraper()
+    listings = []
+    for path in sorted(ROOT.glob("kufar_raw_run_*.json")):
+        with open(path, encoding="utf-8") as f:
+            pages = json.load(f)["raw_api_responses"]
+        for page in pages:
+            for ad in page.get("ads", []):
+                listing = scraper._parse_ad(ad, "барановичи")
+                if listing:
+                    listings.append(listing)
+    unique = list({listing.id: listing for listing in listings}.values())
+    result = []
+    for i in range(copies):
+        for listing in unique:
+            copy = listing if i == 0 else listing.__class__(**{**listing.to_dict(), "id": f"{listing.id}_{i}"})
+            if i:
+                copy.url = f"{listing.url}#{i}"
+            result.append(copy)
+    return result
+
+
+def record_pages(cassette: Cassette, listings: list) -> None:
+    """Страницы объявлений для инспекции: заголовок, адрес и описание из записи"""
+    for listing in listings:
+        if not listing.url:
+            continue
+        page = (
+            f"<html><head><title>{html.escape(listing.title)}</title>"
+            f'<meta name="description" content="{html.escape(listing.description or "")}"></head>'
+            f"<body><h1>{html.escape(listing.title)}</h1><div>{html.escape(listing.address)}</div>"
+            f"<div>{html.escape(listing.description or '')}</div></body></html>"
+        )
+        cassette.save(listing.url, None, 200, page, "text/html")
+
+
+def user_filters(index: int, users: int) -> dict:
+    """Бюджеты пользователей от $25k до $85k, комнаты 1-3"""
+    step = 60000 // max(users, 1)
+    return {
+        "telegram_id": FIRST_USER_ID + index,
+        "city": "барановичи",
+        "min_price": 20000,
+        "max_price": 25000 + step * (index + 1),
+        "min_rooms": 1,
+        "max_rooms": 3,
+    }
+
+
+def matches(filters: dict, listing) -> bool:
+    return (
+        filters["min_price"] <= (listing.price_usd or listing.price) <= filters["max_price"]
+        and filters["min_rooms"] <= listing.rooms <= filters["max_rooms"]
+    )
+
+
+def snapshot(llm: FakeLLMAPI) -> dict:
+    scheduler = llm_scheduler.get_llm_scheduler("groq", ai_valuator.GROQ_MODEL).get_stats()
+    return {
+        "requests": llm.stats["requests"],
+        "rate_limited": llm.stats["rate_limited"],
+        "tokens": llm.stats["total_tokens"],
+        "wait_seconds": scheduler["wait_seconds"],
+        "max_wait_seconds": scheduler["max_wait_seconds"],
+        "client_rate_limited": scheduler["rate_limited"],
+    }
+
+
+async def measure(name: str, llm: FakeLLMAPI, coroutines, first_results: dict = None) -> dict:
+    """first_results заполняют корутины этапа: пользователь -> время первого результата (perf_counter)"""
+    before = snapshot(llm)
+    started = time.perf_counter()
+    await asyncio.gather(*coroutines)
+    elapsed = time.perf_counter() - started
+    after = snapshot(llm)
+    result = {key: after[key] - before[key] for key in ("requests", "rate_limited", "tokens", "wait_seconds")}
+    result.update(stage=name, elapsed=elapsed, max_wait_seconds=after["max_wait_seconds"])
+    if first_results:
+        result["first_result"] = sum(t - started for t in first_results.values()) / len(first_results)
+    return result
+
+
+async def run(args) -> list:
+    listings = load_listings(args.copies)
+    cassette = Cassette(args.cassettes)
+    record_pages(cassette, listings)
+    configure_cassette("replay", cassette)
+
+    llm = FakeLLMAPI(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rpm=args.rpm, tpm=args.tpm,
+        window_seconds=args.window_seconds, rate_limit_every=args.rate_limit_every,
+        retry_after=args.retry_after, seed=args.seed,
+    )
+    async with llm, FakeTelegramAPI(latency_ms=20) as telegram:
+        ai_valuator.GROQ_API_URL = llm.completions_url
+        telegram_api.TELEGRAM_API_URL = telegram.url
+        bot = telegram_api.make_bot(config.BOT_TOKEN)
+        users = [user_filters(i, args.users) for i in range(args.users)]
+        selected = {}
+        first_results = {}
+
+        async def select(filters: dict) -> None:
+            user_id = filters["telegram_id"]
+
+            async def on_pick(event: dict) -> None:
+                first_results.setdefault(user_id, time.perf_counter())
+
+            current_llm_progress.set(on_pick)
+            candidates = [listing for listing in listings if matches(filters, listing)]
+            selected[user_id] = await ai_valuator.select_best_listings(candidates, filters, max_results=5)
+            # Без промежуточных результатов (кэш, обычный ответ) первый результат - итоговый
+            first_results.setdefault(user_id, time.perf_counter())
+
+        async def evaluate(filters: dict) -> None:
+            user_id = filters["telegram_id"]
+            # Выбранные варианты в том виде, в каком их возвращает get_ai_selected_listings
+            previous = [
+                {"listing_id": item["listing"].id, "reason": item.get("reason", ""),
+                 "features": listing_features(item["listing"])}
+                for item in selected.get(user_id, [])
+            ]
+            new_listings = [listing for listing in listings if matches(filters, listing)][-args.new:]
+            await ai_service.evaluate_and_compare_new_listings(bot, user_id, new_listings, previous, filters)
+
+        try:
+            stages = [await measure("select", llm, [select(filters) for filters in users], first_results)]
+            stages.append(await measure("evaluate", llm, [evaluate(filters) for filters in users]))
+        finally:
+            await bot.session.close()
+            valuator = ai_valuator.get_valuator()
+            if valuator:
+                await valuator.close_session()
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--copies", type=int, default=1, help="копий записанных объявлений")
+    parser.add_argument("--new", type=int, default=10, help="новых объявлений для оценки")
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--rpm", type=int, default=30, help="лимит запросов провайдера в окне (0 - без лимита)")
+    parser.add_argument("--tpm", type=int, default=6000, help="лимит токенов провайдера в окне (0 - без лимита)")
+    parser.add_argument("--scheduler-rpm", type=int, default=None, help="бюджет планировщика (по умолчанию --rpm)")
+    parser.add_argument("--scheduler-tpm", type=int, default=None, help="бюджет планировщика (по умолчанию --tpm)")
+    parser.add_argument("--window-seconds", type=float, default=60.0, help="окно лимитов провайдера и планировщика")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="429 на каждый N-й запрос")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--no-cache", action="store_true", help="без кэшей ИИ-оценок и ИИ-подборов")
+    parser.add_argument(
+        "--valuation-concurrency", type=int, default=None,
+        help="одновременных оценок новых объявлений (по умолчанию AI_VALUATION_CONCURRENCY, 1 - по одной)",
+    )
+    parser.add_argument("--no-local-compare", action="store_true", help="оценивать LLM все новые объявления")
+    parser.add_argument("--no-stream", action="store_true", help="обычные (не потоковые) ответы LLM")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # Логи ИИ-режима (по строке на объявление и батч) не нужны в выводе
+    logging.disable(logging.CRITICAL)
+    config.BOT_TOKEN = "123456:BENCHMARK-TOKEN"
+    ai_valuator.GROQ_API_KEY = "benchmark"
+    valuation_cache.persistent = False
+    if args.no_cache:
+        valuation_cache.enabled = False
+        selection_cache.enabled = False
+    ai_valuator.AI_STREAM_ENABLED = not args.no_stream
+    local_comparator.enabled = not args.no_local_compare
+    if args.valuation_concurrency:
+        ai_valuator.AI_VALUATION_CONCURRENCY = args.valuation_concurrency
+    llm_scheduler.WINDOW_SECONDS = args.window_seconds
+    llm_scheduler.GROQ_RPM_LIMIT = args.rpm if args.scheduler_rpm is None else args.scheduler_rpm
+    llm_scheduler.GROQ_TPM_LIMIT = args.tpm if args.scheduler_tpm is None else args.scheduler_tpm
+
+    with tempfile.TemporaryDirectory() as tmp:
+        args.cassettes = str(Path(tmp) / "cassettes")
+        stages = asyncio.run(run(args))
+
+    print(
+        f"пользователей {args.users}, новых объявлений {args.new}, LLM {args.latency_ms:.0f}+{args.jitter_ms:.0f} мс, "
+        f"лимиты {args.rpm or '-'} req / {args.tpm or '-'} tok за {args.window_seconds:g} с, "
+        f"планировщик {llm_scheduler.GROQ_RPM_LIMIT or '-'} req / {llm_scheduler.GROQ_TPM_LIMIT or '-'} tok"
+    )
+    print(
+        f"{'этап':<10}{'время, с':>10}{'первый, с':>11}{'запросов':>10}{'429':>6}{'токенов':>10}"
+        f"{'ожидание, с':>13}{'макс, с':>9}"
+    )
+    for stage in stages:
+        first = f"{stage['first_result']:.1f}" if "first_result" in stage else "-"
+        print(
+            f"{stage['stage']:<10}{stage['elapsed']:>10.1f}{first:>11}{stage['requests']:>10}{stage['rate_limited']:>6}"
+            f"{stage['tokens']:>10}{stage['wait_seconds']:>13.1f}{stage['max_wait_seconds']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
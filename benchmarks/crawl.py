@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Офлайн-бенчмарк обхода источников: ListingsAggregator.fetch_all_listings
+поверх записанных HTTP-ответов (scrapers/http_cassette.py)
+
+Каждый источник обходится отдельным агрегатором rounds раз подряд.
+Сеть не используется: ответы берутся из кассет (replay) с заданной
+задержкой, разбросом и долей ошибок соединения; объявления сохраняются в
+локальный файл libsql вместо Turso. Для каждого источника выводятся:
+
+- pages/s:   запросов страниц в секунду (включая повторы после ошибок)
+- parse, мс: время разбора ответов (HTML_PARSE_POOL_SIZE=0, разбор в процессе)
+- db, мс:    время внутри вызовов БД (execute/commit соединения libsql)
+- peak, МБ:  пик памяти Python за один обход (tracemalloc, отдельный проход)
+
+Кассеты:
+- --synthesize: синтетические страницы поиска Realt/Domovita/GoHome/Etagi
+  (генераторы из benchmarks/html_extraction.py) в --cassettes
+- настоящие ответы: HTTP_CASSETTE_MODE=record HTTP_CASSETTE_DIR=... при
+  обычной работе бота или этим скриптом с --record
+
+Использование:
+    python benchmarks/crawl.py --synthesize
+    python benchmarks/crawl.py --latency-ms 150 --jitter-ms 100 --error-rate 0.05
+    python benchmarks/crawl.py --record --sources realt,etagi --rounds 1
+"""
+import argparse
+import asyncio
+import functools
+import inspect
+import logging
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+import database_turso
+from benchmarks.html_extraction import PAGES, card_page
+from scrapers import aggregator as aggregator_module
+from scrapers.aggregator import ListingsAggregator
+from scrapers.etagi import EtagiScraper
+from scrapers.http_cassette import Cassette, configure_cassette
+from utils import parse_pool
+
+DEFAULT_SOURCES = ("realt", "domovita", "gohome", "etagi")
+
+# Метод разбора ответа каждого источника (для замера parse)
+PARSE_METHODS = {
+    "kufar": "_parse_api_response_with_stop_check",
+    "onliner": "_parse_api_response",
+    "realt": "_parse_html",
+    "domovita": "_parse_html",
+    "gohome": "_parse_html",
+    "etagi": "_parse_html",
+}
+
+# URL страниц поиска для барановичей, 1-4 комнаты (как их запрашивают парсеры)
+SYNTHETIC_URLS = {
+    "realt": "https://realt.by/sale/flats/baranovichi/",
+    "domovita": "https://domovita.by/prodazha/kvartiry/baranovichi",
+    "gohome": "https://gohome.by/sale/flat/baranovichi?rooms=1,2,3,4&currency=usd",
+    "etagi": EtagiScraper()._get_city_url("барановичи") + "/realty/",
+}
+
+
+class Timer:
+    """Суммарное время по источникам"""
+
+    def __init__(self):
+        self.totals = {}
+        self.source = None
+
+    def add(self, seconds: float) -> None:
+        self.totals[self.source] = self.totals.get(self.source, 0.0) + seconds
+
+
+def synthesize(directory: str, cards: int, noise: int) -> None:
+    cassette = Cassette(directory)
+    for source, url in SYNTHETIC_URLS.items():
+        html = card_page(PAGES[source], cards * 2 if source == "etagi" else cards, noise)
+        cassette.save(url, None, 200, html, "text/html")
+    print(f"кассеты: {len(SYNTHETIC_URLS)} страниц в {directory}")
+
+
+def instrument_parse(timer: Timer) -> None:
+    """Оборачивает методы разбора парсеров замером времени"""
+    for source, method_name in PARSE_METHODS.items():
+        scraper_class = ListingsAggregator.SCRAPERS[source]
+        method = getattr(scraper_class, method_name)
+        if inspect.iscoroutinefunction(method):
+            async def timed(*args, _method=method, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await _method(*args, **kwargs)
+                finally:
+                    timer.add(time.perf_counter() - started)
+        else:
+            def timed(*args, _method=method, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return _method(*args, **kwargs)
+                finally:
+                    timer.add(time.perf_counter() - started)
+        setattr(scraper_class, method_name, functools.wraps(method)(timed))
+
+
+class TimedConnection:
+    """Соединение libsql с замером времени execute/executemany/commit"""
+
+    def __init__(self, conn, timer: Timer):
+        self._conn = conn
+        self._timer = timer
+
+    def __getattr__(self, name):
+        attr = getattr(self._conn, name)
+        if name not in ("execute", "executemany", "commit", "rollback"):
+            return attr
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self._timer.add(time.perf_counter() - started)
+        return timed
+
+
+def use_local_db(path: str, timer: Timer) -> None:
+    import libsql
+
+    def connect():
+        conn = libsql.connect(path)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        return TimedConnection(conn, timer)
+
+    database_turso.get_turso_connection = connect
+    asyncio.run(database_turso.ensure_tables_exist())
+
+
+async def crawl(source: str, rounds: int) -> int:
+    found = 0
+    for _ in range(rounds):
+        found = len(await ListingsAggregator([source]).fetch_all_listings("барановичи"))
+    return found
+
+
+async def record(source: str) -> None:
+    """Обход через сеть без сохранения в БД: нужны только кассеты"""
+    async for _ in ListingsAggregator([source]).iter_listings("барановичи", persist=False):
+        pass
+
+
+def run_source(source: str, rounds: int, cassette: Cassette, parse_timer: Timer, db_timer: Timer) -> dict:
+    parse_timer.source = db_timer.source = source
+    requests_before = sum(cassette.stats[key] for key in ("hits", "misses", "injected_errors"))
+    started = time.perf_counter()
+    found = asyncio.run(crawl(source, rounds))
+    elapsed = time.perf_counter() - started
+    requests = sum(cassette.stats[key] for key in ("hits", "misses", "injected_errors")) - requests_before
+
+    # Память - отдельным обходом: tracemalloc замедляет выполнение
+    tracemalloc.start()
+    asyncio.run(crawl(source, 1))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "found": found,
+        "pages_per_s": requests / elapsed if elapsed else 0.0,
+        "parse_ms": parse_timer.totals.get(source, 0.0) / (rounds + 1) * 1000,
+        "db_ms": db_timer.totals.get(source, 0.0) / (rounds + 1) * 1000,
+        "peak_mb": peak / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cassettes", default=str(ROOT / "data" / "cassettes" / "bench"))
+    parser.add_argument("--sources", default=",".join(DEFAULT_SOURCES))
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--synthesize", action="store_true", help="записать синтетические кассеты перед замером")
+    parser.add_argument("--cards", type=int, default=30)
+    parser.add_argument("--noise", type=int, default=200)
+    parser.add_argument("--record", action="store_true", help="обойти источники через сеть, записывая кассеты")
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    sources = [source.strip() for source in args.sources.split(",") if source.strip()]
+    if args.synthesize:
+        synthesize(args.cassettes, args.cards, args.noise)
+
+    cassette = Cassette(
+        args.cassettes, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, seed=args.seed,
+    )
+    if args.record:
+        configure_cassette("record", cassette)
+        for source in sources:
+            asyncio.run(record(source))
+        print(f"записано ответов: {cassette.stats['recorded']} в {args.cassettes}")
+        return
+
+    configure_cassette("replay", cassette)
+    parse_pool.HTML_PARSE_POOL_SIZE = 0
+    # Доставка уведомлений вне замера: новые объявления только ставятся в outbox
+    aggregator_module.NOTIFY_OUTBOX_ENABLED = True
+    parse_timer, db_timer = Timer(), Timer()
+    instrument_parse(parse_timer)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        use_local_db(str(Path(tmp) / "crawl.db"), db_timer)
+        print(
+            f"replay: latency {args.latency_ms:.0f} мс, jitter {args.jitter_ms:.0f} мс, "
+            f"ошибок {args.error_rate:.0%}, обходов {args.rounds}"
+        )
+        print(f"{'источник':>9} {'объявл.':>8} {'pages/s':>8} {'parse, мс':>10} {'db, мс':>8} {'peak, МБ':>9}")
+        for source in sources:
+            result = run_source(source, args.rounds, cassette, parse_timer, db_timer)
+            print(
+                f"{source:>9} {result['found']:>8} {result['pages_per_s']:>8.1f} "
+                f"{result['parse_ms']:>10.1f} {result['db_ms']:>8.1f} {result['peak_mb']:>9.1f}"
+            )
+    print(f"кассеты: {cassette.stats}")
+
+
+if __name__ == "__main__":
+    main()
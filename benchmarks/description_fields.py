@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк KufarScraper._extract_fields_from_description
+
+Описания объявлений берутся из сохраненных ответов API
+(kufar_raw_run_*.json, см. save_kufar_raw_response.py). Сравниваются:
+
+- legacy: прежняя реализация (десяток any(word in ...) и до семи
+          некомпилированных re.search на каждое объявление)
+- cold:   таблица правил, один проход по ключевым словам, компилированные
+          regex только при наличии слова-якоря; кэш пуст
+- warm:   повторный проход по тем же объявлениям (кэш по ad_id + хешу текста),
+          как при повторной проверке тех же страниц
+
+Использование:
+    python benchmarks/description_fields.py
+    python benchmarks/description_fields.py --repeat 200
+"""
+import argparse
+import glob
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from scrapers import kufar
+from scrapers.kufar import KufarScraper
+
+
+def load_descriptions(pattern: str = str(ROOT / "kufar_raw_run_*.json")) -> list:
+    """Пары (ad_id, описание, площадь) из сохраненных ответов API, как в _parse_ad"""
+    ads = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        for response in data.get("raw_api_responses", []):
+            for ad in response.get("ads", []):
+                description = (ad.get("body_short") or ad.get("body") or "").strip()
+                if not description:
+                    continue
+                params = {param.get("p"): param.get("v") for param in ad.get("ad_parameters", [])}
+                try:
+                    area = float(str(params.get("size") or 0).replace(",", "."))
+                except ValueError:
+                    area = 0.0
+                ads.append((str(ad.get("ad_id")), description, area))
+    return ads
+
+
+def legacy_extract_fields(description: str, area: float = 0.0) -> dict:
+    """Прежняя реализация _extract_fields_from_description (эталон для сравнения)"""
+    if not description:
+        return {}
+
+    desc_lower = description.lower()
+    extracted = {}
+
+    # Балкон/лоджия
+    if any(word in desc_lower for word in ["балкон", "лоджия", "с балконом", "есть балкон", "балкон есть"]):
+        extracted["balcony"] = "Есть"
+    elif any(phrase in desc_lower for phrase in ["без балкона", "нет балкона", "балкон отсутствует"]):
+        extracted["balcony"] = "Нет"
+
+    # Тип санузла
+    if "раздельный" in desc_lower and ("санузел" in desc_lower or "туалет" in desc_lower):
+        extracted["bathroom"] = "Раздельный"
+    elif "совмещенный" in desc_lower and ("санузел" in desc_lower or "туалет" in desc_lower):
+        extracted["bathroom"] = "Совмещенный"
+
+    # Тип дома
+    if "кирпичный" in desc_lower:
+        extracted["house_type"] = "Кирпичный"
+    elif "панельный" in desc_lower:
+        extracted["house_type"] = "Панельный"
+    elif "монолитный" in desc_lower:
+        extracted["house_type"] = "Монолитный"
+    elif "блочный" in desc_lower:
+        extracted["house_type"] = "Блочный"
+    elif "деревянный" in desc_lower:
+        extracted["house_type"] = "Деревянный"
+
+    # Состояние ремонта
+    if any(word in desc_lower for word in ["евроремонт", "евро ремонт", "капитальный ремонт", "новый ремонт", "свежий ремонт", "современный ремонт"]):
+        extracted["renovation_state"] = "отличное"
+    elif any(word in desc_lower for word in ["хороший ремонт", "качественный ремонт", "хорошее состояние"]):
+        extracted["renovation_state"] = "хорошее"
+    elif any(word in desc_lower for word in ["требует ремонта", "нужен ремонт", "под ремонт", "требует косметического ремонта", "нужен косметический ремонт"]):
+        extracted["renovation_state"] = "требует ремонта"
+    elif any(word in desc_lower for word in ["без ремонта", "старый ремонт", "советский ремонт", "плохое состояние"]):
+        extracted["renovation_state"] = "плохое"
+
+    # Площадь кухни
+    kitchen_match = re.search(r'кухня\s+(\d+[.,]?\d*)\s*м[²2]', desc_lower)
+    if not kitchen_match:
+        kitchen_match = re.search(r'кухня\s+(\d+[.,]?\d*)', desc_lower)
+    if kitchen_match:
+        try:
+            kitchen_area = float(kitchen_match.group(1).replace(",", "."))
+            # Проверяем разумность: кухня не может быть больше общей площади или меньше 3м²
+            if 3 <= kitchen_area <= 30 and (area == 0 or kitchen_area <= area):
+                extracted["kitchen_area"] = kitchen_area
+        except:
+            pass
+
+    # Жилая площадь
+    living_match = re.search(r'жилая\s+площадь\s+(\d+[.,]?\d*)\s*м[²2]', desc_lower)
+    if not living_match:
+        living_match = re.search(r'жилая\s+(\d+[.,]?\d*)\s*м[²2]', desc_lower)
+    if living_match:
+        try:
+            living_area = float(living_match.group(1).replace(",", "."))
+            # Проверяем разумность: жилая площадь не может быть больше общей площади
+            if 10 <= living_area <= 200 and (area == 0 or living_area <= area):
+                extracted["living_area"] = living_area
+        except:
+            pass
+
+    # Этажность дома
+    floors_match = re.search(r'(\d+)\s*этажн', desc_lower)
+    if not floors_match:
+        floors_match = re.search(r'(\d+)\s*эт\.\s*дом', desc_lower)
+    if not floors_match:
+        floors_match = re.search(r'дом\s+(\d+)\s*этаж', desc_lower)
+    if not floors_match:
+        floors_match = re.search(r'(\d+)\s*этаж', desc_lower)
+    if floors_match:
+        try:
+            total_floors = int(floors_match.group(1))
+            if 1 <= total_floors <= 30:  # Разумные пределы
+                extracted["total_floors"] = str(total_floors)
+        except:
+            pass
+
+    return extracted
+
+
+def timeit(func, ads, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for ad_id, description, area in ads:
+            func(ad_id, description, area)
+    return (time.perf_counter() - started) / repeat / len(ads) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    ads = load_descriptions()
+    if not ads:
+        print("Нет описаний: нужны kufar_raw_run_*.json в корне проекта")
+        return
+    scraper = KufarScraper()
+    mismatches = sum(
+        1 for ad_id, description, area in ads
+        if scraper._extract_fields_from_description(description, area, ad_id) != legacy_extract_fields(description, area)
+    )
+
+    def current(ad_id, description, area):
+        return scraper._extract_fields_from_description(description, area, ad_id)
+
+    legacy_us = timeit(lambda ad_id, description, area: legacy_extract_fields(description, area), ads, args.repeat)
+    cold_us = 0.0
+    for _ in range(args.repeat):
+        kufar._description_cache.clear()
+        cold_us += timeit(current, ads, 1)
+    cold_us /= args.repeat
+    warm_us = timeit(current, ads, args.repeat)
+
+    avg_len = sum(len(description) for _, description, _ in ads) / len(ads)
+    print(f"объявлений: {len(ads)}, средняя длина описания: {avg_len:.0f} симв., расхождений с legacy: {mismatches}")
+    print(f"{'режим':>7} {'мкс/объявл.':>12} {'ускорение':>10}")
+    for name, value in (("legacy", legacy_us), ("cold", cold_us), ("warm", warm_us)):
+        print(f"{name:>7} {value:>12.2f} {legacy_us / value:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Сквозной нагрузочный бенчмарк полного планового прогона: check_new_listings
+и рассылка новых объявлений через notification_outbox
+
+Все внешние зависимости локальные:
+- БД: временный файл libsql вместо Turso и временная SQLite (DATABASE_PATH)
+- сайты: кассеты replay (scrapers/http_cassette.py); страницы поиска,
+  которых нет в --cassettes, синтезируются генераторами
+  benchmarks/html_extraction.py
+- Telegram: tools/fake_telegram_api.py (make_bot + TELEGRAM_API_URL)
+- Groq: tools/fake_llm_api.py (ai_valuator.GROQ_API_URL)
+
+K синтетических пользователей: города по кругу, случайные (seed) фильтры по
+комнатам и цене, доля delivery_mode=full (--full-share) и ИИ-режима среди
+них (--ai-share).
+
+Этапы (время внутри вызовов без вложенных этапов, суммарно по всем задачам):
+- filters: активные пользователи и фильтры (Turso и SQLite)
+- scrape:  парсеры источников и чтение кэша объявлений
+- dedup:   дедупликация партий по signature
+- persist: сохранение в apartments/кэш и постановка в outbox
+- match:   фильтры пользователя, проверки и захваты sent_ads, дубликаты
+- render:  форматирование и сборка сообщений (summary и полные)
+- send:    safe_send_* (включая ожидание Bot API)
+- ai:      ИИ-выбор и оценка (инспекция страниц и запросы к LLM)
+- wait:    asyncio.sleep (паузы между сообщениями, retry/backoff)
+
+Результат сравнивается с сохраненным baseline (--baseline): этап,
+ставший медленнее на --tolerance и больше чем на --min-delta-ms, считается
+регрессией, и скрипт завершается с кодом 1. Baseline зависит от машины -
+обновляйте его (--update-baseline) на той же машине, где сравниваете.
+
+Использование:
+    python benchmarks/full_run.py
+    python benchmarks/full_run.py --users 50 --ai-share 0.2 --telegram-latency-ms 40
+    python benchmarks/full_run.py --update-baseline
+"""
+import argparse
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# Добавляем корневую директорию в путь
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+import aiosqlite
+from aiogram.enums import ParseMode
+
+import ai_valuator
+import config
+import database
+import database_turso
+from benchmarks.html_extraction import PAGES, card_page
+from bot.services import notification_service, search_service, telegram_api
+from bot.services.notification_outbox import OutboxConsumer
+from constants.constants import DELIVERY_MODE_FULL
+from scrapers.aggregator import ListingsAggregator
+from scrapers.aggregator_utils import SignatureIndex
+from scrapers.http_cassette import Cassette, configure_cassette
+from tools.fake_llm_api import FakeLLMAPI
+from tools.fake_telegram_api import FakeTelegramAPI
+from utils import parse_pool
+
+DEFAULT_BASELINE = ROOT / "benchmarks" / "baselines" / "full_run.json"
+SOURCES = ("realt", "domovita", "gohome", "etagi")
+CITIES = ("барановичи", "брест", "минск", "гомель")
+FIRST_USER_ID = 200_000_000
+BOT_TOKEN = "123456:FULL-RUN-TOKEN"
+
+# Хост страницы поиска -> генератор карточек
+SOURCE_BY_HOST = {"realt.by": "realt", "domovita.by": "domovita", "gohome.by": "gohome", "etagi.com": "etagi"}
+
+STAGES = ("filters", "scrape", "dedup", "persist", "match", "render", "send", "ai", "wait")
+
+
+class StageTimer:
+    """
+    Время по этапам без вложенных этапов
+
+    Стек этапов хранится в contextvars, поэтому параллельные задачи
+    (источники агрегатора, фоновые рассылки) считаются независимо.
+    """
+
+    def __init__(self):
+        self.totals = {stage: 0.0 for stage in STAGES}
+        self.calls = {stage: 0 for stage in STAGES}
+        self._stack = contextvars.ContextVar("stage_stack", default=())
+
+    def _enter(self, stage: str):
+        frame = [stage, 0.0]
+        return frame, self._stack.set(self._stack.get() + (frame,)), time.perf_counter()
+
+    def _exit(self, frame, token, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        self._stack.reset(token)
+        self.totals[frame[0]] += elapsed - frame[1]
+        self.calls[frame[0]] += 1
+        parents = self._stack.get()
+        if parents:
+            parents[-1][1] += elapsed
+
+    def wrap(self, stage: str, func):
+        if inspect.iscoroutinefunction(func):
+            async def timed(*args, **kwargs):
+                frame, token, started = self._enter(stage)
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self._exit(frame, token, started)
+        else:
+            def timed(*args, **kwargs):
+                frame, token, started = self._enter(stage)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._exit(frame, token, started)
+        return functools.wraps(func)(timed)
+
+
+def _replace_everywhere(original, wrapped) -> None:
+    """Подменяет функцию во всех модулях проекта, импортировавших ее по имени"""
+    for name, module in list(sys.modules.items()):
+        if module is None or not name.split(".")[0] in (
+            "bot", "scrapers", "database", "database_turso", "ai_valuator", "utils",
+        ):
+            continue
+        for attr, value in list(vars(module).items()):
+            if value is original:
+                setattr(module, attr, wrapped)
+
+
+def instrument(timer: StageTimer) -> None:
+    functions = {
+        "filters": [database.get_active_users, database_turso.get_user_filters_turso, database.get_user_filters],
+        "scrape": [search_service._get_cached_listings],
+        "persist": [database_turso.sync_apartments_batch, database.cache_listings_batch_turso],
+        "match": [
+            search_service.matches_user_filters, database.is_ad_sent_to_user, database.is_duplicate_content,
+            database.claim_ads_for_user, database.complete_ad_claims, database.release_ad_claims,
+        ],
+        "render": [
+            notification_service.format_listing_message, notification_service.send_summary_message,
+            notification_service.send_listing_to_user, notification_service.send_grouped_listings_to_user,
+        ],
+        "send": [telegram_api.safe_send_message, telegram_api.safe_send_media_group, telegram_api.safe_edit_message_text],
+        "ai": [ai_valuator.select_best_listings, ai_valuator.valuate_listing],
+    }
+    for stage, originals in functions.items():
+        for original in originals:
+            _replace_everywhere(original, timer.wrap(stage, original))
+
+    methods = {
+        "scrape": (ListingsAggregator, "_fetch_from_source"),
+        "dedup": (SignatureIndex, "filter_new"),
+    }
+    for stage, (cls, name) in methods.items():
+        setattr(cls, name, timer.wrap(stage, getattr(cls, name)))
+    asyncio.sleep = timer.wrap("wait", asyncio.sleep)
+
+
+# ---------- Окружение ----------
+
+def use_local_db(tmp: Path) -> None:
+    import libsql
+
+    def connect():
+        conn = libsql.connect(str(tmp / "turso.db"))
+        conn.execute("PRAGMA busy_timeout = 5000")
+        return conn
+
+    database_turso.get_turso_connection = connect
+    database.DATABASE_PATH = str(tmp / "local.db")
+
+
+async def synthesize_missing(cassette: Cassette, cards: int, noise: int) -> int:
+    """Синтезирует страницы поиска, которые парсеры запросят для CITIES"""
+    for city in CITIES:
+        async for _ in ListingsAggregator(list(SOURCES)).iter_listings(city, persist=False):
+            pass
+    synthesized = 0
+    for index, key in enumerate(sorted(cassette.missed)):
+        host = urlsplit(key).hostname or ""
+        source = next((src for suffix, src in SOURCE_BY_HOST.items() if host.endswith(suffix)), None)
+        if source is None:
+            continue
+        count = cards * 2 if source == "etagi" else cards
+        offset = index * count
+        html = card_page(lambda i: PAGES[source](i + offset), count, noise)
+        cassette.save(key, None, 200, html, "text/html")
+        synthesized += 1
+    return synthesized
+
+
+async def seed_users(args) -> dict:
+    """Пользователи в Turso (check_new_listings) и SQLite (рассылка outbox)"""
+    rng = random.Random(args.seed)
+    # Новая таблица user_filters создается без колонок city_json/city_slug/...;
+    # их добавляют миграции, которые выполняются только для существующей таблицы
+    await database_turso.ensure_tables_exist()
+    await database_turso.ensure_tables_exist()
+    await database.init_database()
+    modes = {"brief": 0, "full": 0, "ai": 0}
+    rows = []
+    for i in range(args.users):
+        user_id = FIRST_USER_ID + i
+        min_rooms = rng.randint(1, 3)
+        filters = {
+            "city": CITIES[i % len(CITIES)],
+            "min_rooms": min_rooms,
+            "max_rooms": rng.randint(min_rooms, 4),
+            "min_price": rng.choice((0, 20_000, 35_000)),
+            "max_price": rng.choice((60_000, 90_000, 150_000)),
+        }
+        full = rng.random() < args.full_share
+        ai_mode = full and rng.random() < args.ai_share / max(args.full_share, 1e-9)
+        filters["delivery_mode"] = DELIVERY_MODE_FULL if full else "brief"
+        await database_turso.set_user_filters_turso(user_id, filters)
+        if full:
+            notification_service.USER_DELIVERY_MODES[user_id] = DELIVERY_MODE_FULL
+        rows.append((
+            user_id, filters["city"], filters["min_rooms"], filters["max_rooms"],
+            filters["min_price"], filters["max_price"], int(ai_mode),
+        ))
+        modes["ai" if ai_mode else "full" if full else "brief"] += 1
+
+    async with aiosqlite.connect(database.DATABASE_PATH) as db:
+        await db.executemany(
+            "INSERT INTO user_filters (user_id, city, min_rooms, max_rooms, min_price, max_price, ai_mode) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        await db.commit()
+    return modes
+
+
+async def drain_outbox(bot) -> int:
+    """Рассылка всех объявлений, поставленных агрегатором в notification_outbox"""
+    async def deliver(listings):
+        return await notification_service.deliver_outbox_batch(bot, listings)
+
+    consumer = OutboxConsumer(deliver=deliver, workers=1)
+    batches = 0
+    while await consumer.process_batch("full-run"):
+        batches += 1
+    return batches
+
+
+async def run(args, tmp: Path) -> dict:
+    cassette = Cassette(args.cassettes)
+    configure_cassette("replay", cassette)
+    synthesized = await synthesize_missing(cassette, args.cards, args.noise)
+    cassette.missed.clear()
+
+    telegram = FakeTelegramAPI(
+        latency_ms=args.telegram_latency_ms, rate_limit=args.rate_limit, seed=args.seed,
+    )
+    llm = FakeLLMAPI(latency_ms=args.llm_latency_ms)
+    async with telegram, llm:
+        telegram_api.TELEGRAM_API_URL = telegram.url
+        ai_valuator.GROQ_API_URL = llm.completions_url
+        ai_valuator.GROQ_API_KEY = "fake-groq-key"
+        modes = await seed_users(args)
+
+        timer = StageTimer()
+        instrument(timer)
+        bot = telegram_api.make_bot(BOT_TOKEN, parse_mode=ParseMode.HTML)
+        started = time.perf_counter()
+        try:
+            await search_service.check_new_listings(bot)
+            outbox_batches = await drain_outbox(bot)
+        finally:
+            await bot.session.close()
+        wall = time.perf_counter() - started
+
+    return {
+        "wall_s": round(wall, 3),
+        "stages_ms": {stage: round(timer.totals[stage] * 1000, 1) for stage in STAGES},
+        "calls": timer.calls,
+        "counts": {
+            "users": modes,
+            "synthesized_pages": synthesized,
+            "cassette_hits": cassette.stats["hits"],
+            "cassette_misses": cassette.stats["misses"],
+            "outbox_batches": outbox_batches,
+            "messages": telegram.stats["messages"],
+            "telegram_requests": sum(telegram.stats[m] for m in ("sendMessage", "sendMediaGroup", "editMessageText")),
+            "retry_after": telegram.stats["retry_after"],
+            "llm_requests": llm.stats["requests"],
+        },
+    }
+
+
+# ---------- Baseline ----------
+
+def compare(result: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list:
+    """Этапы, ставшие медленнее baseline: [(этап, было, стало)]"""
+    regressions = []
+    for stage, now in result["stages_ms"].items():
+        before = baseline["stages_ms"].get(stage)
+        if before is None:
+            continue
+        if now > before * (1 + tolerance) and now - before > min_delta_ms:
+            regressions.append((stage, before, now))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=12)
+    parser.add_argument("--full-share", type=float, default=0.25, help="доля пользователей с delivery_mode=full")
+    parser.add_argument("--ai-share", type=float, default=0.15, help="доля пользователей в ИИ-режиме (из full)")
+    parser.add_argument("--cards", type=int, default=6, help="карточек на синтетической странице поиска")
+    parser.add_argument("--noise", type=int, default=100)
+    parser.add_argument("--cassettes", default=None, help="каталог кассет (по умолчанию - временный)")
+    parser.add_argument("--telegram-latency-ms", type=float, default=30.0)
+    parser.add_argument("--rate-limit", type=int, default=30)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимое замедление этапа (доля)")
+    parser.add_argument("--min-delta-ms", type=float, default=100.0, help="игнорировать замедление меньше, мс")
+    args = parser.parse_args()
+
+    # Логи прогона (по строке на объявление и пользователя) не нужны в выводе
+    logging.disable(logging.CRITICAL)
+    config.BOT_TOKEN = BOT_TOKEN
+    search_service.DEFAULT_SOURCES = list(SOURCES)
+    parse_pool.HTML_PARSE_POOL_SIZE = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        args.cassettes = args.cassettes or str(tmp / "cassettes")
+        use_local_db(tmp)
+        result = asyncio.run(run(args, tmp))
+
+    result["config"] = {
+        key: getattr(args, key) for key in (
+            "users", "full_share", "ai_share", "cards", "noise",
+            "telegram_latency_ms", "rate_limit", "llm_latency_ms", "seed",
+        )
+    }
+
+    counts = result["counts"]
+    print(
+        f"пользователей {args.users} {counts['users']}, страниц синтезировано {counts['synthesized_pages']}, "
+        f"прогон {result['wall_s']:.1f} с"
+    )
+    print(
+        f"сообщений {counts['messages']} (запросов {counts['telegram_requests']}, 429: {counts['retry_after']}), "
+        f"LLM-запросов {counts['llm_requests']}, партий outbox {counts['outbox_batches']}"
+    )
+    print(f"{'этап':>8} {'вызовов':>8} {'мс':>10}")
+    for stage in STAGES:
+        print(f"{stage:>8} {result['calls'][stage]:>8} {result['stages_ms'][stage]:>10.1f}")
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(result, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline сохранен: {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print(f"baseline не найден: {baseline_path} (--update-baseline, чтобы создать)")
+        return
+
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    if baseline.get("config") != result["config"]:
+        print("⚠️ параметры прогона отличаются от baseline, сравнение приблизительное")
+    regressions = compare(result, baseline, args.tolerance, args.min_delta_ms)
+    for stage, before, now in regressions:
+        print(f"РЕГРЕССИЯ {stage}: {before:.1f} -> {now:.1f} мс (+{(now / before - 1) * 100 if before else 0:.0f}%)")
+    if regressions:
+        sys.exit(1)
+    print(f"регрессий нет (допуск {args.tolerance:.0%}, от {args.min_delta_ms:.0f} мс)")
+
+
+if __name__ == "__main__":
+    main()
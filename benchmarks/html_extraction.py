@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк разбора страниц поиска: полное дерево BeautifulSoup против
+декларативных правил (scrapers/extraction.py)
+
+Синтетическая страница похожа на настоящую: карточки объявлений (30 для
+Realt/Domovita/GoHome, 60 ссылок для Etagi) занимают малую часть HTML,
+остальное - меню, SVG-иконки, футер и большой JSON состояния в <script>.
+
+- full:  BeautifulSoup(html, 'lxml') целиком и прежний поиск карточек
+         (find_all с regex, для Etagi - find_parent + get_text)
+- spec:  текущий _parse_html (XPath lxml, в soup только карточки)
+
+Использование:
+    python benchmarks/html_extraction.py
+    python benchmarks/html_extraction.py --repeat 20 --noise 400
+"""
+import argparse
+import json
+import logging
+import re
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bs4 import BeautifulSoup
+
+from scrapers.domovita import DomovitaScraper
+from scrapers.etagi import EtagiScraper
+from scrapers.gohome import GoHomeScraper
+from scrapers.realt import RealtByScraper
+
+
+def noise(blocks: int) -> str:
+    """Меню, иконки и скрипты, не относящиеся к карточкам"""
+    menu = "".join(f'<li class="menu__item"><a href="/section/{i}">Раздел {i}</a></li>' for i in range(blocks))
+    icons = "".join(
+        f'<span class="icon"><svg viewBox="0 0 24 24"><path d="M{i} 0L24 {i}Z"/><g><circle r="{i}"/></g></svg></span>'
+        for i in range(blocks)
+    )
+    state = json.dumps({"items": [{"id": i, "title": f"Объявление {i}", "tags": ["a", "b"]} for i in range(blocks * 20)]})
+    return (
+        f'<header><nav><ul class="menu">{menu}</ul></nav></header>'
+        f'<div class="sidebar">{icons}</div>'
+        f'<script id="__NEXT_DATA__" type="application/json">{state}</script>'
+    )
+
+
+def card_page(card_html, cards: int, blocks: int) -> str:
+    items = "".join(card_html(i) for i in range(cards))
+    return f"<html><head><title>Поиск</title></head><body>{noise(blocks)}<main>{items}</main>{noise(blocks)}</body></html>"
+
+
+PAGES = {
+    "realt": lambda i: (
+        f'<div class="listing-item"><a href="/sale/flats/object/{i}/"><h3 class="title">{i % 4 + 1}-комн. квартира, {40 + i} м²</h3></a>'
+        f'<div class="price">${40000 + i * 100:,}</div><div class="address">Барановичи, ул. Ленина, {i}</div>'
+        f'<img src="/img/{i}.jpg"></div>'
+    ),
+    "domovita": lambda i: (
+        f'<div class="object-card"><a href="/prodazha/kvartiry/{i}">{i % 4 + 1}-комн. квартира, {40 + i} м², {40000 + i * 100} $</a>'
+        f'<div class="address">ул. Ленина, {i}</div><img src="/img/{i}.jpg"></div>'
+    ),
+    "gohome": lambda i: (
+        f'<div class="object-card"><a href="/sale/flat/{i}">{i % 4 + 1}-комн. квартира, {40 + i} м²</a>'
+        f'<div class="price">${40000 + i * 100}</div><div class="address">ул. Ленина, {i}</div></div>'
+    ),
+    "etagi": lambda i: (
+        f'<div class="card"><a href="/realty/{100000 + i}/">{i % 4 + 1}-комн. кв., {40 + i} м²</a>'
+        f'<span>{120000 + i * 1000} BYN</span><span>{i % 9 + 1}/9 эт.</span><span>ул. Ленина, {i}</span></div>'
+    ),
+}
+
+
+def full_tree(scraper, source: str, html: str) -> int:
+    """Прежний разбор: полное дерево и поиск карточек в нем"""
+    soup = BeautifulSoup(html, "lxml")
+    if source == "etagi":
+        count = 0
+        for link in soup.find_all("a", href=re.compile(r"/realty/\d+/")):
+            container = link.find_parent(["div", "article", "li", "generic"])
+            if container and scraper._parse_listing_from_text(
+                container.get_text(separator=" ", strip=True), "etagi_x",
+                "https://baranovichi.etagi.com" + link["href"], "барановичи"
+            ):
+                count += 1
+        return count
+    cards = []
+    for rule in scraper.CARD_SPEC.rules:
+        attrs = {rule.attr: re.compile(rule.pattern)} if rule.attr else {}
+        cards = soup.find_all(rule.tag, attrs=attrs)
+        if cards:
+            break
+    return sum(1 for card in cards[:scraper.CARD_SPEC.limit] if scraper._parse_card(card))
+
+
+def spec(scraper, source: str, html: str) -> int:
+    if source == "etagi":
+        return len(scraper._parse_html(html, 1, 4, 0, 10_000_000, "https://baranovichi.etagi.com", "барановичи"))
+    return len(scraper._parse_html(html, 1, 4, 0, 10_000_000))
+
+
+def timeit(func, repeat: int) -> float:
+    func()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--noise", type=int, default=200, help="блоков шума (меню/иконки/JSON) на страницу")
+    args = parser.parse_args()
+    # Предупреждения валидации синтетических карточек не нужны в выводе
+    logging.disable(logging.ERROR)
+
+    scrapers = {
+        "realt": RealtByScraper(), "domovita": DomovitaScraper(),
+        "gohome": GoHomeScraper(), "etagi": EtagiScraper(),
+    }
+    print(f"{'источник':>9} {'КБ':>7} {'объявл.':>8} {'full, мс':>9} {'spec, мс':>9} {'ускорение':>10}")
+    for source, scraper in scrapers.items():
+        html = card_page(PAGES[source], 60 if source == "etagi" else 30, args.noise)
+        found = spec(scraper, source, html)
+        full_ms = timeit(lambda: full_tree(scraper, source, html), args.repeat)
+        spec_ms = timeit(lambda: spec(scraper, source, html), args.repeat)
+        print(
+            f"{source:>9} {len(html.encode()) / 1024:>7.0f} {found:>8} "
+            f"{full_ms:>9.1f} {spec_ms:>9.1f} {full_ms / spec_ms:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: парсинг 10 страниц Kufar с логированием и без
+
+Использует записанные ответы API (kufar_raw_run_*.json), сеть не нужна.
+Страницы из записи повторяются по кругу до нужного количества.
+По умолчанию из объявлений убираются необязательные параметры, чтобы
+поля извлекались из описания (как у объявлений, заполненных продавцом
+только текстом) - именно этот путь пишет по несколько строк лога на объявление.
+
+Режимы:
+- off:        логирование INFO/DEBUG выключено (logging.disable)
+- sync:       handlers работают в потоке вызывающего кода (LOG_ASYNC=false)
+- async:      QueueHandler/QueueListener, без ограничения частоты
+- async+rate: QueueHandler/QueueListener + ограничение частоты по источнику
+
+Использование:
+    python benchmarks/kufar_parse_logging.py
+    python benchmarks/kufar_parse_logging.py --pages 10 --repeat 5
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+import error_logger
+from error_logger import ErrorLogger, setup_logging
+from scrapers.kufar import KufarScraper
+
+MODES = ["off", "sync", "async", "async+rate"]
+
+# Параметры, которые _parse_ad умеет восстанавливать из описания
+SPARSE_PARAMS = {
+    "balcony", "bathroom", "house_type", "condition", "flat_repair",
+    "size_kitchen", "size_living_space", "re_number_floors",
+}
+
+
+def load_pages(path: Path, pages: int, sparse: bool) -> list:
+    """Загружает страницы ответов API и повторяет их до нужного количества"""
+    with open(path, encoding="utf-8") as f:
+        raw_pages = json.load(f)["raw_api_responses"]
+    if sparse:
+        for page in raw_pages:
+            for ad in page.get("ads", []):
+                ad["ad_parameters"] = [
+                    p for p in ad.get("ad_parameters", []) if p.get("p") not in SPARSE_PARAMS
+                ]
+                # Полный текст, чтобы в описании было что искать
+                ad["body_short"] = ad.get("body") or ad.get("body_short", "")
+    return [raw_pages[i % len(raw_pages)] for i in range(pages)]
+
+
+def configure(mode: str, log_file: Path) -> None:
+    """Перенастраивает error_logger под режим бенчмарка"""
+    logging.disable(logging.NOTSET)
+    error_logger.LOG_FILE = log_file
+    error_logger.LOG_ASYNC = mode != "sync"
+    setup_logging()
+
+    rate = error_logger.LOG_INFO_RATE_PER_SOURCE if mode == "async+rate" else 0
+    error_logger.error_logger = ErrorLogger()
+    error_logger.error_logger._rate_limiter.rate = rate
+
+    if mode == "off":
+        logging.disable(logging.INFO)
+
+
+def parse_pages(scraper: KufarScraper, pages: list, city: str) -> int:
+    """Парсит страницы так же, как KufarScraper.fetch_listings (без сети)"""
+    matched = 0
+    for page in pages:
+        for ad in page.get("ads", []):
+            listing = scraper._parse_ad(ad, city)
+            if listing and scraper._matches_filters(listing, 1, 4, 0, 100000):
+                matched += 1
+    return matched
+
+
+def run(mode: str, pages: list, repeat: int, city: str) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        configure(mode, Path(tmp) / "app.log")
+        scraper = KufarScraper()
+        parse_pages(scraper, pages[:1], city)  # прогрев
+        timings = []
+        matched = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            matched = parse_pages(scraper, pages, city)
+            timings.append(time.perf_counter() - started)
+        # Дожидаемся записи очереди, чтобы не мешать следующему режиму
+        error_logger._stop_log_listener()
+        suppressed = sum(error_logger.error_logger.get_suppressed().values())
+    return {
+        "mode": mode,
+        "median_ms": round(statistics.median(timings) * 1000, 2),
+        "min_ms": round(min(timings) * 1000, 2),
+        "matched": matched,
+        "suppressed": suppressed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kufar parse benchmark: logging on vs off")
+    parser.add_argument("--pages", type=int, default=10, help="Количество страниц (по умолчанию 10)")
+    parser.add_argument("--repeat", type=int, default=5, help="Количество повторов на режим")
+    parser.add_argument("--input", type=Path, default=None, help="Файл kufar_raw_run_*.json")
+    parser.add_argument("--modes", default=",".join(MODES), help="Режимы через запятую")
+    parser.add_argument("--full-params", action="store_true",
+                        help="Не убирать параметры (поля не извлекаются из описания)")
+    args = parser.parse_args()
+
+    input_path = args.input or sorted(ROOT.glob("kufar_raw_run_*.json"))[-1]
+    pages = load_pages(input_path, args.pages, sparse=not args.full_params)
+    ads = sum(len(p.get("ads", [])) for p in pages)
+
+    # Консольные handlers пишут в /dev/null, чтобы терминал не искажал замер
+    real_stdout = sys.stdout
+    results = []
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = sys.stderr = devnull
+        try:
+            for mode in args.modes.split(","):
+                results.append(run(mode.strip(), pages, args.repeat, "барановичи"))
+        finally:
+            sys.stdout, sys.stderr = real_stdout, sys.__stderr__
+
+    print(f"input={input_path.name} pages={args.pages} ads={ads} repeat={args.repeat}")
+    print(f"{'mode':<12} {'median_ms':>10} {'min_ms':>10} {'matched':>8} {'suppressed':>11}")
+    for r in results:
+        print(f"{r['mode']:<12} {r['median_ms']:>10} {r['min_ms']:>10} {r['matched']:>8} {r['suppressed']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк памяти: размер одного Listing до и после компактного представления
+
+Объявления берутся из записанных прогонов Kufar (kufar_raw_run_*.json):
+raw ответы API парсятся KufarScraper._parse_ad и превращаются в строки
+cached_listings (как их отдает Turso). Затем под tracemalloc из этих строк
+строятся объекты двумя способами:
+
+- before: обычный dataclass с __dict__, без интернирования, photos и
+  description раскрываются сразу (как было раньше)
+- after:  текущий Listing (__slots__, интернированные строки,
+  ленивые description/photos через cached_listing_to_listing)
+
+Строки БД декодируются из JSON внутри замера и удаляются после построения,
+поэтому учитывается только то, что удерживают сами объявления.
+
+Использование:
+    python benchmarks/listing_memory.py
+    python benchmarks/listing_memory.py --copies 20
+"""
+import argparse
+import dataclasses
+import gc
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from scrapers.base import Listing
+from scrapers.kufar import KufarScraper
+from database_turso import cached_listing_to_listing
+
+# Прежнее представление: те же поля, обычный dataclass
+LegacyListing = dataclasses.make_dataclass(
+    "LegacyListing",
+    [
+        (f.name, f.type, dataclasses.field(default=f.default, default_factory=f.default_factory))
+        if f.default_factory is not dataclasses.MISSING
+        else (f.name, f.type, dataclasses.field(default=f.default))
+        for f in dataclasses.fields(Listing)
+        if not f.name.startswith("_")
+    ],
+)
+
+
+def load_rows(copies: int) -> str:
+    """Строки cached_listings из записанных прогонов (JSON текст)"""
+    scraper = KufarScraper()
+    rows = []
+    for path in sorted(ROOT.glob("kufar_raw_run_*.json")):
+        with open(path, encoding="utf-8") as f:
+            pages = json.load(f)["raw_api_responses"]
+        for page in pages:
+            for ad in page.get("ads", []):
+                listing = scraper._parse_ad(ad, "барановичи")
+                if not listing:
+                    continue
+                row = listing.to_dict()
+                row["photos"] = json.dumps(listing.photos)
+                row["city"] = "барановичи"
+                rows.append(row)
+    # Уникальные id, чтобы копии были отдельными объявлениями
+    all_rows = []
+    for i in range(copies):
+        for row in rows:
+            all_rows.append({**row, "id": f"{row['id']}_{i}"})
+    return json.dumps(all_rows, ensure_ascii=False)
+
+
+def build_before(row: dict):
+    row = dict(row)
+    row["photos"] = json.loads(row["photos"]) if row["photos"] else []
+    return LegacyListing(**{k: v for k, v in row.items() if k in LegacyListing.__dataclass_fields__})
+
+
+def build_after(row: dict):
+    return cached_listing_to_listing(row)
+
+
+def measure(rows_json: str, build) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    rows = json.loads(rows_json)
+    listings = [build(row) for row in rows]
+    del rows
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0] - baseline
+
+    # Доступ к полям, нужным для фильтрации/группировки, не раскрывает описание
+    for listing in listings:
+        _ = (listing.price, listing.rooms, listing.address, listing.source)
+    filtered = tracemalloc.get_traced_memory()[0] - baseline
+
+    # Рендеринг: обращение к description/photos
+    for listing in listings:
+        _ = (listing.description, listing.photos)
+    gc.collect()
+    rendered = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    count = len(listings)
+    return {
+        "count": count,
+        "built": current / count,
+        "after_filter": filtered / count,
+        "after_render": rendered / count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Listing memory footprint benchmark")
+    parser.add_argument("--copies", type=int, default=10, help="Сколько раз повторить записанные объявления")
+    args = parser.parse_args()
+
+    rows_json = load_rows(args.copies)
+    before = measure(rows_json, build_before)
+    after = measure(rows_json, build_after)
+
+    print(f"listings={before['count']}")
+    print(f"{'variant':<8} {'built B/obj':>12} {'filtered B/obj':>15} {'rendered B/obj':>15}")
+    for name, r in (("before", before), ("after", after)):
+        print(f"{name:<8} {r['built']:>12.0f} {r['after_filter']:>15.0f} {r['after_render']:>15.0f}")
+    print(f"saved while filtering: {100 * (1 - after['after_filter'] / before['after_filter']):.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк рассылки уведомлений: notify_users_about_new_apartments_summary
+поверх локальной замены Bot API (tools/fake_telegram_api.py)
+
+N синтетических пользователей с фильтрами во временной SQLite-базе
+получают M синтетических объявлений. Бот работает через make_bot с
+TELEGRAM_API_URL, указывающим на локальный сервер: реальным пользователям
+ничего не отправляется, но aiogram, safe_send_* и обработка RetryAfter /
+Forbidden / сетевых ошибок работают как с Telegram.
+
+- messages/s: сообщений, принятых сервером, в секунду рассылки
+- p50/p99:    время от начала рассылки до приема сообщения сервером, мс
+- 429:        ответов Too Many Requests (сколько раз упирались в лимит)
+
+--full переводит пользователей в delivery_mode=full (send_listing_to_user,
+send_grouped_listings_to_user, safe_send_media_group) вместо summary.
+
+Использование:
+    python benchmarks/notification_delivery.py
+    python benchmarks/notification_delivery.py --users 200 --listings 20 --rate-limit 30 --latency-ms 40
+    python benchmarks/notification_delivery.py --full --forbidden 0.05 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+from statistics import quantiles
+
+# Добавляем корневую директорию в путь
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+import aiosqlite
+
+import config
+import database
+from bot.services import notification_service, telegram_api
+from constants.constants import DELIVERY_MODE_FULL
+from scrapers.base import Listing
+from tools.fake_telegram_api import FakeTelegramAPI
+
+FIRST_USER_ID = 100_000_000
+STREETS = ("Советская", "Ленина", "Брестская", "Кирова", "Комсомольская")
+
+
+def make_listings(count: int) -> list:
+    """Объявления нескольких домов (группируются по адресу) с фото"""
+    listings = []
+    for i in range(count):
+        rooms = i % 4 + 1
+        area = 32.0 + rooms * 12 + i % 7
+        price = 30_000 + rooms * 9_000 + i * 150
+        listings.append(Listing(
+            id=f"bench_{i}",
+            source="kufar",
+            title=f"{rooms}-комн. квартира, {area:.0f} м²",
+            price=price,
+            price_formatted=f"${price:,}".replace(",", " "),
+            price_usd=price,
+            rooms=rooms,
+            area=area,
+            address=f"Барановичи, ул. {STREETS[i % len(STREETS)]}, {i % 9 + 1}",
+            url=f"https://re.kufar.by/vi/{i}",
+            photos=[f"https://example.com/photo/{i}_{n}.jpg" for n in range(3)],
+            floor=f"{i % 9 + 1}/9",
+        ))
+    return listings
+
+
+async def seed_users(count: int) -> list:
+    """Пользователи с фильтрами, под которые подходят все объявления"""
+    await database.init_database()
+    user_ids = [FIRST_USER_ID + i for i in range(count)]
+    async with aiosqlite.connect(database.DATABASE_PATH) as db:
+        await db.executemany(
+            "INSERT INTO user_filters (user_id, city, min_rooms, max_rooms, min_price, max_price) "
+            "VALUES (?, 'барановичи', 1, 4, 0, 1000000)",
+            [(user_id,) for user_id in user_ids],
+        )
+        await db.commit()
+    return user_ids
+
+
+async def run(args) -> dict:
+    api = FakeTelegramAPI(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate_limit=args.rate_limit,
+        per_chat_limit=args.per_chat_limit, retry_after=args.retry_after,
+        error_rate=args.error_rate, seed=args.seed,
+    )
+    async with api:
+        telegram_api.TELEGRAM_API_URL = api.url
+        user_ids = await seed_users(args.users)
+        api.forbidden_chats = set(user_ids[:int(len(user_ids) * args.forbidden)])
+        if args.full:
+            notification_service.USER_DELIVERY_MODES.update({user_id: DELIVERY_MODE_FULL for user_id in user_ids})
+
+        started = time.perf_counter()
+        await notification_service.notify_users_about_new_apartments_summary(make_listings(args.listings))
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted((accepted - started) * 1000 for _, _, accepted in api.deliveries)
+    percentiles = quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "users": len({chat_id for chat_id, _, _ in api.deliveries}),
+        "messages": len(latencies),
+        "elapsed": elapsed,
+        "p50": percentiles[49] if percentiles else 0.0,
+        "p99": percentiles[98] if percentiles else 0.0,
+        "stats": api.stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--listings", type=int, default=10)
+    parser.add_argument("--full", action="store_true", help="полные уведомления вместо summary")
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--rate-limit", type=int, default=30, help="сообщений в секунду на всех (0 - без лимита)")
+    parser.add_argument("--per-chat-limit", type=int, default=0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--forbidden", type=float, default=0.0, help="доля пользователей, заблокировавших бота")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # Логи рассылки (по строке на пользователя и сообщение) не нужны в выводе
+    logging.disable(logging.ERROR)
+    config.BOT_TOKEN = "123456:BENCHMARK-TOKEN"
+    database.USE_TURSO_CACHE = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE_PATH = str(Path(tmp) / "bench.db")
+        result = asyncio.run(run(args))
+
+    stats = result["stats"]
+    print(
+        f"режим {'full' if args.full else 'brief'}: пользователей {args.users}, объявлений {args.listings}, "
+        f"latency {args.latency_ms:.0f}+{args.jitter_ms:.0f} мс, лимит {args.rate_limit or '-'}/с"
+    )
+    print(
+        f"сообщений {result['messages']} ({result['users']} пользователей) за {result['elapsed']:.1f} с: "
+        f"{result['messages'] / result['elapsed']:.1f} messages/s"
+    )
+    print(f"p50 {result['p50']:.0f} мс, p99 {result['p99']:.0f} мс")
+    print(
+        f"429: {stats['retry_after']}, 403: {stats['forbidden']}, обрывов: {stats['network_errors']}, "
+        f"запросов: sendMessage {stats['sendMessage']}, sendMediaGroup {stats['sendMediaGroup']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк задержки event loop при разборе HTML: в event loop и в пуле процессов
+
+Синтетическая страница поиска Realt.by (~1.5 МБ, карточки listing-item)
+разбирается RealtByScraper через utils.parse_pool.parse_listings. Пока идет
+разбор, в том же event loop работает проба: каждую миллисекунду засыпает на
+1 мс и замеряет, насколько позже проснулась. Это та задержка, с которой бот
+ответил бы пользователю во время парсинга.
+
+Режимы:
+- inline: HTML_PARSE_POOL_SIZE=0, разбор прямо в event loop
+- pool:   разбор в ProcessPoolExecutor (пул прогревается до замера)
+
+Использование:
+    python benchmarks/parse_offload.py
+    python benchmarks/parse_offload.py --pages 20 --cards 3000
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from scrapers.realt import RealtByScraper
+from utils import parse_pool
+
+
+def make_page(cards: int) -> str:
+    """Страница поиска Realt.by с cards карточками"""
+    filler = "Продается квартира в хорошем состоянии, рядом школа и магазины. " * 4
+    items = []
+    for i in range(cards):
+        rooms = i % 4 + 1
+        items.append(
+            f'<div class="listing-item"><a href="/sale/flats/object/{100000 + i}/">'
+            f'<h3 class="title">{rooms}-комн. квартира, {40 + i % 50} м²</h3></a>'
+            f'<div class="price">${30000 + i * 10:,}</div>'
+            f'<div class="address">Барановичи, ул. Ленина, {i}</div>'
+            f'<img src="/img/{i}.jpg"><p class="description">{filler}</p></div>'
+        )
+    return f"<html><body><div class='list'>{''.join(items)}</div></body></html>"
+
+
+async def measure(html: str, pages: int, concurrency: int) -> dict:
+    """Разбирает pages страниц (по concurrency одновременно) под пробой задержки"""
+    lags = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - started - 0.001)
+
+    scraper = RealtByScraper()
+    probe_task = asyncio.create_task(probe())
+    await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    total = 0
+    for offset in range(0, pages, concurrency):
+        results = await asyncio.gather(*(
+            parse_pool.parse_listings(scraper, html, 1, 4, 0, 10_000_000)
+            for _ in range(min(concurrency, pages - offset))
+        ))
+        total += sum(len(listings) for listings in results)
+    elapsed = time.perf_counter() - started
+
+    done.set()
+    await probe_task
+    lags.sort()
+    return {
+        "elapsed": elapsed,
+        "listings": total,
+        "lag_p50": lags[len(lags) // 2] * 1000,
+        "lag_p99": lags[int(len(lags) * 0.99)] * 1000,
+        "lag_max": lags[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--cards", type=int, default=2500, help="карточек на странице")
+    parser.add_argument("--concurrency", type=int, default=2, help="страниц одновременно")
+    args = parser.parse_args()
+
+    html = make_page(args.cards)
+    print(f"страница: {len(html.encode()) / 1e6:.2f} МБ, {args.cards} карточек, страниц: {args.pages}")
+    print(f"{'режим':>7} {'время, с':>9} {'объявлений':>11} {'lag p50, мс':>12} {'lag p99, мс':>12} {'lag max, мс':>12}")
+
+    modes = [("inline", 0), ("pool", max(2, args.concurrency))]
+    for name, size in modes:
+        parse_pool.HTML_PARSE_POOL_SIZE = size
+        if size:
+            # Прогрев: запуск процессов и импорт модулей не входят в замер
+            asyncio.run(measure(html, args.concurrency, args.concurrency))
+        result = asyncio.run(measure(html, args.pages, args.concurrency))
+        print(
+            f"{name:>7} {result['elapsed']:>9.2f} {result['listings']:>11} "
+            f"{result['lag_p50']:>12.2f} {result['lag_p99']:>12.2f} {result['lag_max']:>12.2f}"
+        )
+    parse_pool.shutdown_parse_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк рассылки по шардам: пропускная способность при 1, 2, 4 процессах
+
+Синтетические пользователи (случайные диапазоны комнат и цен) и объявления
+ставятся в notification_outbox локального файла libsql (по записи на шард,
+как в sync_apartments_batch). Затем N процессов одновременно разбирают
+свои шарды тем же OutboxConsumer.process_batch, что и в боте. Доставка
+подменена: для каждого пользователя шарда выполняется настоящий
+matches_user_filters по партии и имитируется отправка сообщения
+(asyncio.sleep(latency) на пользователя, как summary на партию).
+
+Результат - доставок (объявление -> пользователь) в секунду и ускорение
+относительно одного процесса.
+
+Использование:
+    python benchmarks/sharded_delivery.py
+    python benchmarks/sharded_delivery.py --users 1000 --listings 300 --processes 1 2 4 8
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+import database_turso
+from scrapers.base import Listing
+
+
+def _use_local_db(path: str) -> None:
+    import libsql
+
+    def _connect():
+        conn = libsql.connect(path)
+        conn.execute("PRAGMA busy_timeout = 10000")
+        return conn
+
+    database_turso.get_turso_connection = _connect
+
+
+def make_users(count: int, seed: int) -> dict:
+    """telegram_id -> фильтры"""
+    rnd = random.Random(seed)
+    users = {}
+    for i in range(count):
+        min_rooms = rnd.randint(1, 3)
+        min_price = rnd.choice([0, 20000, 40000])
+        users[100000 + i * 7919] = {
+            "city": "барановичи",
+            "min_rooms": min_rooms,
+            "max_rooms": rnd.randint(min_rooms, 4),
+            "min_price": min_price,
+            "max_price": min_price + rnd.choice([30000, 60000, 100000]),
+        }
+    return users
+
+
+def make_listings(count: int, seed: int) -> list:
+    rnd = random.Random(seed)
+    listings = []
+    for i in range(count):
+        price = rnd.randint(15000, 120000)
+        listings.append(Listing(
+            id=f"kufar_{i}", source="Kufar.by", title="квартира", price=price, price_formatted=f"${price}",
+            rooms=rnd.randint(1, 4), area=40.0, address=f"ул. Тестовая {i}, Барановичи",
+            url=f"https://re.kufar.by/vi/{i}", price_usd=price,
+        ))
+    return listings
+
+
+def _worker(path, shard, shards, args, ready, start, out):
+    """Процесс шарда: разбирает свой шард outbox до конца"""
+    _use_local_db(path)
+    from bot.services.notification_outbox import OutboxConsumer
+    from bot.services.search_service import matches_user_filters
+    from utils.sharding import shard_for_user
+
+    users = {
+        user_id: filters
+        for user_id, filters in make_users(args.users, args.seed).items()
+        if shard_for_user(user_id, shards) == shard
+    }
+
+    async def deliver(listings):
+        deliveries = {}
+        for user_id, filters in users.items():
+            matched = [l.id for l in listings if matches_user_filters(l, filters, log_details=False)]
+            if matched:
+                await asyncio.sleep(args.latency)
+                deliveries[user_id] = matched
+        return deliveries
+
+    async def main():
+        consumer = OutboxConsumer(
+            deliver=deliver, workers=1, batch_size=args.batch_size, lease_seconds=300,
+            shard=shard, shards=shards,
+        )
+        owner = f"bench:{shard}"
+        ready.set()
+        start.wait()
+        started = time.perf_counter()
+        while await consumer.process_batch(owner):
+            pass
+        stats = consumer.get_stats()
+        out.put((shard, time.perf_counter() - started, stats["messages"], len(users)))
+
+    asyncio.run(main())
+
+
+def run(shards: int, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "bench.db")
+        _use_local_db(path)
+        database_turso.NOTIFY_SHARDS = shards
+        asyncio.run(database_turso.ensure_tables_exist())
+        asyncio.run(database_turso.sync_apartments_batch(make_listings(args.listings, args.seed)))
+
+        ctx = multiprocessing.get_context("spawn")
+        out, start = ctx.Queue(), ctx.Event()
+        readies, processes = [], []
+        for shard in range(shards):
+            ready = ctx.Event()
+            process = ctx.Process(target=_worker, args=(path, shard, shards, args, ready, start, out))
+            process.start()
+            readies.append(ready)
+            processes.append(process)
+        for ready in readies:
+            ready.wait(60)
+
+        started = time.perf_counter()
+        start.set()
+        results = [out.get(timeout=600) for _ in processes]
+        elapsed = time.perf_counter() - started
+        for process in processes:
+            process.join(10)
+
+    messages = sum(result[2] for result in results)
+    return {
+        "processes": shards,
+        "elapsed": elapsed,
+        "messages": messages,
+        "per_second": messages / elapsed if elapsed else 0.0,
+        "users_per_shard": sorted(result[3] for result in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=400, help="синтетических пользователей")
+    parser.add_argument("--listings", type=int, default=200, help="объявлений в очереди")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.005, help="имитация отправки одного сообщения, с")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"users={args.users} listings={args.listings} batch={args.batch_size} latency={args.latency * 1000:.1f}ms")
+    print(f"{'процессов':>9} {'время, с':>9} {'доставок':>10} {'дост/с':>9} {'ускорение':>10}  пользователей по шардам")
+    baseline = None
+    for shards in args.processes:
+        result = run(shards, args)
+        baseline = baseline or result["per_second"]
+        print(
+            f"{result['processes']:>9} {result['elapsed']:>9.2f} {result['messages']:>10} "
+            f"{result['per_second']:>9.1f} {result['per_second'] / baseline:>9.2f}x  {result['users_per_shard']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
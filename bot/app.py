@@ -9,6 +9,7 @@ from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import BOT_TOKEN, ADMIN_TELEGRAM_IDS
 from database import init_database
+from bot.services.telegram_api import make_bot
 
 # Импортируем handlers
 from bot.handlers import help, search, start, debug, admin, filters_quick, actions
@@ -29,7 +30,7 @@ async def create_bot() -> tuple[Bot, Dispatcher]:
 
     # ВАЖНО: Не логируем токен бота нигде в коде
     # BOT_TOKEN используется только для создания Bot объекта
-    bot = Bot(token=BOT_TOKEN, parse_mode=ParseMode.HTML)
+    bot = make_bot(BOT_TOKEN, parse_mode=ParseMode.HTML)
 
     # Создаем FSM storage для состояний
     storage = MemoryStorage()
@@ -11,6 +11,15 @@ from aiogram.types import Message
 from aiogram.filters import Command
 
 from constants.constants import DEBUG_FORCE_RUN
+from utils.trace import start_trace, stop_trace
+from utils.listing_cache import get_listing_cache_stats
+from utils.valuation_cache import get_valuation_cache_stats
+from utils.inspection_cache import get_inspection_cache_stats
+from utils.prerank import get_prerank_stats
+from utils.selection_cache import get_selection_cache_stats
+from utils.similarity import get_local_compare_stats
+from utils.tokens import get_token_stats
+from bot.services.notification_outbox import get_outbox_consumer_stats
 from scrapers.aggregator import ListingsAggregator
 from bot.services.notification_service import notify_users_about_new_apartments_summary
 
@@ -26,7 +35,7 @@ _debug_skip_filter_validation = False
 
 @router.message(Command("debug"))
 async def cmd_debug(message: Message):
-    """Обработчик команды /debug run"""
+    """Обработчик команды /debug run [trace [sample_rate]] | /debug cache | /debug outbox"""
     
     # Проверка прав администратора
     if not is_admin(message.from_user.id):
@@ -36,13 +45,60 @@ async def cmd_debug(message: Message):
     global _debug_force_run
     
     parts = message.text.split()
+    if len(parts) >= 2 and parts[1] == "cache":
+        stats = get_listing_cache_stats()
+        valuation_stats = get_valuation_cache_stats()
+        inspection_stats = get_inspection_cache_stats()
+        prerank_stats = get_prerank_stats()
+        selection_stats = get_selection_cache_stats()
+        token_stats = get_token_stats()
+        compare_stats = get_local_compare_stats()
+        await message.answer(
+            "📦 In-process кэш объявлений\n"
+            + "\n".join(f"{key}: {value}" for key, value in stats.items())
+            + "\n\n🤖 Кэш ИИ-оценок\n"
+            + "\n".join(f"{key}: {value}" for key, value in valuation_stats.items())
+            + "\n\n🔎 Кэш страниц объявлений для ИИ\n"
+            + "\n".join(f"{key}: {value}" for key, value in inspection_stats.items())
+            + "\n\n🏁 Пре-ранжирование ИИ-подбора\n"
+            + "\n".join(f"{key}: {value}" for key, value in prerank_stats.items())
+            + "\n\n🧩 Кэш ИИ-подборов\n"
+            + "\n".join(f"{key}: {value}" for key, value in selection_stats.items())
+            + "\n\n🔢 Подсчет токенов\n"
+            + "\n".join(f"{key}: {value}" for key, value in token_stats.items())
+            + "\n\n⚖️ Локальное сравнение с выбранными ИИ\n"
+            + "\n".join(f"{key}: {value}" for key, value in compare_stats.items())
+        )
+        return
+    
+    if len(parts) >= 2 and parts[1] == "outbox":
+        stats = await get_outbox_consumer_stats()
+        await message.answer(
+            "📬 Очередь уведомлений\n"
+            + "\n".join(f"{key}: {value}" for key, value in stats.items())
+        )
+        return
+    
     if len(parts) < 2 or parts[1] != "run":
         await message.answer(
-            "Использование: /debug run\n\n"
-            "Запускает принудительный прогон поиска и отправку уведомлений."
+            "Использование: /debug run [trace [sample_rate]] | /debug cache | /debug outbox\n\n"
+            "Запускает принудительный прогон поиска и отправку уведомлений.\n"
+            "trace — записать структурированную трассировку прогона в JSONL.\n"
+            "cache — метрики кэшей объявлений, ИИ-оценок и ИИ-подборов, страниц для ИИ, пре-ранжирования.\n"
+            "outbox — очередь уведомлений: backlog, lag, пропускная способность."
         )
         return
     
+    # Трассировка включается только на время этого прогона
+    trace_enabled = len(parts) >= 3 and parts[2] == "trace"
+    sample_rate = None
+    if trace_enabled and len(parts) >= 4:
+        try:
+            sample_rate = float(parts[3])
+        except ValueError:
+            await message.answer(f"⚠️ Некорректный sample_rate: {parts[3]}")
+            return
+    
     global _debug_force_run, _debug_bypass_summary, _debug_ignore_sent_ads, _debug_skip_filter_validation
     
     _debug_force_run = True
@@ -52,6 +108,10 @@ async def cmd_debug(message: Message):
     
     await message.answer("🧪 DEBUG RUN запущен. Принудительный прогон поиска…")
     
+    if trace_enabled:
+        tracer = start_trace(sample_rate=sample_rate)
+        await message.answer(f"🧵 Трассировка включена: run_id={tracer.run_id}")
+    
     try:
         # Используем check_new_listings с флагами для DEBUG режима
         
@@ -72,6 +132,15 @@ async def cmd_debug(message: Message):
         await message.answer(f"❌ DEBUG RUN ошибка: {e}")
     
     finally:
+        if trace_enabled:
+            summary = stop_trace()
+            if summary:
+                await message.answer(
+                    f"🧵 Трассировка: {summary['events']} событий "
+                    f"(отброшено семплированием: {summary['sampled_out']})\n"
+                    f"Файл: {summary['path']}"
+                )
+        
         _debug_force_run = False
         _debug_bypass_summary = False
         _debug_ignore_sent_ads = False
@@ -21,31 +21,120 @@ from database import (
 )
 from error_logger import log_error, log_warning, log_info
 from bot.services.telegram_api import safe_send_message, safe_edit_message_text
+from config import AI_PROGRESS_EDIT_INTERVAL_SECONDS
+from utils.llm_scheduler import current_llm_user
+from utils.llm_stream import ThrottledProgress, current_llm_progress
+from utils.similarity import local_comparator
 
 logger = logging.getLogger(__name__)
 
 # ИИ-оценщик (опционально)
 try:
-
+    from ai_valuator import valuate_listing, valuate_listings, select_best_listings
     AI_VALUATOR_AVAILABLE = True
 except ImportError:
     AI_VALUATOR_AVAILABLE = False
     valuate_listing = None
+    valuate_listings = None
     select_best_listings = None
 
 
+class _StatusProgress:
+    """Промежуточные результаты ИИ в статус-сообщении (редактируется не чаще AI_PROGRESS_EDIT_INTERVAL_SECONDS)"""
+
+    def __init__(self, bot: Bot, status_msg: Message, header: str, title: str, final_title: str):
+        self.bot = bot
+        self.status_msg = status_msg
+        self.header = header
+        self.title = title
+        self.final_title = final_title
+        self.note = ""
+        self.picks: Dict[str, Dict[str, Any]] = {}
+        self.started = time.time()
+        self.first_result_seconds: Optional[float] = None
+        self.throttle = ThrottledProgress(self._render, AI_PROGRESS_EDIT_INTERVAL_SECONDS)
+
+    async def add(self, listing: Listing, score: float, final: bool = False) -> None:
+        """Вариант с оценкой ИИ (final - итоговый выбор, а не выбор батча)"""
+        if self.first_result_seconds is None:
+            self.first_result_seconds = time.time() - self.started
+            log_info("ai_mode", f"Первый промежуточный результат ИИ через {self.first_result_seconds:.1f} с")
+        known = self.picks.get(listing.id)
+        if known is None or final or (not known["final"] and (score or 0) >= (known["score"] or 0)):
+            self.picks[listing.id] = {"listing": listing, "score": score or 0, "final": final}
+        await self.throttle.update()
+
+    async def on_pick(self, event: Dict[str, Any]) -> None:
+        """Обработчик current_llm_progress: вариант из потокового ответа ИИ-подбора"""
+        await self.add(event["listing"], event.get("score") or 0, event.get("final", False))
+
+    def close(self) -> None:
+        self.throttle.close()
+
+    async def _render(self) -> None:
+        final = [pick for pick in self.picks.values() if pick["final"]]
+        shown = sorted(final or self.picks.values(), key=lambda pick: pick["score"], reverse=True)[:3]
+        lines = [self.header]
+        if self.note:
+            lines.append(self.note)
+        lines += ["", f"<b>{self.final_title if final else self.title}:</b>"]
+        for i, pick in enumerate(shown, 1):
+            listing = pick["listing"]
+            rooms_text = f"{listing.rooms}-комн." if listing.rooms > 0 else "?"
+            area_text = f"{listing.area} м²" if listing.area > 0 else "?"
+            lines.append(
+                f'{i}. <a href="{listing.url}">{rooms_text}, {area_text}</a> - '
+                f"{listing.price_formatted} (⭐ {pick['score']}/10)"
+            )
+        await safe_edit_message_text(
+            bot=self.bot,
+            chat_id=self.status_msg.chat.id,
+            message_id=self.status_msg.message_id,
+            text="\n".join(lines),
+            parse_mode=ParseMode.HTML,
+            disable_web_page_preview=True,
+        )
+
+
 async def evaluate_and_compare_new_listings(
     bot: Bot,
     user_id: int,
     new_listings: List[Listing],
     previous_selected: List[Dict[str, Any]],
     user_filters: Dict[str, Any],
-):
-    """Оценивает новые объявления через ИИ и сравнивает с предыдущими выбранными вариантами"""
+) -> List[Listing]:
+    """
+    Оценивает новые объявления через ИИ и сравнивает с предыдущими выбранными вариантами
+
+    Returns:
+        Объявления, показанные пользователю (топ оцененных)
+    """
     logger.info(
         f"Оцениваю {len(new_listings)} новых объявлений и сравниваю с {len(previous_selected)} предыдущими"
     )
 
+    # Локальное сравнение с выбранными ранее (utils/similarity.py): в ИИ идут только
+    # объявления, которые могут оказаться не хуже выбранных вариантов
+    decisions = local_comparator.triage(new_listings, previous_selected)
+    escalated = [decision["listing"] for decision in decisions if decision["decision"] == "escalate"]
+    skipped = len(new_listings) - len(escalated)
+    if skipped:
+        log_info(
+            "ai_mode",
+            f"[user_{user_id}] Локальное сравнение: {skipped} из {len(new_listings)} новых объявлений "
+            f"не лучше выбранных ранее, в ИИ - {len(escalated)}",
+        )
+    if not escalated:
+        await safe_send_message(
+            bot=bot,
+            chat_id=user_id,
+            text=f"📊 <b>Оценка новых объявлений</b>\n\n"
+            f"Найдено {len(new_listings)} новых объявлений - ни одно не лучше выбранных ранее вариантов "
+            f"(по цене за м², году, площади, этажу и описанию).",
+            parse_mode=ParseMode.HTML,
+        )
+        return []
+
     # Отправляем уведомление пользователю через безопасную обертку
     status_msg = await safe_send_message(
         bot=bot,
@@ -56,15 +145,31 @@ async def evaluate_and_compare_new_listings(
         parse_mode=ParseMode.HTML,
     )
 
-    # Оцениваем новые объявления через ИИ
+    # Оцениваем новые объявления через ИИ пулом с общей сессией (запросы к Groq
+    # идут в бюджете планировщика, в очереди этого пользователя)
+    current_llm_user.set(user_id)
+    to_evaluate = escalated[:10]  # Ограничиваем до 10 для экономии API
+    # Оценки показываются в статусе по мере готовности
+    progress = None
+    if status_msg:
+        progress = _StatusProgress(
+            bot, status_msg, "🔍 <b>Оценка новых объявлений</b>",
+            "Лучшие из оцененных", "Лучшие из оцененных",
+        )
     evaluated_listings = []
-    for listing in new_listings[:10]:  # Ограничиваем до 10 для экономии API
-        try:
-            ai_valuation = await valuate_listing(listing)
+    try:
+        # Оценки приходят в порядке готовности (ошибка одной не прерывает остальные)
+        done = 0
+        async for listing, ai_valuation in valuate_listings(to_evaluate):
+            done += 1
             if ai_valuation:
                 evaluated_listings.append({"listing": listing, "valuation": ai_valuation})
-        except Exception as e:
-            log_error("ai_mode", f"Ошибка оценки объявления {listing.id}", e)
+                if progress:
+                    progress.note = f"Оценено {done} из {len(to_evaluate)}..."
+                    await progress.add(listing, ai_valuation.get("value_score", 0), final=True)
+    finally:
+        if progress:
+            progress.close()
 
     if not evaluated_listings:
         if status_msg:
@@ -76,11 +181,13 @@ async def evaluate_and_compare_new_listings(
                 "Попробуйте повторить позже.",
                 parse_mode=ParseMode.HTML,
             )
-        return
+        return []
 
     # Формируем сообщение с оценкой и сравнением
     results_text = "📊 <b>Оценка новых объявлений</b>\n\n"
     results_text += f"Проанализировано {len(evaluated_listings)} новых объявлений.\n"
+    if skipped:
+        results_text += f"Еще {skipped} не лучше выбранных ранее (отсеяны без ИИ).\n"
     results_text += f"Сравнение с {len(previous_selected)} предыдущими выбранными вариантами.\n\n"
     results_text += "━━━━━━━━━━━━━━━━━━━━\n\n"
 
@@ -141,21 +248,24 @@ async def evaluate_and_compare_new_listings(
         results_text += "━━━━━━━━━━━━━━━━━━━━\n\n"
 
     # Отправляем сообщение
+    shown = [item["listing"] for item in evaluated_listings[:3]]
     try:
         if status_msg:
             await status_msg.edit_text(
                 results_text, parse_mode=ParseMode.HTML, disable_web_page_preview=False
             )
-        else:
-            await safe_send_message(
-                bot=bot,
-                chat_id=user_id,
-                text=results_text,
-                parse_mode=ParseMode.HTML,
-                disable_web_page_preview=False
-            )
+        elif not await safe_send_message(
+            bot=bot,
+            chat_id=user_id,
+            text=results_text,
+            parse_mode=ParseMode.HTML,
+            disable_web_page_preview=False
+        ):
+            return []
     except Exception as e:
         log_error("ai_mode", f"Ошибка отправки оценки пользователю {user_id}", e, exc_info=True)
+        return []
+    return shown
 
 
 async def check_new_listings_ai_mode(
@@ -164,8 +274,15 @@ async def check_new_listings_ai_mode(
     user_filters: Dict[str, Any],
     all_listings: List[Listing],
     status_msg: Optional[Message] = None,
-):
-    """ИИ-режим: собирает все подходящие объявления, отправляет ИИ для выбора лучших"""
+) -> List[Listing]:
+    """
+    ИИ-режим: собирает все подходящие объявления, отправляет ИИ для выбора лучших
+
+    Returns:
+        Объявления, показанные пользователю (выбор ИИ или лучшие из оцененных новых)
+    """
+    from bot.services.search_service import matches_user_filters
+    from bot.services.notification_service import show_actions_menu, show_no_listings_message
 
     logger.info(f"🤖 ИИ-режим для пользователя {user_id}")
 
@@ -199,7 +316,7 @@ async def check_new_listings_ai_mode(
 
     if not candidate_listings:
         logger.info(f"Пользователю {user_id} нет новых объявлений для ИИ-анализа")
-        return
+        return []
 
     logger.info(f"Найдено {len(candidate_listings)} кандидатов для ИИ-анализа")
 
@@ -212,10 +329,9 @@ async def check_new_listings_ai_mode(
         logger.info(
             f"Найдено {len(previous_selected)} предыдущих выборов ИИ, оцениваю новые объявления..."
         )
-        await evaluate_and_compare_new_listings(
+        return await evaluate_and_compare_new_listings(
             bot, user_id, candidate_listings, previous_selected, user_filters
         )
-        return
 
     # Отправляем уведомление пользователю о начале анализа (сохраняем для редактирования)
     if status_msg is None:
@@ -297,10 +413,23 @@ async def check_new_listings_ai_mode(
 
     # Отправляем все объявления в ИИ для выбора лучших
     if AI_VALUATOR_AVAILABLE and select_best_listings:
-        try:
-            best_with_reasons = await select_best_listings(
-                candidate_listings, user_filters, max_results=5  # Запрашиваем 5 вариантов
+        # Варианты, выбранные ИИ, показываются в статусе по мере потокового ответа
+        progress = None
+        if status_msg:
+            progress = _StatusProgress(
+                bot, status_msg, "🤖 <b>ИИ-анализ идет</b>\n⏳ Продолжаю сравнивать варианты...",
+                "Предварительно лучшие", "Лучшие в финальном сравнении",
             )
+        progress_token = current_llm_progress.set(progress.on_pick if progress else None)
+        try:
+            try:
+                best_with_reasons = await select_best_listings(
+                    candidate_listings, user_filters, max_results=5  # Запрашиваем 5 вариантов
+                )
+            finally:
+                current_llm_progress.reset(progress_token)
+                if progress:
+                    progress.close()
 
             # Рассчитываем фактическое время обработки
             elapsed_time = time.time() - start_time
@@ -446,6 +575,7 @@ async def check_new_listings_ai_mode(
 
                 # Показываем финальное меню действий после ИИ-анализа
                 await show_actions_menu(bot, user_id, len(best_with_reasons), "ИИ-режим")
+                return [item["listing"] for item in best_with_reasons if item.get("listing")]
 
             else:
                 logger.warning(f"ИИ не выбрал ни одного варианта для пользователя {user_id}")
@@ -491,3 +621,4 @@ async def check_new_listings_ai_mode(
             await safe_send_message(
                 bot=bot, chat_id=user_id, text=unavailable_text, parse_mode=ParseMode.HTML
             )
+    return []
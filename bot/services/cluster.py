@@ -0,0 +1,181 @@
+"""
+Многопроцессный режим: координатор парсинга и процессы рассылки по шардам
+
+Включается NOTIFY_WORKER_PROCESSES > 0. Роли процессов:
+
+- координатор (основной процесс с polling и планировщиком): собирает
+  фильтры активных пользователей, планирует по одной задаче парсинга на
+  город (объединение диапазонов комнат и цен) и запускает агрегатор.
+  Новые объявления сохраняются в apartments и ставятся в notification_outbox
+  по записи на шард;
+- воркеры (NOTIFY_WORKER_PROCESSES процессов): каждый читает из outbox
+  только свой шард и рассылает объявления только пользователям шарда
+  (консистентный хеш telegram_id, utils/sharding.py).
+
+Процессы общаются только через БД, поэтому воркер можно перезапустить
+отдельно: его шард дочитает очередь после рестарта.
+"""
+import asyncio
+import multiprocessing
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from error_logger import log_info, log_warning, log_error
+
+# Границы цен, если у пользователя не задан min_price/max_price
+_MIN_PRICE = 0
+_MAX_PRICE = 100_000_000
+
+
+@dataclass
+class CityJob:
+    """Задача парсинга одного города для всех пользователей с этим городом"""
+    city: str
+    min_rooms: int
+    max_rooms: int
+    min_price: int
+    max_price: int
+    user_ids: Set[int] = field(default_factory=set)
+
+
+def plan_city_jobs(filters_by_user: Dict[int, Optional[Dict[str, Any]]]) -> List[CityJob]:
+    """
+    Группирует фильтры пользователей по городу.
+
+    Для каждого города берется объединение диапазонов комнат и цен, чтобы
+    один проход агрегатора покрыл всех пользователей города; точная
+    фильтрация выполняется при рассылке (matches_user_filters).
+    Пользователи без валидных фильтров пропускаются.
+    """
+    from database_turso import has_valid_user_filters
+
+    jobs: Dict[str, CityJob] = {}
+    for user_id, filters in filters_by_user.items():
+        if not has_valid_user_filters(filters):
+            continue
+        city = filters["city"].strip().lower()
+        min_price = filters.get("min_price") or _MIN_PRICE
+        max_price = filters.get("max_price") or _MAX_PRICE
+        job = jobs.get(city)
+        if job is None:
+            job = jobs[city] = CityJob(city, filters["min_rooms"], filters["max_rooms"], min_price, max_price)
+        else:
+            job.min_rooms = min(job.min_rooms, filters["min_rooms"])
+            job.max_rooms = max(job.max_rooms, filters["max_rooms"])
+            job.min_price = min(job.min_price, min_price)
+            job.max_price = max(job.max_price, max_price)
+        job.user_ids.add(user_id)
+    return sorted(jobs.values(), key=lambda job: job.city)
+
+
+async def run_city_job(job: CityJob) -> int:
+    """
+    Парсит город; новые объявления агрегатор сохраняет и ставит в outbox.
+
+    Returns:
+        Количество уникальных объявлений города
+    """
+    from config import DEFAULT_SOURCES
+    from scrapers.aggregator import ListingsAggregator
+
+    total = 0
+    # Те же источники, что и в обычной проверке (search_service._parse_and_cache_listings)
+    aggregator = ListingsAggregator(enabled_sources=DEFAULT_SOURCES)
+    async for batch in aggregator.iter_listings(
+        city=job.city,
+        min_rooms=job.min_rooms,
+        max_rooms=job.max_rooms,
+        min_price=job.min_price,
+        max_price=job.max_price,
+        persist=True,
+    ):
+        total += len(batch)
+    return total
+
+
+async def coordinator_check() -> Dict[str, int]:
+    """
+    Плановая проверка координатора: по одному проходу агрегатора на город.
+
+    Рассылкой занимаются процессы-воркеры, поэтому координатор никому
+    ничего не отправляет.
+
+    Returns:
+        Город -> количество уникальных объявлений
+    """
+    from database import get_active_users
+    from database_turso import get_user_filters_turso
+
+    users = await get_active_users()
+    filters_by_user = {user_id: await get_user_filters_turso(user_id) for user_id in users}
+    jobs = plan_city_jobs(filters_by_user)
+    log_info(
+        "cluster",
+        f"Координатор: пользователей {len(users)}, задач по городам {len(jobs)} "
+        f"({', '.join(f'{job.city}:{len(job.user_ids)}' for job in jobs)})",
+    )
+
+    results: Dict[str, int] = {}
+    for job in jobs:
+        try:
+            results[job.city] = await run_city_job(job)
+        except Exception as e:
+            log_error("cluster", f"Ошибка парсинга города {job.city}", e)
+    return results
+
+
+def run_notify_worker(shard: int, shards: int) -> None:
+    """Точка входа процесса рассылки: пул воркеров outbox для одного шарда"""
+    from aiogram.enums import ParseMode
+
+    from bot.services.notification_outbox import OutboxConsumer
+    from bot.services.telegram_api import make_bot
+
+    async def main():
+        bot = make_bot(parse_mode=ParseMode.HTML)
+        consumer = OutboxConsumer(shard=shard, shards=shards)
+        consumer.start(bot)
+        log_info("cluster", f"Процесс рассылки шарда {shard}/{shards} запущен")
+        try:
+            # Процесс живет, пока его не остановит координатор (terminate)
+            await asyncio.Event().wait()
+        finally:
+            await consumer.stop()
+            await bot.session.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+_worker_processes: List[multiprocessing.Process] = []
+
+
+def start_notify_worker_processes(count: int) -> List[multiprocessing.Process]:
+    """Запускает count процессов рассылки (шарды 0..count-1)"""
+    ctx = multiprocessing.get_context("spawn")
+    for shard in range(count):
+        process = ctx.Process(
+            target=run_notify_worker,
+            args=(shard, count),
+            name=f"notify-worker-{shard}",
+            daemon=True,
+        )
+        process.start()
+        _worker_processes.append(process)
+    log_info("cluster", f"Запущено процессов рассылки: {count}")
+    return list(_worker_processes)
+
+
+def stop_notify_worker_processes(timeout: float = 10.0) -> None:
+    """Останавливает процессы рассылки; недоставленные партии вернутся в очередь по истечении аренды"""
+    for process in _worker_processes:
+        if process.is_alive():
+            process.terminate()
+    for process in _worker_processes:
+        process.join(timeout)
+        if process.is_alive():
+            log_warning("cluster", f"{process.name} не остановился за {timeout}s")
+            process.kill()
+    _worker_processes.clear()
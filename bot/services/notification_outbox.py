@@ -0,0 +1,242 @@
+"""
+Воркеры очереди уведомлений (notification_outbox)
+
+sync_apartments_batch ставит реально новые объявления в notification_outbox
+той же транзакцией, что вставляет их в apartments. Пул воркеров забирает
+записи партиями в аренду (lease), рассылает партию пользователям и одной
+транзакцией пишет sent_ads и отмечает записи доставленными.
+
+Если процесс упал посреди рассылки, аренда истекает и партию забирает
+другой воркер (или этот же процесс после рестарта). Объявления, уже
+записанные в sent_ads, повторно не отправляются; захваты sent_ads упавшей
+рассылки (current_outbox_lease) перехватываются вместе с партией.
+
+В многопроцессном режиме (NOTIFY_WORKER_PROCESSES > 0) объявление ставится
+в очередь по записи на шард, и пул каждого процесса читает только свой шард
+и рассылает только пользователям шарда (bot/services/cluster.py).
+"""
+import asyncio
+import os
+import socket
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import (
+    NOTIFY_OUTBOX_WORKERS,
+    NOTIFY_OUTBOX_BATCH_SIZE,
+    NOTIFY_OUTBOX_LEASE_SECONDS,
+    NOTIFY_OUTBOX_POLL_SECONDS,
+    NOTIFY_OUTBOX_MAX_ATTEMPTS,
+    NOTIFY_SHARDS,
+)
+from database_turso import (
+    claim_outbox_batch,
+    complete_outbox_batch,
+    current_outbox_lease,
+    get_outbox_stats,
+    listing_from_outbox_payload,
+    release_outbox_batch,
+    renew_outbox_lease,
+)
+from error_logger import log_info, log_warning, log_error
+from scrapers.base import Listing
+
+# Функция доставки: (список объявлений) -> telegram_id -> отправленные ad_id
+DeliverFn = Callable[[List[Listing]], Awaitable[Dict[int, List[str]]]]
+
+# Сколько последних замеров lag хранить для перцентилей
+_LAG_SAMPLES = 1000
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class OutboxConsumer:
+    """
+    Пул воркеров notification_outbox
+
+    Args:
+        deliver: Функция доставки партии; по умолчанию deliver_outbox_batch
+            с ботом, переданным в start()
+        workers: Число воркеров (одновременных рассылок)
+        batch_size: Сколько объявлений воркер забирает за раз
+        lease_seconds: Длительность аренды; продлевается каждые lease_seconds / 3
+        poll_seconds: Интервал опроса пустой очереди (wake() будит раньше)
+        max_attempts: После стольких неудачных попыток запись уходит в failed
+        shard: Шард очереди, который читает пул
+        shards: Всего шардов (для выбора пользователей шарда)
+    """
+
+    def __init__(
+        self,
+        deliver: Optional[DeliverFn] = None,
+        workers: int = NOTIFY_OUTBOX_WORKERS,
+        batch_size: int = NOTIFY_OUTBOX_BATCH_SIZE,
+        lease_seconds: float = NOTIFY_OUTBOX_LEASE_SECONDS,
+        poll_seconds: float = NOTIFY_OUTBOX_POLL_SECONDS,
+        max_attempts: int = NOTIFY_OUTBOX_MAX_ATTEMPTS,
+        shard: int = 0,
+        shards: int = NOTIFY_SHARDS,
+    ):
+        self.deliver = deliver
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.shard = shard
+        self.shards = shards
+        self.owner_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._started_at: Optional[float] = None
+        self._lags: deque = deque(maxlen=_LAG_SAMPLES)
+        self._stats = {"batches": 0, "delivered": 0, "messages": 0, "released": 0, "lease_lost": 0}
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def start(self, bot=None) -> None:
+        """Запускает воркеры в текущем event loop"""
+        if self.running:
+            return
+        if self.deliver is None:
+            if bot is None:
+                raise ValueError("OutboxConsumer: нужен bot или функция deliver")
+            from bot.services.notification_service import deliver_outbox_batch
+
+            async def _deliver(listings: List[Listing]) -> Dict[int, List[str]]:
+                return await deliver_outbox_batch(bot, listings, shard=self.shard, shards=self.shards)
+
+            self.deliver = _deliver
+
+        self._wakeup = asyncio.Event()
+        self._started_at = time.monotonic()
+        self._tasks = [
+            asyncio.create_task(self._worker(f"{self.owner_prefix}:{i}"), name=f"outbox:{self.shard}:{i}")
+            for i in range(self.workers)
+        ]
+        log_info(
+            "outbox",
+            f"Запущено воркеров outbox: {self.workers} (шард {self.shard}/{self.shards}, "
+            f"batch={self.batch_size}, lease={self.lease_seconds}s)",
+        )
+
+    async def stop(self) -> None:
+        """Останавливает воркеры; незавершенные партии вернутся в очередь по истечении аренды"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self) -> None:
+        """Будит воркеры после постановки новых объявлений в очередь"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self, owner: str) -> None:
+        while True:
+            try:
+                processed = await self.process_batch(owner)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_error("outbox", f"Ошибка воркера {owner}", e)
+                processed = 0
+
+            if processed:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def process_batch(self, owner: str) -> int:
+        """
+        Забирает и доставляет одну партию.
+
+        Returns:
+            Количество записей outbox в партии (0 - очередь пуста)
+        """
+        rows = await claim_outbox_batch(owner, self.batch_size, self.lease_seconds, shard=self.shard)
+        if not rows:
+            return 0
+
+        outbox_ids = [row["id"] for row in rows]
+        listings = []
+        for row in rows:
+            try:
+                listings.append(listing_from_outbox_payload(row["payload"]))
+            except Exception as e:
+                log_warning("outbox", f"Не удалось разобрать payload {row['ad_id']}: {e}")
+
+        heartbeat = asyncio.create_task(self._renew_lease(outbox_ids, owner))
+        # Захваты sent_ads этой рассылки привязаны к аренде партии
+        lease_token = current_outbox_lease.set(owner)
+        try:
+            deliveries = await self.deliver(listings) if listings else {}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._stats["released"] += len(outbox_ids)
+            log_error("outbox", f"Ошибка доставки партии ({len(outbox_ids)} записей), возвращаю в очередь", e)
+            await release_outbox_batch(outbox_ids, owner, str(e), self.max_attempts)
+            return len(outbox_ids)
+        finally:
+            current_outbox_lease.reset(lease_token)
+            heartbeat.cancel()
+
+        done = await complete_outbox_batch(outbox_ids, owner, deliveries)
+        delivered_at = time.time()
+        self._stats["batches"] += 1
+        self._stats["delivered"] += done
+        self._stats["lease_lost"] += len(outbox_ids) - done
+        self._stats["messages"] += sum(len(ad_ids) for ad_ids in deliveries.values())
+        self._lags.extend(delivered_at - row["enqueued_at"] for row in rows)
+
+        log_info(
+            "outbox",
+            "[%s] партия: %d объявлений, %d пользователей, lag max=%.1fs",
+            owner, done, len(deliveries), max(delivered_at - row["enqueued_at"] for row in rows),
+        )
+        return len(outbox_ids)
+
+    async def _renew_lease(self, outbox_ids: List[int], owner: str) -> None:
+        """Продлевает аренду, пока идет долгая рассылка"""
+        while True:
+            await asyncio.sleep(max(self.lease_seconds / 3, 0.1))
+            await renew_outbox_lease(outbox_ids, owner, self.lease_seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики процесса: пропускная способность и lag (постановка -> доставка)"""
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+        lags = list(self._lags)
+        return {
+            **self._stats,
+            "shard": self.shard,
+            "workers": self.workers if self.running else 0,
+            "throughput_per_min": round(self._stats["delivered"] * 60 / uptime, 2) if uptime else 0.0,
+            "lag_p50": round(_percentile(lags, 0.5), 2),
+            "lag_p95": round(_percentile(lags, 0.95), 2),
+            "lag_max": round(max(lags), 2) if lags else 0.0,
+        }
+
+
+# Глобальный пул процесса (запускается в main.py)
+outbox_consumer = OutboxConsumer()
+
+
+async def get_outbox_consumer_stats() -> Dict[str, Any]:
+    """Метрики воркеров процесса и состояние очереди в БД"""
+    stats = outbox_consumer.get_stats()
+    queue = await get_outbox_stats()
+    stats.update({f"queue_{key}": value for key, value in queue.items()})
+    return stats
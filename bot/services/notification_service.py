@@ -39,9 +39,12 @@ from database import (
     mark_listing_sent,
     mark_listing_sent_to_user,
     is_listing_ai_valuated,
-    is_ad_sent_to_user,
     mark_ad_sent_to_user,
+    claim_ads_for_user,
+    complete_ad_claims,
+    release_ad_claims,
 )
+from database_turso import new_sent_claim_owner
 from config import MAX_PHOTOS
 from constants.constants import (
     MAX_GROUPS_IN_SUMMARY,
@@ -52,6 +55,7 @@ from constants.constants import (
 )
 from error_logger import log_info, log_warning, log_error
 from bot.services.telegram_api import (
+    make_bot,
     safe_send_message,
     safe_send_media_group,
     safe_edit_message_text,
@@ -67,7 +71,7 @@ USER_DELIVERY_MODES: Dict[int, str] = {}
 
 # ИИ-оценщик (опционально)
 try:
-
+    from ai_valuator import valuate_listing
     AI_VALUATOR_AVAILABLE = True
 except ImportError:
     AI_VALUATOR_AVAILABLE = False
@@ -196,7 +200,7 @@ def format_listing_message(listing: Listing, ai_valuation: Optional[Dict[str, An
     if listing.created_at:
         # Форматируем дату для вывода
         try:
-
+            from datetime import datetime
             date_obj = datetime.strptime(listing.created_at, "%Y-%m-%d")
             today = datetime.now()
             days_diff = (today - date_obj).days
@@ -243,53 +247,73 @@ def format_listing_message(listing: Listing, ai_valuation: Optional[Dict[str, An
 
 
 async def send_listing_to_user(
-    bot: Bot, user_id: int, listing: Listing, use_ai_valuation: bool = False
+    bot: Bot, user_id: int, listing: Listing, use_ai_valuation: bool = False,
+    claim_owner: Optional[str] = None, ignore_sent_ads: bool = False,
 ) -> bool:
     """Отправляет объявление пользователю
 
+    Перед отправкой объявление захватывается в sent_ads (claim_ads_for_user),
+    поэтому параллельные воркеры не отправят его дважды. После успешной
+    отправки захват завершается, после неудачной - снимается.
+
     Args:
         bot: Экземпляр бота
         user_id: ID пользователя
         listing: Объявление для отправки
         use_ai_valuation: Если True, будет выполнена ИИ-оценка (по умолчанию False - без оценки)
+        claim_owner: Владелец захвата, если объявление уже захвачено вызывающим;
+            тогда захват снимает вызывающий
+        ignore_sent_ads: Отправить без захвата и проверки sent_ads (DEBUG-запуски)
     
     Returns:
         True если объявление было отправлено, False если уже было отправлено ранее или произошла ошибка
     """
-    try:
-        # ДИАГНОСТИЧЕСКИЙ ЛОГ: логируем перед отправкой
-        log_info(
-            "notification",
-            f"[NOTIFY] user={user_id} ad_id={listing.id} address={listing.address}"
-        )
-        
-        # Идемпотентная проверка: если объявление уже было отправлено этому пользователю - не отправляем
-        # В DEBUG режиме игнорируем проверку sent_ads
-        
-        debug_force = get_debug_force_run() or DEBUG_FORCE_RUN
-        debug_ignore_sent_ads = get_debug_ignore_sent_ads()
-        
-        # Логирование проверки sent_ads
-        ad_key = normalize_ad_id(listing.id)
-        tg = normalize_telegram_id(user_id)
-        already = False
+    # ДИАГНОСТИЧЕСКИЙ ЛОГ: логируем перед отправкой
+    log_info(
+        "notification",
+        f"[NOTIFY] user={user_id} ad_id={listing.id} address={listing.address}"
+    )
+    
+    # Идемпотентный захват: если объявление уже было отправлено этому пользователю
+    # (или его прямо сейчас отправляет другой воркер) - не отправляем
+    # В DEBUG режиме игнорируем проверку sent_ads
+    from constants.constants import DEBUG_FORCE_RUN
+    from bot.handlers.debug import get_debug_force_run, get_debug_ignore_sent_ads
+    debug_force = get_debug_force_run() or DEBUG_FORCE_RUN
+    debug_ignore_sent_ads = ignore_sent_ads or get_debug_ignore_sent_ads()
+    
+    ad_key = normalize_ad_id(listing.id)
+    tg = normalize_telegram_id(user_id)
+    owner = None
+    if claim_owner is None and not (debug_force or debug_ignore_sent_ads):
+        owner = new_sent_claim_owner()
+        claimed = [ad_key]
         try:
-            if not (debug_force or debug_ignore_sent_ads):
-                already = await is_ad_sent_to_user(telegram_id=tg, ad_external_id=ad_key)
-            else:
-                logger.info(f"[sent_check][DEBUG] debug_force={debug_force} debug_ignore={debug_ignore_sent_ads} — пропускаю проверку sent_ads для user={tg} ad={ad_key}")
+            claimed = await claim_ads_for_user(telegram_id=tg, ad_external_ids=[ad_key], owner=owner)
         except Exception as e:
-            logger.exception(f"[sent_check][ERROR] user={tg} ad={ad_key} check failed: {e}")
-        logger.info(f"[sent_check] user={tg} ad={ad_key} already_sent={already}")
+            owner = None
+            logger.exception(f"[sent_check][ERROR] user={tg} ad={ad_key} claim failed: {e}")
+        logger.info(f"[sent_check] user={tg} ad={ad_key} already_sent={not claimed}")
         
-        if already:
+        if not claimed:
             log_info(
                 "notification",
                 f"Объявление {ad_key} уже было отправлено пользователю {tg}, пропускаем"
             )
             logger.info(f"[search][skip] user={tg} skip ad={ad_key} reason=already_sent")
             return False
-        
+    elif claim_owner is None:
+        logger.info(f"[sent_check][DEBUG] debug_force={debug_force} debug_ignore={debug_ignore_sent_ads} — пропускаю проверку sent_ads для user={tg} ad={ad_key}")
+    
+    sent = await _send_listing(bot, user_id, listing, use_ai_valuation)
+    if owner and not sent:
+        await release_ad_claims(telegram_id=tg, ad_external_ids=[ad_key], owner=owner)
+    return sent
+
+
+async def _send_listing(bot: Bot, user_id: int, listing: Listing, use_ai_valuation: bool) -> bool:
+    """Отправка объявления в Telegram и отметка в sent_ads (без проверки дублей)"""
+    try:
         # Проверка per-user rate limit (soft lock)
         now = time()
         unlock_at = USER_SEND_LOCKS.get(user_id)
@@ -329,6 +353,8 @@ async def send_listing_to_user(
         # Если URL слишком длинный, кодируем через callback_codec
         
         # Проверяем длину URL и кодируем если нужно
+        from bot.utils.callback_codec import encode_callback_payload
+        from bot.utils.ui_helpers import build_keyboard
         url_for_callback = listing.url
         if len(f"open_ad:{listing.url}") > 64:
             # URL слишком длинный - кодируем через short_links
@@ -529,6 +555,7 @@ async def send_grouped_listings_to_user(bot: Bot, user_id: int, listings: List[L
         )
         
         # ШАГ 3: ДЕТАЛИЗАЦИЯ ПО КАЖДОМУ АГЕНТСТВУ
+        from collections import defaultdict
         vendors_map = defaultdict(list)
         
         for l in listings:
@@ -744,6 +771,7 @@ async def show_actions_menu(
     builder.adjust(1)
 
     mode_text = "ИИ-мод" if mode == "ИИ-режим" else "Обычный парсер"
+    from bot.utils.ui_helpers import get_contextual_hint
     hint = get_contextual_hint("actions_menu")
     
     if listings_count > 0:
@@ -886,6 +914,117 @@ async def show_listings_list(bot: Bot, user_id: int, listings: List[Listing], st
 
 
 
+async def deliver_listings_to_user(
+    bot: Bot,
+    user_id: int,
+    listings: List[Listing],
+    debug_force: bool = False,
+    debug_ignore_sent_ads: bool = False,
+    debug_bypass_summary: bool = False,
+) -> List[Listing]:
+    """
+    Отправляет пользователю новые объявления, подходящие под его фильтры.
+    
+    Подходящие объявления захватываются в sent_ads одним запросом
+    (claim_ads_for_user): уже отправленные и захваченные другим воркером
+    отсеиваются. Остальные уходят summary или полными уведомлениями в
+    зависимости от delivery_mode; захват отправленных завершается, остальных
+    снимается.
+    
+    Returns:
+        Объявления, отправленные пользователю (пустой список, если ничего не подошло)
+    """
+    from database import get_user_filters
+    from bot.services.search_service import matches_user_filters, validate_user_filters
+    
+    user_filters = await get_user_filters(user_id)
+    if not user_filters:
+        return []
+    
+    # Проверяем валидность фильтров
+    is_valid, error_msg = validate_user_filters(user_filters)
+    if not is_valid:
+        return []
+    
+    # Применяем фильтры пользователя к новым объявлениям
+    matched = [
+        listing for listing in listings
+        if matches_user_filters(listing, user_filters, user_id=user_id, log_details=False)
+    ]
+    if not matched:
+        return []
+    
+    tg = normalize_telegram_id(user_id)
+    owner = None
+    filtered_listings = matched
+    if debug_force or debug_ignore_sent_ads:
+        # В DEBUG режиме игнорируем проверку sent_ads
+        logger.info(f"[sent_check][DEBUG] debug_force={debug_force} debug_ignore={debug_ignore_sent_ads} — пропускаю проверку sent_ads для user={tg}")
+    else:
+        owner = new_sent_claim_owner()
+        claimed = set()
+        try:
+            claimed = set(await claim_ads_for_user(
+                telegram_id=tg, ad_external_ids=[listing.id for listing in matched], owner=owner
+            ))
+        except Exception as e:
+            # Ошибка БД: отправляем без захвата, как раньше без проверки sent_ads
+            owner = None
+            logger.exception(f"[sent_check][ERROR] user={tg} claim failed: {e}")
+        else:
+            filtered_listings = [listing for listing in matched if normalize_ad_id(listing.id) in claimed]
+            for listing in matched:
+                if normalize_ad_id(listing.id) not in claimed:
+                    logger.info(f"[search][skip] user={tg} skip ad={normalize_ad_id(listing.id)} reason=already_sent")
+    
+    if not filtered_listings:
+        return []
+    
+    delivered: List[Listing] = []
+    try:
+        delivered = await _send_to_user(bot, user_id, user_filters, filtered_listings, owner, debug_bypass_summary)
+    finally:
+        if owner:
+            delivered_keys = {normalize_ad_id(listing.id) for listing in delivered}
+            await complete_ad_claims(telegram_id=tg, ad_external_ids=list(delivered_keys), owner=owner)
+            failed = [listing.id for listing in filtered_listings if normalize_ad_id(listing.id) not in delivered_keys]
+            if failed:
+                await release_ad_claims(telegram_id=tg, ad_external_ids=failed, owner=owner)
+    
+    return delivered
+
+
+async def _send_to_user(
+    bot: Bot,
+    user_id: int,
+    user_filters: Dict[str, Any],
+    filtered_listings: List[Listing],
+    claim_owner: Optional[str],
+    debug_bypass_summary: bool,
+) -> List[Listing]:
+    """Отправляет уже захваченные объявления по delivery_mode. Возвращает отправленные"""
+    # Полные уведомления: delivery_mode="full" или DEBUG bypass_summary
+    delivery_mode = USER_DELIVERY_MODES.get(user_id, DELIVERY_MODE_DEFAULT)
+    if not debug_bypass_summary and delivery_mode != DELIVERY_MODE_FULL:
+        # Brief режим - отправляем summary
+        sent = await send_summary_message(bot, user_id, filtered_listings)
+        return filtered_listings if sent else []
+    
+    if user_filters.get("ai_mode"):
+        from bot.services.ai_service import check_new_listings_ai_mode
+        # Отправленными считаются только показанные варианты, остальные захваты снимаются
+        return await check_new_listings_ai_mode(bot, user_id, user_filters, filtered_listings)
+    
+    delivered: List[Listing] = []
+    for group in group_similar_listings(filtered_listings):
+        if len(group) == 1:
+            if await send_listing_to_user(bot, user_id, group[0], use_ai_valuation=False, claim_owner=claim_owner):
+                delivered.append(group[0])
+        elif await send_grouped_listings_to_user(bot, user_id, group):
+            delivered.extend(group)
+    return delivered
+
+
 async def notify_users_about_new_apartments_summary(
     new_listings: List[Listing],
     force: bool = False,
@@ -903,6 +1042,9 @@ async def notify_users_about_new_apartments_summary(
         bypass_summary: Обойти summary и отправлять полные уведомления (для DEBUG режима)
     """
     
+    from constants.constants import DEBUG_FORCE_RUN
+    from bot.handlers.debug import get_debug_force_run, get_debug_bypass_summary, get_debug_ignore_sent_ads
+    
     # Проверяем DEBUG режим
     debug_force = force or get_debug_force_run() or DEBUG_FORCE_RUN
     debug_bypass_summary = bypass_summary or get_debug_bypass_summary()
@@ -920,6 +1062,8 @@ async def notify_users_about_new_apartments_summary(
         return
     
     try:
+        from database import get_active_users
+        from config import BOT_TOKEN
         
         if not BOT_TOKEN:
             log_warning("notification", "[SUMMARY] BOT_TOKEN не настроен, уведомления отключены")
@@ -936,97 +1080,17 @@ async def notify_users_about_new_apartments_summary(
             return
         
         # Создаем бот
-        bot = Bot(token=BOT_TOKEN)
+        bot = make_bot(BOT_TOKEN)
         try:
-            listings = new_listings
-            
             # Для каждого пользователя проверяем объявления по его фильтрам
             for user_id in users:
                 try:
-                    user_filters = await get_user_filters(user_id)
-                    if not user_filters:
-                        continue
-                    
-                    # Проверяем валидность фильтров
-                    is_valid, error_msg = validate_user_filters(user_filters)
-                    if not is_valid:
-                        continue
-                    
-                    # Применяем фильтры пользователя к новым объявлениям
-                    filtered_listings = []
-                    tg = normalize_telegram_id(user_id)
-                    for listing in listings:
-                        # В DEBUG режиме игнорируем проверку sent_ads
-                        ad_key = normalize_ad_id(listing.id)
-                        already = False
-                        try:
-                            if not (debug_force or debug_ignore_sent_ads):
-                                already = await is_ad_sent_to_user(telegram_id=tg, ad_external_id=ad_key)
-                            else:
-                                logger.info(f"[sent_check][DEBUG] debug_force={debug_force} debug_ignore={debug_ignore_sent_ads} — пропускаю проверку sent_ads для user={tg} ad={ad_key}")
-                        except Exception as e:
-                            logger.exception(f"[sent_check][ERROR] user={tg} ad={ad_key} check failed: {e}")
-                        logger.info(f"[sent_check] user={tg} ad={ad_key} already_sent={already}")
-                        
-                        if already:
-                            logger.info(f"[search][skip] user={tg} skip ad={ad_key} reason=already_sent")
-                            continue
-                        
-                        # Проверяем соответствие фильтрам пользователя
-                        if matches_user_filters(listing, user_filters, user_id=user_id, log_details=False):
-                            filtered_listings.append(listing)
-                    
-                    if not filtered_listings:
-                        continue
-                    
-                    # Если bypass_summary=True, отправляем полные уведомления для всех
-                    if debug_bypass_summary or bypass_summary:
-                        # DEBUG режим: отправляем полные уведомления, игнорируя summary
-                        if user_filters.get("ai_mode"):
-                            await check_new_listings_ai_mode(bot, user_id, user_filters, filtered_listings)
-                        else:
-                            groups = group_similar_listings(filtered_listings)
-                            for group in groups:
-                                if len(group) == 1:
-                                    await send_listing_to_user(bot, user_id, group[0], use_ai_valuation=False)
-                                else:
-                                    await send_grouped_listings_to_user(bot, user_id, group)
-                        continue
-                    
-                    # Получаем delivery_mode пользователя (по умолчанию "brief")
-                    delivery_mode = USER_DELIVERY_MODES.get(user_id, DELIVERY_MODE_DEFAULT)
-                    
-                    if delivery_mode == DELIVERY_MODE_FULL:
-                        # Полный режим - отправляем как раньше
-                        if user_filters.get("ai_mode"):
-                            await check_new_listings_ai_mode(bot, user_id, user_filters, filtered_listings)
-                        else:
-                            groups = group_similar_listings(filtered_listings)
-                            for group in groups:
-                                if len(group) == 1:
-                                    # В DEBUG режиме игнорируем проверку sent_ads
-                                    ad_key = normalize_ad_id(group[0].id)
-                                    already = False
-                                    try:
-                                        if not debug_force:
-                                            already = await is_ad_sent_to_user(telegram_id=tg, ad_external_id=ad_key)
-                                        else:
-                                            logger.info(f"[sent_check][DEBUG] debug_force=True — пропускаю проверку sent_ads для user={tg} ad={ad_key}")
-                                    except Exception as e:
-                                        logger.exception(f"[sent_check][ERROR] user={tg} ad={ad_key} check failed: {e}")
-                                    logger.info(f"[sent_check] user={tg} ad={ad_key} already_sent={already}")
-                                    
-                                    if already:
-                                        logger.info(f"[search][skip] user={tg} skip ad={ad_key} reason=already_sent")
-                                        continue
-                                    await send_listing_to_user(bot, user_id, group[0], use_ai_valuation=False)
-                                else:
-                                    await send_grouped_listings_to_user(bot, user_id, group)
-                        continue
-                    
-                    # Brief режим - отправляем summary
-                    await send_summary_message(bot, user_id, filtered_listings)
-                    
+                    await deliver_listings_to_user(
+                        bot, user_id, new_listings,
+                        debug_force=debug_force,
+                        debug_ignore_sent_ads=debug_ignore_sent_ads,
+                        debug_bypass_summary=debug_bypass_summary,
+                    )
                 except Exception as e:
                     log_error("notification", f"[SUMMARY] ошибка обработки пользователя {user_id}: {e}")
                     continue
@@ -1048,7 +1112,52 @@ async def notify_users_about_new_apartments_summary(
         traceback.print_exc()
 
 
-async def send_summary_message(bot: Bot, user_id: int, apartments: List[Listing]) -> None:
+async def deliver_outbox_batch(
+    bot: Bot,
+    new_listings: List[Listing],
+    shard: int = 0,
+    shards: int = 1,
+) -> Dict[int, List[str]]:
+    """
+    Рассылает партию объявлений из notification_outbox активным пользователям шарда.
+    
+    Каждый пользователь получает одну рассылку на всю партию (summary или
+    полные уведомления по delivery_mode). Ошибка одного пользователя не
+    прерывает рассылку остальным.
+    
+    Args:
+        shard: Шард воркера; рассылка только пользователям этого шарда
+        shards: Всего шардов (1 - все пользователи)
+    
+    Returns:
+        telegram_id -> список ad_id, отправленных пользователю; воркер outbox
+        записывает их в sent_ads одной транзакцией с отметкой партии
+    """
+    from database import get_active_users
+    from utils.sharding import shard_for_user
+    
+    users = await get_active_users()
+    if shards > 1:
+        users = [user_id for user_id in users if shard_for_user(user_id, shards) == shard]
+    log_info(
+        "notification",
+        f"[OUTBOX] шард {shard}/{shards}: партия {len(new_listings)} объявлений, пользователей: {len(users)}",
+    )
+    
+    deliveries: Dict[int, List[str]] = {}
+    for user_id in users:
+        try:
+            sent = await deliver_listings_to_user(bot, user_id, new_listings)
+        except Exception as e:
+            log_error("notification", f"[OUTBOX] ошибка обработки пользователя {user_id}: {e}")
+            continue
+        if sent:
+            deliveries[user_id] = [normalize_ad_id(listing.id) for listing in sent]
+    
+    return deliveries
+
+
+async def send_summary_message(bot: Bot, user_id: int, apartments: List[Listing]) -> bool:
     """
     Отправляет summary-сообщение пользователю с группировкой по адресам.
     
@@ -1056,13 +1165,16 @@ async def send_summary_message(bot: Bot, user_id: int, apartments: List[Listing]
         bot: Экземпляр бота
         user_id: ID пользователя
         apartments: Список Listing объектов
+    
+    Returns:
+        True если сообщение отправлено
     """
     try:
         # Группируем объявления по адресу
         groups = group_similar_listings(apartments)
         
         if not groups:
-            return
+            return False
         
         # Вычисляем медианную цену за м² по всему рынку (один раз)
         market_median_ppm = calc_market_median_ppm(apartments)
@@ -1096,6 +1208,7 @@ async def send_summary_message(bot: Bot, user_id: int, apartments: List[Listing]
             dispersion_indicator = ""
             
             if prices_per_m2:
+                from statistics import median
                 house_median_ppm = median(prices_per_m2)
                 
                 # Индикатор цены (если цена за м² ниже рынка > 10%)
@@ -1153,18 +1266,23 @@ async def send_summary_message(bot: Bot, user_id: int, apartments: List[Listing]
         keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
         
         # Отправляем сообщение
-        await safe_send_message(
+        sent_message = await safe_send_message(
             bot=bot,
             chat_id=user_id,
             text=text,
             parse_mode=ParseMode.HTML,
             reply_markup=keyboard
         )
+        if sent_message is None:
+            log_warning("notification", f"[SUMMARY] summary пользователю {user_id} не отправлено")
+            return False
         
         log_info("notification", f"[SUMMARY] отправлено summary пользователю {user_id}: {len(groups_with_scores)} групп")
+        return True
         
     except Exception as e:
         log_error("notification", f"[SUMMARY] ошибка отправки summary пользователю {user_id}: {e}")
+        return False
 
 
 async def get_listings_for_house_hash(house_hash: str) -> List[Listing]:
@@ -1178,6 +1296,7 @@ async def get_listings_for_house_hash(house_hash: str) -> List[Listing]:
         Список Listing объектов с соответствующим адресом
     """
     try:
+        from database_turso import build_dynamic_query
         
         # Получаем все недавние объявления из БД
         all_apartments = await build_dynamic_query(
@@ -1187,6 +1306,7 @@ async def get_listings_for_house_hash(house_hash: str) -> List[Listing]:
         
         # Фильтруем по hash адреса
         import hashlib
+        from bot.services.search_service import apartment_dict_to_listing
         listings = []
         for a in all_apartments:
             listing = apartment_dict_to_listing(a)
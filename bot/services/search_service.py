@@ -11,23 +11,20 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 """
 
 import logging
-import json
-import time
 from typing import List, Dict, Any, Optional, Tuple
 
 from scrapers.aggregator import ListingsAggregator
 from scrapers.base import Listing
 from database import (
     get_active_users,
-    is_ad_sent_to_user,
     is_duplicate_content,
 )
 from database_turso import get_user_filters_turso, has_valid_user_filters
-from database import is_ad_sent_to_user, mark_ad_sent_to_user
-from scrapers.utils.id_utils import normalize_ad_id, normalize_telegram_id
+from database import mark_ad_sent_to_user
 from error_logger import log_info, log_warning, log_error
 from config import DEFAULT_SOURCES, USE_TURSO_CACHE
 from bot.services.telegram_api import safe_send_message
+from utils.trace import trace_event, is_tracing
 
 logger = logging.getLogger(__name__)
 
@@ -269,26 +266,44 @@ async def _get_cached_listings(
     user_city: str,
     user_filters: Dict[str, Any],
 ) -> List[Listing]:
-    """Получает объявления из кэша Turso."""
+    """Получает объявления из кэша Turso.
+
+    Сначала пробует in-process снимок города (utils/listing_cache),
+    при промахе без покрытия - запрос к Turso по фильтрам.
+    """
     cached_listings: List[Listing] = []
 
     if not USE_TURSO_CACHE:
         return cached_listings
 
+    filter_args = dict(
+        min_rooms=user_filters.get("min_rooms", 1),
+        max_rooms=user_filters.get("max_rooms", 5),
+        min_price=user_filters.get("min_price", 0),
+        max_price=user_filters.get("max_price", 1000000),
+        limit=200,
+    )
+
+    try:
+        from utils.listing_cache import get_listings_by_filters
+
+        snapshot_listings = await get_listings_by_filters(city=user_city, **filter_args)
+        if snapshot_listings is not None:
+            log_info(
+                "search",
+                f"📦 Найдено {len(snapshot_listings)} объявлений в кэше (in-process) " f"для пользователя {user_id}",
+            )
+            return snapshot_listings
+    except Exception as e:
+        log_warning("search", f"Ошибка in-process кэша объявлений, идем в Turso: {e}")
+
     try:
         from database import (
             get_cached_listings_by_filters_turso,
             cached_listing_to_listing_turso,
         )
 
-        cached_data = await get_cached_listings_by_filters_turso(
-            city=user_city,
-            min_rooms=user_filters.get("min_rooms", 1),
-            max_rooms=user_filters.get("max_rooms", 5),
-            min_price=user_filters.get("min_price", 0),
-            max_price=user_filters.get("max_price", 1000000),
-            limit=200,
-        )
+        cached_data = await get_cached_listings_by_filters_turso(city=user_city, **filter_args)
 
         for cached_dict in cached_data:
             try:
@@ -313,6 +328,7 @@ async def _parse_and_cache_listings(
     user_city: str | dict,
     user_filters: Dict[str, Any],
     cached_listings: List[Listing],
+    user_id: Optional[int] = None,
 ) -> List[Listing]:
     """Парсит сайты и сохраняет объявления в кэш."""
     log_info(
@@ -320,13 +336,17 @@ async def _parse_and_cache_listings(
         f"🔍 В кэше мало объявлений ({len(cached_listings)}), парсим сайты...",
     )
 
-    # #region agent log
-    city_for_log = user_city if isinstance(user_city, str) else user_city.get("name", "unknown") if isinstance(user_city, dict) else str(user_city)
-    try:
-        with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-            f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"C","location":"search_service.py:292","message":"Starting aggregator fetch","data":{"city":city_for_log,"min_rooms":user_filters.get("min_rooms",1),"max_rooms":user_filters.get("max_rooms",5),"min_price":user_filters.get("min_price",0),"max_price":user_filters.get("max_price",1000000)},"timestamp":int(time.time()*1000)})+'\n')
-    except: pass
-    # #endregion
+    if is_tracing():
+        city_for_log = user_city if isinstance(user_city, str) else user_city.get("name", "unknown") if isinstance(user_city, dict) else str(user_city)
+        trace_event(
+            "aggregator.fetch_start",
+            always=True,
+            city=city_for_log,
+            min_rooms=user_filters.get("min_rooms", 1),
+            max_rooms=user_filters.get("max_rooms", 5),
+            min_price=user_filters.get("min_price", 0),
+            max_price=user_filters.get("max_price", 1000000),
+        )
     aggregator = ListingsAggregator(enabled_sources=DEFAULT_SOURCES)
     parsed_listings = await aggregator.fetch_all_listings(
         city=user_city,  # Может быть str или dict
@@ -336,12 +356,13 @@ async def _parse_and_cache_listings(
         max_price=user_filters.get("max_price", 1000000),
         user_id=user_id,  # Для логирования запросов к Kufar
     )
-    # #region agent log
-    try:
-        with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-            f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"C","location":"search_service.py:300","message":"Aggregator fetch completed","data":{"count":len(parsed_listings) if parsed_listings else 0,"is_none":parsed_listings is None,"type":str(type(parsed_listings))},"timestamp":int(time.time()*1000)})+'\n')
-    except: pass
-    # #endregion
+    trace_event(
+        "aggregator.fetch_done",
+        always=True,
+        count=len(parsed_listings) if parsed_listings else 0,
+        is_none=parsed_listings is None,
+        type=type(parsed_listings).__name__,
+    )
 
     # ДИАГНОСТИКА: проверяем результат парсинга
     if parsed_listings is None:
@@ -357,7 +378,7 @@ async def _parse_and_cache_listings(
     # Сохраняем все найденные объявления в кэш
     if USE_TURSO_CACHE and parsed_listings:
         try:
-
+            from database import cache_listings_batch_turso
             saved_count = await cache_listings_batch_turso(parsed_listings)
             log_info("search", f"💾 Сохранено {saved_count} объявлений в кэш")
         except Exception as e:
@@ -383,6 +404,7 @@ async def fetch_listings_for_user(user_id: int, user_filters: Dict[str, Any]) ->
         Список объявлений
     """
     import logging
+    from constants.constants import LOG_USER_SEARCH
     
     logger = logging.getLogger(__name__)
     
@@ -421,7 +443,7 @@ async def fetch_listings_for_user(user_id: int, user_filters: Dict[str, Any]) ->
 
     # Парсим сайты только если кэша нет или мало объявлений
     if len(cached_listings) < 10:
-        all_listings = await _parse_and_cache_listings(city_for_parser, user_filters, cached_listings)
+        all_listings = await _parse_and_cache_listings(city_for_parser, user_filters, cached_listings, user_id=user_id)
     else:
         log_info(
             "search",
@@ -460,26 +482,8 @@ async def _process_listing_for_user(
     if not matches_user_filters(listing, user_filters, user_id=user_id, log_details=True):
         return False
 
-    # Проверяем, не отправляли ли уже этому пользователю
-    # В DEBUG режиме игнорируем проверку sent_ads
-    debug_ignore_sent_ads = get_debug_ignore_sent_ads()
-    
-    # Логирование проверки sent_ads
-    ad_key = normalize_ad_id(listing.id)
-    tg = normalize_telegram_id(user_id)
-    already = False
-    try:
-        if not debug_ignore_sent_ads:
-            already = await is_ad_sent_to_user(telegram_id=tg, ad_external_id=ad_key)
-        else:
-            logger.info(f"[sent_check][DEBUG] ignore_sent_ads=True — пропускаю проверку sent_ads для user={tg} ad={ad_key}")
-    except Exception as e:
-        logger.exception(f"[sent_check][ERROR] user={tg} ad={ad_key} check failed: {e}")
-    logger.info(f"[sent_check] user={tg} ad={ad_key} already_sent={already}")
-    
-    if already:
-        logger.info(f"[search][skip] user={tg} skip ad={ad_key} reason=already_sent")
-        return False
+    # Уже отправленные отсеивает захват в send_listing_to_user (claim_ads_for_user),
+    # отдельная проверка sent_ads не нужна
 
     # Проверяем глобальную дедупликацию по контенту
     dup_check = await is_duplicate_content(
@@ -497,6 +501,7 @@ async def _process_listing_for_user(
         return False
 
     # Отправляем объявление пользователю БЕЗ ИИ-оценки (обычный режим)
+    from bot.services.notification_service import send_listing_to_user
     return await send_listing_to_user(bot, user_id, listing, use_ai_valuation=False)
 
 
@@ -531,89 +536,36 @@ async def _process_user_listings_normal_mode(
 
     user_new_count = 0
     filtered_count = 0
-    already_sent_count = 0
     duplicate_count = 0
+    not_sent_count = 0
     failed_send_count = 0
-    
-    import json
-    import time
 
-    # #region agent log
-    try:
-        with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-            f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"H1","location":"search_service.py:461","message":"Starting processing listings","data":{"user_id":user_id,"total_listings":len(all_listings),"listing_ids":[l.id for l in all_listings[:10]]},"timestamp":int(time.time()*1000)})+'\n')
-    except: pass
-    # #endregion
+    if is_tracing():
+        trace_event(
+            "user.listings_start",
+            always=True,
+            user_id=user_id,
+            total_listings=len(all_listings),
+            listing_ids=[l.id for l in all_listings[:10]],
+        )
 
-    for idx, listing in enumerate(all_listings):
-        # #region agent log
-        try:
-            with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"H1","location":"search_service.py:469","message":"Processing listing","data":{"user_id":user_id,"listing_id":listing.id,"index":idx,"total":len(all_listings),"price":listing.price,"rooms":listing.rooms},"timestamp":int(time.time()*1000)})+'\n')
-        except: pass
-        # #endregion
-        
+    for listing in all_listings:
         # Проверяем фильтры
-        # #region agent log
-        try:
-            with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"H2","location":"search_service.py:475","message":"Checking listing filters","data":{"user_id":user_id,"listing_price":listing.price,"listing_rooms":listing.rooms,"min_price":user_filters.get("min_price"),"max_price":user_filters.get("max_price"),"min_rooms":user_filters.get("min_rooms"),"max_rooms":user_filters.get("max_rooms")},"timestamp":int(time.time()*1000)})+'\n')
-        except: pass
-        # #endregion
-        
         if not matches_user_filters(listing, user_filters, user_id=user_id, log_details=False):
             filtered_count += 1
-            # #region agent log
-            try:
-                with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                    f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"H2","location":"search_service.py:482","message":"Listing filtered out by filters","data":{"user_id":user_id,"listing_id":listing.id,"filtered_count":filtered_count},"timestamp":int(time.time()*1000)})+'\n')
-            except: pass
-            # #endregion
+            trace_event(
+                "listing.filtered",
+                user_id=user_id,
+                listing_id=listing.id,
+                price=listing.price,
+                rooms=listing.rooms,
+            )
             continue
 
-        # Проверяем, не отправляли ли уже
-        # #region agent log
-        try:
-            with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"H3","location":"search_service.py:490","message":"Checking if already sent","data":{"user_id":user_id,"listing_id":listing.id},"timestamp":int(time.time()*1000)})+'\n')
-        except: pass
-        # #endregion
-        
-        # В DEBUG режиме игнорируем проверку sent_ads
-        debug_ignore_sent_ads = get_debug_ignore_sent_ads()
-        
-        # Логирование проверки sent_ads
-        ad_key = normalize_ad_id(listing.id)
-        tg = normalize_telegram_id(user_id)
-        already = False
-        try:
-            if not ignore_sent_ads and not debug_ignore_sent_ads:
-                already = await is_ad_sent_to_user(telegram_id=tg, ad_external_id=ad_key)
-            else:
-                logger.info(f"[sent_check][DEBUG] ignore_sent_ads={ignore_sent_ads} debug_ignore={debug_ignore_sent_ads} — пропускаю проверку sent_ads для user={tg} ad={ad_key}")
-        except Exception as e:
-            logger.exception(f"[sent_check][ERROR] user={tg} ad={ad_key} check failed: {e}")
-        logger.info(f"[sent_check] user={tg} ad={ad_key} already_sent={already}")
-        
-        if already:
-            already_sent_count += 1
-            logger.info(f"[search][skip] user={tg} skip ad={ad_key} reason=already_sent")
-            # #region agent log
-            try:
-                with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                    f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"H3","location":"search_service.py:494","message":"Listing already sent","data":{"user_id":user_id,"listing_id":listing.id,"already_sent_count":already_sent_count},"timestamp":int(time.time()*1000)})+'\n')
-            except: pass
-            # #endregion
-            continue
+        # Уже отправленные отсеивает захват в send_listing_to_user (claim_ads_for_user):
+        # отдельная проверка sent_ads - лишний запрос к БД на каждое объявление
 
         # Проверяем дубликаты
-        # #region agent log
-        try:
-            with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"H4","location":"search_service.py:500","message":"Checking duplicates","data":{"user_id":user_id,"listing_id":listing.id,"rooms":listing.rooms,"area":listing.area,"address":listing.address,"price":listing.price},"timestamp":int(time.time()*1000)})+'\n')
-        except: pass
-        # #endregion
-        
         dup_check = await is_duplicate_content(
             rooms=listing.rooms,
             area=listing.area,
@@ -623,34 +575,27 @@ async def _process_user_listings_normal_mode(
 
         if dup_check["is_duplicate"]:
             duplicate_count += 1
-            # #region agent log
-            try:
-                with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                    f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"H4","location":"search_service.py:512","message":"Listing is duplicate","data":{"user_id":user_id,"listing_id":listing.id,"duplicate_count":duplicate_count},"timestamp":int(time.time()*1000)})+'\n')
-            except: pass
-            # #endregion
+            trace_event(
+                "listing.duplicate",
+                user_id=user_id,
+                listing_id=listing.id,
+                rooms=listing.rooms,
+                area=listing.area,
+                address=listing.address,
+                price=listing.price,
+            )
             continue
 
         # Отправляем объявление
-        # ВАЖНО: фильтры, проверка "уже отправлено" и дубликаты уже проверены выше
+        # ВАЖНО: фильтры и дубликаты уже проверены выше, "уже отправлено" - при захвате
         try:
+            from bot.services.notification_service import send_listing_to_user
             
             # Отправляем объявление пользователю БЕЗ ИИ-оценки (обычный режим)
-            # #region agent log
-            try:
-                with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                    f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"H5","location":"search_service.py:540","message":"Attempting to send listing","data":{"user_id":user_id,"listing_id":listing.id,"current_sent":user_new_count},"timestamp":int(time.time()*1000)})+'\n')
-            except: pass
-            # #endregion
-            
-            send_result = await send_listing_to_user(bot, user_id, listing, use_ai_valuation=False)
-            
-            # #region agent log
-            try:
-                with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                    f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"H5","location":"search_service.py:545","message":"Send listing result","data":{"user_id":user_id,"listing_id":listing.id,"send_result":send_result},"timestamp":int(time.time()*1000)})+'\n')
-            except: pass
-            # #endregion
+            send_result = await send_listing_to_user(
+                bot, user_id, listing, use_ai_valuation=False, ignore_sent_ads=ignore_sent_ads
+            )
+            trace_event("listing.send", user_id=user_id, listing_id=listing.id, send_result=bool(send_result))
             
             if send_result:
                 user_new_count += 1
@@ -658,40 +603,35 @@ async def _process_user_listings_normal_mode(
                 # Задержка между сообщениями чтобы не получить бан
                 await asyncio.sleep(1)
             else:
-                failed_send_count += 1
-                log_warning("search", f"[user_{user_id}] ⚠️ Не удалось отправить объявление {listing.id}")
-                # #region agent log
-                try:
-                    with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                        f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"H5","location":"search_service.py:556","message":"Failed to send listing","data":{"user_id":user_id,"listing_id":listing.id,"failed_send_count":failed_send_count},"timestamp":int(time.time()*1000)})+'\n')
-                except: pass
-                # #endregion
+                # Уже отправлено (захват не получен) или ошибка отправки - причина в логе send_listing_to_user
+                not_sent_count += 1
+                log_info("search", f"[user_{user_id}] Объявление {listing.id} не отправлено (уже отправлено или ошибка)")
         except Exception as e:
             failed_send_count += 1
             log_error("search", f"[user_{user_id}] ❌ Ошибка отправки объявления {listing.id}", e)
-            # #region agent log
-            try:
-                with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                    f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"H6","location":"search_service.py:563","message":"Exception sending listing","data":{"user_id":user_id,"listing_id":listing.id,"error":str(e),"failed_send_count":failed_send_count},"timestamp":int(time.time()*1000)})+'\n')
-            except: pass
-            # #endregion
+            trace_event("listing.send_error", always=True, user_id=user_id, listing_id=listing.id, error=str(e))
             continue
 
     # ДИАГНОСТИКА: логируем статистику фильтрации
-    # #region agent log
-    try:
-        with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-            f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"H7","location":"search_service.py:575","message":"Final statistics","data":{"user_id":user_id,"total":len(all_listings),"filtered":filtered_count,"already_sent":already_sent_count,"duplicates":duplicate_count,"sent":user_new_count,"failed_send":failed_send_count},"timestamp":int(time.time()*1000)})+'\n')
-    except: pass
-    # #endregion
-    
+    trace_event(
+        "user.listings_done",
+        always=True,
+        user_id=user_id,
+        total=len(all_listings),
+        filtered=filtered_count,
+        duplicates=duplicate_count,
+        not_sent=not_sent_count,
+        sent=user_new_count,
+        failed_send=failed_send_count,
+    )
+
     log_info(
         "search",
         f"[user_{user_id}] 📊 Статистика обработки: "
         f"всего={len(all_listings)}, "
         f"отфильтровано={filtered_count}, "
-        f"уже отправлено={already_sent_count}, "
         f"дубликаты={duplicate_count}, "
+        f"не отправлено (уже отправлено или ошибка)={not_sent_count}, "
         f"ошибки отправки={failed_send_count}, "
         f"отправлено={user_new_count}",
     )
@@ -725,6 +665,8 @@ async def check_new_listings(
         ignore_sent_ads: Игнорировать проверку sent_ads
         bypass_summary: Обойти summary и отправлять полные уведомления
     """
+    from bot.services.ai_service import check_new_listings_ai_mode
+    from bot.handlers.debug import get_debug_ignore_sent_ads
     
     # Логирование debug run параметров
     debug_ignore_sent_ads = get_debug_ignore_sent_ads()
@@ -736,14 +678,6 @@ async def check_new_listings(
     log_info("search", "Проверка новых объявлений со всех источников...")
 
     # Получаем список активных пользователей
-    # #region agent log
-    import json
-    import time
-    try:
-        with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-            f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"A","location":"search_service.py:513","message":"check_new_listings: calling get_active_users","data":{},"timestamp":int(time.time()*1000)})+'\n')
-    except: pass
-    # #endregion
     active_users = await get_active_users()
     
     # Диагностический лог: 100% понимание, почему уведомления не идут
@@ -753,12 +687,7 @@ async def check_new_listings(
         active_users
     )
     
-    # #region agent log
-    try:
-        with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-            f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"A","location":"search_service.py:516","message":"check_new_listings: get_active_users result","data":{"count":len(active_users),"user_ids":active_users},"timestamp":int(time.time()*1000)})+'\n')
-    except: pass
-    # #endregion
+    trace_event("run.active_users", always=True, count=len(active_users), user_ids=active_users)
 
     # Лог-валидация: обязательно логируем количество найденных активных пользователей
     logger.info(
@@ -775,12 +704,6 @@ async def check_new_listings(
 
     # Для каждого пользователя проверяем объявления по его фильтрам
     for user_id in active_users:
-        # #region agent log
-        try:
-            with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"A","location":"search_service.py:524","message":"Processing user","data":{"user_id":user_id},"timestamp":int(time.time()*1000)})+'\n')
-        except: pass
-        # #endregion
         # ОДИН ИСТОЧНИК ФИЛЬТРОВ: только Turso, без fallback на SQLite
         user_filters = await get_user_filters_turso(user_id)
         
@@ -823,15 +746,17 @@ async def check_new_listings(
             f"[SEARCH_ENTRY] user={user_id} filters_valid={filters_valid}"
         )
         
-        # #region agent log
-        try:
-            with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"A","location":"search_service.py:526","message":"User filters retrieved","data":{"user_id":user_id,"has_filters":user_filters is not None,"is_active":user_filters.get("is_active") if user_filters else None},"timestamp":int(time.time()*1000)})+'\n')
-        except: pass
-        # #endregion
+        trace_event(
+            "user.filters",
+            always=True,
+            user_id=user_id,
+            filters_valid=filters_valid,
+            is_active=user_filters.get("is_active"),
+        )
         
         # ЕДИНАЯ ПРОВЕРКА ФИЛЬТРОВ: используем has_valid_user_filters
         # DEBUG RUN должен игнорировать проверку фильтров
+        from bot.handlers.debug import get_debug_force_run, get_debug_skip_filter_validation
         debug_force_run = get_debug_force_run()
         skip_filter_validation = get_debug_skip_filter_validation()
         
@@ -916,6 +841,7 @@ async def _send_setup_filters_message(bot: Any, telegram_id: int) -> None:
         telegram_id: ID пользователя в Telegram
     """
     try:
+        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
         
         keyboard = InlineKeyboardMarkup(inline_keyboard=[[
             InlineKeyboardButton(
@@ -12,6 +12,8 @@ import logging
 from typing import Optional, Any, List
 
 from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.types import Message, InputMediaPhoto
 from aiogram.enums import ParseMode
 from aiogram.exceptions import (
@@ -24,11 +26,25 @@ from aiogram.exceptions import (
     TelegramForbiddenError,
 )
 
+from config import BOT_TOKEN, TELEGRAM_API_URL
 from error_logger import log_error, log_warning, log_info
 
 logger = logging.getLogger(__name__)
 
 
+def make_bot(token: Optional[str] = None, **kwargs) -> Bot:
+    """
+    Создает Bot; при TELEGRAM_API_URL запросы идут на указанный сервер Bot API
+
+    Args:
+        token: Токен бота (по умолчанию BOT_TOKEN)
+        **kwargs: Остальные аргументы Bot (parse_mode и т.п.)
+    """
+    if TELEGRAM_API_URL:
+        kwargs.setdefault("session", AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)))
+    return Bot(token=token or BOT_TOKEN, **kwargs)
+
+
 async def safe_send_message(
     bot: Bot,
     chat_id: int,
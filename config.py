@@ -8,6 +8,9 @@ load_dotenv()
 
 # Telegram настройки
 BOT_TOKEN = os.getenv("BOT_TOKEN", "")
+# Адрес сервера Bot API (собственный telegram-bot-api или локальная замена
+# tools/fake_telegram_api.py); пусто - https://api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
 
 # Интервал проверки в минутах (30 минут по умолчанию)
 CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", "30"))
@@ -62,6 +65,120 @@ ENABLE_OSM_FALLBACK = os.getenv("ENABLE_OSM_FALLBACK", "false").lower() == "true
 KUFAR_USE_SLUG_FOR_SEARCH = os.getenv("KUFAR_USE_SLUG_FOR_SEARCH", "true").lower() == "true"
 KUFAR_SEARCH_RADIUS_METERS = int(os.getenv("KUFAR_SEARCH_RADIUS_METERS", "10000"))
 
+# In-process кэш объявлений города поверх cached_listings (utils/listing_cache.py)
+LISTING_CACHE_ENABLED = os.getenv("LISTING_CACHE_ENABLED", "true").lower() == "true"
+LISTING_CACHE_TTL_SECONDS = int(os.getenv("LISTING_CACHE_TTL_SECONDS", "300"))
+LISTING_CACHE_MAX_CITIES = int(os.getenv("LISTING_CACHE_MAX_CITIES", "32"))
+LISTING_CACHE_MAX_PER_CITY = int(os.getenv("LISTING_CACHE_MAX_PER_CITY", "5000"))
+
+# Очередь уведомлений о новых объявлениях (notification_outbox, bot/services/notification_outbox.py)
+# NOTIFY_OUTBOX_LEASE_SECONDS: на сколько воркер забирает партию; аренда продлевается,
+# пока идет доставка, и истекает, если процесс упал. Очередь хранится в Turso:
+# без USE_TURSO_CACHE она выключена
+NOTIFY_OUTBOX_ENABLED = USE_TURSO_CACHE and os.getenv("NOTIFY_OUTBOX_ENABLED", "true").lower() == "true"
+NOTIFY_OUTBOX_WORKERS = int(os.getenv("NOTIFY_OUTBOX_WORKERS", "2"))
+NOTIFY_OUTBOX_BATCH_SIZE = int(os.getenv("NOTIFY_OUTBOX_BATCH_SIZE", "50"))
+NOTIFY_OUTBOX_LEASE_SECONDS = int(os.getenv("NOTIFY_OUTBOX_LEASE_SECONDS", "120"))
+NOTIFY_OUTBOX_POLL_SECONDS = float(os.getenv("NOTIFY_OUTBOX_POLL_SECONDS", "10"))
+NOTIFY_OUTBOX_MAX_ATTEMPTS = int(os.getenv("NOTIFY_OUTBOX_MAX_ATTEMPTS", "5"))
+
+# Многопроцессный режим (bot/services/cluster.py): процесс-координатор сканирует
+# города, NOTIFY_WORKER_PROCESSES процессов рассылают уведомления, каждый своему
+# шарду telegram_id (utils/sharding.py). 0 - рассылка в основном процессе.
+NOTIFY_WORKER_PROCESSES = int(os.getenv("NOTIFY_WORKER_PROCESSES", "0"))
+NOTIFY_SHARDS = max(1, NOTIFY_WORKER_PROCESSES)
+
+# Захват объявления перед отправкой (sent_ads.state='pending'): через сколько секунд
+# захват, брошенный упавшим процессом, может перехватить другой. Захваты рассылки
+# из outbox перехватываются раньше - как только истекла аренда партии
+SENT_CLAIM_TTL_SECONDS = int(os.getenv("SENT_CLAIM_TTL_SECONDS", "600"))
+
+# Аренда плановых задач между репликами (utils/job_lease.py): задачи планировщика
+# выполняет только реплика, держащая аренду; без heartbeat аренда истекает через TTL
+JOB_LEASE_ENABLED = os.getenv("JOB_LEASE_ENABLED", "true").lower() == "true"
+JOB_LEASE_TTL_SECONDS = int(os.getenv("JOB_LEASE_TTL_SECONDS", "90"))
+
+# Разбор HTML в пуле процессов (utils/parse_pool.py): 0 - разбор в event loop.
+# Документы меньше HTML_PARSE_INLINE_MAX_BYTES всегда разбираются на месте
+HTML_PARSE_POOL_SIZE = int(os.getenv("HTML_PARSE_POOL_SIZE", "2"))
+HTML_PARSE_INLINE_MAX_BYTES = int(os.getenv("HTML_PARSE_INLINE_MAX_BYTES", "65536"))
+
+# Запись/воспроизведение HTTP-ответов парсеров (scrapers/http_cassette.py):
+# off - обычная работа, record - ответы пишутся в кассеты, replay - сеть не
+# используется, ответы берутся из кассет с заданной задержкой и долей ошибок
+HTTP_CASSETTE_MODE = os.getenv("HTTP_CASSETTE_MODE", "off").lower()
+HTTP_CASSETTE_DIR = os.getenv("HTTP_CASSETTE_DIR", "data/cassettes")
+HTTP_REPLAY_LATENCY_MS = float(os.getenv("HTTP_REPLAY_LATENCY_MS", "0"))
+HTTP_REPLAY_JITTER_MS = float(os.getenv("HTTP_REPLAY_JITTER_MS", "0"))
+HTTP_REPLAY_ERROR_RATE = float(os.getenv("HTTP_REPLAY_ERROR_RATE", "0"))
+
+# Кэш ИИ-оценок объявлений (utils/valuation_cache.py, таблица ai_valuations в Turso):
+# одна оценка на версию объявления (цена/площадь/описание, модель, версия промпта)
+# для всех пользователей; изменение цены или описания дает новую версию
+AI_VALUATION_CACHE_ENABLED = os.getenv("AI_VALUATION_CACHE_ENABLED", "true").lower() == "true"
+AI_VALUATION_CACHE_TTL_SECONDS = int(os.getenv("AI_VALUATION_CACHE_TTL_SECONDS", str(7 * 86400)))
+
+# Сколько объявлений оценивается одновременно при оценке новых объявлений в ИИ-режиме
+# (общая сессия оценщика; запросы к Groq все равно идут в бюджете GROQ_RPM/TPM_LIMIT)
+AI_VALUATION_CONCURRENCY = int(os.getenv("AI_VALUATION_CONCURRENCY", "4"))
+
+# Локальное сравнение новых объявлений с выбранными ИИ ранее (utils/similarity.py):
+# объявление, которое хуже самого похожего выбранного варианта больше чем на
+# AI_LOCAL_COMPARE_MARGIN (по локальной оценке выгодности), в LLM не отправляется.
+# Сравнение считается надежным при сходстве не ниже AI_LOCAL_COMPARE_MIN_SIMILARITY,
+# сходство от AI_LOCAL_COMPARE_DUPLICATE_SIMILARITY - повтор выбранного варианта
+AI_LOCAL_COMPARE_ENABLED = os.getenv("AI_LOCAL_COMPARE_ENABLED", "true").lower() == "true"
+AI_LOCAL_COMPARE_MARGIN = float(os.getenv("AI_LOCAL_COMPARE_MARGIN", "0.05"))
+AI_LOCAL_COMPARE_MIN_SIMILARITY = float(os.getenv("AI_LOCAL_COMPARE_MIN_SIMILARITY", "0.4"))
+AI_LOCAL_COMPARE_DUPLICATE_SIMILARITY = float(os.getenv("AI_LOCAL_COMPARE_DUPLICATE_SIMILARITY", "0.97"))
+
+# Кэш инспекций страниц объявлений для ИИ (utils/inspection_cache.py): страница
+# перепроверяется условным запросом после TTL или при изменении цены/площади/адреса
+AI_INSPECT_CACHE_TTL_SECONDS = int(os.getenv("AI_INSPECT_CACHE_TTL_SECONDS", str(6 * 3600)))
+AI_INSPECT_CACHE_MAX_ENTRIES = int(os.getenv("AI_INSPECT_CACHE_MAX_ENTRIES", "5000"))
+AI_INSPECT_PER_HOST_LIMIT = int(os.getenv("AI_INSPECT_PER_HOST_LIMIT", "4"))
+
+# Лимиты Groq для планировщика запросов к LLM (utils/llm_scheduler.py): запросы
+# уходят сразу, пока оценка токенов помещается в минутное окно (0 - без ограничения)
+GROQ_RPM_LIMIT = int(os.getenv("GROQ_RPM_LIMIT", "30"))
+GROQ_TPM_LIMIT = int(os.getenv("GROQ_TPM_LIMIT", "6000"))
+
+# Пре-ранжирование кандидатов ИИ-подбора (utils/prerank.py): доминируемые по цене
+# за м², году и площади отбрасываются, в LLM уходят только AI_PRERANK_TOP_K лучших
+# (0 - отправлять всех кандидатов, как раньше)
+AI_PRERANK_TOP_K = int(os.getenv("AI_PRERANK_TOP_K", "24"))
+
+# Бюджет токенов промпта одного запроса ИИ-подбора: батчи объявлений набираются
+# до этого размера (вместе с max_tokens ответа должен помещаться в лимит модели)
+AI_SELECT_PROMPT_TOKENS = int(os.getenv("AI_SELECT_PROMPT_TOKENS", "3000"))
+
+# Кэш результатов ИИ-подбора (utils/selection_cache.py): пользователи с теми же
+# кандидатами и фильтром получают готовый выбор, пересекающиеся - ранжируют
+# только новых кандидатов вместе с победителями прошлого турнира
+AI_SELECTION_CACHE_ENABLED = os.getenv("AI_SELECTION_CACHE_ENABLED", "true").lower() == "true"
+AI_SELECTION_CACHE_TTL_SECONDS = int(os.getenv("AI_SELECTION_CACHE_TTL_SECONDS", "3600"))
+AI_SELECTION_CACHE_MAX_ENTRIES = int(os.getenv("AI_SELECTION_CACHE_MAX_ENTRIES", "200"))
+
+# Потоковые ответы Groq (SSE, utils/llm_stream.py): выбранные ИИ варианты
+# показываются в статус-сообщении по мере генерации ответа; статус
+# редактируется не чаще раза в AI_PROGRESS_EDIT_INTERVAL_SECONDS
+AI_STREAM_ENABLED = os.getenv("AI_STREAM_ENABLED", "true").lower() == "true"
+AI_PROGRESS_EDIT_INTERVAL_SECONDS = float(os.getenv("AI_PROGRESS_EDIT_INTERVAL_SECONDS", "2.0"))
+
+# Трассировка прогонов поиска (включается на один прогон через /debug run trace)
+# {run_id} в пути заменяется идентификатором прогона
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "logs/trace_{run_id}.jsonl")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "2000"))
+
+# Логирование
+# LOG_ASYNC: запись логов в фоновом потоке (QueueHandler/QueueListener)
+# LOG_INFO_RATE_PER_SOURCE: сколько INFO/DEBUG сообщений в секунду пропускать
+# для одного источника (0 = без ограничения), LOG_INFO_BURST_PER_SOURCE - запас
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() == "true"
+LOG_INFO_RATE_PER_SOURCE = float(os.getenv("LOG_INFO_RATE_PER_SOURCE", "20"))
+LOG_INFO_BURST_PER_SOURCE = int(os.getenv("LOG_INFO_BURST_PER_SOURCE", "100"))
+
 # Администраторы бота (ID из Telegram)
 # Формат: ADMIN_TELEGRAM_IDS=714797710,123456789 (через запятую)
 # По умолчанию: 714797710
@@ -11,15 +11,19 @@
 """
 import aiosqlite
 import hashlib
+import json
 from config import DATABASE_PATH, USE_TURSO_CACHE
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from scrapers.utils.id_utils import normalize_ad_id, normalize_telegram_id
+from utils.similarity import listing_features
+from utils.trace import trace_event
 from database_turso import activate_user as activate_user_turso
 from database_turso import set_user_filters_turso
 from database_turso import get_active_users_turso
 from database_turso import is_ad_sent_to_user_turso
 from database_turso import mark_ad_sent_to_user_turso
+from database_turso import claim_ads_for_user_turso, complete_ad_claims_turso, release_ad_claims_turso
 from database_turso import ensure_tables_exist
 from database_turso import create_or_update_user
 from database_turso import get_user_filters_turso
@@ -142,6 +146,13 @@ async def init_database():
             CREATE INDEX IF NOT EXISTS idx_ai_selected ON ai_selected_listings(user_id, selected_at)
         """)
         
+        # Признаки выбранного варианта для локального сравнения с новыми (utils/similarity.py)
+        try:
+            await db.execute("ALTER TABLE ai_selected_listings ADD COLUMN features TEXT")
+            await db.commit()
+        except aiosqlite.OperationalError:
+            pass  # Колонка уже существует
+        
         # Таблица ИИ-оценок объявлений (для проверки, было ли уже оценено)
         await db.execute("""
             CREATE TABLE IF NOT EXISTS ai_valuations (
@@ -454,40 +465,13 @@ async def mark_listing_sent_to_user(user_id: int, listing_id: str):
 
 async def get_active_users() -> List[int]:
     """Возвращает список ID активных пользователей (с включенными фильтрами)"""
-    # #region agent log
-    import json
-    import time
-    try:
-        with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-            f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"A","location":"database.py:320","message":"get_active_users entry","data":{"DATABASE_PATH":DATABASE_PATH},"timestamp":int(time.time()*1000)})+'\n')
-    except: pass
-    # #endregion
-    
-    # Проверяем, используется ли Turso
-    # #region agent log
-    try:
-        with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-            f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"B","location":"database.py:325","message":"USE_TURSO_CACHE check","data":{"USE_TURSO_CACHE":USE_TURSO_CACHE},"timestamp":int(time.time()*1000)})+'\n')
-    except: pass
-    # #endregion
-    
     if USE_TURSO_CACHE:
         try:
             result = await get_active_users_turso()
-            # #region agent log
-            try:
-                with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                    f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"B","location":"database.py:332","message":"get_active_users_turso result","data":{"count":len(result),"user_ids":result},"timestamp":int(time.time()*1000)})+'\n')
-            except: pass
-            # #endregion
+            trace_event("db.active_users", always=True, backend="turso", count=len(result))
             return result
         except Exception as e:
-            # #region agent log
-            try:
-                with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                    f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"B","location":"database.py:337","message":"get_active_users_turso error","data":{"error":str(e)},"timestamp":int(time.time()*1000)})+'\n')
-            except: pass
-            # #endregion
+            trace_event("db.active_users_error", always=True, backend="turso", error=str(e))
             # Fallback to SQLite
             pass
     
@@ -500,12 +484,7 @@ async def get_active_users() -> List[int]:
         )
         rows = await cursor.fetchall()
         result = [row[0] for row in rows]  # user_id в SQLite = telegram_id
-        # #region agent log
-        try:
-            with open('/Users/vmakhakei/TG BOT/.cursor/debug.log', 'a') as f:
-                f.write(json.dumps({"sessionId":"debug-session","runId":"run1","hypothesisId":"A","location":"database.py:350","message":"get_active_users SQLite result","data":{"count":len(result),"user_ids":result},"timestamp":int(time.time()*1000)})+'\n')
-        except: pass
-        # #endregion
+        trace_event("db.active_users", always=True, backend="sqlite", count=len(result))
         return result
 
 
@@ -520,27 +499,33 @@ async def save_ai_selected_listings(user_id: int, selected_listings: List[Dict[s
             listing = item.get("listing")
             reason = item.get("reason", "")
             if listing:
+                features = json.dumps(listing_features(listing), ensure_ascii=False)
                 await db.execute("""
-                    INSERT OR REPLACE INTO ai_selected_listings (user_id, listing_id, reason, selected_at)
-                    VALUES (?, ?, ?, ?)
-                """, (user_id, listing.id, reason, datetime.now().isoformat()))
+                    INSERT OR REPLACE INTO ai_selected_listings (user_id, listing_id, reason, selected_at, features)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (user_id, listing.id, reason, datetime.now().isoformat(), features))
         
         await db.commit()
 
 
 async def get_ai_selected_listings(user_id: int) -> List[Dict[str, Any]]:
-    """Получает последние выбранные ИИ варианты для пользователя"""
+    """Получает последние выбранные ИИ варианты для пользователя (features - признаки или None)"""
     async with aiosqlite.connect(DATABASE_PATH) as db:
         db.row_factory = aiosqlite.Row
         cursor = await db.execute("""
-            SELECT listing_id, reason, selected_at 
+            SELECT listing_id, reason, selected_at, features 
             FROM ai_selected_listings 
             WHERE user_id = ? 
             ORDER BY selected_at DESC 
             LIMIT 10
         """, (user_id,))
         rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+        selected = []
+        for row in rows:
+            item = dict(row)
+            item["features"] = json.loads(item["features"]) if item["features"] else None
+            selected.append(item)
+        return selected
 
 
 async def is_listing_ai_valuated(user_id: int, listing_id: str) -> bool:
@@ -635,6 +620,78 @@ async def mark_ad_sent_to_user(telegram_id: int, ad_external_id: str):
         await db.commit()
 
 
+async def claim_ads_for_user(telegram_id: int, ad_external_ids: List[str], owner: str) -> List[str]:
+    """Захватывает объявления перед отправкой пользователю (вместо проверки is_ad_sent_to_user)
+    
+    Захваченные объявления после успешной отправки завершаются через
+    mark_ad_sent_to_user/complete_ad_claims, после неудачной - снимаются
+    через release_ad_claims.
+    
+    Args:
+        telegram_id: ID пользователя в Telegram
+        ad_external_ids: Внешние ID объявлений (listing.id)
+        owner: Владелец захвата (new_sent_claim_owner())
+    
+    Returns:
+        ID объявлений, которые нужно отправить (не отправлены и не захвачены другими)
+    """
+    tg = normalize_telegram_id(telegram_id)
+    ads = list(dict.fromkeys(normalize_ad_id(ad) for ad in ad_external_ids))
+    
+    if USE_TURSO_CACHE:
+        try:
+            return await claim_ads_for_user_turso(tg, ads, owner)
+        except ImportError:
+            pass  # Fallback to local DB
+    
+    # Локальная БД - один процесс: захват сразу записывается как отправка
+    claimed = []
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        for ad in ads:
+            cursor = await db.execute("""
+                INSERT OR IGNORE INTO sent_ads (user_id, ad_external_id, sent_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+            """, (str(tg), ad))
+            if cursor.rowcount == 1:
+                claimed.append(ad)
+        await db.commit()
+    return claimed
+
+
+async def complete_ad_claims(telegram_id: int, ad_external_ids: List[str], owner: str):
+    """Завершает захват объявлений после успешной отправки (одной транзакцией)"""
+    tg = normalize_telegram_id(telegram_id)
+    ads = [normalize_ad_id(ad) for ad in ad_external_ids]
+    
+    if USE_TURSO_CACHE:
+        try:
+            await complete_ad_claims_turso(tg, ads, owner)
+            return
+        except ImportError:
+            pass  # Fallback to local DB
+    # В локальной БД захват уже записан как отправка
+
+
+async def release_ad_claims(telegram_id: int, ad_external_ids: List[str], owner: str):
+    """Снимает захват объявлений после неудачной отправки"""
+    tg = normalize_telegram_id(telegram_id)
+    ads = [normalize_ad_id(ad) for ad in ad_external_ids]
+    
+    if USE_TURSO_CACHE:
+        try:
+            await release_ad_claims_turso(tg, ads, owner)
+            return
+        except ImportError:
+            pass  # Fallback to local DB
+    
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        await db.executemany(
+            "DELETE FROM sent_ads WHERE user_id = ? AND ad_external_id = ?",
+            [(str(tg), ad) for ad in ads],
+        )
+        await db.commit()
+
+
 async def get_listing_by_id(listing_id: str) -> Optional[Dict[str, Any]]:
     """Получает объявление из базы данных по ID"""
     async with aiosqlite.connect(DATABASE_PATH) as db:
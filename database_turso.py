@@ -10,9 +10,15 @@
 import json
 import logging
 import asyncio
-from typing import Optional, List, Dict, Any
+import contextvars
+import itertools
+import os
+import socket
+import time
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
 from contextlib import contextmanager
+from dataclasses import fields
 from scrapers.utils.id_utils import normalize_ad_id, normalize_telegram_id
 from constants.constants import LOG_FILTER_LOAD, LOG_FILTER_SAVE, LOG_FILTER_VERIFY
 
@@ -39,8 +45,8 @@ except ImportError as e:
     libsql = None
     LIBSQL_AVAILABLE = False
 
-from config import TURSO_DB_URL, TURSO_AUTH_TOKEN, USE_TURSO_CACHE
-from scrapers.base import Listing
+from config import TURSO_DB_URL, TURSO_AUTH_TOKEN, USE_TURSO_CACHE, SENT_CLAIM_TTL_SECONDS, NOTIFY_SHARDS
+from scrapers.base import Listing, row_details_loader
 
 
 class TursoTransaction:
@@ -204,34 +210,9 @@ async def get_cached_listings_by_filters(
         
         listings = []
         for row in rows:
-            try:
-                # Правильная конвертация Row в словарь
-                if hasattr(row, '_asdict'):
-                    # Если это Row объект с методом _asdict
-                    listing_dict = row._asdict()
-                elif isinstance(row, dict):
-                    # Если уже словарь
-                    listing_dict = row
-                else:
-                    # Если это кортеж или список - используем zip с колонками
-                    listing_dict = dict(zip(columns, row))
-            except Exception as e:
-                log_error("turso_cache", f"Ошибка конвертации строки в словарь: {e}, row={row}, columns={columns}")
-                continue
-            # Конвертируем photos из JSON строки в список
-            if listing_dict.get("photos"):
-                try:
-                    listing_dict["photos"] = json.loads(listing_dict["photos"]) if isinstance(listing_dict["photos"], str) else listing_dict["photos"]
-                except:
-                    listing_dict["photos"] = []
-            else:
-                listing_dict["photos"] = []
-            
-            # Конвертируем is_company из INTEGER в bool
-            if "is_company" in listing_dict:
-                listing_dict["is_company"] = bool(listing_dict["is_company"]) if listing_dict["is_company"] is not None else None
-            
-            listings.append(listing_dict)
+            listing_dict = _cached_row_to_dict(row, columns)
+            if listing_dict is not None:
+                listings.append(listing_dict)
         
         logger.info(f"Найдено {len(listings)} объявлений в кэше для города {city}")
         return listings
@@ -244,6 +225,99 @@ async def get_cached_listings_by_filters(
             conn.close()
 
 
+def _cached_row_to_dict(row, columns: List[str], decode_photos: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Конвертирует строку cached_listings в словарь (photos -> list, is_company -> bool)
+    
+    decode_photos=False оставляет photos JSON строкой (декодируется лениво в Listing)
+    """
+    try:
+        # Правильная конвертация Row в словарь
+        if hasattr(row, '_asdict'):
+            # Если это Row объект с методом _asdict
+            listing_dict = row._asdict()
+        elif isinstance(row, dict):
+            # Если уже словарь
+            listing_dict = row
+        else:
+            # Если это кортеж или список - используем zip с колонками
+            listing_dict = dict(zip(columns, row))
+    except Exception as e:
+        log_error("turso_cache", f"Ошибка конвертации строки в словарь: {e}, row={row}, columns={columns}")
+        return None
+    # Конвертируем photos из JSON строки в список
+    if not decode_photos:
+        pass
+    elif listing_dict.get("photos"):
+        try:
+            listing_dict["photos"] = json.loads(listing_dict["photos"]) if isinstance(listing_dict["photos"], str) else listing_dict["photos"]
+        except:
+            listing_dict["photos"] = []
+    else:
+        listing_dict["photos"] = []
+    
+    # Конвертируем is_company из INTEGER в bool
+    if "is_company" in listing_dict:
+        listing_dict["is_company"] = bool(listing_dict["is_company"]) if listing_dict["is_company"] is not None else None
+    
+    return listing_dict
+
+
+async def get_cached_listings_by_city(
+    city: str,
+    status: str = "active",
+    limit: int = 5000
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Получает все объявления города из кэша (для in-process снимка utils/listing_cache)
+    
+    Returns:
+        Список объявлений (новые сверху) или None при ошибке / без соединения
+    """
+    conn = get_turso_connection()
+    if not conn:
+        return None
+    
+    try:
+        def _execute_with_columns():
+            cursor = conn.execute("""
+                SELECT * FROM cached_listings
+                WHERE city = ? AND status = ?
+                ORDER BY updated_at DESC
+                LIMIT ?
+            """, (city, status, limit))
+            rows = cursor.fetchall()
+            columns = [desc[0] for desc in cursor.description]
+            return rows, columns
+        
+        rows, columns = await asyncio.to_thread(_execute_with_columns)
+        
+        listings = []
+        for row in rows:
+            listing_dict = _cached_row_to_dict(row, columns, decode_photos=False)
+            if listing_dict is not None:
+                listings.append(listing_dict)
+        
+        logger.info(f"Загружено {len(listings)} объявлений города {city} в in-process кэш")
+        return listings
+        
+    except Exception as e:
+        logger.error(f"Ошибка загрузки объявлений города {city} из кэша: {e}")
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+
+def _apply_to_listing_cache(listings: List[Listing]) -> None:
+    """Обновляет in-process снимки городов после записи в cached_listings"""
+    try:
+        from utils.listing_cache import listing_cache
+        listing_cache.apply_saved(listings, lambda listing: _extract_city_from_address(listing.address))
+    except Exception as e:
+        log_warning("turso_cache", f"Не удалось обновить in-process кэш объявлений: {e}")
+
+
 async def cache_listing(listing: Listing) -> bool:
     """
     Сохраняет объявление в кэш (атомарная операция с транзакцией)
@@ -306,6 +380,7 @@ async def cache_listing(listing: Listing) -> bool:
                 # Commit происходит автоматически при выходе из контекста
         
         await asyncio.to_thread(_execute)
+        _apply_to_listing_cache([listing])
         return True
         
     except Exception as e:
@@ -387,6 +462,7 @@ async def cache_listings_batch(listings: List[Listing]) -> int:
                 return saved_count
         
         saved_count = await asyncio.to_thread(_execute_batch)
+        _apply_to_listing_cache(listings)
         log_info("turso_cache", f"Сохранено {saved_count} из {len(listings)} объявлений в кэш (атомарно)")
         return saved_count
         
@@ -408,6 +484,11 @@ async def mark_listing_deleted(listing_id: str) -> bool:
                 # Commit происходит автоматически
         
         await asyncio.to_thread(_execute)
+        try:
+            from utils.listing_cache import listing_cache
+            listing_cache.remove(listing_id)
+        except Exception as e:
+            log_warning("turso_cache", f"Не удалось обновить in-process кэш объявлений: {e}")
         return True
         
     except Exception as e:
@@ -458,6 +539,7 @@ async def update_cached_listing(listing: Listing) -> bool:
                 # Commit происходит автоматически
         
         await asyncio.to_thread(_execute)
+        _apply_to_listing_cache([listing])
         return True
         
     except Exception as e:
@@ -678,6 +760,7 @@ def migrate_sent_ads_schema(conn):
     """
     Миграция таблицы sent_ads:
     user_id (TEXT) -> telegram_id (INTEGER)
+    + колонки захвата (state, claimed_by, claimed_at)
     
     Args:
         conn: Соединение с базой данных (синхронное)
@@ -685,7 +768,13 @@ def migrate_sent_ads_schema(conn):
     try:
         cols = {r[1] for r in conn.execute("PRAGMA table_info(sent_ads)").fetchall()}
         if "telegram_id" in cols and "user_id" not in cols:
-            return  # уже новая схема
+            # уже новая схема, добавляем колонки захвата если их нет
+            if "state" not in cols:
+                conn.execute("ALTER TABLE sent_ads ADD COLUMN state TEXT NOT NULL DEFAULT 'sent'")
+                conn.execute("ALTER TABLE sent_ads ADD COLUMN claimed_by TEXT")
+                conn.execute("ALTER TABLE sent_ads ADD COLUMN claimed_at REAL")
+                logger.info("[migration] В sent_ads добавлены колонки state/claimed_by/claimed_at")
+            return
         
         logger.warning("[migration] Начинаю миграцию sent_ads → новая схема")
         
@@ -700,6 +789,9 @@ def migrate_sent_ads_schema(conn):
             telegram_id INTEGER NOT NULL,
             ad_external_id TEXT NOT NULL,
             sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            state TEXT NOT NULL DEFAULT 'sent',
+            claimed_by TEXT,
+            claimed_at REAL,
             UNIQUE(telegram_id, ad_external_id)
         )
         """)
@@ -750,6 +842,58 @@ def migrate_sent_ads_schema(conn):
         raise
 
 
+def _create_notification_outbox(conn):
+    """Создает notification_outbox: по строке на объявление и шард воркеров уведомлений"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ad_id TEXT NOT NULL,
+            shard INTEGER NOT NULL DEFAULT 0,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_until REAL,
+            enqueued_at REAL NOT NULL,
+            delivered_at REAL,
+            last_error TEXT,
+            UNIQUE(ad_id, shard)
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_outbox_shard_status_lease
+        ON notification_outbox(shard, status, lease_until)
+    """)
+
+
+def migrate_notification_outbox_schema(conn):
+    """
+    Миграция notification_outbox: UNIQUE(ad_id) -> колонка shard и UNIQUE(ad_id, shard)
+    
+    Args:
+        conn: Соединение с базой данных (синхронное)
+    """
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(notification_outbox)").fetchall()}
+    if "shard" in cols:
+        return
+    
+    logger.warning("[migration] Начинаю миграцию notification_outbox → шарды")
+    conn.execute("ALTER TABLE notification_outbox RENAME TO notification_outbox_old")
+    conn.execute("DROP INDEX IF EXISTS idx_outbox_status_lease")
+    _create_notification_outbox(conn)
+    conn.execute("""
+        INSERT INTO notification_outbox (
+            ad_id, shard, payload, status, attempts, lease_owner, lease_until,
+            enqueued_at, delivered_at, last_error
+        )
+        SELECT ad_id, 0, payload, status, attempts, lease_owner, lease_until,
+               enqueued_at, delivered_at, last_error
+        FROM notification_outbox_old
+    """)
+    conn.execute("DROP TABLE notification_outbox_old")
+    logger.warning("[migration] Миграция notification_outbox завершена успешно")
+
+
 def migrate_user_filters_schema(conn):
     """
     Миграция user_filters:
@@ -1267,6 +1411,9 @@ async def ensure_tables_exist():
                             telegram_id INTEGER NOT NULL,
                             ad_external_id TEXT NOT NULL,
                             sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            state TEXT NOT NULL DEFAULT 'sent',
+                            claimed_by TEXT,
+                            claimed_at REAL,
                             UNIQUE(telegram_id, ad_external_id)
                         )
                     """)
@@ -1294,7 +1441,63 @@ async def ensure_tables_exist():
                         )
                     """)
                     logger.info("✅ Таблица short_links создана")
-                
+
+                # 8. Таблица notification_outbox (очередь уведомлений о новых объявлениях)
+                cursor = conn.execute("""
+                    SELECT name FROM sqlite_master
+                    WHERE type='table' AND name='notification_outbox'
+                """)
+                if not cursor.fetchone():
+                    logger.info("📋 Создание таблицы notification_outbox...")
+                    _create_notification_outbox(conn)
+                    logger.info("✅ Таблица notification_outbox создана")
+                else:
+                    migrate_notification_outbox_schema(conn)
+
+                # 9. Таблица job_leases (аренда плановых задач между репликами)
+                cursor = conn.execute("""
+                    SELECT name FROM sqlite_master
+                    WHERE type='table' AND name='job_leases'
+                """)
+                if not cursor.fetchone():
+                    logger.info("📋 Создание таблицы job_leases...")
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS job_leases (
+                            name TEXT PRIMARY KEY,
+                            owner TEXT NOT NULL,
+                            acquired_at REAL NOT NULL,
+                            heartbeat_at REAL NOT NULL,
+                            expires_at REAL NOT NULL
+                        )
+                    """)
+                    logger.info("✅ Таблица job_leases создана")
+
+                # 10. Таблица ai_valuations (ИИ-оценки объявлений, общие для всех пользователей)
+                cursor = conn.execute("""
+                    SELECT name FROM sqlite_master
+                    WHERE type='table' AND name='ai_valuations'
+                """)
+                if not cursor.fetchone():
+                    logger.info("📋 Создание таблицы ai_valuations...")
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS ai_valuations (
+                            listing_id TEXT PRIMARY KEY,
+                            content_hash TEXT NOT NULL,
+                            model TEXT NOT NULL,
+                            prompt_version TEXT NOT NULL,
+                            result TEXT NOT NULL,
+                            tokens INTEGER DEFAULT 0,
+                            hits INTEGER DEFAULT 0,
+                            created_at REAL NOT NULL,
+                            expires_at REAL NOT NULL
+                        )
+                    """)
+                    conn.execute("""
+                        CREATE INDEX IF NOT EXISTS idx_ai_valuations_expires
+                        ON ai_valuations(expires_at)
+                    """)
+                    logger.info("✅ Таблица ai_valuations создана")
+
                 # Проверяем, что все миграции прошли успешно (fail-fast)
                 assert_no_legacy_user_id_columns(conn)
                 
@@ -1464,7 +1667,7 @@ def cached_listing_to_listing(cached_dict: Dict[str, Any]) -> Listing:
     else:
         price_formatted = f"{price:,} BYN".replace(",", " ")
     
-    return Listing(
+    listing = Listing(
         id=cached_dict.get("id", ""),
         source=cached_dict.get("source", "unknown"),
         title=cached_dict.get("title", ""),
@@ -1474,14 +1677,17 @@ def cached_listing_to_listing(cached_dict: Dict[str, Any]) -> Listing:
         area=cached_dict.get("area", 0.0),
         address=cached_dict.get("address", ""),
         url=cached_dict.get("url", ""),
-        photos=cached_dict.get("photos", []),
         floor=cached_dict.get("floor", ""),
-        description=cached_dict.get("description", ""),
         currency=currency,
         price_usd=cached_dict.get("price_usd", 0),
         year_built=cached_dict.get("year_built", ""),
         is_company=cached_dict.get("is_company"),
     )
+    # description/photos нужны только для отправки и ИИ - раскрываем при обращении
+    listing.set_details_loader(
+        row_details_loader(cached_dict.get("description", ""), cached_dict.get("photos", []))
+    )
+    return listing
 
 
 def _extract_city_from_address(address: str) -> str:
@@ -2194,10 +2400,13 @@ def _listing_to_ad_data(listing: Listing) -> dict:
     }
 
 
-async def sync_apartments_batch(listings: List[Listing]) -> List[str]:
+async def sync_apartments_batch(listings: List[Listing], enqueue_notifications: bool = True) -> List[str]:
     """
     Сохраняет список объявлений.
     Возвращает список ad_id, которые были реально вставлены.
+
+    Реально вставленные объявления в той же транзакции ставятся в
+    notification_outbox (enqueue_notifications=False - без очереди).
     """
     if not listings:
         logger.info("[DB][BATCH] пустой список, сохранять нечего")
@@ -2205,6 +2414,7 @@ async def sync_apartments_batch(listings: List[Listing]) -> List[str]:
 
     def _execute():
         inserted_ids = []
+        enqueued_at = time.time()
         with turso_transaction() as conn:
             for listing in listings:
                 try:
@@ -2215,6 +2425,9 @@ async def sync_apartments_batch(listings: List[Listing]) -> List[str]:
                     address = listing.address or ""
                     price_usd = listing.price_usd if listing.price_usd is not None else None
                     url = listing.url
+                    # Payload готовим до INSERT, чтобы ошибка сериализации не оставила
+                    # вставленное объявление без записи в outbox
+                    payload = listing_to_outbox_payload(listing) if enqueue_notifications else None
 
                     # --- Batch INSERT ---
                     cur = conn.execute(
@@ -2236,6 +2449,8 @@ async def sync_apartments_batch(listings: List[Listing]) -> List[str]:
 
                     if cur.rowcount == 1:
                         inserted_ids.append(ad_id)
+                        if payload is not None:
+                            _enqueue_outbox(conn, ad_id, payload, enqueued_at)
 
                 except Exception as e:
                     ad_id_str = str(listing.id) if listing else "unknown"
@@ -2764,10 +2979,15 @@ async def is_ad_sent_to_user_turso(telegram_id: int, ad_external_id: str) -> boo
                     logger.warning(f"[sent_check][STALE] ad={ad} not found in apartments; treating as NOT sent for user={tg}")
                     return False
                 
-                # 2) Затем проверить sent_ads
+                # 2) Затем проверить sent_ads (свежий захват другим воркером тоже считается отправкой)
                 cursor = conn.execute(
-                    "SELECT 1 FROM sent_ads WHERE telegram_id = ? AND ad_external_id = ? LIMIT 1",
-                    (tg, ad)
+                    """
+                    SELECT 1 FROM sent_ads
+                    WHERE telegram_id = ? AND ad_external_id = ?
+                      AND (state = 'sent' OR claimed_at >= ?)
+                    LIMIT 1
+                    """,
+                    (tg, ad, time.time() - SENT_CLAIM_TTL_SECONDS)
                 )
                 return cursor.fetchone() is not None
         
@@ -2784,6 +3004,8 @@ async def mark_ad_sent_to_user_turso(telegram_id: int, ad_external_id: str) -> b
     """
     Отмечает объявление как отправленное пользователю (идемпотентная запись для Turso)
     
+    Захват (state='pending') этого объявления переводится в state='sent'.
+    
     Args:
         telegram_id: ID пользователя в Telegram
         ad_external_id: Внешний ID объявления (listing.id)
@@ -2798,10 +3020,7 @@ async def mark_ad_sent_to_user_turso(telegram_id: int, ad_external_id: str) -> b
     try:
         def _execute():
             with turso_transaction() as conn:
-                conn.execute("""
-                    INSERT OR IGNORE INTO sent_ads (telegram_id, ad_external_id, sent_at)
-                    VALUES (?, ?, CURRENT_TIMESTAMP)
-                """, (tg, ad))
+                conn.execute(_MARK_SENT_SQL, (tg, ad))
                 # Commit происходит автоматически при выходе из контекста
         
         await asyncio.to_thread(_execute)
@@ -2811,6 +3030,121 @@ async def mark_ad_sent_to_user_turso(telegram_id: int, ad_external_id: str) -> b
         return False
 
 
+# Отметка отправки: новая запись или завершение захвата (pending -> sent)
+_MARK_SENT_SQL = """
+    INSERT INTO sent_ads (telegram_id, ad_external_id, sent_at, state)
+    VALUES (?, ?, CURRENT_TIMESTAMP, 'sent')
+    ON CONFLICT(telegram_id, ad_external_id) DO UPDATE
+    SET state = 'sent', sent_at = CURRENT_TIMESTAMP, claimed_by = NULL, claimed_at = NULL
+    WHERE sent_ads.state = 'pending'
+"""
+
+_claim_counter = itertools.count(1)
+
+# Владелец аренды notification_outbox, в рамках которой идет рассылка (задает воркер
+# outbox). Захваты sent_ads такой рассылки живут, пока жива аренда: если воркер упал,
+# партию забирает другой воркер, и ему не нужно ждать SENT_CLAIM_TTL_SECONDS
+current_outbox_lease: contextvars.ContextVar = contextvars.ContextVar("current_outbox_lease", default=None)
+
+# Разделитель владельца захвата и владельца аренды outbox в sent_ads.claimed_by
+_LEASE_SEPARATOR = "@"
+
+
+def new_sent_claim_owner() -> str:
+    """Уникальный владелец захвата sent_ads (процесс + номер рассылки [@ аренда outbox])"""
+    owner = f"{socket.gethostname()}:{os.getpid()}:{next(_claim_counter)}"
+    lease = current_outbox_lease.get()
+    return f"{owner}{_LEASE_SEPARATOR}{lease}" if lease else owner
+
+
+async def claim_ads_for_user_turso(telegram_id: int, ad_external_ids: List[str], owner: str) -> List[str]:
+    """
+    Захватывает объявления для отправки пользователю (state='pending').
+    
+    INSERT ... ON CONFLICT ... RETURNING: строка возвращается только если
+    объявление еще не отправлялось и не захвачено другим воркером, поэтому
+    два процесса не отправят одно и то же объявление. Захват, брошенный
+    упавшим процессом, перехватывается через SENT_CLAIM_TTL_SECONDS, а
+    захват рассылки из outbox - сразу, как только аренда ее партии истекла
+    или перешла другому воркеру.
+    
+    Args:
+        telegram_id: ID пользователя в Telegram
+        ad_external_ids: Нормализованные ID объявлений
+        owner: Владелец захвата (new_sent_claim_owner())
+    
+    Returns:
+        ID объявлений, которые захвачены этим владельцем и должны быть отправлены
+    """
+    if not ad_external_ids:
+        return []
+    
+    def _execute():
+        now = time.time()
+        claimed = []
+        with turso_transaction() as conn:
+            for ad in ad_external_ids:
+                cursor = conn.execute("""
+                    INSERT INTO sent_ads (telegram_id, ad_external_id, sent_at, state, claimed_by, claimed_at)
+                    VALUES (?, ?, CURRENT_TIMESTAMP, 'pending', ?, ?)
+                    ON CONFLICT(telegram_id, ad_external_id) DO UPDATE
+                    SET claimed_by = excluded.claimed_by, claimed_at = excluded.claimed_at
+                    WHERE sent_ads.state = 'pending' AND (
+                        sent_ads.claimed_at < ?
+                        OR (instr(sent_ads.claimed_by, ?) > 0 AND NOT EXISTS (
+                            SELECT 1 FROM notification_outbox
+                            WHERE lease_owner = substr(sent_ads.claimed_by, instr(sent_ads.claimed_by, ?) + 1)
+                              AND status = 'leased' AND lease_until >= ?
+                        ))
+                    )
+                    RETURNING ad_external_id
+                """, (
+                    telegram_id, ad, owner, now,
+                    now - SENT_CLAIM_TTL_SECONDS, _LEASE_SEPARATOR, _LEASE_SEPARATOR, now,
+                ))
+                # fetchall дочитывает RETURNING, иначе commit не пройдет
+                if cursor.fetchall():
+                    claimed.append(ad)
+        return claimed
+    
+    return await asyncio.to_thread(_execute)
+
+
+async def complete_ad_claims_turso(telegram_id: int, ad_external_ids: List[str], owner: str) -> int:
+    """Завершает захват после успешной отправки (pending -> sent). Возвращает число строк"""
+    if not ad_external_ids:
+        return 0
+    
+    def _execute():
+        with turso_transaction() as conn:
+            cursor = conn.execute(f"""
+                UPDATE sent_ads
+                SET state = 'sent', sent_at = CURRENT_TIMESTAMP, claimed_by = NULL, claimed_at = NULL
+                WHERE telegram_id = ? AND ad_external_id IN ({_ids_placeholders(ad_external_ids)})
+                  AND state = 'pending' AND claimed_by = ?
+            """, (telegram_id, *ad_external_ids, owner))
+            return cursor.rowcount
+    
+    return await asyncio.to_thread(_execute)
+
+
+async def release_ad_claims_turso(telegram_id: int, ad_external_ids: List[str], owner: str) -> int:
+    """Снимает захват после неудачной отправки, объявление можно отправить снова"""
+    if not ad_external_ids:
+        return 0
+    
+    def _execute():
+        with turso_transaction() as conn:
+            cursor = conn.execute(f"""
+                DELETE FROM sent_ads
+                WHERE telegram_id = ? AND ad_external_id IN ({_ids_placeholders(ad_external_ids)})
+                  AND state = 'pending' AND claimed_by = ?
+            """, (telegram_id, *ad_external_ids, owner))
+            return cursor.rowcount
+    
+    return await asyncio.to_thread(_execute)
+
+
 async def delete_sent_ads_for_user(telegram_id: int) -> int:
     """
     Безопасно удаляет все записи sent_ads для указанного пользователя.
@@ -2842,6 +3176,415 @@ async def delete_sent_ads_for_user(telegram_id: int) -> int:
         return -1
 
 
+# ========== OUTBOX УВЕДОМЛЕНИЙ ==========
+
+def listing_to_outbox_payload(listing: Listing) -> str:
+    """Сериализует Listing для notification_outbox (полный набор полей для отправки)"""
+    return json.dumps(listing.to_dict(), ensure_ascii=False, default=str)
+
+
+def listing_from_outbox_payload(payload: str) -> Listing:
+    """Восстанавливает Listing из payload записи notification_outbox"""
+    data = json.loads(payload)
+    init_fields = {f.name for f in fields(Listing) if f.init}
+    return Listing(**{k: v for k, v in data.items() if k in init_fields})
+
+
+def _enqueue_outbox(conn, ad_id: str, payload: str, enqueued_at: float) -> None:
+    """
+    Ставит объявление в notification_outbox (вызывается внутри транзакции вставки)
+    
+    По строке на каждый шард воркеров уведомлений: воркер шарда рассылает
+    объявление только своим пользователям (utils/sharding.py).
+    """
+    for shard in range(NOTIFY_SHARDS):
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO notification_outbox (ad_id, shard, payload, status, enqueued_at)
+            VALUES (?, ?, ?, 'pending', ?)
+            """,
+            (ad_id, shard, payload, enqueued_at),
+        )
+
+
+def _ids_placeholders(ids: List[Any]) -> str:
+    return ",".join("?" for _ in ids)
+
+
+async def claim_outbox_batch(owner: str, limit: int, lease_seconds: float, shard: int = 0) -> List[Dict[str, Any]]:
+    """
+    Забирает до limit записей шарда shard в аренду (lease) для owner.
+
+    Берутся записи в статусе pending и записи с истекшей арендой (воркер упал
+    или завис). Выборка и захват - один UPDATE ... RETURNING, поэтому два
+    воркера не получат одну и ту же запись.
+
+    Returns:
+        Список словарей {id, ad_id, payload, enqueued_at, attempts}
+    """
+    def _execute():
+        now = time.time()
+        with turso_transaction() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE notification_outbox
+                SET status = 'leased', lease_owner = ?, lease_until = ?, attempts = attempts + 1
+                WHERE id IN (
+                    SELECT id FROM notification_outbox
+                    WHERE shard = ? AND (status = 'pending' OR (status = 'leased' AND lease_until < ?))
+                    ORDER BY id
+                    LIMIT ?
+                )
+                RETURNING id, ad_id, payload, enqueued_at, attempts
+                """,
+                (owner, now + lease_seconds, shard, now, limit),
+            )
+            rows = cursor.fetchall()
+        rows.sort(key=lambda row: row[0])
+        return [
+            {"id": row[0], "ad_id": row[1], "payload": row[2], "enqueued_at": row[3], "attempts": row[4]}
+            for row in rows
+        ]
+
+    try:
+        return await asyncio.to_thread(_execute)
+    except Exception as e:
+        log_error("outbox", f"Ошибка захвата записей outbox ({owner})", e)
+        return []
+
+
+async def renew_outbox_lease(outbox_ids: List[int], owner: str, lease_seconds: float) -> int:
+    """Продлевает аренду записей, которыми владеет owner. Возвращает число продленных"""
+    if not outbox_ids:
+        return 0
+
+    def _execute():
+        with turso_transaction() as conn:
+            cursor = conn.execute(
+                f"""
+                UPDATE notification_outbox SET lease_until = ?
+                WHERE id IN ({_ids_placeholders(outbox_ids)}) AND lease_owner = ? AND status = 'leased'
+                """,
+                (time.time() + lease_seconds, *outbox_ids, owner),
+            )
+            return cursor.rowcount
+
+    try:
+        return await asyncio.to_thread(_execute)
+    except Exception as e:
+        log_error("outbox", f"Ошибка продления аренды outbox ({owner})", e)
+        return 0
+
+
+async def complete_outbox_batch(
+    outbox_ids: List[int],
+    owner: str,
+    deliveries: Dict[int, List[str]],
+) -> int:
+    """
+    Отмечает партию доставленной: записи sent_ads и статус done - одной транзакцией.
+
+    sent_ads пишутся для всех фактически отправленных объявлений, даже если
+    аренда части записей уже перехвачена другим воркером: повторная доставка
+    тогда отсеется проверкой sent_ads.
+
+    Args:
+        outbox_ids: ID записей outbox, которые обработал воркер
+        owner: Владелец аренды
+        deliveries: telegram_id -> список ad_id, отправленных пользователю
+
+    Returns:
+        Количество записей outbox, переведенных в done (0 при ошибке)
+    """
+    if not outbox_ids:
+        return 0
+
+    sent_rows = [
+        (normalize_telegram_id(telegram_id), normalize_ad_id(ad_id))
+        for telegram_id, ad_ids in deliveries.items()
+        for ad_id in ad_ids
+    ]
+
+    def _execute():
+        with turso_transaction() as conn:
+            for tg, ad in sent_rows:
+                conn.execute(_MARK_SENT_SQL, (tg, ad))
+            cursor = conn.execute(
+                f"""
+                UPDATE notification_outbox
+                SET status = 'done', delivered_at = ?, lease_owner = NULL, lease_until = NULL, last_error = NULL
+                WHERE id IN ({_ids_placeholders(outbox_ids)}) AND lease_owner = ? AND status = 'leased'
+                """,
+                (time.time(), *outbox_ids, owner),
+            )
+            return cursor.rowcount
+
+    try:
+        done = await asyncio.to_thread(_execute)
+        if done < len(outbox_ids):
+            log_warning("outbox", f"Аренда {len(outbox_ids) - done} записей outbox потеряна ({owner})")
+        return done
+    except Exception as e:
+        log_error("outbox", f"Ошибка завершения партии outbox ({owner})", e)
+        return 0
+
+
+async def release_outbox_batch(
+    outbox_ids: List[int],
+    owner: str,
+    error: str,
+    max_attempts: int,
+) -> None:
+    """
+    Возвращает партию в очередь после ошибки доставки.
+
+    Записи, исчерпавшие max_attempts, переводятся в failed и больше не выдаются.
+    """
+    if not outbox_ids:
+        return
+
+    def _execute():
+        with turso_transaction() as conn:
+            conn.execute(
+                f"""
+                UPDATE notification_outbox
+                SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    lease_owner = NULL, lease_until = NULL, last_error = ?
+                WHERE id IN ({_ids_placeholders(outbox_ids)}) AND lease_owner = ? AND status = 'leased'
+                """,
+                (max_attempts, error[:500], *outbox_ids, owner),
+            )
+
+    try:
+        await asyncio.to_thread(_execute)
+    except Exception as e:
+        log_error("outbox", f"Ошибка возврата партии outbox ({owner})", e)
+
+
+async def get_outbox_stats() -> Dict[str, Any]:
+    """
+    Состояние notification_outbox: размер очереди по статусам и возраст
+    самой старой недоставленной записи (lag очереди), секунды.
+    """
+    def _execute():
+        with turso_transaction() as conn:
+            cursor = conn.execute("""
+                SELECT status, COUNT(*), MIN(enqueued_at)
+                FROM notification_outbox
+                GROUP BY status
+            """)
+            rows = cursor.fetchall()
+        stats = {"pending": 0, "leased": 0, "done": 0, "failed": 0, "oldest_undelivered_age": 0.0}
+        now = time.time()
+        for status, count, oldest in rows:
+            stats[status] = count
+            if status in ("pending", "leased") and oldest is not None:
+                stats["oldest_undelivered_age"] = max(stats["oldest_undelivered_age"], round(now - oldest, 1))
+        return stats
+
+    try:
+        return await asyncio.to_thread(_execute)
+    except Exception as e:
+        log_error("outbox", "Ошибка получения статистики outbox", e)
+        return {}
+
+
+async def purge_notification_outbox(older_than_days: int = 7) -> int:
+    """
+    Удаляет доставленные записи outbox старше older_than_days и записи
+    шардов, которых больше нет (после уменьшения NOTIFY_WORKER_PROCESSES).
+    Возвращает число удаленных.
+    """
+    def _execute():
+        with turso_transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM notification_outbox WHERE (status = 'done' AND delivered_at < ?) OR shard >= ?",
+                (time.time() - older_than_days * 86400, NOTIFY_SHARDS),
+            )
+            return cursor.rowcount
+
+    try:
+        return await asyncio.to_thread(_execute)
+    except Exception as e:
+        log_error("outbox", "Ошибка очистки notification_outbox", e)
+        return 0
+
+
+# ========== КЭШ ИИ-ОЦЕНОК ==========
+
+async def get_ai_valuation(
+    listing_id: str,
+    content_hash: str,
+    model: str,
+    prompt_version: str,
+) -> Optional[Tuple[Dict[str, Any], int]]:
+    """
+    Непросроченная оценка объявления для данной версии контента, модели и промпта.
+
+    Returns:
+        (оценка, токенов потрачено на нее) или None (нет, устарела или ошибка БД)
+    """
+    def _execute():
+        with turso_transaction() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE ai_valuations SET hits = hits + 1
+                WHERE listing_id = ? AND content_hash = ? AND model = ? AND prompt_version = ?
+                  AND expires_at > ?
+                RETURNING result, tokens
+                """,
+                (listing_id, content_hash, model, prompt_version, time.time()),
+            )
+            # fetchall дочитывает RETURNING, иначе commit не пройдет
+            return cursor.fetchall()
+
+    try:
+        rows = await asyncio.to_thread(_execute)
+    except Exception as e:
+        log_error("ai_valuations", f"Ошибка чтения оценки {listing_id}", e)
+        return None
+    if not rows:
+        return None
+    return json.loads(rows[0][0]), rows[0][1] or 0
+
+
+async def save_ai_valuation(
+    listing_id: str,
+    content_hash: str,
+    model: str,
+    prompt_version: str,
+    result: Dict[str, Any],
+    tokens: int,
+    ttl_seconds: float,
+) -> bool:
+    """
+    Сохраняет оценку объявления. Строка одна на объявление: оценка новой
+    версии (другая цена, описание, модель или промпт) заменяет прежнюю.
+    """
+    def _execute():
+        now = time.time()
+        with turso_transaction() as conn:
+            conn.execute(
+                """
+                INSERT INTO ai_valuations (
+                    listing_id, content_hash, model, prompt_version, result, tokens, hits, created_at, expires_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)
+                ON CONFLICT(listing_id) DO UPDATE SET
+                    content_hash = excluded.content_hash,
+                    model = excluded.model,
+                    prompt_version = excluded.prompt_version,
+                    result = excluded.result,
+                    tokens = excluded.tokens,
+                    hits = 0,
+                    created_at = excluded.created_at,
+                    expires_at = excluded.expires_at
+                """,
+                (
+                    listing_id, content_hash, model, prompt_version,
+                    json.dumps(result, ensure_ascii=False), tokens, now, now + ttl_seconds,
+                ),
+            )
+
+    try:
+        await asyncio.to_thread(_execute)
+        return True
+    except Exception as e:
+        log_error("ai_valuations", f"Ошибка сохранения оценки {listing_id}", e)
+        return False
+
+
+async def purge_ai_valuations() -> int:
+    """Удаляет просроченные оценки. Возвращает число удаленных"""
+    def _execute():
+        with turso_transaction() as conn:
+            cursor = conn.execute("DELETE FROM ai_valuations WHERE expires_at < ?", (time.time(),))
+            return cursor.rowcount
+
+    try:
+        return await asyncio.to_thread(_execute)
+    except Exception as e:
+        log_error("ai_valuations", "Ошибка очистки ai_valuations", e)
+        return 0
+
+
+# ========== АРЕНДА ПЛАНОВЫХ ЗАДАЧ ==========
+
+async def acquire_job_lease(name: str, owner: str, ttl_seconds: float) -> bool:
+    """
+    Захватывает или продлевает аренду name для owner на ttl_seconds.
+
+    Аренда переходит к другому владельцу только после истечения expires_at
+    (владелец упал и перестал обновлять heartbeat). Повторный вызов тем же
+    владельцем продлевает аренду.
+
+    Returns:
+        True если owner держит аренду, False если она у другого или при ошибке БД
+    """
+    def _execute():
+        now = time.time()
+        with turso_transaction() as conn:
+            cursor = conn.execute(
+                """
+                INSERT INTO job_leases (name, owner, acquired_at, heartbeat_at, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    acquired_at = CASE WHEN job_leases.owner = excluded.owner
+                                       THEN job_leases.acquired_at ELSE excluded.acquired_at END,
+                    owner = excluded.owner,
+                    heartbeat_at = excluded.heartbeat_at,
+                    expires_at = excluded.expires_at
+                WHERE job_leases.owner = excluded.owner OR job_leases.expires_at < excluded.heartbeat_at
+                RETURNING owner
+                """,
+                (name, owner, now, now, now + ttl_seconds),
+            )
+            # fetchall дочитывает RETURNING, иначе commit не пройдет
+            return bool(cursor.fetchall())
+
+    try:
+        return await asyncio.to_thread(_execute)
+    except Exception as e:
+        log_error("job_lease", f"Ошибка захвата аренды {name} ({owner})", e)
+        return False
+
+
+async def release_job_lease(name: str, owner: str) -> bool:
+    """Освобождает аренду, если ее держит owner (другая реплика подхватит сразу)"""
+    def _execute():
+        with turso_transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM job_leases WHERE name = ? AND owner = ?",
+                (name, owner),
+            )
+            return cursor.rowcount == 1
+
+    try:
+        return await asyncio.to_thread(_execute)
+    except Exception as e:
+        log_error("job_lease", f"Ошибка освобождения аренды {name} ({owner})", e)
+        return False
+
+
+async def get_job_lease(name: str) -> Optional[Dict[str, Any]]:
+    """Текущий владелец аренды (None если аренды нет)"""
+    def _execute():
+        with turso_transaction() as conn:
+            row = conn.execute(
+                "SELECT owner, acquired_at, heartbeat_at, expires_at FROM job_leases WHERE name = ?",
+                (name,),
+            ).fetchone()
+        if not row:
+            return None
+        return {"owner": row[0], "acquired_at": row[1], "heartbeat_at": row[2], "expires_at": row[3]}
+
+    try:
+        return await asyncio.to_thread(_execute)
+    except Exception as e:
+        log_error("job_lease", f"Ошибка чтения аренды {name}", e)
+        return None
+
+
 async def find_stale_sent_ads() -> List[Dict[str, Any]]:
     """
     Находит записи в sent_ads, которые ссылаются на несуществующие объявления в apartments.
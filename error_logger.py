@@ -7,17 +7,28 @@
 - Логирование traceback для ошибок
 - Совместимость с существующим API
 - Безопасность: фильтрация токенов и чувствительных данных из логов
+- Неблокирующая запись: форматирование, очистка и I/O выполняются
+  в фоновом потоке (QueueHandler/QueueListener)
+- Ограничение частоты INFO/DEBUG сообщений по источнику
 """
+import atexit
+import copy
 import logging
+import queue
 import sys
+import threading
+import time
 import traceback
 import os
 import re
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from typing import List, Dict, Any, Optional
 from collections import deque
 from pathlib import Path
 
+from config import LOG_ASYNC, LOG_INFO_RATE_PER_SOURCE, LOG_INFO_BURST_PER_SOURCE
+
 
 # Создаем директорию для логов, если её нет
 LOG_DIR = Path("logs")
@@ -25,15 +36,136 @@ LOG_DIR.mkdir(exist_ok=True)
 LOG_FILE = LOG_DIR / "app.log"
 
 
+# Паттерны для поиска чувствительных данных (в порядке приоритета)
+# Компилируются один раз при импорте модуля
+_SENSITIVE_PATTERNS = [
+    # Переменные окружения с токенами (самый приоритетный - заменяем полностью)
+    (r'(BOT_TOKEN|TURSO_AUTH_TOKEN|API_KEY|SECRET|PASSWORD|AUTH_TOKEN)\s*[:=]\s*["\']?[A-Za-z0-9_:_-]{20,}["\']?', r'\1=[REDACTED]'),
+    # Токены бота Telegram (формат: 123456789:ABCdefGHIjklMNOpqrsTUVwxyz)
+    # Очень специфичный паттерн для токенов бота (цифры:буквы_цифры_дефисы)
+    # Должен быть перед общим паттерном token, чтобы не перехватывался
+    # Ищем токены бота в любом контексте (с пробелами, в кавычках, после = и т.д.)
+    # Токены бота обычно имеют 8+ цифр, двоеточие и 20+ символов после
+    (r'\d{8,}:[A-Za-z0-9_-]{20,}', '[BOT_TOKEN]'),
+    # Токены в URL или connection strings (но не токены бота, которые уже обработаны)
+    (r'(auth_token|token|api_key|apikey)\s*[:=]\s*["\']?[A-Za-z0-9_-]{20,}["\']?', r'\1=[REDACTED]'),
+    # Длинные токены (40+ символов) - могут быть токенами Turso или другими
+    # Но только если это не часть URL или другого контекста
+    (r'\b[A-Za-z0-9_-]{40,}\b', '[TOKEN]'),
+    # API ключи в различных форматах
+    (r'\b(api[_-]?key|apikey|api_key)\s*[:=]\s*["\']?[A-Za-z0-9_-]{20,}["\']?', r'\1=[API_KEY]'),
+    # Секреты и пароли
+    (r'\b(secret|password|passwd|pwd|pass)\s*[:=]\s*["\']?[^\s"\']+["\']?', r'\1=[REDACTED]'),
+    # Email адреса
+    (r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '[EMAIL]'),
+    # Телефонные номера (различные форматы) - но не токены бота
+    (r'\b\+?\d{1,3}[-.\s]?\(?\d{1,4}\)?[-.\s]?\d{1,4}[-.\s]?\d{1,9}\b(?!:)', '[PHONE]'),
+    # Полные сообщения пользователей (оставляем только ID)
+    (r'message\.text\s*[:=]\s*["\'][^"\']+["\']', 'message.text=[REDACTED]'),
+    (r'message\.from_user\.(username|first_name|last_name|phone_number)\s*[:=]\s*["\'][^"\']+["\']', r'message.from_user.\1=[REDACTED]'),
+    # Данные пользователя в словарях
+    (r'["\'](username|first_name|last_name|phone_number|email)["\']\s*:\s*["\'][^"\']+["\']', r'"\1":"[REDACTED]"'),
+]
+_SENSITIVE_PATTERNS = [
+    (re.compile(pattern, re.IGNORECASE), replacement)
+    for pattern, replacement in _SENSITIVE_PATTERNS
+]
+
+
+class SanitizingFormatter(logging.Formatter):
+    """
+    Форматтер, очищающий итоговую строку от чувствительных данных
+
+    Очистка выполняется только для реально выводимых записей
+    (в потоке QueueListener), а не при каждом вызове log_*.
+    Очищаются текст сообщения и traceback, но не время/уровень.
+    Шаблон и аргументы очищаются по отдельности, до подстановки: в
+    склеенной строке "[src] ... 999999999: boom" номер перед ": " не
+    распознается как телефон.
+    """
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        # Запись проходит через несколько handlers - очищаем один раз
+        cached = getattr(record, "_sanitized_message", None)
+        if cached is None or cached[0] != record.message:
+            cached = (record.message, _sanitize_record_message(record))
+            record._sanitized_message = cached
+        record.message = cached[1]
+        return super().formatMessage(record)
+
+    def formatException(self, ei) -> str:
+        return sanitize_sensitive_data(super().formatException(ei))
+
+    def formatStack(self, stack_info: str) -> str:
+        return sanitize_sensitive_data(super().formatStack(stack_info))
+
+
+def _sanitize_record_message(record: logging.LogRecord) -> str:
+    """Очищенный текст записи: шаблон и строковые аргументы очищаются по отдельности"""
+    if isinstance(record.args, tuple) and record.args:
+        args = tuple(
+            arg if isinstance(arg, (int, float)) else sanitize_sensitive_data(str(arg))
+            for arg in record.args
+        )
+        try:
+            return sanitize_sensitive_data(str(record.msg)) % args
+        except (TypeError, ValueError):
+            pass
+    return sanitize_sensitive_data(record.message)
+
+
+class _AsyncQueueHandler(QueueHandler):
+    """
+    QueueHandler, оставляющий форматирование фоновому потоку
+
+    Стандартный prepare() форматирует запись (включая traceback) в потоке
+    вызывающего кода. Записи не покидают процесс, поэтому здесь только
+    фиксируем аргументы (объекты - строкой: они могут измениться до записи),
+    а подстановку, очистку и exc_info выполняет QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if isinstance(record.args, tuple):
+            record.args = tuple(
+                arg if isinstance(arg, (str, int, float)) else str(arg) for arg in record.args
+            )
+        else:
+            record.msg = record.message
+            record.args = None
+        return record
+
+
+# Фоновый поток записи логов (None, если LOG_ASYNC выключен)
+_log_listener: Optional[QueueListener] = None
+
+
+def _stop_log_listener():
+    """Останавливает фоновый поток, дописывая очередь (вызывается при выходе)"""
+    global _log_listener
+    if _log_listener is not None:
+        try:
+            _log_listener.stop()
+        except Exception:
+            pass
+        _log_listener = None
+
+
 def setup_logging():
     """
     Настраивает систему логирования
     
     ВАЖНО: Логи должны идти в stdout/stderr для Railway и других платформ.
     Файловый handler опционален и используется только если возможно создать файл.
+    
+    При LOG_ASYNC=true корневой логгер получает только QueueHandler,
+    а реальные handlers работают в фоновом потоке QueueListener.
     """
-    # Создаем форматтер
-    formatter = logging.Formatter(
+    global _log_listener
+    
+    # Создаем форматтер (очищает чувствительные данные при выводе)
+    formatter = SanitizingFormatter(
         fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
@@ -43,20 +175,23 @@ def setup_logging():
     root_logger.setLevel(logging.DEBUG)
     
     # Удаляем существующие handlers, чтобы избежать дублирования
+    _stop_log_listener()
     root_logger.handlers.clear()
     
+    handlers = []
+    
     # ВАЖНО: Консольный handler ДОЛЖЕН быть первым для Railway
     # Railway читает логи из stdout/stderr
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)  # В консоль только INFO и выше
     console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
+    handlers.append(console_handler)
     
     # Также добавляем stderr handler для ошибок (Railway читает и его)
     stderr_handler = logging.StreamHandler(sys.stderr)
     stderr_handler.setLevel(logging.WARNING)  # В stderr только WARNING и ERROR
     stderr_handler.setFormatter(formatter)
-    root_logger.addHandler(stderr_handler)
+    handlers.append(stderr_handler)
     
     # Файловый handler опционален (может не работать в Railway)
     # Пытаемся создать только если возможно
@@ -64,17 +199,71 @@ def setup_logging():
         file_handler = logging.FileHandler(LOG_FILE, encoding='utf-8')
         file_handler.setLevel(logging.DEBUG)  # В файл пишем все уровни
         file_handler.setFormatter(formatter)
-        root_logger.addHandler(file_handler)
+        handlers.append(file_handler)
     except (OSError, PermissionError, FileNotFoundError):
         # Если не удалось создать файл (например, в Railway), продолжаем без него
         # Логи все равно будут в stdout/stderr
         pass
     
+    if LOG_ASYNC:
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        root_logger.addHandler(_AsyncQueueHandler(log_queue))
+        _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _log_listener.start()
+    else:
+        for handler in handlers:
+            root_logger.addHandler(handler)
+    
     return root_logger
 
 
 # Инициализируем логирование при импорте модуля
 setup_logging()
+atexit.register(_stop_log_listener)
+
+
+class _SourceRateLimiter:
+    """
+    Ограничитель частоты сообщений по источнику (token bucket)
+
+    Каждый источник получает rate сообщений в секунду с запасом burst.
+    Подавленные сообщения подсчитываются и сообщаются при следующей
+    пропущенной записи, поэтому поток логов не теряется бесследно.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._buckets: Dict[str, List[float]] = {}  # source -> [tokens, last_ts]
+        self._suppressed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, source: str) -> Optional[int]:
+        """
+        Returns:
+            None если сообщение нужно подавить, иначе количество
+            подавленных с прошлого раза сообщений (обычно 0)
+        """
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(source)
+            if bucket is None:
+                bucket = [float(self.burst), now]
+                self._buckets[source] = bucket
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < 1.0:
+                self._suppressed[source] = self._suppressed.get(source, 0) + 1
+                return None
+            bucket[0] -= 1.0
+            return self._suppressed.pop(source, 0)
+
+    def get_suppressed(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._suppressed)
 
 
 def sanitize_sensitive_data(text: str) -> str:
@@ -98,39 +287,9 @@ def sanitize_sensitive_data(text: str) -> str:
     if not text:
         return text
     
-    # Паттерны для поиска чувствительных данных (в порядке приоритета)
-    patterns = [
-        # Переменные окружения с токенами (самый приоритетный - заменяем полностью)
-        (r'(BOT_TOKEN|TURSO_AUTH_TOKEN|API_KEY|SECRET|PASSWORD|AUTH_TOKEN)\s*[:=]\s*["\']?[A-Za-z0-9_:_-]{20,}["\']?', r'\1=[REDACTED]'),
-        # Токены бота Telegram (формат: 123456789:ABCdefGHIjklMNOpqrsTUVwxyz)
-        # Очень специфичный паттерн для токенов бота (цифры:буквы_цифры_дефисы)
-        # Должен быть перед общим паттерном token, чтобы не перехватывался
-        # Ищем токены бота в любом контексте (с пробелами, в кавычках, после = и т.д.)
-        # Токены бота обычно имеют 8+ цифр, двоеточие и 20+ символов после
-        (r'\d{8,}:[A-Za-z0-9_-]{20,}', '[BOT_TOKEN]'),
-        # Токены в URL или connection strings (но не токены бота, которые уже обработаны)
-        (r'(auth_token|token|api_key|apikey)\s*[:=]\s*["\']?[A-Za-z0-9_-]{20,}["\']?', r'\1=[REDACTED]'),
-        # Длинные токены (40+ символов) - могут быть токенами Turso или другими
-        # Но только если это не часть URL или другого контекста
-        (r'\b[A-Za-z0-9_-]{40,}\b', '[TOKEN]'),
-        # API ключи в различных форматах
-        (r'\b(api[_-]?key|apikey|api_key)\s*[:=]\s*["\']?[A-Za-z0-9_-]{20,}["\']?', r'\1=[API_KEY]'),
-        # Секреты и пароли
-        (r'\b(secret|password|passwd|pwd|pass)\s*[:=]\s*["\']?[^\s"\']+["\']?', r'\1=[REDACTED]'),
-        # Email адреса
-        (r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '[EMAIL]'),
-        # Телефонные номера (различные форматы) - но не токены бота
-        (r'\b\+?\d{1,3}[-.\s]?\(?\d{1,4}\)?[-.\s]?\d{1,4}[-.\s]?\d{1,9}\b(?!:)', '[PHONE]'),
-        # Полные сообщения пользователей (оставляем только ID)
-        (r'message\.text\s*[:=]\s*["\'][^"\']+["\']', 'message.text=[REDACTED]'),
-        (r'message\.from_user\.(username|first_name|last_name|phone_number)\s*[:=]\s*["\'][^"\']+["\']', r'message.from_user.\1=[REDACTED]'),
-        # Данные пользователя в словарях
-        (r'["\'](username|first_name|last_name|phone_number|email)["\']\s*:\s*["\'][^"\']+["\']', r'"\1":"[REDACTED]"'),
-    ]
-    
     sanitized = text
-    for pattern, replacement in patterns:
-        sanitized = re.sub(pattern, replacement, sanitized, flags=re.IGNORECASE)
+    for pattern, replacement in _SENSITIVE_PATTERNS:
+        sanitized = pattern.sub(replacement, sanitized)
     
     return sanitized
 
@@ -152,6 +311,9 @@ class ErrorLogger:
         # Создаем отдельный логгер для этого модуля
         self._logger = logging.getLogger("error_logger")
         self._logger.setLevel(logging.DEBUG)
+        
+        # Ограничение частоты INFO/DEBUG по источнику (ошибки и предупреждения не ограничиваются)
+        self._rate_limiter = _SourceRateLimiter(LOG_INFO_RATE_PER_SOURCE, LOG_INFO_BURST_PER_SOURCE)
     
     def log_error(
         self, 
@@ -163,6 +325,10 @@ class ErrorLogger:
         """
         Логирует ошибку с полным traceback
         
+        Traceback и очистка чувствительных данных выполняются форматтером
+        в фоновом потоке; в памяти хранится исходная запись, которая
+        очищается при чтении (get_errors / format_for_telegram).
+        
         Args:
             source: Источник ошибки (модуль/компонент)
             message: Сообщение об ошибке
@@ -174,53 +340,32 @@ class ErrorLogger:
             exception_type_name = type(exception).__name__
             # TelegramForbiddenError - ожидаемая ошибка (пользователь заблокировал бота)
             if exception_type_name == "TelegramForbiddenError":
-                sanitized_message = sanitize_sensitive_data(message)
-                self._logger.info(f"[{source}] {sanitized_message} (пользователь заблокировал бота)")
+                self._logger.info("[%s] %s (пользователь заблокировал бота)", source, message)
                 return  # Не логируем как ошибку и не сохраняем в errors
         
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # Очищаем чувствительные данные из сообщения
-        sanitized_message = sanitize_sensitive_data(message)
-        
-        # Формируем полное сообщение
-        full_message = f"[{source}] {sanitized_message}"
-        
-        # Если передан exception, добавляем его информацию (также очищенную)
-        exception_str = None
-        if exception:
-            exception_str = str(exception)
-            exception_str = sanitize_sensitive_data(exception_str)
-            full_message += f": {exception_str}"
-        
-        # Записываем в память (только очищенные данные)
+        # Записываем в память (очищается при чтении)
         error_entry = {
             "timestamp": timestamp,
             "source": source,
-            "message": sanitized_message,
-            "exception": exception_str,
+            "message": message,
+            "exception": str(exception) if exception else None,
             "type": "error"
         }
         self.errors.append(error_entry)
         
         # Логируем с traceback если нужно
-        # ВАЖНО: traceback может содержать чувствительные данные (токены, пароли)
-        # Поэтому мы очищаем traceback перед логированием
-        if exc_info and exception:
-            try:
-                # Получаем traceback и очищаем его от чувствительных данных
-                import traceback as tb
-                tb_str = ''.join(tb.format_exception(type(exception), exception, exception.__traceback__))
-                # Очищаем traceback от токенов и чувствительных данных
-                tb_str = sanitize_sensitive_data(tb_str)
-                # Логируем очищенный traceback
-                self._logger.error(f"{full_message}\n{tb_str}")
-            except Exception:
-                # Если не удалось получить или очистить traceback, логируем только сообщение
-                self._logger.error(full_message)
+        # ВАЖНО: traceback может содержать чувствительные данные (токены, пароли),
+        # SanitizingFormatter очищает итоговую строку вместе с traceback
+        if exception:
+            self._logger.error(
+                "[%s] %s: %s", source, message, exception,
+                exc_info=(type(exception), exception, exception.__traceback__) if exc_info else None,
+            )
         else:
             # Логируем без traceback
-            self._logger.error(full_message)
+            self._logger.error("[%s] %s", source, message)
     
     def log_warning(self, source: str, message: str):
         """
@@ -232,55 +377,81 @@ class ErrorLogger:
         """
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # Очищаем чувствительные данные из сообщения
-        sanitized_message = sanitize_sensitive_data(message)
-        
-        # Записываем в память (только очищенные данные)
+        # Записываем в память (очищается при чтении)
         warning_entry = {
             "timestamp": timestamp,
             "source": source,
-            "message": sanitized_message,
+            "message": message,
             "type": "warning"
         }
         self.warnings.append(warning_entry)
         
         # Логируем
-        self._logger.warning(f"[{source}] {sanitized_message}")
+        self._logger.warning("[%s] %s", source, message)
     
-    def log_info(self, source: str, message: str):
+    def log_info(self, source: str, message: str, *args: Any):
         """
         Логирует информационное сообщение
         
         Args:
             source: Источник информации
-            message: Сообщение
+            message: Сообщение (может содержать %-плейсхолдеры)
+            *args: Аргументы для message, подставляются только если запись будет выведена
         """
-        self._logger.info(f"[{source}] {message}")
+        self._log_limited(logging.INFO, source, message, args)
     
-    def log_debug(self, source: str, message: str):
+    def log_debug(self, source: str, message: str, *args: Any):
         """
         Логирует отладочное сообщение
         
         Args:
             source: Источник отладки
-            message: Сообщение
+            message: Сообщение (может содержать %-плейсхолдеры)
+            *args: Аргументы для message, подставляются только если запись будет выведена
         """
-        self._logger.debug(f"[{source}] {message}")
+        self._log_limited(logging.DEBUG, source, message, args)
+    
+    def _log_limited(self, level: int, source: str, message: str, args: tuple):
+        """Логирует INFO/DEBUG с учетом ограничения частоты по источнику"""
+        if not self._logger.isEnabledFor(level):
+            return
+        suppressed = self._rate_limiter.acquire(source)
+        if suppressed is None:
+            return
+        if args:
+            message = message % args
+        if suppressed:
+            self._logger.log(level, "[%s] %s (подавлено сообщений: %d)", source, message, suppressed)
+        else:
+            self._logger.log(level, "[%s] %s", source, message)
+    
+    def get_suppressed(self) -> Dict[str, int]:
+        """Возвращает количество подавленных INFO/DEBUG сообщений по источникам"""
+        return self._rate_limiter.get_suppressed()
+    
+    @staticmethod
+    def _sanitize_entry(entry: Dict) -> Dict:
+        """Возвращает копию записи с очищенными сообщением и исключением"""
+        sanitized = dict(entry)
+        sanitized["message"] = sanitize_sensitive_data(entry.get("message", ""))
+        if entry.get("exception"):
+            sanitized["exception"] = sanitize_sensitive_data(entry["exception"])
+        return sanitized
     
     def get_errors(self, limit: int = 20) -> List[Dict]:
         """Возвращает последние ошибки"""
-        return list(self.errors)[-limit:]
+        return [self._sanitize_entry(e) for e in list(self.errors)[-limit:]]
     
     def get_warnings(self, limit: int = 10) -> List[Dict]:
         """Возвращает последние предупреждения"""
-        return list(self.warnings)[-limit:]
+        return [self._sanitize_entry(w) for w in list(self.warnings)[-limit:]]
     
     def get_all_logs(self, limit: int = 30) -> List[Dict]:
         """Возвращает все логи (ошибки + предупреждения)"""
         all_logs = list(self.errors) + list(self.warnings)
         # Сортируем по времени (новые сверху)
         all_logs.sort(key=lambda x: x["timestamp"], reverse=True)
-        return all_logs[:limit]
+        return [self._sanitize_entry(e) for e in all_logs[:limit]]
     
     def clear(self):
         """Очищает все логи из памяти"""
@@ -376,29 +547,32 @@ def log_warning(source: str, message: str):
     error_logger.log_warning(source, message)
 
 
-def log_info(source: str, message: str):
+def log_info(source: str, message: str, *args: Any):
     """
     Быстрое логирование информации
     
     Args:
         source: Источник информации
         message: Сообщение
+        *args: Аргументы для %-форматирования (подставляются лениво)
     
     Пример использования:
         log_info("module_name", "Информационное сообщение")
+        log_info("module_name", "Обработано %d объявлений", count)
     """
-    error_logger.log_info(source, message)
+    error_logger.log_info(source, message, *args)
 
 
-def log_debug(source: str, message: str):
+def log_debug(source: str, message: str, *args: Any):
     """
     Быстрое логирование отладочного сообщения
     
     Args:
         source: Источник отладки
         message: Сообщение
+        *args: Аргументы для %-форматирования (подставляются лениво)
     
     Пример использования:
         log_debug("module_name", "Отладочное сообщение")
     """
-    error_logger.log_debug(source, message)
+    error_logger.log_debug(source, message, *args)
@@ -21,9 +21,13 @@ from apscheduler.triggers.interval import IntervalTrigger
 
 from bot.app import create_bot
 from bot.services.search_service import check_new_listings
-from config import CHECK_INTERVAL, BOT_TOKEN, USE_TURSO_CACHE
+from config import CHECK_INTERVAL, BOT_TOKEN, USE_TURSO_CACHE, NOTIFY_OUTBOX_ENABLED, NOTIFY_WORKER_PROCESSES
 from database import init_database, clear_old_listings, ensure_turso_tables_exist, update_cached_listings_daily_turso, get_active_users
-from database_turso import get_user_filters_turso, has_valid_user_filters
+from database_turso import get_user_filters_turso, has_valid_user_filters, purge_notification_outbox, purge_ai_valuations
+from bot.services.notification_outbox import outbox_consumer
+from bot.services.cluster import coordinator_check, start_notify_worker_processes, stop_notify_worker_processes
+from utils.job_lease import JobLease
+from utils.parse_pool import shutdown_parse_pool
 from ai_valuator import get_valuator
 
 
@@ -121,7 +125,11 @@ async def scheduled_check(bot):
     
     log_info("scheduler", f"Запуск плановой проверки: {datetime.now()}")
     try:
-        await check_new_listings(bot)
+        if NOTIFY_OUTBOX_ENABLED and NOTIFY_WORKER_PROCESSES > 0:
+            # Многопроцессный режим: только парсинг по городам, рассылают процессы-воркеры
+            await coordinator_check()
+        else:
+            await check_new_listings(bot)
     except Exception as e:
         log_error("scheduler", "Ошибка при плановой проверке", e)
 
@@ -132,6 +140,10 @@ async def cleanup_old_records():
     log_info("scheduler", "Очистка старых записей...")
     try:
         await clear_old_listings(days=30)
+        if NOTIFY_OUTBOX_ENABLED:
+            await purge_notification_outbox(older_than_days=7)
+        if USE_TURSO_CACHE:
+            await purge_ai_valuations()
     except Exception as e:
         log_error("scheduler", "Ошибка при очистке старых записей", e)
 
@@ -165,10 +177,15 @@ async def main():
     # Настройка планировщика
     scheduler = AsyncIOScheduler()
     
+    # Плановые задачи выполняет только реплика, держащая аренду в БД
+    # (вторая реплика или старый экземпляр при деплое их пропускает)
+    scheduler_lease = JobLease("scheduler")
+    await scheduler_lease.start()
+    
     # Проверка объявлений каждые N минут (30 минут по умолчанию)
     # Задержка первого запуска на 2 минуты, чтобы пользователь успел нажать /start
     scheduler.add_job(
-        scheduled_check,
+        scheduler_lease.guard(scheduled_check),
         trigger=IntervalTrigger(
             minutes=CHECK_INTERVAL,
             start_date=datetime.now(timezone.utc) + timedelta(minutes=2)
@@ -181,7 +198,7 @@ async def main():
     
     # Очистка старых записей раз в день
     scheduler.add_job(
-        cleanup_old_records,
+        scheduler_lease.guard(cleanup_old_records),
         trigger=IntervalTrigger(days=1),
         id='cleanup',
         name='Очистка старых записей',
@@ -199,7 +216,7 @@ async def main():
                 log_error("scheduler", "Ошибка обновления кэша Turso", e)
         
         scheduler.add_job(
-            update_turso_cache,
+            scheduler_lease.guard(update_turso_cache),
             trigger=IntervalTrigger(days=1),
             id='update_turso_cache',
             name='Обновление кэша Turso',
@@ -208,6 +225,13 @@ async def main():
         logger.info("✅ Задача ежедневного обновления кэша Turso добавлена")
     
     scheduler.start()
+    
+    # Воркеры очереди уведомлений: доставляют и то, что осталось в outbox после рестарта
+    if NOTIFY_OUTBOX_ENABLED and NOTIFY_WORKER_PROCESSES > 0:
+        start_notify_worker_processes(NOTIFY_WORKER_PROCESSES)
+    elif NOTIFY_OUTBOX_ENABLED:
+        outbox_consumer.start(bot)
+    
     interval_hours = CHECK_INTERVAL / 60
     logger.info(f"✅ Планировщик запущен (интервал: {interval_hours:.1f} часов)")
     
@@ -277,6 +301,10 @@ async def main():
                     raise
     finally:
         scheduler.shutdown()
+        await scheduler_lease.stop()
+        await outbox_consumer.stop()
+        stop_notify_worker_processes()
+        shutdown_parse_pool()
         if bot.session:
             try:
                 await bot.session.close()
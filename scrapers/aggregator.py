@@ -30,14 +30,16 @@ import os
 import time
 import json
 import aiohttp
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
 from datetime import datetime
 from collections import defaultdict
 
 # Добавляем родительскую директорию в path для импорта
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from scrapers.base import Listing
+from scrapers.base import Listing, row_details_loader
+from scrapers.aggregator_utils import SignatureIndex
+from config import NOTIFY_OUTBOX_ENABLED
 from scrapers.kufar import KufarScraper
 from scrapers.realt import RealtByScraper
 from scrapers.domovita import DomovitaScraper
@@ -57,6 +59,10 @@ except ImportError:
     def log_info(source, message):
         print(f"[INFO] [{source}] {message}")
 
+# Фоновые задачи уведомлений при NOTIFY_OUTBOX_ENABLED=false (держим ссылки, чтобы задачи не собрал GC)
+_background_tasks: set = set()
+
+
 class ListingsAggregator:
     """Агрегатор объявлений со всех сайтов"""
     
@@ -82,6 +88,9 @@ class ListingsAggregator:
             self.enabled_sources = [s.lower() for s in enabled_sources]
         else:
             self.enabled_sources = list(self.SCRAPERS.keys())
+        
+        # Статистика последнего прогона по источникам (заполняется iter_listings)
+        self.last_source_stats: Dict[str, Dict[str, Any]] = {}
     
     async def fetch_all_listings(
         self,
@@ -91,146 +100,213 @@ class ListingsAggregator:
         min_price: int = 0,
         max_price: int = 100000,
         user_id: int | None = None,  # Для логирования
-    ) -> tuple[List[Listing], List[Dict[str, Any]]]:
+    ) -> List[Listing]:
         """
         Получает объявления со всех включенных источников
         
-        Каждый scraper обернут в try/except, при падении одного
-        остальные продолжают работать.
+        Обертка над iter_listings(): собирает все партии в один список.
+        Сохранение в apartments и уведомления запускаются по мере
+        завершения каждого источника, не дожидаясь остальных.
         
         Returns:
-            Объединенный список объявлений со всех сайтов
+            Объединенный список уникальных объявлений со всех сайтов (по цене)
         """
-        all_listings = []
-        tasks = []
-        source_names = []
+        unique_listings: List[Listing] = []
+        async for batch in self.iter_listings(
+            city=city,
+            min_rooms=min_rooms,
+            max_rooms=max_rooms,
+            min_price=min_price,
+            max_price=max_price,
+            user_id=user_id,
+        ):
+            unique_listings.extend(batch)
         
-        log_info("aggregator", f"Начинаю парсинг с {len(self.enabled_sources)} источников: {', '.join(self.enabled_sources)}")
+        # Сортируем по дате (новые первые) - у нас нет даты, сортируем по цене
+        unique_listings.sort(key=lambda x: x.price if x.price > 0 else 999999999)
         
-        # Создаем задачи для каждого парсера
-        for source_name in self.enabled_sources:
-            if source_name in self.SCRAPERS:
-                try:
-                    scraper_class = self.SCRAPERS[source_name]
-                    # Создаем экземпляр scraper'а с защитой от ошибок инициализации
-                    try:
-                        scraper_instance = scraper_class()
-                    except Exception as e:
-                        log_error("aggregator", f"Ошибка создания экземпляра scraper '{source_name}'", e)
-                        continue
-                    
-                    # Создаем задачу с защитой от падений
-                    task = self._fetch_from_source(
-                        scraper_instance,
-                        source_name,
-                        city, min_rooms, max_rooms, min_price, max_price
-                    )
-                    tasks.append(task)
-                    source_names.append(source_name)
-                except Exception as e:
-                    log_error("aggregator", f"Ошибка подготовки scraper '{source_name}'", e)
-                    continue
+        log_info("aggregator", f"Итого уникальных объявлений: {len(unique_listings)}")
         
+        return unique_listings
+    
+    async def iter_listings(
+        self,
+        city: str | dict = "барановичи",
+        min_rooms: int = 1,
+        max_rooms: int = 4,
+        min_price: int = 0,
+        max_price: int = 100000,
+        user_id: int | None = None,  # Для логирования
+        persist: bool = True,
+    ) -> AsyncIterator[List[Listing]]:
+        """
+        Отдает объявления партиями по мере завершения источников
+        
+        Источники запускаются параллельно (asyncio.as_completed). Каждая
+        партия дедуплицируется по ID и signature относительно уже отданных,
+        сразу сохраняется в apartments, а реально новые объявления уходят
+        в уведомления в фоне - медленный источник не задерживает остальные.
+        
+        Каждый scraper обернут в try/except, при падении одного
+        остальные продолжают работать. Статистика по источникам после
+        завершения доступна в self.last_source_stats.
+        
+        Args:
+            persist: Сохранять партии в apartments и запускать уведомления
+        
+        Yields:
+            Список новых уникальных объявлений одного источника (может быть пустым)
+        """
+        log_info("aggregator", f"Начинаю парсинг с {len(self.enabled_sources)} источников: {', '.join(self.enabled_sources)}")
+        
+        tasks = self._create_source_tasks(city, min_rooms, max_rooms, min_price, max_price, user_id)
         if not tasks:
             log_warning("aggregator", "Не удалось создать ни одной задачи для парсинга")
-            return []
+            return
         
-        # Выполняем все запросы параллельно с защитой от исключений
-        # return_exceptions=True гарантирует, что при падении одного scraper'а остальные продолжат работу
         log_info("aggregator", f"Запускаю {len(tasks)} задач параллельно...")
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # Обрабатываем результаты с детальным логированием
-        source_stats = {}
-        successful_sources = 0
-        failed_sources = 0
-        
-        for source_name, result in zip(source_names, results):
-            if isinstance(result, Exception):
-                # Ошибка уже залогирована в _fetch_from_source, но логируем здесь тоже для статистики
-                log_error("aggregator", f"Scraper '{source_name}' завершился с ошибкой: {type(result).__name__}", result)
-                source_stats[source_name] = {"error": str(result), "count": 0}
-                failed_sources += 1
-            elif result is None:
-                # КРИТИЧНО: None считается ошибкой
-                log_error("aggregator", f"Scraper '{source_name}' вернул None - это ошибка!")
-                source_stats[source_name] = {"error": "Вернул None", "count": 0}
-                failed_sources += 1
-            elif isinstance(result, list):
-                count = len(result)
-                all_listings.extend(result)
-                source_stats[source_name] = {"count": count, "error": None}
-                successful_sources += 1
-                log_info("aggregator", f"✅ Scraper '{source_name}': получено {count} объявлений")
-            else:
-                log_error("aggregator", f"Scraper '{source_name}': неожиданный тип результата: {type(result)}, значение: {result}")
-                source_stats[source_name] = {"error": f"Неожиданный тип результата: {type(result)}", "count": 0}
-                failed_sources += 1
-        
-        # Логируем итоговую статистику
-        log_info("aggregator", f"Парсинг завершен: успешно {successful_sources}/{len(source_names)}, ошибок {failed_sources}")
-        log_info("aggregator", f"📊 Всего объявлений до дедупликации: {len(all_listings)}")
-        
-        # Удаляем дубликаты по ID
-        unique_listings = self._remove_duplicates(all_listings)
-        duplicates_removed = len(all_listings) - len(unique_listings)
-        if duplicates_removed > 0:
-            log_info("aggregator", f"Удалено {duplicates_removed} дубликатов по ID")
-        
-        # Дедупликация по signature (адрес + vendor + цена + фото)
-        if unique_listings:
-            try:
-                before_signature = len(unique_listings)
-                unique_listings = dedupe_by_signature(unique_listings)
-                signature_removed = before_signature - len(unique_listings)
-                if signature_removed > 0:
-                    log_info("aggregator", f"[AGGREGATOR] удалено {signature_removed} дубликатов по signature (из {before_signature})")
-            except ImportError as e:
-                log_warning("aggregator", f"Не удалось импортировать dedupe_by_signature: {e}")
-            except Exception as e:
-                log_error("aggregator", f"Ошибка при дедупликации по signature: {e}")
         
-        # КРИТИЧНО: Сохраняем все объявления в таблицу apartments одной транзакцией
-        # Это гарантирует, что данные реально попадают в БД, а не только существуют в памяти
-        if unique_listings:
-            try:
+        seen_ids = set()
+        signature_index = SignatureIndex()
+        source_stats: Dict[str, Dict[str, Any]] = {}
+        self.last_source_stats = source_stats
+        total_received = 0
+        
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                source_name, result = await next_done
+                
+                if isinstance(result, Exception):
+                    # Ошибка уже залогирована в _fetch_from_source, но логируем здесь тоже для статистики
+                    log_error("aggregator", f"Scraper '{source_name}' завершился с ошибкой: {type(result).__name__}", result)
+                    source_stats[source_name] = {"error": str(result), "count": 0}
+                    continue
+                if result is None:
+                    # КРИТИЧНО: None считается ошибкой
+                    log_error("aggregator", f"Scraper '{source_name}' вернул None - это ошибка!")
+                    source_stats[source_name] = {"error": "Вернул None", "count": 0}
+                    continue
+                if not isinstance(result, list):
+                    log_error("aggregator", f"Scraper '{source_name}': неожиданный тип результата: {type(result)}, значение: {result}")
+                    source_stats[source_name] = {"error": f"Неожиданный тип результата: {type(result)}", "count": 0}
+                    continue
                 
-                # Сохраняем все объявления одной транзакцией
-                inserted_ids = await sync_apartments_batch(unique_listings)
+                total_received += len(result)
                 
-                if inserted_ids:
-                    # Фильтруем только реально вставленные объявления
-                    new_listings = [
-                        listing for listing in unique_listings
-                        if str(listing.id) in inserted_ids
-                    ]
-                    
-                    # Запускаем уведомления в фоне, не блокируя парсинг остальных источников
-                    asyncio.create_task(
-                        notify_users_about_new_apartments_summary(new_listings)
-                    )
-                    
-                    log_info("aggregator", f"[AGGREGATOR] отправлено в notify: {len(new_listings)}")
-                else:
-                    log_info("aggregator", "[AGGREGATOR] новых объявлений нет")
-            except ImportError as e:
-                log_error("aggregator", f"Не удалось импортировать sync_apartments_batch: {e}")
+                # Удаляем дубликаты по ID и по signature относительно уже отданных партий
+                by_id = []
+                for listing in result:
+                    if listing.id not in seen_ids:
+                        seen_ids.add(listing.id)
+                        by_id.append(listing)
+                removed_before = signature_index.removed_count
+                batch = signature_index.filter_new(by_id)
+                
+                source_stats[source_name] = {"count": len(result), "unique": len(batch), "error": None}
+                log_info(
+                    "aggregator",
+                    f"✅ Scraper '{source_name}': получено {len(result)} объявлений, "
+                    f"уникальных {len(batch)} (дубликатов по ID: {len(result) - len(by_id)}, "
+                    f"по signature: {signature_index.removed_count - removed_before})",
+                )
+                
+                if persist and batch:
+                    await self._persist_and_notify(source_name, batch)
+                
+                yield batch
+        finally:
+            # При досрочном выходе из генератора не оставляем висящие запросы
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        
+        successful = sum(1 for stats in source_stats.values() if stats.get("error") is None)
+        log_info("aggregator", f"Парсинг завершен: успешно {successful}/{len(tasks)}, ошибок {len(source_stats) - successful}")
+        log_info(
+            "aggregator",
+            f"📊 Всего объявлений: {total_received}, уникальных: {len(signature_index)}",
+        )
+    
+    def _create_source_tasks(
+        self,
+        city: str | dict,
+        min_rooms: int,
+        max_rooms: int,
+        min_price: int,
+        max_price: int,
+        user_id: int | None,
+    ) -> List[asyncio.Task]:
+        """Создает задачи парсинга для всех включенных источников"""
+        tasks = []
+        for source_name in self.enabled_sources:
+            if source_name not in self.SCRAPERS:
+                continue
+            try:
+                scraper_class = self.SCRAPERS[source_name]
+                # Создаем экземпляр scraper'а с защитой от ошибок инициализации
+                try:
+                    scraper_instance = scraper_class()
+                except Exception as e:
+                    log_error("aggregator", f"Ошибка создания экземпляра scraper '{source_name}'", e)
+                    continue
+                
+                tasks.append(asyncio.create_task(
+                    self._fetch_named(
+                        scraper_instance,
+                        source_name,
+                        city, min_rooms, max_rooms, min_price, max_price,
+                        user_id,
+                    ),
+                    name=f"aggregator:{source_name}",
+                ))
             except Exception as e:
-                log_error("aggregator", f"Критическая ошибка при сохранении в apartments: {e}")
-        
-        # Сортируем по дате (новые первые) - у нас нет даты, сортируем по цене
-        unique_listings.sort(key=lambda x: x.price if x.price > 0 else 999999999)
-        
-        log_info("aggregator", f"Итого уникальных объявлений: {len(unique_listings)}")
-        
-        # КРИТИЧНО: явно возвращаем список
-        if not isinstance(unique_listings, list):
-            log_error("aggregator", f"ОШИБКА: _remove_duplicates вернул не список: {type(unique_listings)}")
-            return []
+                log_error("aggregator", f"Ошибка подготовки scraper '{source_name}'", e)
+                continue
+        return tasks
+    
+    async def _fetch_named(self, scraper, source_name: str, *args) -> tuple[str, Any]:
+        """Обертка для as_completed: возвращает (источник, результат или исключение)"""
+        try:
+            return source_name, await self._fetch_from_source(scraper, source_name, *args)
+        except Exception as e:
+            return source_name, e
+    
+    async def _persist_and_notify(self, source_name: str, batch: List[Listing]) -> None:
+        """
+        Сохраняет партию в apartments и ставит реально новые в очередь уведомлений
         
-        # Возвращаем unique_listings для обратной совместимости
-        # new_apartments доступны через атрибут или можно добавить отдельный метод
-        return unique_listings
+        КРИТИЧНО: Сохраняем объявления в таблицу apartments одной транзакцией.
+        Это гарантирует, что данные реально попадают в БД, а не только существуют в памяти.
+        Новые объявления попадают в notification_outbox в той же транзакции,
+        рассылкой занимаются воркеры outbox (bot/services/notification_outbox.py).
+        """
+        try:
+            from database_turso import sync_apartments_batch
+            
+            inserted_ids = await sync_apartments_batch(batch, enqueue_notifications=NOTIFY_OUTBOX_ENABLED)
+            if not inserted_ids:
+                log_info("aggregator", f"[AGGREGATOR] {source_name}: новых объявлений нет")
+                return
+            
+            if NOTIFY_OUTBOX_ENABLED:
+                from bot.services.notification_outbox import outbox_consumer
+                outbox_consumer.wake()
+                log_info("aggregator", f"[AGGREGATOR] {source_name}: в очередь уведомлений: {len(inserted_ids)}")
+                return
+            
+            # Очередь отключена: уведомляем в фоне, не блокируя парсинг остальных источников
+            from bot.services.notification_service import notify_users_about_new_apartments_summary
+            inserted = set(inserted_ids)
+            new_listings = [listing for listing in batch if str(listing.id) in inserted]
+            task = asyncio.create_task(notify_users_about_new_apartments_summary(new_listings))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+            
+            log_info("aggregator", f"[AGGREGATOR] {source_name}: отправлено в notify: {len(new_listings)}")
+        except ImportError as e:
+            log_error("aggregator", f"Не удалось импортировать sync_apartments_batch: {e}")
+        except Exception as e:
+            log_error("aggregator", f"Критическая ошибка при сохранении в apartments ({source_name}): {e}")
     
     async def _fetch_from_source(
         self,
@@ -241,6 +317,7 @@ class ListingsAggregator:
         max_rooms: int,
         min_price: int,
         max_price: int,
+        user_id: int | None = None,
     ) -> List[Listing]:
         """
         Получает объявления из одного источника
@@ -256,6 +333,7 @@ class ListingsAggregator:
             max_rooms: Максимальное количество комнат
             min_price: Минимальная цена
             max_price: Максимальная цена
+            user_id: ID пользователя (для логирования запросов Kufar)
         
         Returns:
             Список объявлений или пустой список при ошибке
@@ -382,16 +460,6 @@ async def apartment_dict_to_listing(apartment_dict: Dict[str, Any]) -> Optional[
             else:
                 price_formatted += f" (${price_usd:,})".replace(",", " ")
         
-        # Получаем photos (может быть список или JSON строка)
-        photos = apartment_dict.get("photos", [])
-        if isinstance(photos, str):
-            try:
-                photos = json.loads(photos) if photos else []
-            except:
-                photos = []
-        if not isinstance(photos, list):
-            photos = []
-        
         # Формируем title если его нет
         title = apartment_dict.get("title", "")
         if not title:
@@ -412,9 +480,7 @@ async def apartment_dict_to_listing(apartment_dict: Dict[str, Any]) -> Optional[
             area=apartment_dict.get("total_area", 0.0),
             address=apartment_dict.get("address", ""),
             url=apartment_dict.get("url", ""),
-            photos=photos,
             floor=apartment_dict.get("floor", ""),
-            description=apartment_dict.get("description", ""),
             currency=currency,
             price_usd=price_usd,
             price_byn=price_byn,
@@ -434,6 +500,13 @@ async def apartment_dict_to_listing(apartment_dict: Dict[str, Any]) -> Optional[
         if "raw_json" in apartment_dict:
             listing.raw_json = apartment_dict["raw_json"]
         
+        # description/photos (photos может быть списком или JSON строкой) раскрываются при обращении
+        listing.set_details_loader(row_details_loader(
+            apartment_dict.get("description", ""),
+            apartment_dict.get("photos", []),
+            raw_json=apartment_dict.get("raw_json"),
+        ))
+        
         # Добавляем city как атрибут если есть
         if "city" in apartment_dict:
             listing.city = apartment_dict["city"]
@@ -509,6 +582,7 @@ def _extract_city_from_listing(listing: Listing) -> str:
         return str(city).strip().lower()
     
     # Извлекаем из адреса
+    from database_turso import _extract_city_from_address
     return _extract_city_from_address(listing.address or "").lower()
 
 
@@ -568,6 +642,8 @@ def make_group_key(listing: Listing) -> tuple:
     Returns:
         Кортеж-ключ для группировки
     """
+    from utils.address_utils import split_address
+    from config import GROUP_BY_VENDOR_FOR_ADDRESS
     
     addr = split_address(listing.address or "")
     city = _extract_city_from_listing(listing)
@@ -609,6 +685,7 @@ def group_similar_listings(listings: List[Listing]) -> List[List[Listing]]:
     Returns:
         Список групп объявлений (каждая группа - список объявлений)
     """
+    from utils.geo import haversine_m
     
     # 1) Первичная группировка по ключу
     buckets = defaultdict(list)
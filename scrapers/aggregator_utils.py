@@ -9,6 +9,7 @@ import logging
 from typing import List, Optional
 
 from scrapers.base import Listing
+from utils.address_utils import split_address
 
 logger = logging.getLogger(__name__)
 
@@ -142,118 +143,119 @@ def build_listing_signature(listing: Listing) -> str:
     return hashlib.sha1(key.encode('utf-8')).hexdigest()
 
 
-def dedupe_by_signature(listings: List[Listing]) -> List[Listing]:
+def _extract_vendor(listing: Listing) -> Optional[str]:
+    """Извлекает agency/seller из raw_json объявления"""
+    try:
+        raw_json = getattr(listing, 'raw_json', None)
+        if raw_json:
+            if isinstance(raw_json, dict):
+                return raw_json.get('agency') or raw_json.get('seller')
+            elif isinstance(raw_json, str):
+                try:
+                    raw_data = json.loads(raw_json)
+                    return raw_data.get('agency') or raw_data.get('seller')
+                except:
+                    pass
+    except Exception:
+        pass
+    return None
+
+
+class SignatureIndex:
     """
-    Удаляет дубликаты объявлений по сигнатуре.
+    Инкрементальный индекс для дедупликации по сигнатуре
     
-    Два объявления считаются дубликатами если:
+    Позволяет дедуплицировать объявления партиями по мере их поступления
+    (например, по источникам в ListingsAggregator.iter_listings), сохраняя
+    правила dedupe_by_signature:
     1. signature совпадает ИЛИ
     2. совпадает vendor+house+abs(price diff) < 5% + abs(area diff) < 1.0
     
-    Args:
-        listings: Список объявлений для дедупликации
-        
-    Returns:
-        Список уникальных объявлений
+    Для проверки 2 объявления раскладываются по корзинам (vendor, house),
+    поэтому сравнение идет только с объявлениями того же дома и продавца.
     """
-    seen = {}
-    result = []
-    removed_count = 0
     
-    for l in listings:
-        sig = build_listing_signature(l)
+    def __init__(self):
+        self.seen = {}  # signature -> listing.id
+        self._by_vendor_house = {}  # (vendor_lower, house) -> [(price_usd, area, listing.id)]
+        self.removed_count = 0
+    
+    def __len__(self) -> int:
+        return len(self.seen)
+    
+    def add(self, listing: Listing) -> bool:
+        """
+        Добавляет объявление в индекс
+        
+        Returns:
+            True если объявление уникально (добавлено), False если это дубликат
+        """
+        sig = build_listing_signature(listing)
         
         # Проверка 1: точное совпадение signature
-        if sig in seen:
-            removed_count += 1
-            logger.debug(f"[dedupe] duplicate signature: {l.id} same_as {seen[sig]}")
-            continue
+        if sig in self.seen:
+            self.removed_count += 1
+            logger.debug(f"[dedupe] duplicate signature: {listing.id} same_as {self.seen[sig]}")
+            return False
         
-        # Проверка 2: дополнительная проверка по vendor+house+цена+площадь
-        is_duplicate = False
-        vendor = None
-        try:
-            raw_json = getattr(l, 'raw_json', None)
-            if raw_json:
-                if isinstance(raw_json, dict):
-                    vendor = raw_json.get('agency') or raw_json.get('seller')
-                elif isinstance(raw_json, str):
-                    try:
-                        raw_data = json.loads(raw_json)
-                        vendor = raw_data.get('agency') or raw_data.get('seller')
-                    except:
-                        pass
-        except Exception:
-            pass
+        vendor = _extract_vendor(listing)
         
         # Извлекаем номер дома из адреса
         house = None
         try:
-            addr = split_address(l.address or "")
+            addr = split_address(listing.address or "")
             house = addr.get("house")
         except:
             pass
         
-        # Если есть vendor и house, проверяем похожие объявления
-        if vendor and house:
-            price_usd = l.price_usd or 0
-            area = getattr(l, 'total_area', None) or getattr(l, 'area', None) or 0.0
-            
-            for existing_sig, existing_id in seen.items():
-                # Находим существующее объявление
-                existing_l = next((x for x in listings if x.id == existing_id), None)
-                if not existing_l:
+        price_usd = listing.price_usd or 0
+        area = getattr(listing, 'total_area', None) or getattr(listing, 'area', None) or 0.0
+        bucket_key = (vendor.lower(), house) if vendor and house else None
+        
+        # Проверка 2: дополнительная проверка по vendor+house+цена+площадь
+        if bucket_key is not None and price_usd > 0:
+            for existing_price, existing_area, existing_id in self._by_vendor_house.get(bucket_key, ()):
+                if existing_price <= 0:
                     continue
-                
-                existing_vendor = None
-                try:
-                    existing_raw_json = getattr(existing_l, 'raw_json', None)
-                    if existing_raw_json:
-                        if isinstance(existing_raw_json, dict):
-                            existing_vendor = existing_raw_json.get('agency') or existing_raw_json.get('seller')
-                        elif isinstance(existing_raw_json, str):
-                            try:
-                                existing_raw_data = json.loads(existing_raw_json)
-                                existing_vendor = existing_raw_data.get('agency') or existing_raw_data.get('seller')
-                            except:
-                                pass
-                except Exception:
-                    pass
-                
-                if existing_vendor and existing_vendor.lower() == vendor.lower():
-                    existing_house = None
-                    try:
-                        existing_addr = split_address(existing_l.address or "")
-                        existing_house = existing_addr.get("house")
-                    except:
-                        pass
-                    
-                    if existing_house and existing_house == house:
-                        existing_price = existing_l.price_usd or 0
-                        existing_area = getattr(existing_l, 'total_area', None) or getattr(existing_l, 'area', None) or 0.0
-                        
-                        # Проверяем разницу в цене (< 5%)
-                        if price_usd > 0 and existing_price > 0:
-                            price_diff_pct = abs(price_usd - existing_price) / max(price_usd, existing_price)
-                            if price_diff_pct < 0.05:  # 5%
-                                # Проверяем разницу в площади (< 1.0 м²)
-                                area_diff = abs(area - existing_area)
-                                if area_diff < 1.0:
-                                    is_duplicate = True
-                                    removed_count += 1
-                                    logger.info(
-                                        f"[dedupe] duplicate by vendor+house+price+area: {l.id} same_as {existing_id} "
-                                        f"(vendor={vendor}, house={house}, price_diff={price_diff_pct:.2%}, area_diff={area_diff:.1f})"
-                                    )
-                                    break
+                price_diff_pct = abs(price_usd - existing_price) / max(price_usd, existing_price)
+                if price_diff_pct < 0.05:  # 5%
+                    area_diff = abs(area - existing_area)
+                    if area_diff < 1.0:
+                        self.removed_count += 1
+                        logger.info(
+                            f"[dedupe] duplicate by vendor+house+price+area: {listing.id} same_as {existing_id} "
+                            f"(vendor={vendor}, house={house}, price_diff={price_diff_pct:.2%}, area_diff={area_diff:.1f})"
+                        )
+                        return False
         
-        if is_duplicate:
-            continue
+        self.seen[sig] = listing.id
+        if bucket_key is not None:
+            self._by_vendor_house.setdefault(bucket_key, []).append((price_usd, area, listing.id))
+        return True
+    
+    def filter_new(self, listings: List[Listing]) -> List[Listing]:
+        """Возвращает объявления партии, которых еще нет в индексе (и добавляет их)"""
+        return [l for l in listings if self.add(l)]
+
+
+def dedupe_by_signature(listings: List[Listing]) -> List[Listing]:
+    """
+    Удаляет дубликаты объявлений по сигнатуре.
+    
+    Два объявления считаются дубликатами если:
+    1. signature совпадает ИЛИ
+    2. совпадает vendor+house+abs(price diff) < 5% + abs(area diff) < 1.0
+    
+    Args:
+        listings: Список объявлений для дедупликации
         
-        seen[sig] = l.id
-        result.append(l)
+    Returns:
+        Список уникальных объявлений
+    """
+    index = SignatureIndex()
+    result = index.filter_new(listings)
     
-    if removed_count > 0:
-        logger.info(f"[dedupe] удалено {removed_count} дубликатов из {len(listings)} объявлений")
+    if index.removed_count > 0:
+        logger.info(f"[dedupe] удалено {index.removed_count} дубликатов из {len(listings)} объявлений")
     
     return result
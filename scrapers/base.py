@@ -2,9 +2,11 @@
 Базовый класс для всех парсеров недвижимости
 """
 import asyncio
+import json
+import sys
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable, Tuple
 import hashlib
 
 # Импортируем унифицированный HTTP-клиент
@@ -13,7 +15,18 @@ from scrapers.http_client import HTTPClient, get_http_client
 from scrapers.dto import ListingDTO
 
 
-@dataclass
+# Поля с небольшим набором значений (источник, валюта, тип дома и т.п.):
+# одинаковые строки повторяются в тысячах объявлений, поэтому интернируем их
+_INTERNED_FIELDS = (
+    "source", "currency", "balcony", "bathroom", "total_floors",
+    "house_type", "renovation_state", "city", "vendor",
+)
+
+# Маркер еще не загруженных description/photos
+_NOT_LOADED = object()
+
+
+@dataclass(slots=True)
 class Listing:
     """Объявление о продаже квартиры"""
     id: str
@@ -43,14 +56,65 @@ class Listing:
     renovation_state: str = ""  # Состояние ремонта
     kitchen_area: float = 0.0  # Площадь кухни в м²
     living_area: float = 0.0  # Жилая площадь в м²
+    # Служебные поля, которые заполняются после парсинга (aggregator, apartments)
+    raw_json: Optional[str] = field(default=None, repr=False, compare=False)
+    city: Optional[str] = field(default=None, repr=False, compare=False)
+    vendor: Optional[str] = field(default=None, repr=False, compare=False)
+    lat: Optional[float] = field(default=None, repr=False, compare=False)
+    lon: Optional[float] = field(default=None, repr=False, compare=False)
+    # Загрузчик description/photos (см. set_details_loader)
+    _details_loader: Optional[Callable[[], Tuple[str, List[str]]]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
     
     def __post_init__(self):
-        """Вычисляем цену за м² если не указана"""
+        """Вычисляем цену за м² если не указана, интернируем повторяющиеся строки"""
+        for name in _INTERNED_FIELDS:
+            value = getattr(self, name)
+            if type(value) is str:
+                setattr(self, name, sys.intern(value))
+        
         if self.price_per_sqm == 0 and self.price > 0 and self.area > 0:
             self.price_per_sqm = int(self.price / self.area)
             symbol = "$" if self.currency == "USD" else "BYN"
             self.price_per_sqm_formatted = f"{self.price_per_sqm:,} {symbol}/м²".replace(",", " ")
     
+    def set_details_loader(self, loader: Callable[[], Tuple[str, List[str]]]) -> None:
+        """
+        Откладывает загрузку description/photos до первого обращения
+        
+        Фильтрация, группировка и дедупликация не читают эти поля, поэтому
+        для объявлений из БД (или raw JSON) их можно не раскрывать заранее.
+        
+        Args:
+            loader: Функция без аргументов, возвращающая (description, photos)
+        """
+        self._details_loader = loader
+        _DESCRIPTION_SLOT.__set__(self, _NOT_LOADED)
+        _PHOTOS_SLOT.__set__(self, _NOT_LOADED)
+    
+    def __copy__(self) -> "Listing":
+        """Поверхностная копия без материализации description/photos"""
+        clone = object.__new__(Listing)
+        for name in Listing.__slots__:
+            if name == "description":
+                _DESCRIPTION_SLOT.__set__(clone, _DESCRIPTION_SLOT.__get__(self, Listing))
+            elif name == "photos":
+                _PHOTOS_SLOT.__set__(clone, _PHOTOS_SLOT.__get__(self, Listing))
+            else:
+                setattr(clone, name, getattr(self, name))
+        return clone
+    
+    def _load_details(self) -> None:
+        """Материализует description/photos через загрузчик"""
+        loader = self._details_loader
+        self._details_loader = None
+        description, photos = ("", []) if loader is None else loader()
+        if _DESCRIPTION_SLOT.__get__(self, Listing) is _NOT_LOADED:
+            _DESCRIPTION_SLOT.__set__(self, description or "")
+        if _PHOTOS_SLOT.__get__(self, Listing) is _NOT_LOADED:
+            _PHOTOS_SLOT.__set__(self, list(photos or []))
+    
     def to_dict(self) -> Dict[str, Any]:
         """Конвертация в словарь"""
         return {
@@ -89,6 +153,70 @@ class Listing:
         return hashlib.md5(data.encode()).hexdigest()[:16]
 
 
+def row_details_loader(
+    description: Optional[str],
+    photos: Any,
+    raw_json: Optional[str] = None,
+) -> Callable[[], Tuple[str, List[str]]]:
+    """
+    Загрузчик description/photos для строки БД (cached_listings, apartments)
+
+    photos может быть JSON строкой - декодируется только при обращении.
+    Если описания в строке нет, берется body_short/body из raw JSON Kufar.
+    """
+    def _load() -> Tuple[str, List[str]]:
+        text = description or ""
+        if not text and raw_json:
+            try:
+                raw = json.loads(raw_json) if isinstance(raw_json, str) else raw_json
+                text = (raw.get("body_short") or raw.get("body") or "").strip() if isinstance(raw, dict) else ""
+            except (ValueError, TypeError):
+                text = ""
+        
+        photos_list = photos
+        if isinstance(photos_list, str):
+            try:
+                photos_list = json.loads(photos_list) if photos_list else []
+            except ValueError:
+                photos_list = []
+        if not isinstance(photos_list, list):
+            photos_list = []
+        return text, photos_list
+    
+    return _load
+
+
+class _LazyDetailField:
+    """
+    Дескриптор поверх слота Listing: при первом чтении вызывает загрузчик
+
+    Хранение остается в слоте (без __dict__), запись работает как обычно.
+    """
+
+    __slots__ = ("_slot",)
+
+    def __init__(self, slot):
+        self._slot = slot
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = self._slot.__get__(obj, objtype)
+        if value is _NOT_LOADED:
+            obj._load_details()
+            value = self._slot.__get__(obj, objtype)
+        return value
+
+    def __set__(self, obj, value):
+        self._slot.__set__(obj, value)
+
+
+_DESCRIPTION_SLOT = Listing.description
+_PHOTOS_SLOT = Listing.photos
+Listing.description = _LazyDetailField(_DESCRIPTION_SLOT)
+Listing.photos = _LazyDetailField(_PHOTOS_SLOT)
+
+
 class BaseScraper(ABC):
     """Базовый класс парсера"""
     
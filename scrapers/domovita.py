@@ -3,8 +3,9 @@
 """
 import re
 from typing import List, Optional
-from bs4 import BeautifulSoup
 from scrapers.base import BaseScraper, Listing
+from scrapers.extraction import CardRule, CardSpec
+from utils.parse_pool import parse_listings
 
 
 class DomovitaScraper(BaseScraper):
@@ -13,6 +14,16 @@ class DomovitaScraper(BaseScraper):
     SOURCE_NAME = "domovita"
     BASE_URL = "https://domovita.by"
     
+    # Карточки объявлений: первое правило, давшее результат; не больше 20
+    CARD_SPEC = CardSpec(
+        (
+            CardRule("div", "class", r"object-card|listing-card|item"),
+            CardRule("article"),
+            CardRule("a", "href", r"/prodazha/kvartiry/"),
+        ),
+        limit=20,
+    )
+    
     async def fetch_listings(
         self,
         city: str = "барановичи",
@@ -43,7 +54,7 @@ class DomovitaScraper(BaseScraper):
         if not html:
             return []
         
-        return self._parse_html(html, min_rooms, max_rooms, min_price, max_price)
+        return await parse_listings(self, html, min_rooms, max_rooms, min_price, max_price)
     
     def _parse_html(
         self, 
@@ -54,17 +65,10 @@ class DomovitaScraper(BaseScraper):
         max_price: int
     ) -> List[Listing]:
         """Парсит HTML страницу"""
-        soup = BeautifulSoup(html, 'lxml')
         listings = []
         
-        # Ищем карточки объявлений
-        cards = soup.find_all('div', class_=re.compile(r'object-card|listing-card|item'))
-        if not cards:
-            cards = soup.find_all('article')
-        if not cards:
-            cards = soup.find_all('a', href=re.compile(r'/prodazha/kvartiry/'))
-        
-        for card in cards[:20]:  # Ограничиваем количество
+        # Разбираем только карточки объявлений (XPath lxml)
+        for card in self.CARD_SPEC.select(html):
             listing = self._parse_card(card)
             if listing and self._matches_filters(listing, min_rooms, max_rooms, min_price, max_price):
                 listings.append(listing)
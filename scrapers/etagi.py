@@ -9,12 +9,13 @@ import re
 import sys
 import os
 from typing import List, Optional
-from bs4 import BeautifulSoup
 
 # Добавляем родительскую директорию в path для импорта
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from scrapers.base import BaseScraper, Listing
+from scrapers.extraction import LinkContainerSpec
+from utils.parse_pool import parse_listings
 
 # Импортируем error_logger если доступен
 try:
@@ -34,6 +35,9 @@ class EtagiScraper(BaseScraper):
     SOURCE_NAME = "etagi"
     BASE_URL = "https://baranovichi.etagi.com"  # По умолчанию для Барановичей
     
+    # Ссылки на объявления /realty/XXXXXXXX/ и ближайший контейнер с данными
+    LINK_SPEC = LinkContainerSpec(r"/realty/\d+/", ("div", "article", "li", "generic"))
+    
     def _get_city_url(self, city: str) -> str:
         """Преобразует название города в URL для Etagi"""
         city_lower = city.lower().strip()
@@ -79,7 +83,7 @@ class EtagiScraper(BaseScraper):
             return []
         
         log_info("etagi", f"Загружена страница для города {city}: {url}")
-        return self._parse_html(html, min_rooms, max_rooms, min_price, max_price, base_url, city)
+        return await parse_listings(self, html, min_rooms, max_rooms, min_price, max_price, base_url, city)
     
     def _parse_html(
         self, 
@@ -92,14 +96,11 @@ class EtagiScraper(BaseScraper):
         city: str = "Минск"
     ) -> List[Listing]:
         """Парсит HTML страницу"""
-        soup = BeautifulSoup(html, 'lxml')
         listings = []
         seen_ids = set()
         
-        # Ищем все ссылки на объявления формата /realty/XXXXXXXX/
-        for link in soup.find_all('a', href=re.compile(r'/realty/\d+/')):
-            href = link.get('href', '')
-            
+        # Все ссылки на объявления формата /realty/XXXXXXXX/ и текст их контейнеров (XPath)
+        for href, container_text in self.LINK_SPEC.select(html):
             # Извлекаем ID объявления
             id_match = re.search(r'/realty/(\d+)/', href)
             if not id_match:
@@ -121,13 +122,12 @@ class EtagiScraper(BaseScraper):
                 url_base = base_url if base_url else self.BASE_URL
                 full_url = f"{url_base}{href}"
             
-            # Ищем родительский контейнер с данными объявления
-            container = link.find_parent(['div', 'article', 'li', 'generic'])
-            if not container:
+            # Родительский контейнер с данными объявления
+            if container_text is None:
                 continue
             
-            # Парсим данные из контейнера
-            listing = self._parse_listing_from_container(container, listing_id, full_url, city)
+            # Парсим данные из текста контейнера
+            listing = self._parse_listing_from_text(container_text, listing_id, full_url, city)
             if listing:
                 if self._matches_filters(listing, min_rooms, max_rooms, min_price, max_price):
                     listings.append(listing)
@@ -136,10 +136,12 @@ class EtagiScraper(BaseScraper):
         return listings
     
     def _parse_listing_from_container(self, container, listing_id: str, url: str, city: str = "Минск") -> Optional[Listing]:
-        """Парсит объявление из контейнера"""
+        """Парсит объявление из контейнера (Tag BeautifulSoup)"""
+        return self._parse_listing_from_text(container.get_text(separator=' ', strip=True), listing_id, url, city)
+    
+    def _parse_listing_from_text(self, text: str, listing_id: str, url: str, city: str = "Минск") -> Optional[Listing]:
+        """Парсит объявление из текста контейнера"""
         try:
-            text = container.get_text(separator=' ', strip=True)
-            
             # Комнаты - ищем "X-комн. кв." или "X-комнатная"
             rooms = 0
             rooms_match = re.search(r'(\d+)\s*-?\s*комн', text, re.I)
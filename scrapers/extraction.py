@@ -0,0 +1,162 @@
+"""
+Декларативные правила извлечения карточек объявлений из HTML
+
+Раньше каждый HTML-парсер строил полное дерево BeautifulSoup страницы и
+искал в нем карточки через find_all(..., class_=re.compile(...)). Полное
+дерево - самая дорогая часть разбора, а карточки занимают малую часть
+страницы (шапка, меню, скрипты, JSON состояния, футер не нужны).
+
+Правила описываются один раз на источник и компилируются один раз в XPath
+lxml. Страница разбирается lxml (C), карточки находятся XPath, и только
+они превращаются в Tag BeautifulSoup - разбор карточки (_parse_card) не
+меняется.
+
+- CardSpec: карточки по тегу и regex атрибута (первое непустое правило)
+- LinkContainerSpec: ссылки на объявления и ближайший контейнер-предок
+  (Etagi); из контейнера нужен только текст
+
+Использование:
+    CARD_SPEC = CardSpec((CardRule("div", "class", r"listing-item|card"),), limit=20)
+    for card in CARD_SPEC.select(html):
+        ...
+"""
+from dataclasses import dataclass
+from functools import cached_property
+from typing import List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+# Пространство имен EXSLT regex (re:test в XPath использует модуль re Python)
+_XPATH_NS = {"re": "http://exslt.org/regular-expressions"}
+
+# Строки внутри этих тегов BeautifulSoup не включает в get_text()
+_NON_TEXT_TAGS = frozenset({"script", "style", "template"})
+
+
+def _parse_tree(html: str):
+    """Дерево lxml страницы (None для пустого документа)"""
+    return etree.HTML(html.encode("utf-8"), etree.HTMLParser(encoding="utf-8"))
+
+
+def _to_soup(element):
+    """Поддерево lxml -> Tag BeautifulSoup с тем же содержимым"""
+    fragment = etree.tostring(element, encoding="unicode", method="html", with_tail=False)
+    return BeautifulSoup(fragment, "lxml").find(element.tag)
+
+
+@dataclass(frozen=True)
+class CardRule:
+    """
+    Правило поиска карточек, эквивалент soup.find_all(tag, attrs={attr: re.compile(pattern)})
+
+    Args:
+        tag: Имя тега
+        attr: Атрибут для regex (None - любой такой тег)
+        pattern: Регулярное выражение (re.search) по значению атрибута
+    """
+    tag: str
+    attr: Optional[str] = None
+    pattern: Optional[str] = None
+
+    @cached_property
+    def xpath(self) -> etree.XPath:
+        # re:test ищет по всей строке атрибута ("a b"), что для class без пробелов
+        # в шаблоне совпадает с поиском BeautifulSoup по отдельным классам
+        if self.attr is None:
+            return etree.XPath(f"//{self.tag}")
+        return etree.XPath(f"//{self.tag}[re:test(@{self.attr}, $pattern)]", namespaces=_XPATH_NS)
+
+    def find_all(self, root) -> list:
+        """Элементы lxml, подходящие под правило, в порядке документа"""
+        if self.attr is None:
+            return self.xpath(root)
+        return self.xpath(root, pattern=self.pattern)
+
+
+@dataclass(frozen=True)
+class CardSpec:
+    """
+    Карточки объявлений источника
+
+    Args:
+        rules: Правила по порядку; берется первое, давшее карточки
+        limit: Сколько карточек разбирать (None - все)
+    """
+    rules: Tuple[CardRule, ...]
+    limit: Optional[int] = None
+
+    def select(self, html: str) -> list:
+        """Карточки страницы (Tag BeautifulSoup) без построения полного дерева soup"""
+        root = _parse_tree(html)
+        if root is None:
+            return []
+        cards: list = []
+        for rule in self.rules:
+            cards = rule.find_all(root)
+            if cards:
+                break
+        if self.limit is not None:
+            cards = cards[:self.limit]
+        return [_to_soup(card) for card in cards]
+
+
+def element_text(element) -> str:
+    """
+    Текст элемента lxml как Tag.get_text(separator=' ', strip=True)
+
+    Без комментариев и содержимого script/style/template, но с текстом
+    после них (tail).
+    """
+    parts: List[str] = []
+
+    def _walk(node) -> None:
+        if isinstance(node.tag, str) and node.tag not in _NON_TEXT_TAGS and node.text:
+            parts.append(node.text)
+        for child in node:
+            _walk(child)
+            if child.tail:
+                parts.append(child.tail)
+
+    _walk(element)
+    return " ".join(stripped for stripped in (part.strip() for part in parts) if stripped)
+
+
+@dataclass(frozen=True)
+class LinkContainerSpec:
+    """
+    Ссылки на объявления и их ближайший контейнер
+
+    Эквивалент soup.find_all('a', href=re.compile(href_pattern)) и
+    link.find_parent(container_tags) на полном дереве, но через XPath lxml
+    без построения дерева BeautifulSoup.
+
+    Args:
+        href_pattern: Регулярное выражение (re.search) по href ссылки
+        container_tags: Теги контейнера (ближайший предок с таким тегом)
+    """
+    href_pattern: str
+    container_tags: Tuple[str, ...]
+
+    @cached_property
+    def _links(self) -> etree.XPath:
+        return etree.XPath("//a[re:test(@href, $pattern)]", namespaces=_XPATH_NS)
+
+    @cached_property
+    def _container(self) -> etree.XPath:
+        condition = " or ".join(f"self::{tag}" for tag in self.container_tags)
+        return etree.XPath(f"ancestor::*[{condition}][1]")
+
+    def select(self, html: str) -> List[Tuple[str, Optional[str]]]:
+        """
+        Returns:
+            Список (href, текст контейнера или None) в порядке документа
+        """
+        root = _parse_tree(html)
+        if root is None:
+            return []
+        result = []
+        for link in self._links(root, pattern=self.href_pattern):
+            containers = self._container(link)
+            result.append((link.get("href", ""), element_text(containers[0]) if containers else None))
+        return result
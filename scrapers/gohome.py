@@ -3,8 +3,9 @@
 """
 import re
 from typing import List, Optional
-from bs4 import BeautifulSoup
 from scrapers.base import BaseScraper, Listing
+from scrapers.extraction import CardRule, CardSpec
+from utils.parse_pool import parse_listings
 
 
 class GoHomeScraper(BaseScraper):
@@ -13,6 +14,16 @@ class GoHomeScraper(BaseScraper):
     SOURCE_NAME = "gohome"
     BASE_URL = "https://gohome.by"
     
+    # Карточки объявлений: первое правило, давшее результат; не больше 30
+    CARD_SPEC = CardSpec(
+        (
+            CardRule("div", "class", r"object|listing|card|item"),
+            CardRule("article"),
+            CardRule("a", "href", r"/sale/flat/\d+"),
+        ),
+        limit=30,
+    )
+    
     async def fetch_listings(
         self,
         city: str = "барановичи",
@@ -49,7 +60,7 @@ class GoHomeScraper(BaseScraper):
         if not html:
             return []
         
-        return self._parse_html(html, min_rooms, max_rooms, min_price, max_price)
+        return await parse_listings(self, html, min_rooms, max_rooms, min_price, max_price)
     
     def _parse_html(
         self, 
@@ -60,19 +71,11 @@ class GoHomeScraper(BaseScraper):
         max_price: int
     ) -> List[Listing]:
         """Парсит HTML страницу"""
-        soup = BeautifulSoup(html, 'lxml')
         listings = []
         
-        # Ищем карточки объявлений
-        cards = soup.find_all('div', class_=re.compile(r'object|listing|card|item'))
-        if not cards:
-            cards = soup.find_all('article')
-        if not cards:
-            # Ищем ссылки на объявления
-            cards = soup.find_all('a', href=re.compile(r'/sale/flat/\d+'))
-        
+        # Разбираем только карточки объявлений (XPath lxml)
         seen_urls = set()
-        for card in cards[:30]:
+        for card in self.CARD_SPEC.select(html):
             listing = self._parse_card(card)
             if listing and listing.url not in seen_urls:
                 if self._matches_filters(listing, min_rooms, max_rooms, min_price, max_price):
@@ -0,0 +1,282 @@
+"""
+Запись и воспроизведение HTTP-ответов парсеров (кассеты)
+
+Особенности:
+- record: HTTPClient работает через сеть, каждый прочитанный ответ
+  сохраняется в кассету (один файл .json.gz на запрос)
+- replay: сеть не используется, ответы берутся из кассет; можно задать
+  задержку, случайный разброс и долю запросов с ошибкой соединения
+- Ключ кассеты - URL с отсортированными параметрами запроса (заголовки не
+  учитываются)
+- Подменяется только сессия HTTPClient, поэтому retry/backoff и обработка
+  ошибок в replay работают так же, как с сетью
+- Запрос без кассеты в replay получает HTTP 404
+
+Использование:
+    HTTP_CASSETTE_MODE=record python main.py      # записать
+    HTTP_CASSETTE_MODE=replay python main.py      # воспроизвести без сети
+
+    configure_cassette("replay", Cassette("data/cassettes", latency_ms=200, error_rate=0.05))
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import random
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+
+import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+try:
+    from config import (
+        HTTP_CASSETTE_MODE,
+        HTTP_CASSETTE_DIR,
+        HTTP_REPLAY_LATENCY_MS,
+        HTTP_REPLAY_JITTER_MS,
+        HTTP_REPLAY_ERROR_RATE,
+    )
+except ImportError:
+    HTTP_CASSETTE_MODE = "off"
+    HTTP_CASSETTE_DIR = "data/cassettes"
+    HTTP_REPLAY_LATENCY_MS = 0.0
+    HTTP_REPLAY_JITTER_MS = 0.0
+    HTTP_REPLAY_ERROR_RATE = 0.0
+
+MODES = ("off", "record", "replay")
+
+
+class Cassette:
+    """Каталог записанных ответов и параметры воспроизведения"""
+
+    def __init__(
+        self,
+        directory: str,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            directory: Каталог с файлами кассет
+            latency_ms: Задержка каждого ответа в replay
+            jitter_ms: Случайная добавка к задержке (0..jitter_ms)
+            error_rate: Доля запросов, завершающихся ошибкой соединения в replay
+            seed: Seed генератора задержек и ошибок (воспроизводимые прогоны)
+        """
+        self.directory = Path(directory)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._entries: Dict[str, Optional[Dict[str, Any]]] = {}
+        self.stats = {"recorded": 0, "hits": 0, "misses": 0, "injected_errors": 0}
+        # Ключи запросов без записи (что нужно записать или синтезировать)
+        self.missed: Set[str] = set()
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """URL запроса с параметрами в каноническом порядке"""
+        request_url = URL(url)
+        if params:
+            request_url = request_url.update_query({k: str(v) for k, v in params.items()})
+        return str(request_url.with_query(sorted(request_url.query.items())))
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]}.json.gz"
+
+    def load(self, url: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Запись для запроса или None"""
+        key = self.key(url, params)
+        if key not in self._entries:
+            path = self.path(key)
+            entry = None
+            if path.exists():
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    entry = json.load(f)
+            self._entries[key] = entry
+        entry = self._entries[key]
+        self.stats["hits" if entry is not None else "misses"] += 1
+        if entry is None:
+            self.missed.add(key)
+        return entry
+
+    def save(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]],
+        status: int,
+        body: str,
+        content_type: str = "",
+    ) -> None:
+        """Сохраняет ответ (атомарно: запись во временный файл и rename)"""
+        key = self.key(url, params)
+        entry = {"url": key, "status": status, "content_type": content_type, "body": body}
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._entries[key] = entry
+        self.missed.discard(key)
+        self.stats["recorded"] += 1
+
+    async def delay(self) -> None:
+        """Задержка ответа в replay"""
+        seconds = (self.latency_ms + self._random.uniform(0, self.jitter_ms)) / 1000
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def should_fail(self) -> bool:
+        """Нужно ли завершить очередной запрос ошибкой соединения"""
+        if self.error_rate > 0 and self._random.random() < self.error_rate:
+            self.stats["injected_errors"] += 1
+            return True
+        return False
+
+
+class _ReplayResponse:
+    """Ответ из кассеты с интерфейсом aiohttp.ClientResponse, который использует HTTPClient"""
+
+    def __init__(self, url: str, entry: Optional[Dict[str, Any]]):
+        self.url = URL(url)
+        self.status = entry["status"] if entry else 404
+        self.content_type = entry.get("content_type", "") if entry else ""
+        self.headers = CIMultiDictProxy(CIMultiDict({"Content-Type": self.content_type} if self.content_type else {}))
+        self._body = entry["body"] if entry else ""
+
+    async def text(self) -> str:
+        return self._body
+
+    async def json(self) -> Any:
+        return json.loads(self._body)
+
+    def raise_for_status(self) -> None:
+        if self.status >= 400:
+            request_info = aiohttp.RequestInfo(self.url, "GET", CIMultiDictProxy(CIMultiDict()), self.url)
+            raise aiohttp.ClientResponseError(
+                request_info, (), status=self.status, message="cassette" if self.status == 404 else ""
+            )
+
+
+class _ReplayRequest:
+    def __init__(self, cassette: Cassette, url: str, params: Optional[Dict[str, Any]]):
+        self._cassette = cassette
+        self._url = url
+        self._params = params
+
+    async def __aenter__(self) -> _ReplayResponse:
+        await self._cassette.delay()
+        if self._cassette.should_fail():
+            raise aiohttp.ClientConnectionError(f"Injected connection error: {self._url}")
+        return _ReplayResponse(self._url, self._cassette.load(self._url, self._params))
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+class ReplaySession:
+    """Замена aiohttp.ClientSession: ответы только из кассет"""
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+        self.closed = False
+
+    def get(self, url: str, headers=None, params=None, **kwargs) -> _ReplayRequest:
+        return _ReplayRequest(self.cassette, url, params)
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class _RecordingResponse:
+    """Обертка ответа aiohttp: прочитанное тело сохраняется в кассету"""
+
+    def __init__(self, response: aiohttp.ClientResponse, cassette: Cassette, url: str, params):
+        self._response = response
+        self._cassette = cassette
+        self._url = url
+        self._params = params
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    async def text(self) -> str:
+        body = await self._response.text()
+        self._cassette.save(self._url, self._params, self._response.status, body, self._response.content_type)
+        return body
+
+    async def json(self) -> Any:
+        return json.loads(await self.text())
+
+
+class _RecordingRequest:
+    def __init__(self, request, cassette: Cassette, url: str, params):
+        self._request = request
+        self._cassette = cassette
+        self._url = url
+        self._params = params
+
+    async def __aenter__(self) -> _RecordingResponse:
+        response = await self._request.__aenter__()
+        return _RecordingResponse(response, self._cassette, self._url, self._params)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return await self._request.__aexit__(exc_type, exc_val, exc_tb)
+
+
+class RecordingSession:
+    """Обертка aiohttp.ClientSession: запросы идут в сеть, ответы пишутся в кассеты"""
+
+    def __init__(self, session: aiohttp.ClientSession, cassette: Cassette):
+        self._session = session
+        self.cassette = cassette
+
+    @property
+    def closed(self) -> bool:
+        return self._session.closed
+
+    def get(self, url: str, headers=None, params=None, **kwargs) -> _RecordingRequest:
+        return _RecordingRequest(
+            self._session.get(url, headers=headers, params=params, **kwargs), self.cassette, url, params
+        )
+
+    async def close(self) -> None:
+        await self._session.close()
+
+
+# Режим процесса: задается из конфигурации или configure_cassette()
+_mode: Optional[str] = None
+_cassette: Optional[Cassette] = None
+
+
+def configure_cassette(mode: str, cassette: Optional[Cassette] = None) -> None:
+    """
+    Устанавливает режим для новых сессий HTTPClient
+
+    Args:
+        mode: off, record или replay
+        cassette: Кассета (по умолчанию - из HTTP_CASSETTE_DIR и HTTP_REPLAY_*)
+    """
+    global _mode, _cassette
+    if mode not in MODES:
+        raise ValueError(f"Неизвестный режим кассет: {mode}")
+    _mode = mode
+    _cassette = None if mode == "off" else cassette or Cassette(
+        HTTP_CASSETTE_DIR,
+        latency_ms=HTTP_REPLAY_LATENCY_MS,
+        jitter_ms=HTTP_REPLAY_JITTER_MS,
+        error_rate=HTTP_REPLAY_ERROR_RATE,
+    )
+
+
+def get_cassette() -> Tuple[str, Optional[Cassette]]:
+    """Текущий режим и кассета (при первом вызове - из конфигурации)"""
+    if _mode is None:
+        configure_cassette(HTTP_CASSETTE_MODE if HTTP_CASSETTE_MODE in MODES else "off")
+    return _mode, _cassette
@@ -6,12 +6,15 @@
 - Retry механизм (3 попытки)
 - Общий User-Agent из конфигурации
 - Централизованная обработка ошибок
+- Запись/воспроизведение ответов (HTTP_CASSETTE_MODE, scrapers/http_cassette.py)
 """
 import asyncio
 import aiohttp
 from typing import Optional, Dict, Any
 from functools import wraps
 
+from scrapers.http_cassette import RecordingSession, ReplaySession, get_cassette
+
 # Импортируем конфигурацию
 try:
     from config import USER_AGENT
@@ -45,6 +48,7 @@ class HTTPClient:
     - Retry механизм (3 попытки по умолчанию)
     - Общий User-Agent
     - Централизованная обработка ошибок
+    - В режиме record/replay сессия заменяется на RecordingSession/ReplaySession
     """
     
     def __init__(
@@ -97,10 +101,16 @@ class HTTPClient:
                     await self.session.close()
                 except Exception:
                     pass  # Игнорируем ошибки при закрытии
+            mode, cassette = get_cassette()
+            if mode == "replay":
+                self.session = ReplaySession(cassette)
+                return
             self.session = aiohttp.ClientSession(
                 headers=self.base_headers,
                 timeout=self.timeout
             )
+            if mode == "record":
+                self.session = RecordingSession(self.session, cassette)
     
     async def close_session(self):
         """Закрывает HTTP сессию"""
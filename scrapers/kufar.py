@@ -17,6 +17,7 @@ import os
 import time
 import asyncio
 import aiohttp
+from collections import OrderedDict
 from typing import List, Optional, Dict, Any
 
 # Добавляем родительскую директорию в path для импорта
@@ -32,13 +33,103 @@ except ImportError:
         print(f"[ERROR] [{source}] {message}: {exception}")
     def log_warning(source, message):
         print(f"[WARN] [{source}] {message}")
-    def log_info(source, message):
-        print(f"[INFO] [{source}] {message}")
+    def log_info(source, message, *args):
+        print(f"[INFO] [{source}] {message % args if args else message}")
 
 # Конфигурационные константы для оптимизации парсинга
 MAX_PAGES_PER_RUN = 2  # Жёсткий предохранитель - максимум страниц за один запуск
 STOP_ON_OLD_THRESHOLD = 5  # Сколько подряд старых объявлений считаем сигналом остановки
 
+# Кэш разбора описаний: (ad_id, хеш описания) -> результат _scan_description (LRU)
+DESCRIPTION_CACHE_MAX_SIZE = 5000
+_description_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+# Поля из ключевых слов описания: (поле, значение, слова, нужно одно из слов контекста).
+# Правила одного поля проверяются по порядку, побеждает первое сработавшее
+_KEYWORD_RULES = (
+    ("balcony", "Есть", ("балкон", "лоджия", "с балконом", "есть балкон", "балкон есть"), ()),
+    ("balcony", "Нет", ("без балкона", "нет балкона", "балкон отсутствует"), ()),
+    ("bathroom", "Раздельный", ("раздельный",), ("санузел", "туалет")),
+    ("bathroom", "Совмещенный", ("совмещенный",), ("санузел", "туалет")),
+    ("house_type", "Кирпичный", ("кирпичный",), ()),
+    ("house_type", "Панельный", ("панельный",), ()),
+    ("house_type", "Монолитный", ("монолитный",), ()),
+    ("house_type", "Блочный", ("блочный",), ()),
+    ("house_type", "Деревянный", ("деревянный",), ()),
+    ("renovation_state", "отличное", (
+        "евроремонт", "евро ремонт", "капитальный ремонт", "новый ремонт", "свежий ремонт", "современный ремонт",
+    ), ()),
+    ("renovation_state", "хорошее", ("хороший ремонт", "качественный ремонт", "хорошее состояние"), ()),
+    ("renovation_state", "требует ремонта", (
+        "требует ремонта", "нужен ремонт", "под ремонт", "требует косметического ремонта", "нужен косметический ремонт",
+    ), ()),
+    ("renovation_state", "плохое", ("без ремонта", "старый ремонт", "советский ремонт", "плохое состояние"), ()),
+)
+
+# Числовые поля: (поле, слова-якоря, шаблоны по приоритету, тип). Шаблоны
+# проверяются только если в описании есть хотя бы одно слово-якорь
+_NUMERIC_RULES = (
+    ("kitchen_area", ("кухня",), (
+        re.compile(r'кухня\s+(\d+[.,]?\d*)\s*м[²2]'),
+        re.compile(r'кухня\s+(\d+[.,]?\d*)'),
+    ), float),
+    ("living_area", ("жилая",), (
+        re.compile(r'жилая\s+площадь\s+(\d+[.,]?\d*)\s*м[²2]'),
+        re.compile(r'жилая\s+(\d+[.,]?\d*)\s*м[²2]'),
+    ), float),
+    ("total_floors", ("этаж", "эт."), (
+        re.compile(r'(\d+)\s*этажн'),
+        re.compile(r'(\d+)\s*эт\.\s*дом'),
+        re.compile(r'дом\s+(\d+)\s*этаж'),
+        re.compile(r'(\d+)\s*этаж'),
+    ), int),
+)
+
+# Допустимые значения числовых полей: (min, max, не больше общей площади)
+_NUMERIC_LIMITS = {
+    "kitchen_area": (3, 30, True),
+    "living_area": (10, 200, True),
+    "total_floors": (1, 30, False),
+}
+
+# Все слова, которые нужно найти в описании (один проход по списку)
+_DESCRIPTION_WORDS = tuple(dict.fromkeys(
+    [word for _, _, words, context in _KEYWORD_RULES for word in words + context]
+    + [word for _, anchors, _, _ in _NUMERIC_RULES for word in anchors]
+))
+
+
+def _scan_description(desc_lower: str) -> tuple:
+    """
+    Разбор описания в нижнем регистре без учета общей площади
+
+    Returns:
+        (поля из ключевых слов, числа до проверки пределов)
+    """
+    found = {word for word in _DESCRIPTION_WORDS if word in desc_lower}
+    if not found:
+        return {}, {}
+
+    keywords: Dict[str, str] = {}
+    for field, value, words, context in _KEYWORD_RULES:
+        if field in keywords or found.isdisjoint(words):
+            continue
+        if context and found.isdisjoint(context):
+            continue
+        keywords[field] = value
+
+    numbers: Dict[str, Any] = {}
+    for field, anchors, patterns, cast in _NUMERIC_RULES:
+        if found.isdisjoint(anchors):
+            continue
+        for pattern in patterns:
+            match = pattern.search(desc_lower)
+            if match:
+                numbers[field] = cast(match.group(1).replace(",", "."))
+                break
+    return keywords, numbers
+
+
 # Kufar suggestion API endpoints (пробуем оба)
 KUFAR_SUGGEST_URLS = [
     "https://api.kufar.by/search-api/v1/autocomplete/location",
@@ -602,7 +693,8 @@ class KufarScraper(BaseScraper):
                 else:
                     # Логируем первые 3 отфильтрованных объявления для диагностики
                     if logged_samples < 3:
-                        log_info("kufar", f"Отфильтровано: {listing.rooms}к, ${listing.price} (фильтр: {min_rooms}-{max_rooms}к, ${min_price}-${max_price})")
+                        log_info("kufar", "Отфильтровано: %sк, $%s (фильтр: %s-%sк, $%s-$%s)",
+                                 listing.rooms, listing.price, min_rooms, max_rooms, min_price, max_price)
                         logged_samples += 1
                     
                     # Считаем причины отсева
@@ -633,90 +725,36 @@ class KufarScraper(BaseScraper):
         )
         return listings
     
-    def _extract_fields_from_description(self, description: str, area: float = 0.0) -> dict:
-        """Извлекает поля из описания объявления"""
+    def _extract_fields_from_description(
+        self, description: str, area: float = 0.0, ad_id: Optional[str] = None
+    ) -> dict:
+        """
+        Извлекает поля из описания объявления
+
+        Разбор текста (_scan_description) кэшируется по (ad_id, хеш описания):
+        повторно встреченное объявление не разбирается заново. Проверка
+        чисел по общей площади выполняется при каждом вызове.
+        """
         if not description:
             return {}
-        
-        desc_lower = description.lower()
-        extracted = {}
-        
-        # Балкон/лоджия
-        if any(word in desc_lower for word in ["балкон", "лоджия", "с балконом", "есть балкон", "балкон есть"]):
-            extracted["balcony"] = "Есть"
-        elif any(phrase in desc_lower for phrase in ["без балкона", "нет балкона", "балкон отсутствует"]):
-            extracted["balcony"] = "Нет"
-        
-        # Тип санузла
-        if "раздельный" in desc_lower and ("санузел" in desc_lower or "туалет" in desc_lower):
-            extracted["bathroom"] = "Раздельный"
-        elif "совмещенный" in desc_lower and ("санузел" in desc_lower or "туалет" in desc_lower):
-            extracted["bathroom"] = "Совмещенный"
-        
-        # Тип дома
-        if "кирпичный" in desc_lower:
-            extracted["house_type"] = "Кирпичный"
-        elif "панельный" in desc_lower:
-            extracted["house_type"] = "Панельный"
-        elif "монолитный" in desc_lower:
-            extracted["house_type"] = "Монолитный"
-        elif "блочный" in desc_lower:
-            extracted["house_type"] = "Блочный"
-        elif "деревянный" in desc_lower:
-            extracted["house_type"] = "Деревянный"
-        
-        # Состояние ремонта
-        if any(word in desc_lower for word in ["евроремонт", "евро ремонт", "капитальный ремонт", "новый ремонт", "свежий ремонт", "современный ремонт"]):
-            extracted["renovation_state"] = "отличное"
-        elif any(word in desc_lower for word in ["хороший ремонт", "качественный ремонт", "хорошее состояние"]):
-            extracted["renovation_state"] = "хорошее"
-        elif any(word in desc_lower for word in ["требует ремонта", "нужен ремонт", "под ремонт", "требует косметического ремонта", "нужен косметический ремонт"]):
-            extracted["renovation_state"] = "требует ремонта"
-        elif any(word in desc_lower for word in ["без ремонта", "старый ремонт", "советский ремонт", "плохое состояние"]):
-            extracted["renovation_state"] = "плохое"
-        
-        # Площадь кухни
-        kitchen_match = re.search(r'кухня\s+(\d+[.,]?\d*)\s*м[²2]', desc_lower)
-        if not kitchen_match:
-            kitchen_match = re.search(r'кухня\s+(\d+[.,]?\d*)', desc_lower)
-        if kitchen_match:
-            try:
-                kitchen_area = float(kitchen_match.group(1).replace(",", "."))
-                # Проверяем разумность: кухня не может быть больше общей площади или меньше 3м²
-                if 3 <= kitchen_area <= 30 and (area == 0 or kitchen_area <= area):
-                    extracted["kitchen_area"] = kitchen_area
-            except:
-                pass
-        
-        # Жилая площадь
-        living_match = re.search(r'жилая\s+площадь\s+(\d+[.,]?\d*)\s*м[²2]', desc_lower)
-        if not living_match:
-            living_match = re.search(r'жилая\s+(\d+[.,]?\d*)\s*м[²2]', desc_lower)
-        if living_match:
-            try:
-                living_area = float(living_match.group(1).replace(",", "."))
-                # Проверяем разумность: жилая площадь не может быть больше общей площади
-                if 10 <= living_area <= 200 and (area == 0 or living_area <= area):
-                    extracted["living_area"] = living_area
-            except:
-                pass
-        
-        # Этажность дома
-        floors_match = re.search(r'(\d+)\s*этажн', desc_lower)
-        if not floors_match:
-            floors_match = re.search(r'(\d+)\s*эт\.\s*дом', desc_lower)
-        if not floors_match:
-            floors_match = re.search(r'дом\s+(\d+)\s*этаж', desc_lower)
-        if not floors_match:
-            floors_match = re.search(r'(\d+)\s*этаж', desc_lower)
-        if floors_match:
-            try:
-                total_floors = int(floors_match.group(1))
-                if 1 <= total_floors <= 30:  # Разумные пределы
-                    extracted["total_floors"] = str(total_floors)
-            except:
-                pass
-        
+
+        key = (ad_id, hash(description))
+        scanned = _description_cache.get(key)
+        if scanned is None:
+            scanned = _scan_description(description.lower())
+            _description_cache[key] = scanned
+            if len(_description_cache) > DESCRIPTION_CACHE_MAX_SIZE:
+                _description_cache.popitem(last=False)
+        else:
+            _description_cache.move_to_end(key)
+
+        keywords, numbers = scanned
+        extracted = dict(keywords)
+        for field, value in numbers.items():
+            low, high, within_area = _NUMERIC_LIMITS[field]
+            # Проверяем разумность; кухня и жилая не больше общей площади
+            if low <= value <= high and not (within_area and area and value > area):
+                extracted[field] = str(value) if field == "total_floors" else value
         return extracted
     
     def _parse_ad(self, ad: dict, city: str = "Минск") -> Optional[Listing]:
@@ -888,39 +926,39 @@ class KufarScraper(BaseScraper):
             
             # Извлекаем недостающие поля из описания
             if description:
-                extracted_fields = self._extract_fields_from_description(description, area)
+                extracted_fields = self._extract_fields_from_description(description, area, str(ad_id))
                 
                 # Заполняем только пустые поля (приоритет у API параметров)
                 if not balcony and extracted_fields.get("balcony"):
                     balcony = extracted_fields["balcony"]
-                    log_info("kufar", f"Извлечено из описания: балкон={balcony}")
+                    log_info("kufar", "Извлечено из описания: балкон=%s", balcony)
                 
                 if not bathroom and extracted_fields.get("bathroom"):
                     bathroom = extracted_fields["bathroom"]
-                    log_info("kufar", f"Извлечено из описания: санузел={bathroom}")
+                    log_info("kufar", "Извлечено из описания: санузел=%s", bathroom)
                 
                 if not house_type and extracted_fields.get("house_type"):
                     house_type = extracted_fields["house_type"]
-                    log_info("kufar", f"Извлечено из описания: тип дома={house_type}")
+                    log_info("kufar", "Извлечено из описания: тип дома=%s", house_type)
                 
                 if not renovation_state and extracted_fields.get("renovation_state"):
                     renovation_state = extracted_fields["renovation_state"]
-                    log_info("kufar", f"Извлечено из описания: состояние ремонта={renovation_state}")
+                    log_info("kufar", "Извлечено из описания: состояние ремонта=%s", renovation_state)
                 
                 if kitchen_area == 0.0 and extracted_fields.get("kitchen_area"):
                     kitchen_area = extracted_fields["kitchen_area"]
-                    log_info("kufar", f"Извлечено из описания: площадь кухни={kitchen_area}")
+                    log_info("kufar", "Извлечено из описания: площадь кухни=%s", kitchen_area)
                 
                 if living_area == 0.0 and extracted_fields.get("living_area"):
                     living_area = extracted_fields["living_area"]
-                    log_info("kufar", f"Извлечено из описания: жилая площадь={living_area}")
+                    log_info("kufar", "Извлечено из описания: жилая площадь=%s", living_area)
                 
                 if not total_floors and extracted_fields.get("total_floors"):
                     total_floors = extracted_fields["total_floors"]
                     # Обновляем floor если нужно
                     if floor and "/" not in str(floor):
                         floor = f"{floor}/{total_floors}"
-                    log_info("kufar", f"Извлечено из описания: этажность={total_floors}")
+                    log_info("kufar", "Извлечено из описания: этажность=%s", total_floors)
             
             # Год постройки
             year_built = ""
@@ -3,8 +3,9 @@
 """
 import re
 from typing import List, Optional
-from bs4 import BeautifulSoup
 from scrapers.base import BaseScraper, Listing
+from scrapers.extraction import CardRule, CardSpec
+from utils.parse_pool import parse_listings
 
 
 class RealtByScraper(BaseScraper):
@@ -13,6 +14,9 @@ class RealtByScraper(BaseScraper):
     SOURCE_NAME = "realt.by"
     BASE_URL = "https://realt.by"
     
+    # Карточки объявлений на странице поиска
+    CARD_SPEC = CardSpec((CardRule("div", "class", r"listing-item|teaser|card"),))
+    
     def _build_search_url(
         self,
         city: str = "барановичи",
@@ -54,7 +58,7 @@ class RealtByScraper(BaseScraper):
         if not html:
             return []
         
-        return self._parse_html(html, min_rooms, max_rooms, min_price, max_price)
+        return await parse_listings(self, html, min_rooms, max_rooms, min_price, max_price)
     
     def _parse_html(
         self, 
@@ -65,13 +69,10 @@ class RealtByScraper(BaseScraper):
         max_price: int
     ) -> List[Listing]:
         """Парсит HTML страницу"""
-        soup = BeautifulSoup(html, 'lxml')
         listings = []
         
-        # Ищем карточки объявлений
-        cards = soup.find_all('div', class_=re.compile(r'listing-item|teaser|card'))
-        
-        for card in cards:
+        # Разбираем только карточки объявлений (XPath lxml)
+        for card in self.CARD_SPEC.select(html):
             listing = self._parse_card(card)
             if listing and self._matches_filters(listing, min_rooms, max_rooms, min_price, max_price):
                 listings.append(listing)
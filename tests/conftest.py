@@ -0,0 +1,38 @@
+"""
+Общие фикстуры тестов
+"""
+import asyncio
+
+import pytest
+
+import database_turso
+
+
+@pytest.fixture
+def local_turso(tmp_path, monkeypatch):
+    """Подменяет Turso локальным файлом libsql и создает схему. Возвращает путь к файлу"""
+    libsql = pytest.importorskip("libsql")
+    path = str(tmp_path / "turso.db")
+
+    def _connect():
+        conn = libsql.connect(path)
+        # Параллельные транзакции ждут блокировку файла, как запросы к серверу Turso
+        conn.execute("PRAGMA busy_timeout = 5000")
+        return conn
+
+    monkeypatch.setattr(database_turso, "get_turso_connection", _connect)
+    assert asyncio.run(database_turso.ensure_tables_exist())
+    return path
+
+
+def query_local_turso(path: str, sql: str, params=()):
+    """Выполняет запрос к локальному файлу libsql в отдельном соединении"""
+    import libsql
+
+    conn = libsql.connect(path)
+    try:
+        rows = conn.execute(sql, params).fetchall()
+        conn.commit()
+        return rows
+    finally:
+        conn.close()
@@ -0,0 +1,85 @@
+"""
+Unit-тесты для потокового режима ListingsAggregator
+"""
+import asyncio
+
+import pytest
+from scrapers.aggregator import ListingsAggregator
+from scrapers.base import Listing
+
+
+def _listing(listing_id: str, price: int, title: str = "2-комн., 50 м²") -> Listing:
+    return Listing(
+        id=listing_id, source="test", title=title, price=price, price_formatted=f"${price}",
+        rooms=2, area=50.0, address="Минск, ул. Ленина, 1", url=f"https://example.com/{listing_id}",
+        price_usd=price,
+    )
+
+
+def _fake_scraper(delay: float, listings):
+    class FakeScraper:
+        SOURCE_NAME = "fake"
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def fetch_listings(self, **kwargs):
+            await asyncio.sleep(delay)
+            return list(listings)
+
+    return FakeScraper
+
+
+@pytest.fixture
+def aggregator(monkeypatch):
+    monkeypatch.setattr(ListingsAggregator, "SCRAPERS", {
+        "fast": _fake_scraper(0.0, [_listing("fast_1", 30000), _listing("fast_2", 40000, "3-комн.")]),
+        "slow": _fake_scraper(0.2, [_listing("fast_1", 30000), _listing("slow_1", 25000, "1-комн.")]),
+    })
+    return ListingsAggregator(enabled_sources=["slow", "fast"])
+
+
+class TestIterListings:
+    """Тесты для ListingsAggregator.iter_listings"""
+
+    async def test_yields_fast_source_first_and_dedupes(self, aggregator):
+        """Партия быстрого источника отдается до завершения медленного, дубли отбрасываются"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        batches = []
+        async for batch in aggregator.iter_listings(persist=False):
+            batches.append(([l.id for l in batch], loop.time() - started))
+
+        assert [ids for ids, _ in batches] == [["fast_1", "fast_2"], ["slow_1"]]
+        assert batches[0][1] < 0.15
+        assert aggregator.last_source_stats["slow"] == {"count": 2, "unique": 1, "error": None}
+
+    async def test_persists_each_batch(self, aggregator, monkeypatch):
+        """Каждая партия сохраняется сразу, fetch_all_listings собирает все"""
+        persisted = []
+
+        async def _fake_persist(self, source_name, batch):
+            persisted.append((source_name, [l.id for l in batch]))
+
+        monkeypatch.setattr(ListingsAggregator, "_persist_and_notify", _fake_persist)
+
+        listings = await aggregator.fetch_all_listings()
+
+        assert persisted == [("fast", ["fast_1", "fast_2"]), ("slow", ["slow_1"])]
+        assert [l.id for l in listings] == ["slow_1", "fast_1", "fast_2"]
+
+    async def test_early_exit_cancels_pending_sources(self, aggregator):
+        """Досрочный выход из генератора отменяет незавершенные источники"""
+        generator = aggregator.iter_listings(persist=False)
+        first = await generator.__anext__()
+        pending = [t for t in asyncio.all_tasks() if t.get_name() == "aggregator:slow"]
+        assert len(pending) == 1
+
+        await generator.aclose()
+        await asyncio.sleep(0)
+
+        assert [l.id for l in first] == ["fast_1", "fast_2"]
+        assert pending[0].cancelled()
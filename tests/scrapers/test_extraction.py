@@ -0,0 +1,163 @@
+"""
+Эквивалентность декларативных правил извлечения (scrapers/extraction.py)
+прежнему разбору полного дерева BeautifulSoup
+"""
+import re
+
+import pytest
+from bs4 import BeautifulSoup
+
+from scrapers.domovita import DomovitaScraper
+from scrapers.etagi import EtagiScraper
+from scrapers.gohome import GoHomeScraper
+from scrapers.realt import RealtByScraper
+
+# Шум реальной страницы: шапка, меню, скрипты, комментарии, футер
+_NOISE_HEAD = """
+<html><head><title>Квартиры</title><style>.card {color: red}</style>
+<script>var cards = "<div class='card'>не карточка</div>";</script></head>
+<body><header class="header"><a href="/">Главная</a><nav><ul><li>Меню</li></ul></nav></header>
+<!-- <div class="listing-item">закомментированная карточка</div> -->
+"""
+_NOISE_TAIL = """
+<footer class="footer"><p>© 2024</p><img src="/logo.png"></footer>
+<script>window.__STATE__ = {"items": []};</script></body></html>
+"""
+
+# Разметка из фикстур tests/scrapers/test_*.py
+_FIXTURES = {
+    "realt": """
+        <div class="listing-item">
+            <a href="/sale/flats/object/123456">2-комн. квартира, 50 м²</a>
+            <div class="price">$50,000</div>
+            <div class="address">Минск, ул. Ленина, 1</div>
+        </div>
+    """,
+    "domovita": """
+        <div class="object-card">
+            <a href="/prodazha/kvartiry/123456">2-комн. квартира, 50 м², 50 000 $</a>
+            <div class="address">Минск, ул. Ленина, 1</div>
+        </div>
+    """,
+    "gohome": """
+        <div class="object-card">
+            <a href="/sale/flat/123456">2-комн. квартира, 50 м²</a>
+            <div class="price">$50,000</div>
+            <div class="address">Минск, ул. Ленина, 1</div>
+        </div>
+    """,
+    "etagi": """
+        <div class="listing-item">
+            <a href="/realty/123456/">2-комн. квартира, 50 м²</a>
+            <div class="price">150 000 BYN</div>
+            <div class="address">Минск, ул. Ленина, 1</div>
+        </div>
+        <div class="listing-item">
+            <a href="/realty/789012/">3-комн. квартира, 70 м²</a>
+            <div class="price">200 000 BYN</div>
+            <div class="address">Минск, ул. Пушкина, 2</div>
+        </div>
+    """,
+}
+
+# Усложненные варианты: вложенные карточки, фолбэки на article/ссылки, скрипты в карточках
+_EXTRA = {
+    "realt": """
+        <div class="teaser big"><div class="card-body">
+            <h3 class="title">3-комн. квартира, 72,5 м²</h3><span class="price-usd">$81 000</span>
+            <a href="/sale/flats/object/555/"><img data-src="/p.jpg" src="/img/555.jpg"></a>
+            <div class="geo">Барановичи, ул. Советская, 5</div><script>track(555)</script>
+        </div></div>
+        <section><div class="card"><a href="https://realt.by/sale/flats/object/556/">1-комн.&nbsp;33 м²</a>
+        <div class="cost">45&nbsp;000 $</div></div></section>
+    """,
+    "domovita": """
+        <article><a href="/prodazha/kvartiry/777">1-комн. квартира 33 м² 30 000 $</a>
+        <span class="location">ул. Кирова, 3</span><img src="/placeholder.png"></article>
+        <article><a href="/arenda/777">аренда</a></article>
+    """,
+    "gohome": """
+        <a href="/sale/flat/901">3-комн. 64 м² 71 000 USD ул. Брестская, 10</a>
+        <a href="/sale/flat/902"><img src="/img/902.jpg">2-комн. 48 м² $ 52 500</a>
+    """,
+    "etagi": """
+        <ul><li><a href="https://baranovichi.etagi.com/realty/333/">1-комн. кв. 30 м²</a>
+        <!-- скрытая цена 1 BYN --> <span>95 000 BYN</span><span>3 100 BYN / м²</span>
+        <span>2/5 эт.</span><script>var price = "1 BYN";</script> ул. Гагарина, 7</li>
+        <li><a href="/realty/333/">дубль</a></li></ul>
+        <generic><a href="/realty/444/">2-комн. 45 м² 120 000 BYN 1975 г.</a></generic>
+        <a href="/realty/555/">без контейнера</a>
+    """,
+}
+
+
+def _page(source: str, extra: bool) -> str:
+    body = _FIXTURES[source] + (_EXTRA[source] if extra else "")
+    return _NOISE_HEAD + body + _NOISE_TAIL
+
+
+def _legacy_cards(source: str, html: str) -> list:
+    """Выбор карточек, как в парсерах до перехода на CardSpec"""
+    soup = BeautifulSoup(html, "lxml")
+    if source == "realt":
+        return soup.find_all("div", class_=re.compile(r"listing-item|teaser|card"))
+    if source == "domovita":
+        cards = soup.find_all("div", class_=re.compile(r"object-card|listing-card|item"))
+        if not cards:
+            cards = soup.find_all("article")
+        if not cards:
+            cards = soup.find_all("a", href=re.compile(r"/prodazha/kvartiry/"))
+        return cards[:20]
+    cards = soup.find_all("div", class_=re.compile(r"object|listing|card|item"))
+    if not cards:
+        cards = soup.find_all("article")
+    if not cards:
+        cards = soup.find_all("a", href=re.compile(r"/sale/flat/\d+"))
+    return cards[:30]
+
+
+def _as_dicts(listings):
+    return [listing.to_dict() if listing else None for listing in listings]
+
+
+@pytest.mark.parametrize("extra", [False, True], ids=["fixture", "extended"])
+@pytest.mark.parametrize("scraper_cls,source", [
+    (RealtByScraper, "realt"),
+    (DomovitaScraper, "domovita"),
+    (GoHomeScraper, "gohome"),
+])
+def test_card_spec_matches_full_tree(scraper_cls, source, extra):
+    """XPath дает те же карточки и те же Listing, что полное дерево"""
+    html = _page(source, extra)
+    scraper = scraper_cls()
+    legacy = [scraper._parse_card(card) for card in _legacy_cards(source, html)]
+    strained = [scraper._parse_card(card) for card in scraper.CARD_SPEC.select(html)]
+
+    assert any(legacy)
+    assert _as_dicts(strained) == _as_dicts(legacy)
+
+
+def test_card_spec_fallback_rules():
+    """Фолбэки: без div-карточек берутся article, затем ссылки"""
+    articles = DomovitaScraper.CARD_SPEC.select(_NOISE_HEAD + _EXTRA["domovita"] + _NOISE_TAIL)
+    assert [card.name for card in articles] == ["article", "article"]
+    links = GoHomeScraper.CARD_SPEC.select(_NOISE_HEAD + _EXTRA["gohome"] + _NOISE_TAIL)
+    assert [card["href"] for card in links] == ["/sale/flat/901", "/sale/flat/902"]
+
+
+@pytest.mark.parametrize("extra", [False, True], ids=["fixture", "extended"])
+def test_etagi_link_spec_matches_full_tree(extra):
+    """XPath дает те же ссылки и тот же текст контейнеров, что find_parent + get_text"""
+    html = _page("etagi", extra)
+    soup = BeautifulSoup(html, "lxml")
+    legacy = []
+    for link in soup.find_all("a", href=re.compile(r"/realty/\d+/")):
+        container = link.find_parent(["div", "article", "li", "generic"])
+        legacy.append((link.get("href", ""), container.get_text(separator=" ", strip=True) if container else None))
+
+    assert EtagiScraper.LINK_SPEC.select(html) == legacy
+
+    # Остальной разбор не менялся: объявления строятся из того же текста контейнера
+    listings = EtagiScraper()._parse_html(html, 1, 4, 0, 10_000_000, "https://baranovichi.etagi.com", "барановичи")
+    expected = ["etagi_123456", "etagi_789012"] + (["etagi_333", "etagi_444"] if extra else [])
+    assert [listing.id for listing in listings] == expected
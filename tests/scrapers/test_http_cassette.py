@@ -0,0 +1,71 @@
+"""
+Тесты записи/воспроизведения HTTP-ответов (scrapers/http_cassette.py)
+"""
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from scrapers import http_cassette
+from scrapers.http_cassette import Cassette, configure_cassette
+from scrapers.http_client import HTTPClient
+
+
+async def _serve():
+    async def page(request):
+        return web.Response(text=f"<html>{request.query.get('page', '1')}</html>", content_type="text/html")
+
+    async def api(request):
+        return web.json_response({"ads": [{"ad_id": 1, "subject": "2-комн."}]})
+
+    app = web.Application()
+    app.router.add_get("/page", page)
+    app.router.add_get("/api", api)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+async def test_record_then_replay_without_network(tmp_path, monkeypatch):
+    """Записанные ответы воспроизводятся после остановки сервера"""
+    monkeypatch.setattr(http_cassette, "_mode", None)
+    monkeypatch.setattr(http_cassette, "_cassette", None)
+    server = await _serve()
+    page_url, api_url = str(server.make_url("/page")), str(server.make_url("/api"))
+    recorder = Cassette(str(tmp_path))
+    configure_cassette("record", recorder)
+    async with HTTPClient(retry_delay=0) as client:
+        recorded_html = await client.fetch_html(page_url, params={"page": "2"})
+        recorded_json = await client.fetch_json(api_url)
+    await server.close()
+
+    assert recorded_html == "<html>2</html>"
+    assert recorder.stats["recorded"] == 2
+    assert sorted(path.suffixes for path in tmp_path.iterdir()) == [[".json", ".gz"]] * 2
+
+    player = Cassette(str(tmp_path))
+    configure_cassette("replay", player)
+    async with HTTPClient(retry_delay=0) as client:
+        # Порядок параметров не важен: ключ кассеты канонический
+        assert await client.fetch_html(f"{page_url}?page=2") == recorded_html
+        assert await client.fetch_json(api_url) == recorded_json
+        assert await client.fetch_json(f"{api_url}?page=9") is None
+    assert player.stats == {"recorded": 0, "hits": 2, "misses": 3, "injected_errors": 0}
+
+
+async def test_replay_injects_connection_errors(tmp_path, monkeypatch):
+    """Ошибки проходят через retry HTTPClient, как ошибки сети"""
+    monkeypatch.setattr(http_cassette, "_mode", None)
+    monkeypatch.setattr(http_cassette, "_cassette", None)
+    Cassette(str(tmp_path)).save("https://api.test/ads", None, 200, '{"ads": []}', "application/json")
+
+    failing = Cassette(str(tmp_path), error_rate=1.0)
+    configure_cassette("replay", failing)
+    async with HTTPClient(retry_count=3, retry_delay=0) as client:
+        assert await client.fetch_json("https://api.test/ads") is None
+    assert failing.stats["injected_errors"] == 3
+
+    flaky = Cassette(str(tmp_path), latency_ms=1, jitter_ms=2, error_rate=0.5, seed=3)
+    configure_cassette("replay", flaky)
+    async with HTTPClient(retry_count=10, retry_delay=0) as client:
+        results = [await client.fetch_json("https://api.test/ads") for _ in range(5)]
+    assert results == [{"ads": []}] * 5
+    assert flaky.stats["injected_errors"] > 0 and flaky.stats["hits"] == 5
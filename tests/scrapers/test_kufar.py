@@ -381,3 +381,49 @@ class TestKufarScraper:
         assert dto.url.startswith("http")
         assert isinstance(dto.location, str)
         assert isinstance(dto.source, str) and len(dto.source) > 0
+
+
+# Описания с признаками всех полей и граничными случаями правил
+_DESCRIPTION_CASES = [
+    "Квартира без балкона, санузел совмещенный, панельный дом, требует ремонта. Кухня 9,5 м2",
+    "Лоджия застеклена. Раздельный туалет. Кирпичный 9-этажный дом. Евроремонт. Жилая площадь 32 м²",
+    "Нет балкона. Раздельный. Блочный дом 5 эт. дом, кухня 45 м², жилая 120 м2, хорошее состояние",
+    "Монолитный дом 40 этажей, кухня 12, советский ремонт, совмещенный санузел",
+    "Деревянный дом 2 этаж, старый ремонт",
+    "Просто квартира",
+]
+
+
+class TestKufarDescriptionFields:
+    """Извлечение полей из описания: совпадение с прежней реализацией и кэш"""
+
+    @pytest.mark.parametrize("area", [0.0, 20.0, 60.0])
+    def test_matches_legacy_extraction(self, area):
+        from benchmarks.description_fields import legacy_extract_fields, load_descriptions
+
+        scraper = KufarScraper()
+        descriptions = _DESCRIPTION_CASES + [description for _, description, _ in load_descriptions()]
+        for description in descriptions:
+            assert scraper._extract_fields_from_description(description, area) == legacy_extract_fields(description, area)
+
+    def test_scan_is_cached_by_ad_id_and_text(self, monkeypatch):
+        from scrapers import kufar
+
+        scans = []
+        original = kufar._scan_description
+        monkeypatch.setattr(kufar, "_scan_description", lambda text: scans.append(text) or original(text))
+        monkeypatch.setattr(kufar, "_description_cache", kufar.OrderedDict())
+        monkeypatch.setattr(kufar, "DESCRIPTION_CACHE_MAX_SIZE", 2)
+        scraper = KufarScraper()
+        description = _DESCRIPTION_CASES[0]
+
+        assert scraper._extract_fields_from_description(description, 50.0, "1")["kitchen_area"] == 9.5
+        # Тот же ad_id и текст: без повторного разбора, пределы проверяются заново
+        assert "kitchen_area" not in scraper._extract_fields_from_description(description, 8.0, "1")
+        assert len(scans) == 1
+
+        # Изменился текст или другое объявление - разбор заново; старые ключи вытесняются
+        scraper._extract_fields_from_description(description + " Лоджия", 50.0, "1")
+        scraper._extract_fields_from_description(description, 50.0, "2")
+        assert len(scans) == 3
+        assert list(kufar._description_cache) == [("1", hash(description + " Лоджия")), ("2", hash(description))]
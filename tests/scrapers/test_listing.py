@@ -0,0 +1,71 @@
+"""
+Unit-тесты для компактного представления Listing
+"""
+import copy
+
+import pytest
+from scrapers.base import Listing, row_details_loader
+
+
+def _listing(**kwargs) -> Listing:
+    defaults = dict(
+        id="kufar_1", source="Kufar.by", title="2-комн., 50 м²", price=50000,
+        price_formatted="$50 000", rooms=2, area=50.0, address="Минск, ул. Ленина, 1",
+        url="https://re.kufar.by/vi/1",
+    )
+    defaults.update(kwargs)
+    return Listing(**defaults)
+
+
+class TestListing:
+    """Тесты для Listing (__slots__, интернирование, ленивые поля)"""
+
+    def test_slots_without_dict(self):
+        """У объекта нет __dict__, служебные поля объявлены явно"""
+        listing = _listing()
+        assert not hasattr(listing, "__dict__")
+        listing.raw_json = "{}"
+        listing.city = "минск"
+        assert getattr(listing, "vendor", None) is None
+        with pytest.raises(AttributeError):
+            listing.unknown_field = 1
+
+    def test_low_cardinality_strings_interned(self):
+        """Одинаковые значения source/house_type - один объект строки"""
+        first = _listing(house_type="".join(["панель", "ный"]))
+        second = _listing(house_type="".join(["панель", "ный"]))
+        assert first.house_type is second.house_type
+
+    def test_lazy_details_loaded_once(self):
+        """description/photos раскрываются при первом обращении"""
+        calls = []
+        listing = _listing()
+        listing.set_details_loader(lambda: (calls.append(1) or "Описание", ["a.jpg"]))
+
+        assert calls == []
+        assert listing.price == 50000
+        assert calls == []
+        assert listing.description == "Описание"
+        assert listing.photos == ["a.jpg"]
+        assert calls == [1]
+
+    def test_copy_keeps_details_lazy(self):
+        """copy.copy не раскрывает ленивые поля"""
+        calls = []
+        listing = _listing()
+        listing.set_details_loader(lambda: (calls.append(1) or "Описание", []))
+
+        clone = copy.copy(listing)
+        assert calls == []
+        clone.title = "changed"
+        assert listing.title != "changed"
+        assert clone.description == "Описание"
+
+    def test_row_details_loader(self):
+        """photos из JSON строки, описание из raw JSON если его нет в строке"""
+        listing = _listing()
+        listing.set_details_loader(
+            row_details_loader("", '["a.jpg", "b.jpg"]', raw_json='{"body_short": " Текст "}')
+        )
+        assert listing.photos == ["a.jpg", "b.jpg"]
+        assert listing.description == "Текст"
@@ -0,0 +1,85 @@
+"""
+Тесты для неблокирующего логирования (error_logger.py)
+"""
+import logging
+
+from error_logger import (
+    ErrorLogger,
+    SanitizingFormatter,
+    _SourceRateLimiter,
+    sanitize_sensitive_data,
+)
+
+
+def test_sanitize_sensitive_data():
+    """Предкомпилированные паттерны очищают токены и email"""
+    text = "token=abcdefghijklmnopqrstuvwxyz12 bot 123456789:ABCdefGHIjklMNOpqrsTUVwxyz user@mail.by"
+    sanitized = sanitize_sensitive_data(text)
+    assert "abcdefghijklmnopqrstuvwxyz12" not in sanitized
+    assert "ABCdefGHIjklMNOpqrsTUVwxyz" not in sanitized
+    assert "[EMAIL]" in sanitized
+
+
+def test_formatter_sanitizes_message_and_traceback_only():
+    """Форматтер очищает сообщение и traceback, но не время записи"""
+    formatter = SanitizingFormatter(fmt="%(asctime)s %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+    try:
+        raise ValueError("password=hunter2")
+    except ValueError as e:
+        record = logging.LogRecord(
+            "test", logging.ERROR, __file__, 1, "[%s] %s", ("src", "api_key=abcdefghijklmnopqrstuvwxyz"),
+            (type(e), e, e.__traceback__),
+        )
+
+    output = formatter.format(record)
+    assert "hunter2" not in output
+    assert "abcdefghijklmnopqrstuvwxyz" not in output
+    assert "[PHONE]" not in output  # дата не принимается за телефон
+
+
+def test_rate_limiter_suppresses_and_reports():
+    """Сверх запаса сообщения подавляются и сообщаются при следующем пропуске"""
+    limiter = _SourceRateLimiter(rate=0.001, burst=3)
+
+    assert [limiter.acquire("kufar") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("kufar") is None
+    assert limiter.acquire("kufar") is None
+    assert limiter.get_suppressed() == {"kufar": 2}
+    # Другой источник не затронут
+    assert limiter.acquire("onliner") == 0
+
+    limiter._buckets["kufar"][0] = 1.0
+    assert limiter.acquire("kufar") == 2
+    assert limiter.get_suppressed() == {}
+
+
+def test_rate_limiter_disabled_with_zero_rate():
+    """rate=0 отключает ограничение"""
+    limiter = _SourceRateLimiter(rate=0, burst=1)
+    assert all(limiter.acquire("kufar") == 0 for _ in range(100))
+
+
+def test_log_info_lazy_args_and_stored_entries_sanitized_on_read(caplog):
+    """Аргументы подставляются лениво, ошибки очищаются при чтении"""
+    logger = ErrorLogger()
+
+    with caplog.at_level(logging.INFO, logger="error_logger"):
+        logger.log_info("kufar", "Извлечено из описания: балкон=%s", "Есть")
+        logger.log_error("db", "connect failed token=abcdefghijklmnopqrstuvwxyz12", exc_info=False)
+
+    assert "[kufar] Извлечено из описания: балкон=Есть" in caplog.messages
+    assert logger.errors[0]["message"].endswith("abcdefghijklmnopqrstuvwxyz12")
+    assert "abcdefghijklmnopqrstuvwxyz12" not in logger.get_errors()[0]["message"]
+
+
+def test_id_before_exception_text_is_masked(caplog):
+    """Номер в конце сообщения маскируется и перед ": <исключение>" (части очищаются по отдельности)"""
+    formatter = SanitizingFormatter(fmt="%(message)s")
+    logger = ErrorLogger()
+
+    with caplog.at_level(logging.ERROR, logger="error_logger"):
+        logger.log_error("turso_filters", "Ошибка пользователя 999999999", Exception("boom"), exc_info=False)
+
+    output = formatter.format(caplog.records[-1])
+    assert "999999999" not in output
+    assert output == "[turso_filters] Ошибка пользователя [PHONE]: boom"
@@ -0,0 +1,74 @@
+"""
+Запросы ИИ-оценки к локальной замене LLM (tools/fake_llm_api.py):
+учет токенов, заголовки лимитов, 429 и формат Ollama
+"""
+import aiohttp
+import pytest
+
+import ai_valuator
+from scrapers.base import Listing
+from tools.fake_llm_api import FakeLLMAPI
+from utils import llm_scheduler
+
+
+def _listing(n: int = 1) -> Listing:
+    return Listing(
+        id=f"kufar_{n}", source="kufar", title="2-комн.", price=50000, price_formatted="$50 000",
+        rooms=2, area=50.0, address="Барановичи, ул. Ленина, 1", url="", price_usd=50000,
+    )
+
+
+@pytest.fixture
+def groq(monkeypatch):
+    monkeypatch.setattr(ai_valuator, "GROQ_API_KEY", "test")
+    # Отдельный планировщик на тест: модель с уникальным именем
+    monkeypatch.setattr(ai_valuator, "GROQ_MODEL", f"fake-{id(monkeypatch)}")
+    monkeypatch.setattr(llm_scheduler, "WINDOW_SECONDS", 0.3)
+
+
+async def test_usage_and_rate_limit_headers(groq, monkeypatch):
+    async with FakeLLMAPI(tpm=100000, rpm=10) as llm:
+        monkeypatch.setattr(ai_valuator, "GROQ_API_URL", llm.completions_url)
+        async with ai_valuator.AIValuator("groq") as valuator:
+            result = await valuator.valuate_groq(_listing())
+
+    assert result["fair_price_usd"] > 0
+    assert result["tokens_used"] == llm.stats["total_tokens"] > 0
+    scheduler = llm_scheduler.get_llm_scheduler("groq", ai_valuator.GROQ_MODEL)
+    assert scheduler._server_requests[0] == 9
+
+
+async def test_injected_429_pauses_scheduler(groq, monkeypatch):
+    async with FakeLLMAPI(rate_limit_every=1, retry_after=0.2) as llm:
+        monkeypatch.setattr(ai_valuator, "GROQ_API_URL", llm.completions_url)
+        async with ai_valuator.AIValuator("groq") as valuator:
+            assert await valuator.valuate_groq(_listing()) is None
+            llm.rate_limit_every = 0
+            assert await valuator.valuate_groq(_listing(2)) is not None
+
+    scheduler = llm_scheduler.get_llm_scheduler("groq", ai_valuator.GROQ_MODEL).get_stats()
+    assert (llm.stats["rate_limited"], llm.stats["requests"]) == (1, 1)
+    assert scheduler["rate_limited"] == 1
+    assert scheduler["max_wait_seconds"] >= 0.15
+
+
+async def test_tpm_limit_returns_429_with_retry_after():
+    async with FakeLLMAPI(tpm=50, window_seconds=0.5) as llm:
+        payload = {"messages": [{"role": "user", "content": "а" * 90}]}
+        async with aiohttp.ClientSession() as session:
+            async with session.post(llm.completions_url, json=payload) as resp:
+                assert resp.status == 200
+                assert int(resp.headers["x-ratelimit-remaining-tokens"]) < 50
+            async with session.post(llm.completions_url, json=payload) as resp:
+                assert resp.status == 429
+                assert 0 < float(resp.headers["retry-after"]) <= 0.5
+
+
+async def test_ollama_generate(monkeypatch):
+    async with FakeLLMAPI() as llm:
+        monkeypatch.setattr(ai_valuator, "OLLAMA_URL", llm.ollama_url)
+        async with ai_valuator.AIValuator("ollama") as valuator:
+            result = await valuator.valuate(_listing())
+
+    assert result["fair_price_usd"] > 0
+    assert result["tokens_used"] == llm.stats["total_tokens"]
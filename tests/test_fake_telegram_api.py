@@ -0,0 +1,61 @@
+"""
+Обработка ответов Bot API в safe_send_* на локальном сервере
+(tools/fake_telegram_api.py): RetryAfter, Forbidden, обрыв соединения
+"""
+import pytest
+from aiogram.types import InputMediaPhoto
+
+from bot.services import telegram_api
+from tools.fake_telegram_api import FakeTelegramAPI
+
+CHAT_ID = 424242
+
+
+@pytest.fixture
+async def fake_bot(monkeypatch):
+    async with FakeTelegramAPI(retry_after=1, seed=1) as api:
+        monkeypatch.setattr(telegram_api, "TELEGRAM_API_URL", api.url)
+        bot = telegram_api.make_bot("123456:TEST-TOKEN")
+        try:
+            yield api, bot
+        finally:
+            await bot.session.close()
+
+
+async def test_retry_after_is_waited_and_retried(fake_bot):
+    api, bot = fake_bot
+    api.inject(CHAT_ID, "429")
+
+    message = await telegram_api.safe_send_message(bot, CHAT_ID, "привет")
+
+    assert message.text == "привет"
+    assert message.chat.id == CHAT_ID
+    assert api.stats["retry_after"] == 1
+    assert api.stats["sendMessage"] == 2
+    assert [chat_id for chat_id, _, _ in api.deliveries] == [CHAT_ID]
+
+
+async def test_forbidden_is_not_retried(fake_bot):
+    api, bot = fake_bot
+    api.forbidden_chats.add(CHAT_ID)
+
+    assert await telegram_api.safe_send_message(bot, CHAT_ID, "привет") is None
+    assert await telegram_api.safe_send_media_group(
+        bot, CHAT_ID, [InputMediaPhoto(media="https://example.com/1.jpg")]
+    ) is None
+    assert api.stats["forbidden"] == 2
+    assert api.deliveries == []
+
+
+async def test_network_error_is_retried(fake_bot):
+    api, bot = fake_bot
+    api.inject(CHAT_ID, "network")
+
+    messages = await telegram_api.safe_send_media_group(bot, CHAT_ID, [
+        InputMediaPhoto(media="https://example.com/1.jpg"),
+        InputMediaPhoto(media="https://example.com/2.jpg"),
+    ])
+
+    assert len(messages) == 2
+    assert api.stats["network_errors"] == 1
+    assert api.stats["messages"] == 2
@@ -0,0 +1,121 @@
+"""
+Тесты кэша инспекций страниц объявлений (utils/inspection_cache.py)
+на локальном aiohttp-сервере с ETag
+"""
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from scrapers.base import Listing
+from utils.inspection_cache import InspectionCache, inspection_version
+
+
+class PageServer:
+    """Страницы /flat/<n> с ETag; считает запросы, ответы 304 и одновременные загрузки"""
+
+    def __init__(self):
+        self.requests = 0
+        self.not_modified = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def handle(self, request):
+        self.requests += 1
+        etag = f'"v-{request.match_info["n"]}"'
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            self.active -= 1
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return web.Response(status=304)
+        return web.Response(text=f"<html>flat {request.match_info['n']}</html>", headers={"ETag": etag})
+
+
+@pytest.fixture
+async def server():
+    pages = PageServer()
+    app = web.Application()
+    app.router.add_get("/flat/{n}", pages.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    async with aiohttp.ClientSession() as session:
+        yield pages, session, f"http://127.0.0.1:{port}/flat"
+    await runner.cleanup()
+
+
+def _parser():
+    parsed = []
+
+    async def parse(html):
+        parsed.append(html)
+        return {"full_description": html}
+
+    return parse, parsed
+
+
+def _listing(price: int) -> Listing:
+    return Listing(
+        id="realt_1", source="realt", title="2-комн.", price=price, price_formatted=f"${price}",
+        rooms=2, area=50.0, address="Барановичи, ул. Ленина, 1", url="",
+    )
+
+
+async def test_cached_page_is_revalidated_after_ttl_or_listing_change(server):
+    pages, session, base = server
+    parse, parsed = _parser()
+    cache = InspectionCache(ttl_seconds=3600, max_entries=10, per_host=4)
+    url = f"{base}/1"
+
+    first = await cache.get_page(session, url, inspection_version(_listing(50000)), parse)
+    again = await cache.get_page(session, url, inspection_version(_listing(50000)), parse)
+    assert first == again == {"full_description": "<html>flat 1</html>"}
+    assert (pages.requests, len(parsed)) == (1, 1)
+
+    # Цена изменилась - условный запрос, страница та же (304) и не разбирается заново
+    await cache.get_page(session, url, inspection_version(_listing(48000)), parse)
+    assert (pages.requests, pages.not_modified, len(parsed)) == (2, 1, 1)
+
+    cache.ttl_seconds = 0
+    await cache.get_page(session, url, inspection_version(_listing(48000)), parse)
+    assert (pages.requests, pages.not_modified, len(parsed)) == (3, 2, 1)
+    assert cache.get_stats()["revalidated"] == 2
+
+
+async def test_one_fetch_per_url_and_per_host_limit(server):
+    pages, session, base = server
+    parse, parsed = _parser()
+    cache = InspectionCache(ttl_seconds=3600, max_entries=3, per_host=2)
+    version = inspection_version(_listing(50000))
+
+    await asyncio.gather(*(cache.get_page(session, f"{base}/1", version, parse) for _ in range(3)))
+    assert pages.requests == 1
+
+    await asyncio.gather(*(cache.get_page(session, f"{base}/{n}", version, parse) for n in range(2, 8)))
+    assert pages.max_active == 2
+    assert len(parsed) == 7
+    assert cache.get_stats()["entries"] == 3
+
+
+async def test_late_caller_waits_for_queued_fetch_of_same_url(server):
+    pages, session, base = server
+    parse, _ = _parser()
+    # Каждый запрос перепроверяет страницу: загрузки одного URL должны идти по очереди
+    cache = InspectionCache(ttl_seconds=0, max_entries=10, per_host=4)
+    version = inspection_version(_listing(50000))
+
+    first = asyncio.ensure_future(cache.get_page(session, f"{base}/1", version, parse))
+    queued = asyncio.ensure_future(cache.get_page(session, f"{base}/1", version, parse))
+    await first
+    # Второй запрос еще в очереди блокировки - новый должен встать за ним
+    await asyncio.gather(queued, cache.get_page(session, f"{base}/1", version, parse))
+    assert pages.requests == 3
+    assert pages.max_active == 1
+    assert not cache._locks
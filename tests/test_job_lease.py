@@ -0,0 +1,123 @@
+"""
+Тесты аренды плановых задач (utils/job_lease.py) на локальном файле libsql
+
+Две реплики моделируются двумя процессами, которые конкурируют за одну
+строку job_leases в общем файле БД.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+
+import database_turso
+from tests.conftest import query_local_turso as _query
+from utils.job_lease import JobLease
+
+
+async def test_only_one_owner_runs_jobs(local_turso):
+    """Задача выполняется только у владельца аренды; stop() сразу отдает аренду"""
+    runs = []
+
+    async def job(name):
+        runs.append(name)
+
+    first = JobLease("scheduler", ttl_seconds=30, owner="a", enabled=True)
+    second = JobLease("scheduler", ttl_seconds=30, owner="b", enabled=True)
+    await first.start()
+    await second.start()
+
+    await first.guard(job)("a")
+    await second.guard(job)("b")
+    assert runs == ["a"]
+    assert (first.is_leader, second.is_leader) == (True, False)
+    assert second.get_stats()["skipped_runs"] == 1
+
+    await first.stop()
+    await second.guard(job)("b")
+    assert runs == ["a", "b"]
+    await second.stop()
+
+
+async def test_expired_lease_is_taken_over(local_turso):
+    """Аренда упавшей реплики (без heartbeat) переходит к другой после истечения"""
+    first = JobLease("scheduler", ttl_seconds=30, owner="a", enabled=True)
+    second = JobLease("scheduler", ttl_seconds=30, owner="b", enabled=True)
+    assert await first.try_acquire()
+    assert not await second.try_acquire()
+
+    _query(local_turso, "UPDATE job_leases SET expires_at = 0")
+    assert await second.try_acquire()
+    assert not await first.try_acquire()
+    assert (await database_turso.get_job_lease("scheduler"))["owner"] == "b"
+
+
+async def test_disabled_lease_always_runs():
+    """Без Turso (один экземпляр) аренда не нужна"""
+    lease = JobLease("scheduler", enabled=False)
+    assert await lease.try_acquire()
+    assert await lease.guard(asyncio.sleep)(0, result="ok") == "ok"
+
+
+def _replica(path, owner, ttl, duration, crash_after, ready, out):
+    """Процесс-реплика: каждые 50 мс запускает задачу через lease.guard"""
+    import libsql
+
+    def _connect():
+        conn = libsql.connect(path)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        return conn
+
+    database_turso.get_turso_connection = _connect
+
+    async def main():
+        lease = JobLease("scheduler", ttl_seconds=ttl, owner=owner, enabled=True)
+        runs = []
+
+        async def job():
+            started = time.time()
+            await asyncio.sleep(0.05)
+            runs.append((started, time.time()))
+
+        guarded = lease.guard(job)
+        await lease.start()
+        ready.set()
+        started = time.time()
+        while time.time() - started < duration:
+            if crash_after and time.time() - started > crash_after:
+                # Падение без освобождения аренды
+                out.put((owner, runs))
+                out.close()
+                out.join_thread()
+                os._exit(1)
+            await guarded()
+            await asyncio.sleep(0.05)
+        await lease.stop()
+        out.put((owner, runs))
+
+    asyncio.run(main())
+
+
+def test_two_processes_compete_for_lease(local_turso):
+    """Две реплики: задачи выполняет одна, после ее падения - вторая, без пересечений"""
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    ttl = 0.6
+    first_ready, second_ready = ctx.Event(), ctx.Event()
+    first = ctx.Process(target=_replica, args=(local_turso, "replica-a", ttl, 3.0, 1.0, first_ready, out))
+    first.start()
+    assert first_ready.wait(30)
+    second = ctx.Process(target=_replica, args=(local_turso, "replica-b", ttl, 2.5, None, second_ready, out))
+    second.start()
+
+    results = dict(out.get(timeout=30) for _ in range(2))
+    first.join(10)
+    second.join(10)
+
+    runs_a, runs_b = results["replica-a"], results["replica-b"]
+    assert runs_a and runs_b
+    # Пока реплика A жива, B не запускает задачи; после падения A - запускает не раньше истечения аренды
+    assert runs_b[0][0] >= runs_a[-1][1]
+    assert runs_b[0][0] - runs_a[-1][1] >= ttl * 0.5
+    # Интервалы выполнения не пересекаются
+    intervals = sorted(runs_a + runs_b)
+    assert all(prev[1] <= cur[0] for prev, cur in zip(intervals, intervals[1:]))
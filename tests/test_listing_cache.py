@@ -0,0 +1,120 @@
+"""
+Тесты для in-process кэша объявлений города (utils/listing_cache.py)
+"""
+import random
+
+import pytest
+
+import database_turso
+from scrapers.base import Listing
+from utils.listing_cache import ListingCache
+
+
+def _row(i: int, price: int, rooms: int, city: str = "барановичи") -> dict:
+    return {
+        "id": f"kufar_{i}",
+        "source": "Kufar.by",
+        "title": f"{rooms}-комн.",
+        "price": price,
+        "rooms": rooms,
+        "area": 40.0,
+        "address": f"ул. Тестовая {i}, {city}",
+        "url": f"https://re.kufar.by/vi/{i}",
+        "photos": [],
+        "currency": "USD",
+        "price_usd": price,
+        "city": city,
+        "updated_at": f"2026-01-{1 + i % 28:02d}T00:00:{i % 60:02d}",
+    }
+
+
+@pytest.fixture
+def rows():
+    rnd = random.Random(42)
+    return [_row(i, rnd.randint(10000, 120000), rnd.randint(1, 5)) for i in range(300)]
+
+
+@pytest.fixture
+def loader(monkeypatch, rows):
+    """Подменяет загрузку города из Turso и считает запросы"""
+    calls = []
+
+    async def _fake_load(city, status="active", limit=5000):
+        calls.append((city, status, limit))
+        matched = [r for r in rows if r["city"] == city]
+        matched.sort(key=lambda r: r["updated_at"], reverse=True)
+        return [dict(r) for r in matched[:limit]]
+
+    monkeypatch.setattr(database_turso, "get_cached_listings_by_city", _fake_load)
+    return calls
+
+
+def _expected(rows, min_rooms, max_rooms, min_price, max_price, limit):
+    """Та же выборка, что делает SQL в get_cached_listings_by_filters"""
+    matched = [
+        r for r in rows
+        if min_rooms <= r["rooms"] <= max_rooms and min_price <= r["price"] <= max_price
+    ]
+    matched.sort(key=lambda r: r["updated_at"], reverse=True)
+    return {r["id"] for r in matched[:limit]}
+
+
+async def test_subranges_served_from_one_load(loader, rows):
+    """Разные фильтры пользователей обслуживаются одним запросом к БД"""
+    cache = ListingCache()
+    for filters in [(1, 5, 0, 1000000, 200), (2, 3, 30000, 60000, 200), (1, 1, 0, 50000, 10), (4, 5, 90000, 95000, 5)]:
+        result = await cache.get_listings("барановичи", *filters)
+        assert {listing.id for listing in result} == _expected(rows, *filters)
+
+    assert len(loader) == 1
+    assert cache.get_stats()["hits"] == 3
+    assert cache.get_stats()["misses"] == 1
+
+
+async def test_returns_copies(loader):
+    """Изменение результата не портит снимок"""
+    cache = ListingCache()
+    first = await cache.get_listings("барановичи", 1, 5, 0, 1000000, 1)
+    first[0].title = "changed"
+    second = await cache.get_listings("барановичи", 1, 5, 0, 1000000, 1)
+    assert second[0].title != "changed"
+
+
+async def test_ttl_and_lru(loader):
+    """Просроченный снимок перезагружается, лишние города вытесняются"""
+    cache = ListingCache(ttl_seconds=0, max_cities=1)
+    await cache.get_listings("барановичи", 1, 5, 0, 1000000)
+    await cache.get_listings("барановичи", 1, 5, 0, 1000000)
+    assert len(loader) == 2
+    assert cache.get_stats()["expired"] == 1
+
+    cache.ttl_seconds = 300
+    await cache.get_listings("брест", 1, 5, 0, 1000000)
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.get_stats()["cities"] == 1
+
+
+async def test_truncated_snapshot_falls_back(loader):
+    """Обрезанный снимок не выдает неполный результат"""
+    cache = ListingCache(max_per_city=50)
+    assert await cache.get_listings("барановичи", 1, 1, 0, 20000, 200) is None
+    assert cache.get_stats()["partial"] == 1
+
+
+async def test_apply_saved_and_remove(loader):
+    """Сохраненные объявления попадают в снимок, удаленные - исчезают"""
+    cache = ListingCache()
+    await cache.get_listings("барановичи", 1, 5, 0, 1000000)
+
+    new = Listing(
+        id="kufar_new", source="Kufar.by", title="2-комн.", price=5000, price_formatted="$5 000",
+        rooms=2, area=50.0, address="ул. Новая 1, барановичи", url="https://re.kufar.by/vi/new",
+    )
+    cache.apply_saved([new], lambda listing: "барановичи")
+    result = await cache.get_listings("барановичи", 2, 2, 0, 6000, 1)
+    assert [listing.id for listing in result] == ["kufar_new"]
+
+    cache.remove("kufar_new")
+    result = await cache.get_listings("барановичи", 2, 2, 0, 6000, 1)
+    assert result == []
+    assert len(loader) == 1
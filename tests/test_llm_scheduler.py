@@ -0,0 +1,88 @@
+"""
+Тесты планировщика запросов к LLM (utils/llm_scheduler.py)
+
+Окно бюджета сокращено до долей секунды, чтобы проверять ожидания быстро.
+"""
+import asyncio
+import time
+
+import pytest
+
+from utils import llm_scheduler
+from utils.llm_scheduler import LLMScheduler, parse_duration
+
+
+@pytest.fixture(autouse=True)
+def short_window(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "WINDOW_SECONDS", 0.2)
+
+
+async def _request(scheduler, user, tag, order, tokens=100, used=None, max_tokens=0):
+    async with scheduler.slot(tokens, max_tokens, user=user) as slot:
+        order.append((tag, time.monotonic()))
+        if used is not None:
+            slot.settle(used)
+
+
+async def test_dispatches_within_budget_and_waits_for_window():
+    scheduler = LLMScheduler("test", tpm=300)
+    order = []
+    started = time.monotonic()
+    await asyncio.gather(*(_request(scheduler, None, i, order) for i in range(4)))
+
+    delays = [at - started for _, at in order]
+    assert all(delay < 0.1 for delay in delays[:3])
+    assert delays[3] >= 0.19
+    assert scheduler.get_stats()["queued"] == 1
+
+
+async def test_actual_usage_frees_reserved_budget():
+    """
+    Резерв по оценке заменяется фактическим расходом, и следующий запрос
+    не ждет окна; ответ резервируется по средней фактической длине, а не max_tokens
+    """
+    scheduler = LLMScheduler("test", tpm=1000)
+    order = []
+    started = time.monotonic()
+    await _request(scheduler, None, "first", order, tokens=100, max_tokens=800, used=300)
+    assert scheduler.get_stats()["window_tokens"] == 300
+
+    await _request(scheduler, None, "second", order, tokens=100, max_tokens=800)
+    assert order[-1][1] - started < 0.1
+    assert scheduler.get_stats()["window_tokens"] == 300 + 100 + 200
+
+
+async def test_users_are_served_round_robin():
+    scheduler = LLMScheduler("test", rpm=1)
+    order = []
+    tasks = [asyncio.create_task(_request(scheduler, "a", f"a{i}", order)) for i in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(_request(scheduler, "b", "b0", order)))
+    await asyncio.gather(*tasks)
+    assert [tag for tag, _ in order] == ["a0", "b0", "a1", "a2"]
+
+
+async def test_rate_limit_headers_pause_dispatch():
+    scheduler = LLMScheduler("test", tpm=100000)
+    order = []
+    async with scheduler.slot(100) as slot:
+        slot.observe(429, {"retry-after": "0.3"})
+    started = time.monotonic()
+    await _request(scheduler, None, "after", order)
+    assert order[0][1] - started >= 0.29
+    assert scheduler.get_stats()["rate_limited"] == 1
+
+    # Остаток токенов по данным провайдера меньше запроса - ждем сброса
+    async with scheduler.slot(100) as slot:
+        slot.observe(200, {"x-ratelimit-remaining-tokens": "50", "x-ratelimit-reset-tokens": "150ms"})
+    started = time.monotonic()
+    await _request(scheduler, None, "reset", order)
+    assert order[1][1] - started >= 0.14
+
+
+def test_parse_duration():
+    assert parse_duration("7.66s") == pytest.approx(7.66)
+    assert parse_duration("2m59.56s") == pytest.approx(179.56)
+    assert parse_duration("120ms") == pytest.approx(0.12)
+    assert parse_duration("3") == 3.0
+    assert parse_duration("") is None
@@ -0,0 +1,108 @@
+"""
+Тесты потоковых ответов LLM (utils/llm_stream.py) на локальной замене
+Groq (tools/fake_llm_api.py)
+"""
+import asyncio
+import json
+import time
+
+import aiohttp
+
+import ai_valuator
+from scrapers.base import Listing
+from tools.fake_llm_api import FakeLLMAPI
+from utils.llm_stream import ThrottledProgress, TopOffersParser, current_llm_progress, read_completion
+
+FILTERS = {"city": "барановичи", "min_price": 20000, "max_price": 60000, "min_rooms": 1, "max_rooms": 3}
+
+
+def _item(n: int) -> dict:
+    listing = Listing(
+        id=f"kufar_{n}", source="kufar", title="2-комн.", price=40000 + n, price_formatted="",
+        rooms=2, area=50.0, address="Барановичи, ул. Ленина, 1", url="", price_usd=40000 + n,
+    )
+    return {"listing": listing, "inspection": {}}
+
+
+def test_top_offers_are_parsed_from_partial_json():
+    response = json.dumps({
+        "analysis_summary": "Сравнено {3} варианта, \"лучшие\" ниже",
+        "top_offers": [
+            {"offer_id": "kufar_1", "reason": "цена } ниже {рынка", "critical_notes": []},
+            {"offer_id": "kufar_2", "reason": "кирпич", "critical_notes": ["нет лифта"]},
+        ],
+        "best_overall": {"offer_id": "kufar_1"},
+    }, ensure_ascii=False)
+    parser = TopOffersParser()
+    arrivals = []
+    for i, char in enumerate(response):
+        for offer in parser.feed(char):
+            arrivals.append((i, offer["offer_id"]))
+
+    assert [offer_id for _, offer_id in arrivals] == ["kufar_1", "kufar_2"]
+    # Первый вариант доступен задолго до конца ответа
+    assert arrivals[0][0] < response.index("kufar_2")
+
+
+async def test_streamed_completion_matches_plain_and_reports_picks(monkeypatch):
+    async with FakeLLMAPI(latency_ms=300, stream_chunks=20) as llm:
+        payload = {"messages": [{"role": "user", "content": "Оцени: $45 000, верни fair_price_usd"}]}
+        async with aiohttp.ClientSession() as session:
+            async with session.post(llm.completions_url, json=payload) as resp:
+                plain = await read_completion(resp)
+            chunks = []
+
+            async def on_text(text):
+                chunks.append(text)
+
+            payload.update(stream=True, stream_options={"include_usage": True})
+            async with session.post(llm.completions_url, json=payload) as resp:
+                streamed = await read_completion(resp, on_text)
+        assert streamed["choices"][0]["message"]["content"] == plain["choices"][0]["message"]["content"]
+        assert streamed["usage"] == plain["usage"]
+        assert len(chunks) > 1
+
+        monkeypatch.setattr(ai_valuator, "GROQ_API_KEY", "test")
+        monkeypatch.setattr(ai_valuator, "GROQ_MODEL", f"fake-{id(monkeypatch)}")
+        monkeypatch.setattr(ai_valuator, "GROQ_API_URL", llm.completions_url)
+        picks = []
+
+        async def on_pick(event):
+            picks.append((time.perf_counter(), event["listing"].id))
+
+        items = [_item(n) for n in range(5)]
+        prompt = ai_valuator._prepare_selection_prompt_detailed(items, FILTERS, 2)
+        token = current_llm_progress.set(on_pick)
+        try:
+            async with ai_valuator.AIValuator("groq") as valuator:
+                result = await valuator._select_best_groq_detailed(prompt, items)
+            finished = time.perf_counter()
+        finally:
+            current_llm_progress.reset(token)
+
+    assert [item["listing"].id for item in result] == ["kufar_0", "kufar_1"]
+    assert [listing_id for _, listing_id in picks] == ["kufar_0", "kufar_1"]
+    assert finished - picks[0][0] > 0.05
+
+
+async def test_throttled_progress_renders_latest_state_once_per_interval():
+    rendered = []
+    state = {"value": 0}
+
+    async def render():
+        rendered.append(state["value"])
+
+    progress = ThrottledProgress(render, interval=0.1)
+    for value in range(1, 6):
+        state["value"] = value
+        await progress.update()
+    assert rendered == [1]
+
+    await asyncio.sleep(0.15)
+    assert rendered == [1, 5]
+
+    state["value"] = 6
+    await progress.update()
+    progress.close()
+    await asyncio.sleep(0.15)
+    assert rendered == [1, 5]
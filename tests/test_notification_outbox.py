@@ -0,0 +1,123 @@
+"""
+Тесты очереди уведомлений (notification_outbox) на локальном файле libsql
+"""
+import pytest
+
+import database_turso
+from bot.services.notification_outbox import OutboxConsumer
+from scrapers.base import Listing
+from tests.conftest import query_local_turso as _query
+
+
+@pytest.fixture
+def local_db(local_turso):
+    return local_turso
+
+
+def _listing(i: int) -> Listing:
+    return Listing(
+        id=f"kufar_{i}", source="Kufar.by", title="2-комн.", price=50000 + i, price_formatted="$50 000",
+        rooms=2, area=50.0, address=f"ул. Тестовая {i}, Барановичи", url=f"https://re.kufar.by/vi/{i}",
+        photos=["a.jpg"], price_usd=50000 + i,
+    )
+
+
+async def test_enqueued_with_insert_only_once(local_db):
+    """В outbox попадают только реально вставленные объявления, payload восстанавливается"""
+    assert await database_turso.sync_apartments_batch([_listing(1), _listing(2)]) == ["kufar_1", "kufar_2"]
+    assert await database_turso.sync_apartments_batch([_listing(2), _listing(3)]) == ["kufar_3"]
+
+    rows = _query(local_db, "SELECT ad_id, status, payload FROM notification_outbox ORDER BY id")
+    assert [(row[0], row[1]) for row in rows] == [("kufar_1", "pending"), ("kufar_2", "pending"), ("kufar_3", "pending")]
+    restored = database_turso.listing_from_outbox_payload(rows[0][2])
+    assert (restored.id, restored.price_usd, restored.photos) == ("kufar_1", 50001, ["a.jpg"])
+
+
+async def test_lease_is_exclusive_until_expired(local_db):
+    """Арендованную запись не получит другой воркер, пока аренда не истекла"""
+    await database_turso.sync_apartments_batch([_listing(1), _listing(2)])
+
+    first = await database_turso.claim_outbox_batch("worker-a", limit=10, lease_seconds=60)
+    assert [row["ad_id"] for row in first] == ["kufar_1", "kufar_2"]
+    assert await database_turso.claim_outbox_batch("worker-b", limit=10, lease_seconds=60) == []
+
+    # Истекшую аренду (воркер упал) забирает другой воркер
+    _query(local_db, "UPDATE notification_outbox SET lease_until = 0")
+    second = await database_turso.claim_outbox_batch("worker-b", limit=1, lease_seconds=60)
+    assert [(row["ad_id"], row["attempts"]) for row in second] == [("kufar_1", 2)]
+
+    # Прежний владелец не может завершить перехваченную запись, но sent_ads записываются
+    done = await database_turso.complete_outbox_batch([row["id"] for row in first], "worker-a", {42: ["kufar_1"]})
+    assert done == 1
+    assert _query(local_db, "SELECT telegram_id, ad_external_id FROM sent_ads") == [(42, "kufar_1")]
+    assert _query(local_db, "SELECT ad_id, status FROM notification_outbox ORDER BY id") == [
+        ("kufar_1", "leased"), ("kufar_2", "done"),
+    ]
+
+
+async def test_consumer_delivers_batch_and_records_sent_ads(local_db):
+    """Воркер рассылает партию и одной транзакцией отмечает ее и sent_ads"""
+    await database_turso.sync_apartments_batch([_listing(1), _listing(2), _listing(3)])
+    delivered = []
+
+    async def _deliver(listings):
+        delivered.append([listing.id for listing in listings])
+        return {1: ["kufar_1", "kufar_3"], 2: ["kufar_2"]}
+
+    consumer = OutboxConsumer(deliver=_deliver, batch_size=10)
+    assert await consumer.process_batch("worker-a") == 3
+    assert await consumer.process_batch("worker-a") == 0
+
+    assert delivered == [["kufar_1", "kufar_2", "kufar_3"]]
+    assert _query(local_db, "SELECT COUNT(*) FROM notification_outbox WHERE status = 'done'") == [(3,)]
+    assert sorted(_query(local_db, "SELECT telegram_id, ad_external_id FROM sent_ads")) == [
+        (1, "kufar_1"), (1, "kufar_3"), (2, "kufar_2"),
+    ]
+    stats = consumer.get_stats()
+    assert stats["delivered"] == 3 and stats["messages"] == 3
+    assert stats["lag_max"] >= 0
+
+
+async def test_failed_delivery_retried_then_failed(local_db):
+    """Ошибка доставки возвращает партию в очередь, после max_attempts - failed"""
+    await database_turso.sync_apartments_batch([_listing(1)])
+
+    async def _deliver(listings):
+        raise RuntimeError("telegram недоступен")
+
+    consumer = OutboxConsumer(deliver=_deliver, max_attempts=2)
+    await consumer.process_batch("worker-a")
+    assert _query(local_db, "SELECT status, attempts, last_error FROM notification_outbox") == [
+        ("pending", 1, "telegram недоступен"),
+    ]
+    await consumer.process_batch("worker-a")
+    assert _query(local_db, "SELECT status FROM notification_outbox") == [("failed",)]
+    assert await consumer.process_batch("worker-a") == 0
+    assert _query(local_db, "SELECT COUNT(*) FROM sent_ads") == [(0,)]
+
+
+async def test_claims_of_crashed_delivery_are_taken_over_with_batch(local_db):
+    """Воркер упал после захвата sent_ads: партию и захваты забирает следующий воркер"""
+    await database_turso.sync_apartments_batch([_listing(1)])
+
+    async def _crash(listings):
+        owner = database_turso.new_sent_claim_owner()
+        assert await database_turso.claim_ads_for_user_turso(42, ["kufar_1"], owner) == ["kufar_1"]
+        raise SystemExit("процесс упал")
+
+    with pytest.raises(SystemExit):
+        await OutboxConsumer(deliver=_crash).process_batch("worker-a")
+    # Пока аренда жива, захват упавшей рассылки не перехватывается
+    assert await database_turso.claim_ads_for_user_turso(42, ["kufar_1"], "other") == []
+
+    async def _deliver(listings):
+        owner = database_turso.new_sent_claim_owner()
+        claimed = await database_turso.claim_ads_for_user_turso(42, [listing.id for listing in listings], owner)
+        await database_turso.complete_ad_claims_turso(42, claimed, owner)
+        return {42: claimed}
+
+    # Аренда истекла (SENT_CLAIM_TTL_SECONDS еще нет): следующий воркер доставляет партию
+    _query(local_db, "UPDATE notification_outbox SET lease_until = 0")
+    assert await OutboxConsumer(deliver=_deliver).process_batch("worker-b") == 1
+    assert _query(local_db, "SELECT telegram_id, ad_external_id, state FROM sent_ads") == [(42, "kufar_1", "sent")]
+    assert _query(local_db, "SELECT status FROM notification_outbox") == [("done",)]
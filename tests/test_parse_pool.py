@@ -0,0 +1,41 @@
+"""
+Тесты разбора HTML в пуле процессов (utils/parse_pool.py)
+"""
+from ai_valuator import extract_listing_page
+from benchmarks.parse_offload import make_page
+from scrapers.realt import RealtByScraper
+from utils import parse_pool
+
+
+async def test_pool_matches_inline_parsing(monkeypatch):
+    """В пуле получаются те же Listing, что и при разборе в event loop"""
+    html = make_page(30)
+    scraper = RealtByScraper()
+    inline = scraper._parse_html(html, 1, 4, 0, 10_000_000)
+
+    monkeypatch.setattr(parse_pool, "HTML_PARSE_POOL_SIZE", 1)
+    monkeypatch.setattr(parse_pool, "HTML_PARSE_INLINE_MAX_BYTES", 1024)
+    monkeypatch.setattr(parse_pool, "_stats", {"pool": 0, "inline": 0, "fallback": 0})
+    try:
+        pooled = await parse_pool.parse_listings(scraper, html, 1, 4, 0, 10_000_000)
+        page = await parse_pool.run_parse(extract_listing_page, html, "https://realt.by/x", "ул. Ленина")
+    finally:
+        parse_pool.shutdown_parse_pool()
+
+    assert len(inline) == 30
+    assert [listing.to_dict() for listing in pooled] == [listing.to_dict() for listing in inline]
+    # Порядок фото с одинаковым ключом сортировки зависит от хеша строк в процессе
+    expected = extract_listing_page(html, "https://realt.by/x", "ул. Ленина")
+    assert {**page, "all_photos": None} == {**expected, "all_photos": None}
+    assert len(page["all_photos"]) == len(expected["all_photos"]) == 10
+    assert parse_pool.get_parse_pool_stats()["pool"] == 2
+
+
+async def test_small_document_is_parsed_inline(monkeypatch):
+    """Маленький документ разбирается без пула (пул даже не создается)"""
+    monkeypatch.setattr(parse_pool, "HTML_PARSE_POOL_SIZE", 1)
+    monkeypatch.setattr(parse_pool, "_stats", {"pool": 0, "inline": 0, "fallback": 0})
+    listings = await parse_pool.parse_listings(RealtByScraper(), make_page(2), 1, 4, 0, 10_000_000)
+
+    assert len(listings) == 2
+    assert parse_pool.get_parse_pool_stats() == {"size": 1, "running": False, "pool": 0, "inline": 1, "fallback": 0}
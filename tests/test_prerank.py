@@ -0,0 +1,61 @@
+"""
+Тесты пре-ранжирования кандидатов ИИ-подбора (utils/prerank.py)
+"""
+from scrapers.base import Listing
+from utils.prerank import PrerankStats, pareto_front, prerank_listings, selection_llm_calls
+
+
+def _listing(n: int, price: int, area: float, year: str = "2000") -> Listing:
+    return Listing(
+        id=f"realt_{n}", source="realt", title="2-комн.", price=price, price_formatted=f"${price}",
+        rooms=2, area=area, address="Барановичи, ул. Ленина, 1", url="", price_usd=price, year_built=year,
+    )
+
+
+def test_dominated_listings_are_dropped():
+    best = _listing(1, 50000, 60.0, "2015")
+    dominated = _listing(2, 55000, 55.0, "1985")  # дороже за м², старше и меньше
+    bigger = _listing(3, 70000, 80.0, "2015")  # дороже за м², но больше - не доминируется
+    unknown = _listing(4, 40000, 50.0, "")  # без года сравнить нельзя
+
+    assert pareto_front([best, dominated, bigger, unknown]) == [best, bigger, unknown]
+
+
+def test_ranked_by_value_against_market_median():
+    cheap = _listing(1, 40000, 50.0, "1990")
+    new = _listing(2, 52000, 50.0, "2020")
+    pricey = _listing(3, 90000, 75.0, "2021")
+
+    ranked = prerank_listings([pricey, new, cheap])
+    assert [listing.id for listing in ranked] == ["realt_1", "realt_2", "realt_3"]
+
+
+def test_dominated_listings_backfill_up_to_min_count():
+    best = _listing(0, 40000, 70.0, "2020")  # доминирует над остальными
+    others = [_listing(n, 50000 + 1000 * n, 60.0, "2000") for n in range(1, 5)]
+
+    assert [listing.id for listing in prerank_listings([*others, best])] == ["realt_0"]
+    ranked = prerank_listings([*others, best], min_count=3)
+    assert [listing.id for listing in ranked] == ["realt_0", "realt_1", "realt_2"]
+    assert len(prerank_listings([*others, best], min_count=10)) == 5
+
+
+def test_llm_calls_follow_selection_tournament():
+    # 100 кандидатов: 9 батчей -> 18 вариантов -> раунд из 2 батчей -> финальное сравнение
+    assert selection_llm_calls(100, 5) == 12
+    # 24 кандидата: 2 батча по топ-2 - вариантов не больше max_results
+    assert selection_llm_calls(24, 5) == 2
+    assert selection_llm_calls(10, 5) == 1
+    assert selection_llm_calls(0, 5) == 0
+
+
+def test_stats_report_savings_and_agreement():
+    stats = PrerankStats()
+    avoided = stats.record_run(candidates=100, dominated=40, sent=24, max_results=5, tokens_avoided=9000)
+    assert avoided == {"llm_calls": 10, "tokens": 9000}
+
+    stats.record_picks(["a", "b", "c", "d"], ["b", "d", "a"])
+    result = stats.get_stats()
+    assert (result["llm_picks"], result["picks_in_prerank_top"]) == (3, 2)
+    assert result["agreement"] == round(2 / 3, 3)
+    assert result["top1_agreement"] == 0.0
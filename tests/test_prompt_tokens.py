@@ -0,0 +1,64 @@
+"""
+Тесты подсчета токенов (utils/tokens.py) и компактных промптов ИИ-подбора
+"""
+from ai_valuator import _listing_row, _pack_batches, _relevant_excerpt
+from scrapers.base import Listing
+from utils.tokens import TokenCalibration, raw_token_count
+
+FILTERS = {"city": "барановичи", "min_price": 20000, "max_price": 60000, "min_rooms": 1, "max_rooms": 3}
+
+
+def _item(n: int, description: str = "") -> dict:
+    listing = Listing(
+        id=f"kufar_{n}", source="Kufar.by", title=f"{n % 3 + 1}-комн. квартира", price=40000 + n * 100,
+        price_formatted="", rooms=n % 3 + 1, area=40.0 + n, address=f"Барановичи, ул. Ленина, {n}",
+        url=f"https://re.kufar.by/vi/{n}", year_built="2005", floor="3", total_floors="9",
+        price_usd=40000 + n * 100, description=description,
+    )
+    return {"listing": listing, "inspection": {}}
+
+
+def test_token_count_is_additive_over_lines_and_calibrated():
+    lines = ["kufar_1|2|48|3/9|2005|41000", "Уютная квартира с ремонтом, 2 балкона!", "Ленина, 15"]
+    assert raw_token_count("\n".join(lines) + "\n") == sum(raw_token_count(line + "\n") for line in lines)
+
+    calibration = TokenCalibration()
+    calibration.observe(100, 130)
+    assert calibration.apply(200) == 260
+    # Выбросы usage ограничены
+    calibration.observe(100, 10_000)
+    assert calibration.ratio <= 2.0
+
+
+def test_relevant_excerpt_keeps_share_sentences():
+    text = (
+        "Продается светлая квартира. Рядом парк и остановка. Во дворе детская площадка. "
+        "Продается 1/2 доли в квартире. Хороший ремонт, кирпичный дом."
+    )
+    excerpt = _relevant_excerpt(text, 70)
+    assert len(excerpt) <= 70
+    assert "1/2 доли" in excerpt
+    assert "ремонт" in excerpt
+    assert "детская площадка" not in excerpt
+
+
+def test_batches_are_packed_to_token_budget():
+    items = [_item(n, "Хороший ремонт, кирпичный дом, балкон застеклен. " * 3) for n in range(40)]
+    assert _listing_row(items[0]).startswith("kufar_0|")
+
+    batches = _pack_batches(items, FILTERS, budget_tokens=3000)
+    assert [item["listing"].id for batch in batches for item in batch] == [item["listing"].id for item in items]
+    # Компактные строки: в бюджет помещается больше прежних 12 объявлений
+    assert len(batches[0]) > 12
+
+    small = _pack_batches(items, FILTERS, budget_tokens=1500)
+    assert len(small) > len(batches)
+
+
+def test_tiny_budget_keeps_batches_large_enough_to_shrink_rounds():
+    items = [_item(n, "Хороший ремонт, кирпичный дом, балкон застеклен. " * 3) for n in range(13)]
+    batches = _pack_batches(items, FILTERS, budget_tokens=1)
+    # Из батча выбираются 2 лучших: раунд турнира должен сокращать 13 вариантов
+    assert all(len(batch) >= 3 for batch in batches[:-1])
+    assert 2 * len(batches) < len(items)
+    assert [item["listing"].id for batch in batches for item in batch] == [item["listing"].id for item in items]
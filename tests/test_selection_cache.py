@@ -0,0 +1,73 @@
+"""
+Тесты кэша ИИ-подборов (utils/selection_cache.py)
+"""
+import asyncio
+
+from scrapers.base import Listing
+from utils.selection_cache import SelectionCache
+
+FILTERS = {"city": "Барановичи", "min_price": 20000, "max_price": 60000, "min_rooms": 1, "max_rooms": 3}
+
+
+def _listings(*numbers: int):
+    return [
+        Listing(
+            id=f"realt_{n}", source="realt", title="2-комн.", price=30000 + n, price_formatted=f"${30000 + n}",
+            rooms=2, area=50.0, address="Барановичи", url="",
+        )
+        for n in numbers
+    ]
+
+
+def _selector(delay: float = 0.0):
+    """Турнир: два варианта с наименьшим номером; запоминает состав каждого турнира"""
+    pools = []
+
+    async def select(pool):
+        pools.append(sorted(int(listing.id.split("_")[1]) for listing in pool))
+        await asyncio.sleep(delay)
+        winners = sorted(pool, key=lambda listing: listing.price)[:2]
+        return [{"listing": listing, "reason": f"вариант {listing.id}"} for listing in winners]
+
+    return select, pools
+
+
+async def test_same_candidates_and_filter_share_one_tournament():
+    select, pools = _selector(delay=0.05)
+    cache = SelectionCache(ttl_seconds=3600, max_entries=10)
+
+    results = await asyncio.gather(*(cache.get_or_select(_listings(*range(10)), FILTERS, 5, "1", select) for _ in range(3)))
+    again = await cache.get_or_select(_listings(*reversed(range(10))), dict(FILTERS, city=" барановичи "), 5, "1", select)
+
+    assert len(pools) == 1
+    assert all([r["listing"].id for r in result] == ["realt_0", "realt_1"] for result in results + [again])
+    results[0][0]["reason"] = "изменено"
+    assert again[0]["reason"] == "вариант realt_0"
+
+    # Другая версия промпта или max_results - отдельный турнир
+    await cache.get_or_select(_listings(*range(10)), FILTERS, 5, "2", select)
+    assert len(pools) == 2
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["shared"], stats["misses"]) == (1, 2, 2)
+
+
+async def test_overlapping_user_reranks_only_delta():
+    select, pools = _selector()
+    cache = SelectionCache(ttl_seconds=3600, max_entries=10)
+    await cache.get_or_select(_listings(*range(10)), FILTERS, 5, "1", select)
+
+    # Другой бюджет, но те же победители и 2 новых кандидата: в турнир идут победители + дельта
+    other = dict(FILTERS, max_price=50000)
+    results = await cache.get_or_select(_listings(*range(8), 20, 21), other, 5, "1", select)
+    assert pools[-1] == [0, 1, 20, 21]
+    assert [r["listing"].id for r in results] == ["realt_0", "realt_1"]
+
+    # Кандидаты - подмножество прошлого турнира: без запросов к ИИ
+    await cache.get_or_select(_listings(0, 1, 2, 3), other, 5, "1", select)
+    assert len(pools) == 2
+
+    # Победителя прошлых турниров нет среди кандидатов - полный турнир
+    await cache.get_or_select(_listings(*range(1, 10)), other, 5, "1", select)
+    assert pools[-1] == list(range(1, 10))
+    stats = cache.get_stats()
+    assert (stats["delta_runs"], stats["reranked"], stats["misses"]) == (1, 2, 2)
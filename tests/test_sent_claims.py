@@ -0,0 +1,165 @@
+"""
+Тесты захвата объявлений перед отправкой (sent_ads.state='pending')
+"""
+import asyncio
+
+import database_turso
+from tests.conftest import query_local_turso as _query
+
+
+async def _add_apartment(path: str, ad_id: str):
+    _query(path, "INSERT INTO apartments (ad_id, source, url) VALUES (?, 'kufar', ?)", (ad_id, f"https://x/{ad_id}"))
+
+
+async def test_second_worker_cannot_claim(local_turso):
+    """Захваченное объявление не получит другой воркер, пока захват не снят"""
+    ads = ["kufar_1", "kufar_2"]
+    assert await database_turso.claim_ads_for_user_turso(42, ads, "a") == ads
+    assert await database_turso.claim_ads_for_user_turso(42, ads, "b") == []
+    # Другому пользователю те же объявления доступны
+    assert await database_turso.claim_ads_for_user_turso(7, ads, "b") == ads
+
+    # Неудачная отправка: захват снят, объявление можно отправить снова
+    assert await database_turso.release_ad_claims_turso(42, ["kufar_2"], "a") == 1
+    assert await database_turso.claim_ads_for_user_turso(42, ads, "b") == ["kufar_2"]
+
+    # Снять или завершить чужой захват нельзя
+    assert await database_turso.release_ad_claims_turso(42, ["kufar_2"], "a") == 0
+    assert await database_turso.complete_ad_claims_turso(42, ["kufar_1"], "a") == 1
+    assert await database_turso.release_ad_claims_turso(42, ["kufar_1"], "a") == 0
+    assert _query(local_turso, "SELECT ad_external_id, state FROM sent_ads WHERE telegram_id = 42 ORDER BY ad_external_id") == [
+        ("kufar_1", "sent"), ("kufar_2", "pending"),
+    ]
+
+
+async def test_pending_counts_as_sent_and_mark_completes(local_turso):
+    """Свежий захват для читателей - уже отправлено; mark_ad_sent завершает захват"""
+    await _add_apartment(local_turso, "kufar_1")
+    await database_turso.claim_ads_for_user_turso(42, ["kufar_1"], "a")
+    assert await database_turso.is_ad_sent_to_user_turso(42, "kufar_1")
+
+    assert await database_turso.mark_ad_sent_to_user_turso(42, "kufar_1")
+    assert _query(local_turso, "SELECT state, claimed_by FROM sent_ads") == [("sent", None)]
+    # Отправленное объявление не захватывается повторно
+    assert await database_turso.claim_ads_for_user_turso(42, ["kufar_1"], "b") == []
+
+
+async def test_abandoned_claim_is_taken_over(local_turso):
+    """Захват упавшего процесса перехватывается после SENT_CLAIM_TTL_SECONDS"""
+    await _add_apartment(local_turso, "kufar_1")
+    await database_turso.claim_ads_for_user_turso(42, ["kufar_1"], "crashed")
+    _query(local_turso, "UPDATE sent_ads SET claimed_at = 0")
+
+    assert not await database_turso.is_ad_sent_to_user_turso(42, "kufar_1")
+    assert await database_turso.claim_ads_for_user_turso(42, ["kufar_1"], "b") == ["kufar_1"]
+    assert _query(local_turso, "SELECT claimed_by FROM sent_ads") == [("b",)]
+
+
+async def test_concurrent_workers_split_ads(local_turso):
+    """Параллельные воркеры не получают одно объявление дважды"""
+    ads = [f"kufar_{i}" for i in range(30)]
+    results = await asyncio.gather(*(
+        database_turso.claim_ads_for_user_turso(42, ads, f"worker-{n}") for n in range(4)
+    ))
+    claimed = [ad for result in results for ad in result]
+    assert sorted(claimed) == sorted(ads)
+
+
+def test_migration_adds_claim_columns(tmp_path, monkeypatch):
+    """Существующая sent_ads без колонок захвата мигрируется без потери строк"""
+    import libsql
+
+    path = str(tmp_path / "old.db")
+    _query(path, """
+        CREATE TABLE sent_ads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER NOT NULL,
+            ad_external_id TEXT NOT NULL,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(telegram_id, ad_external_id)
+        )
+    """)
+    _query(path, "INSERT INTO sent_ads (telegram_id, ad_external_id) VALUES (42, 'kufar_1')")
+    monkeypatch.setattr(database_turso, "get_turso_connection", lambda: libsql.connect(path))
+
+    assert asyncio.run(database_turso.ensure_tables_exist())
+    assert _query(path, "SELECT ad_external_id, state FROM sent_ads") == [("kufar_1", "sent")]
+
+
+async def test_delivery_survives_claim_error(monkeypatch):
+    """Ошибка БД при захвате не прерывает доставку: объявления уходят без захвата"""
+    import database
+    from bot.services import notification_service, search_service
+    from scrapers.base import Listing
+
+    listing = Listing(
+        id="kufar_1", source="kufar", title="2-комн.", price=40000, price_formatted="",
+        rooms=2, area=50.0, address="Барановичи", url="", price_usd=40000,
+    )
+
+    async def get_user_filters(user_id):
+        return {"city": "барановичи"}
+
+    async def claim_ads_for_user(**kwargs):
+        raise RuntimeError("database is locked")
+
+    async def send_to_user(bot, user_id, user_filters, listings, owner, debug_bypass_summary):
+        assert owner is None
+        return listings
+
+    async def fail(**kwargs):
+        raise AssertionError("захвата не было - снимать и завершать нечего")
+
+    monkeypatch.setattr(database, "get_user_filters", get_user_filters)
+    monkeypatch.setattr(search_service, "validate_user_filters", lambda filters: (True, ""))
+    monkeypatch.setattr(search_service, "matches_user_filters", lambda *args, **kwargs: True)
+    monkeypatch.setattr(notification_service, "claim_ads_for_user", claim_ads_for_user)
+    monkeypatch.setattr(notification_service, "complete_ad_claims", fail)
+    monkeypatch.setattr(notification_service, "release_ad_claims", fail)
+    monkeypatch.setattr(notification_service, "_send_to_user", send_to_user)
+
+    delivered = await notification_service.deliver_listings_to_user(None, 42, [listing])
+    assert delivered == [listing]
+
+
+async def test_ai_mode_completes_only_shown_picks(monkeypatch):
+    """ИИ-режим: отправленными отмечаются только показанные варианты, захват остальных снимается"""
+    import database
+    from bot.services import ai_service, notification_service, search_service
+    from scrapers.base import Listing
+
+    listings = [
+        Listing(
+            id=f"kufar_{n}", source="kufar", title="2-комн.", price=40000 + n, price_formatted="",
+            rooms=2, area=50.0, address="Барановичи", url="", price_usd=40000 + n,
+        )
+        for n in range(4)
+    ]
+    calls = {}
+
+    async def get_user_filters(user_id):
+        return {"city": "барановичи", "ai_mode": True}
+
+    async def claim_ads_for_user(telegram_id, ad_external_ids, owner):
+        return list(ad_external_ids)
+
+    async def check_new_listings_ai_mode(bot, user_id, user_filters, candidates):
+        return candidates[:2]
+
+    def record(name):
+        async def _record(telegram_id, ad_external_ids, owner):
+            calls[name] = sorted(ad_external_ids)
+        return _record
+
+    monkeypatch.setattr(database, "get_user_filters", get_user_filters)
+    monkeypatch.setattr(search_service, "validate_user_filters", lambda filters: (True, ""))
+    monkeypatch.setattr(search_service, "matches_user_filters", lambda *args, **kwargs: True)
+    monkeypatch.setattr(ai_service, "check_new_listings_ai_mode", check_new_listings_ai_mode)
+    monkeypatch.setattr(notification_service, "claim_ads_for_user", claim_ads_for_user)
+    monkeypatch.setattr(notification_service, "complete_ad_claims", record("complete"))
+    monkeypatch.setattr(notification_service, "release_ad_claims", record("release"))
+    monkeypatch.setitem(notification_service.USER_DELIVERY_MODES, 42, notification_service.DELIVERY_MODE_FULL)
+
+    delivered = await notification_service.deliver_listings_to_user(None, 42, listings)
+    assert delivered == listings[:2]
+    assert calls == {"complete": ["kufar_0", "kufar_1"], "release": ["kufar_2", "kufar_3"]}
@@ -0,0 +1,76 @@
+"""
+Тесты многопроцессного режима: консистентный хеш, план по городам, шарды outbox
+"""
+import database_turso
+from bot.services.cluster import CityJob, plan_city_jobs, run_city_job
+from tests.conftest import query_local_turso as _query
+from tests.test_notification_outbox import _listing
+from utils.sharding import HashRing, shard_for_user
+
+
+def test_ring_moves_about_one_nth_of_users():
+    """При добавлении шарда переезжает ~1/N пользователей и только на новый шард"""
+    users = range(100000, 110000)
+    before = {user: shard_for_user(user, 4) for user in users}
+    after = {user: shard_for_user(user, 5) for user in users}
+
+    moved = [user for user in users if before[user] != after[user]]
+    assert all(after[user] == 4 for user in moved)
+    assert 0.1 < len(moved) / len(users) < 0.3
+
+    sizes = [len(keys) for keys in HashRing(4).split(users).values()]
+    assert min(sizes) > len(users) / 4 * 0.7
+
+
+def test_plan_city_jobs_merges_ranges():
+    """Один проход на город с объединением диапазонов; невалидные фильтры пропускаются"""
+    jobs = plan_city_jobs({
+        1: {"city": "Барановичи", "min_rooms": 2, "max_rooms": 3, "min_price": 30000, "max_price": 50000},
+        2: {"city": "барановичи ", "min_rooms": 1, "max_rooms": 2, "min_price": None, "max_price": 40000},
+        3: {"city": "брест", "min_rooms": 1, "max_rooms": 4},
+        4: {"city": "", "min_rooms": 1, "max_rooms": 4},
+        5: None,
+    })
+    assert [(job.city, job.min_rooms, job.max_rooms, job.min_price, job.user_ids) for job in jobs] == [
+        ("барановичи", 1, 3, 0, {1, 2}),
+        ("брест", 1, 4, 0, {3}),
+    ]
+    assert jobs[0].max_price == 50000
+
+
+async def test_outbox_fans_out_per_shard(local_turso, monkeypatch):
+    """Объявление ставится в очередь каждого шарда; воркер шарда видит только свои записи"""
+    monkeypatch.setattr(database_turso, "NOTIFY_SHARDS", 2)
+    await database_turso.sync_apartments_batch([_listing(1)])
+    assert _query(local_turso, "SELECT ad_id, shard FROM notification_outbox ORDER BY shard") == [
+        ("kufar_1", 0), ("kufar_1", 1),
+    ]
+
+    rows = await database_turso.claim_outbox_batch("a", limit=10, lease_seconds=60, shard=1)
+    assert [row["ad_id"] for row in rows] == ["kufar_1"]
+    assert await database_turso.claim_outbox_batch("b", limit=10, lease_seconds=60, shard=1) == []
+    assert len(await database_turso.claim_outbox_batch("b", limit=10, lease_seconds=60, shard=0)) == 1
+
+    # После уменьшения числа шардов записи лишнего шарда удаляются
+    monkeypatch.setattr(database_turso, "NOTIFY_SHARDS", 1)
+    assert await database_turso.purge_notification_outbox() == 1
+
+
+async def test_city_job_scrapes_default_sources(monkeypatch):
+    """Координатор парсит те же источники, что и обычная проверка"""
+    import config
+    from scrapers import aggregator
+
+    created = []
+
+    class Aggregator:
+        def __init__(self, **kwargs):
+            created.append(kwargs)
+
+        async def iter_listings(self, **kwargs):
+            yield [_listing(1), _listing(2)]
+
+    monkeypatch.setattr(aggregator, "ListingsAggregator", Aggregator)
+    job = CityJob(city="барановичи", min_rooms=1, max_rooms=3, min_price=0, max_price=50000)
+    assert await run_city_job(job) == 2
+    assert created == [{"enabled_sources": config.DEFAULT_SOURCES}]
@@ -0,0 +1,95 @@
+"""
+Тесты локального сравнения новых объявлений с выбранными ИИ (utils/similarity.py)
+"""
+import json
+import zlib
+
+from scrapers.base import Listing
+from utils.similarity import LocalComparator, listing_features, text_vector
+
+
+def _listing(n: int, price: int, area: float = 50.0, rooms: int = 2, description: str = "") -> Listing:
+    return Listing(
+        id=f"kufar_{n}", source="kufar", title=f"{rooms}-комн. квартира", price=price, price_formatted="",
+        rooms=rooms, area=area, address="Барановичи, ул. Ленина, 1", url="", price_usd=price,
+        floor="3", total_floors="9", year_built="2008", house_type="кирпичный", description=description,
+    )
+
+
+def _selected(listing: Listing) -> dict:
+    # Как после save_ai_selected_listings / get_ai_selected_listings
+    return {"listing_id": listing.id, "reason": "", "features": json.loads(json.dumps(listing_features(listing)))}
+
+
+def test_text_vector_buckets_are_stable():
+    vector = text_vector("Уютная квартира с ремонтом, рядом парк")
+    assert vector == text_vector("уютная КВАРТИРА с ремонтом; рядом парк")
+    # Номера корзин не зависят от PYTHONHASHSEED (crc32): признаки сохраняются в БД
+    assert text_vector("ремонт ремонт") == {str(zlib.crc32("ремонт".encode("utf-8")) % 2048): 1.6931,
+                                            str(zlib.crc32("ремонт ремонт".encode("utf-8")) % 2048): 1.0}
+
+
+def test_triage_skips_worse_and_duplicates_and_escalates_close_ones():
+    description = "Квартира в кирпичном доме, хороший ремонт, застекленный балкон, рядом школа"
+    incumbents = [_listing(1, 40000, description=description), _listing(2, 42000, area=52.0, description=description)]
+    new = [
+        _listing(3, 60000, description=description),            # та же квартира на 50% дороже
+        _listing(4, 41000, description="Светлая квартира, новая сантехника, рядом парк"),  # близкая - решает LLM
+        _listing(5, 36000, description=description),            # дешевле выбранных - решает LLM
+        _listing(1, 40000, description=description),            # уже выбрана
+    ]
+    comparator = LocalComparator(margin=0.05, min_similarity=0.4, duplicate_similarity=0.999)
+    decisions = {d["listing"].id: d for d in comparator.triage(new, [_selected(l) for l in incumbents])}
+
+    assert decisions["kufar_3"]["decision"] == "worse"
+    assert decisions["kufar_3"]["incumbent_id"] == "kufar_1"
+    assert decisions["kufar_4"]["decision"] == "escalate"
+    assert decisions["kufar_5"]["decision"] == "escalate"
+    assert decisions["kufar_1"]["decision"] == "duplicate"
+    assert comparator.get_stats()["skipped_worse"] == 1
+
+
+def test_cheaper_twin_of_selected_listing_goes_to_llm():
+    description = "Квартира в кирпичном доме, хороший ремонт, застекленный балкон, рядом школа"
+    incumbent = _listing(1, 50000, description=description)
+    comparator = LocalComparator(margin=0.05, min_similarity=0.4, duplicate_similarity=0.97)
+    decisions = comparator.triage(
+        [_listing(2, 40000, description=description), _listing(3, 50500, description=description)],
+        [_selected(incumbent)],
+    )
+
+    # Та же квартира на 20% дешевле - не повтор, решает LLM; почти та же цена - повтор
+    assert decisions[0]["similarity"] >= 0.97 and decisions[0]["delta"] > 0.05
+    assert [d["decision"] for d in decisions] == ["escalate", "duplicate"]
+
+
+def test_selections_without_features_escalate_everything():
+    comparator = LocalComparator(margin=0.05, min_similarity=0.4, duplicate_similarity=0.97)
+    previous = [{"listing_id": "kufar_1", "reason": "", "features": None}]
+    decisions = comparator.triage([_listing(3, 90000)], previous)
+    assert [d["decision"] for d in decisions] == ["escalate"]
+    assert comparator.get_stats()["no_features"] == 1
+
+
+async def test_selected_features_roundtrip_and_migration(tmp_path, monkeypatch):
+    import aiosqlite
+
+    import database
+
+    path = str(tmp_path / "bot.db")
+    monkeypatch.setattr(database, "DATABASE_PATH", path)
+    # Таблица из прежней версии - без колонки features
+    async with aiosqlite.connect(path) as db:
+        await db.execute(
+            "CREATE TABLE ai_selected_listings (user_id INTEGER, listing_id TEXT, reason TEXT, "
+            "selected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (user_id, listing_id))"
+        )
+        await db.execute("INSERT INTO ai_selected_listings (user_id, listing_id, reason) VALUES (1, 'kufar_old', '')")
+        await db.commit()
+    await database.init_database()
+
+    assert (await database.get_ai_selected_listings(1))[0]["features"] is None
+    listing = _listing(1, 40000, description="Кирпичный дом, ремонт")
+    await database.save_ai_selected_listings(1, [{"listing": listing, "reason": "дешево"}])
+    [selected] = await database.get_ai_selected_listings(1)
+    assert selected["features"] == json.loads(json.dumps(listing_features(listing)))
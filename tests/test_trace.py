@@ -0,0 +1,73 @@
+"""
+Тесты для структурированной трассировки (utils/trace.py)
+"""
+import json
+
+import pytest
+
+from utils.trace import (
+    start_trace,
+    stop_trace,
+    is_tracing,
+    trace_event,
+    get_recent_events,
+)
+
+
+@pytest.fixture(autouse=True)
+def _stop_trace_after_test():
+    """Гарантирует, что трассировка не протекает между тестами"""
+    yield
+    stop_trace()
+
+
+def test_trace_disabled_is_noop():
+    """Без start_trace события игнорируются"""
+    assert not is_tracing()
+    trace_event("listing.filtered", user_id=1)
+    assert get_recent_events() == []
+    assert stop_trace() is None
+
+
+def test_trace_writes_jsonl(tmp_path):
+    """События пишутся в JSONL в фоновом потоке"""
+    path = tmp_path / "trace_{run_id}.jsonl"
+    tracer = start_trace(run_id="test", path=str(path))
+
+    trace_event("run.active_users", always=True, count=2, user_ids=[1, 2])
+    trace_event("listing.filtered", user_id=1, listing_id="kufar_1")
+
+    summary = stop_trace()
+    assert summary["events"] == 2
+    assert not is_tracing()
+
+    lines = (tmp_path / "trace_test.jsonl").read_text(encoding="utf-8").splitlines()
+    events = [json.loads(line) for line in lines]
+    assert [e["event"] for e in events] == ["run.active_users", "listing.filtered"]
+    assert events[0]["run_id"] == tracer.run_id
+    assert events[1]["data"] == {"user_id": 1, "listing_id": "kufar_1"}
+
+
+def test_trace_sampling_keeps_always_events(tmp_path):
+    """Семплирование не отбрасывает сводные события"""
+    start_trace(run_id="sampled", path=str(tmp_path / "t.jsonl"), sample_rate=0.0)
+
+    for i in range(50):
+        trace_event("listing.filtered", listing_id=i)
+    trace_event("user.listings_done", always=True, sent=0)
+
+    summary = stop_trace()
+    assert summary["events"] == 1
+    assert summary["sampled_out"] == 50
+
+
+def test_trace_ring_buffer_is_bounded(tmp_path):
+    """Кольцевой буфер хранит только последние события"""
+    start_trace(run_id="ring", path=str(tmp_path / "t.jsonl"), buffer_size=5)
+
+    for i in range(20):
+        trace_event("listing.filtered", listing_id=i)
+
+    recent = get_recent_events()
+    assert len(recent) == 5
+    assert [e["data"]["listing_id"] for e in recent] == [15, 16, 17, 18, 19]
@@ -0,0 +1,89 @@
+"""
+Тесты кэша ИИ-оценок (utils/valuation_cache.py) на локальном файле libsql
+"""
+import asyncio
+import time
+
+from scrapers.base import Listing
+from tests.conftest import query_local_turso as _query
+from utils.valuation_cache import ValuationCache
+
+
+def _listing(price: int = 50000, description: str = "Ремонт 2020 года") -> Listing:
+    return Listing(
+        id="realt_1",
+        source="Realt.by",
+        title="2-комн. квартира",
+        price=price,
+        price_formatted=f"${price}",
+        rooms=2,
+        area=52.0,
+        address="Барановичи, ул. Ленина, 1",
+        url="https://realt.by/sale/flats/object/1/",
+        description=description,
+        price_usd=price,
+    )
+
+
+def _valuator(delay: float = 0.0):
+    """Функция оценки, считающая вызовы"""
+    calls = []
+
+    async def valuate(listing):
+        calls.append(listing.price)
+        await asyncio.sleep(delay)
+        return {"fair_price_usd": listing.price - 1000, "value_score": 7, "tokens_used": 900}
+
+    return valuate, calls
+
+
+async def test_one_valuation_per_listing_version(local_turso):
+    """Повтор - из кэша (и после перезапуска процесса); новая цена - новая оценка"""
+    valuate, calls = _valuator()
+    cache = ValuationCache(ttl_seconds=3600)
+
+    first = await cache.get_or_valuate(_listing(), "m", "1", valuate)
+    first["fair_price_usd"] = 0
+    second = await ValuationCache(ttl_seconds=3600).get_or_valuate(_listing(), "m", "1", valuate)
+    assert calls == [50000]
+    assert second["fair_price_usd"] == 49000
+
+    changed = await cache.get_or_valuate(_listing(price=45000), "m", "1", valuate)
+    assert calls == [50000, 45000]
+    assert changed["fair_price_usd"] == 44000
+    # Строка одна на объявление: прежняя версия заменена
+    assert _query(local_turso, "SELECT COUNT(*) FROM ai_valuations") == [(1,)]
+
+    await cache.get_or_valuate(_listing(price=45000), "m", "2", valuate)
+    await cache.get_or_valuate(_listing(price=45000, description="Без ремонта"), "m", "2", valuate)
+    assert len(calls) == 4
+
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["stored"]) == (0, 4, 4)
+
+
+async def test_expired_valuation_is_recomputed(local_turso):
+    valuate, calls = _valuator()
+    cache = ValuationCache(ttl_seconds=3600)
+    await cache.get_or_valuate(_listing(), "m", "1", valuate)
+    _query(local_turso, "UPDATE ai_valuations SET expires_at = ?", (time.time() - 1,))
+
+    await cache.get_or_valuate(_listing(), "m", "1", valuate)
+    assert len(calls) == 2
+
+
+async def test_concurrent_users_share_one_valuation(local_turso):
+    """Одновременные запросы ждут одну оценку; токены попаданий считаются сэкономленными"""
+    valuate, calls = _valuator(delay=0.05)
+    cache = ValuationCache(ttl_seconds=3600)
+
+    results = await asyncio.gather(*(cache.get_or_valuate(_listing(), "m", "1", valuate) for _ in range(5)))
+    await cache.get_or_valuate(_listing(), "m", "1", valuate)
+
+    assert calls == [50000]
+    assert all(result["fair_price_usd"] == 49000 for result in results)
+    stats = cache.get_stats()
+    assert (stats["misses"], stats["shared"], stats["hits"]) == (1, 4, 1)
+    assert stats["tokens_spent"] == 900
+    assert stats["tokens_saved"] == 5 * 900
+    assert stats["hit_rate"] == round(5 / 6, 3)
@@ -0,0 +1,55 @@
+"""
+Тесты пула ИИ-оценок (ai_valuator.valuate_listings) на локальной замене
+Groq (tools/fake_llm_api.py)
+"""
+import pytest
+
+import ai_valuator
+from scrapers.base import Listing
+from tools.fake_llm_api import FakeLLMAPI
+from utils import llm_scheduler
+from utils.valuation_cache import valuation_cache
+
+
+def _listing(n: int) -> Listing:
+    return Listing(
+        id=f"kufar_pool_{n}", source="kufar", title="2-комн.", price=40000 + n, price_formatted="",
+        rooms=2, area=50.0, address="Барановичи, ул. Ленина, 1", url="", price_usd=40000 + n,
+    )
+
+
+@pytest.fixture
+def groq(monkeypatch):
+    monkeypatch.setattr(ai_valuator, "GROQ_API_KEY", "test")
+    monkeypatch.setattr(ai_valuator, "GROQ_MODEL", f"fake-{id(monkeypatch)}")
+    monkeypatch.setattr(llm_scheduler, "WINDOW_SECONDS", 0.3)
+    monkeypatch.setattr(valuation_cache, "enabled", False)
+    valuator = ai_valuator.AIValuator("groq")
+    monkeypatch.setattr(ai_valuator, "_valuator", valuator)
+    return valuator
+
+
+async def test_pool_runs_concurrently_with_one_session(groq, monkeypatch):
+    async with FakeLLMAPI(latency_ms=200) as llm:
+        monkeypatch.setattr(ai_valuator, "GROQ_API_URL", llm.completions_url)
+        sessions = set()
+        results = []
+        async for listing, valuation in ai_valuator.valuate_listings([_listing(n) for n in range(6)], concurrency=3):
+            sessions.add(id(groq.session))
+            results.append((listing.id, valuation))
+
+    assert sorted(listing_id for listing_id, _ in results) == [f"kufar_pool_{n}" for n in range(6)]
+    assert all(valuation and valuation["fair_price_usd"] > 0 for _, valuation in results)
+    assert llm.stats["valuations"] == 6
+    # Оценки идут параллельно, но не больше concurrency одновременно
+    assert llm.stats["max_in_flight"] == 3
+    assert len(sessions) == 1
+    assert groq.session.closed
+
+
+async def test_nested_valuator_users_keep_session_open(groq):
+    async with groq:
+        async with groq:
+            session = groq.session
+        assert not session.closed
+    assert session.closed
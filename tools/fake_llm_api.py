@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Локальная замена LLM-провайдеров: OpenAI-совместимый chat completions (Groq)
+и /api/generate (Ollama)
+
+Сервер отвечает детерминированно, по содержимому промпта:
+- промпт оценки (просит fair_price_usd) -> JSON оценки по цене из промпта
+- промпт выбора (строки таблицы "<id>|..." или "ID:<id> | ...") -> JSON
+  top_offers с первыми ТОП-N объявлениями из промпта (N из "ТОП-N", по умолчанию 2)
+
+Имитация:
+- задержка ответа (latency_ms + случайная добавка 0..jitter_ms)
+- потоковые ответы ("stream": true): SSE-чанки chat.completion.chunk,
+  первый - через first_chunk_share задержки, остальные равномерно до ее
+  конца; usage - в последнем чанке (usage и x_groq.usage)
+- учет токенов: usage (prompt/completion/total_tokens) в ответах chat
+  completions, prompt_eval_count/eval_count в ответах Ollama
+- лимиты rpm/tpm в скользящем окне window_seconds: ответ 429 с retry-after,
+  заголовки x-ratelimit-limit-*/remaining-*/reset-* в каждом ответе, как у Groq
+- 429 на каждый rate_limit_every-й запрос (независимо от лимитов)
+- stats["max_in_flight"]: наибольшее число одновременно обрабатываемых запросов
+
+AIValuator направляется на сервер через GROQ_API_URL / OLLAMA_URL
+(и любой непустой GROQ_API_KEY).
+
+Использование:
+    python tools/fake_llm_api.py --port 8082 --latency-ms 300 --tpm 6000 --rpm 30
+    GROQ_API_URL=http://127.0.0.1:8082/openai/v1/chat/completions GROQ_API_KEY=fake python main.py
+    OLLAMA_URL=http://127.0.0.1:8082/api/generate AI_PROVIDER=ollama python main.py
+
+    async with FakeLLMAPI(latency_ms=300, tpm=6000) as llm:
+        ai_valuator.GROQ_API_URL = llm.completions_url
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import random
+import re
+import time
+from collections import Counter, deque
+from typing import Deque, List, Optional, Tuple
+
+from aiohttp import web
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+OLLAMA_PATH = "/api/generate"
+
+_OFFER_ID_RE = re.compile(r"ID:([^\s|]+)|^([a-z]+_[^\s|]+)\|", re.MULTILINE)
+_TOP_RE = re.compile(r"ТОП-(\d+)")
+_PRICE_RE = re.compile(r"\$\s?([\d\s,]{4,})")
+
+
+def count_tokens(text: str) -> int:
+    """Токены текста: ~3 символа на токен (как у llama-токенизаторов для кириллицы)"""
+    return max(1, math.ceil(len(text) / 3))
+
+
+class FakeLLMAPI:
+    """aiohttp-сервер с интерфейсами chat completions и Ollama"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        rpm: int = 0,
+        tpm: int = 0,
+        window_seconds: float = 60.0,
+        rate_limit_every: int = 0,
+        retry_after: float = 1.0,
+        seed: Optional[int] = None,
+        stream_chunks: int = 12,
+        first_chunk_share: float = 0.15,
+    ):
+        """
+        Args:
+            host: Адрес сервера
+            port: Порт (0 - свободный порт, см. url после start())
+            latency_ms: Задержка каждого ответа
+            jitter_ms: Случайная добавка к задержке (0..jitter_ms)
+            rpm: Запросов в окне (0 - без лимита)
+            tpm: Токенов в окне (0 - без лимита)
+            window_seconds: Окно лимитов (60 - минута, как у провайдера)
+            rate_limit_every: 429 на каждый N-й запрос (0 - не вставлять)
+            retry_after: retry-after вставленных 429, секунд
+            seed: Seed генератора задержек
+            stream_chunks: Чанков потокового ответа
+            first_chunk_share: Доля задержки до первого чанка потокового ответа
+        """
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window_seconds = window_seconds
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.stream_chunks = stream_chunks
+        self.first_chunk_share = first_chunk_share
+        self._random = random.Random(seed)
+        # Окно лимитов: (время приема, токены запроса)
+        self._window: Deque[Tuple[float, int]] = deque()
+        self._runner: Optional[web.AppRunner] = None
+        self._in_flight = 0
+        self.stats: Counter = Counter()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def completions_url(self) -> str:
+        return self.url + COMPLETIONS_PATH
+
+    @property
+    def ollama_url(self) -> str:
+        return self.url + OLLAMA_PATH
+
+    def reset(self) -> None:
+        """Сбрасывает статистику и окно лимитов"""
+        self.stats.clear()
+        self._window.clear()
+
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post(COMPLETIONS_PATH, self._handle_completions)
+        app.router.add_post(OLLAMA_PATH, self._handle_ollama)
+        return app
+
+    async def start(self) -> "FakeLLMAPI":
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakeLLMAPI":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    # ---------- Лимиты ----------
+
+    def _trim(self, now: float) -> None:
+        while self._window and self._window[0][0] <= now - self.window_seconds:
+            self._window.popleft()
+
+    def _reset_in(self, now: float) -> float:
+        """Через сколько секунд освободится самый старый запрос окна"""
+        return max(0.0, self._window[0][0] + self.window_seconds - now) if self._window else 0.0
+
+    def _limit_headers(self, now: float) -> dict:
+        used = sum(tokens for _, tokens in self._window)
+        reset = f"{self._reset_in(now):.2f}s"
+        headers = {}
+        if self.rpm:
+            headers.update({
+                "x-ratelimit-limit-requests": str(self.rpm),
+                "x-ratelimit-remaining-requests": str(max(0, self.rpm - len(self._window))),
+                "x-ratelimit-reset-requests": reset,
+            })
+        if self.tpm:
+            headers.update({
+                "x-ratelimit-limit-tokens": str(self.tpm),
+                "x-ratelimit-remaining-tokens": str(max(0, self.tpm - used)),
+                "x-ratelimit-reset-tokens": reset,
+            })
+        return headers
+
+    def _check_limits(self, prompt_tokens: int) -> Optional[web.Response]:
+        """Ответ 429, если запрос не помещается в лимиты (или вставляется по rate_limit_every)"""
+        now = time.monotonic()
+        self._trim(now)
+        self.stats["received"] += 1
+        used = sum(tokens for _, tokens in self._window)
+
+        reason, retry_after = None, 0.0
+        if self.rate_limit_every and self.stats["received"] % self.rate_limit_every == 0:
+            reason, retry_after = "injected", self.retry_after
+        elif self.rpm and len(self._window) >= self.rpm:
+            reason, retry_after = "requests per minute (RPM)", self._reset_in(now)
+        elif self.tpm and self._window and used + prompt_tokens > self.tpm:
+            # Освобождаем окно, пока запрос не поместится
+            freed, retry_after = used + prompt_tokens - self.tpm, 0.0
+            for issued_at, tokens in self._window:
+                retry_after = issued_at + self.window_seconds - now
+                freed -= tokens
+                if freed <= 0:
+                    break
+            reason = "tokens per minute (TPM)"
+        if reason is None:
+            return None
+
+        self.stats["rate_limited"] += 1
+        headers = self._limit_headers(now)
+        headers["retry-after"] = f"{max(retry_after, 0.01):.2f}"
+        message = (
+            f"Rate limit reached: {reason}: Limit {self.tpm or self.rpm}, Used {used}, "
+            f"Requested {prompt_tokens}. Please try again in {retry_after:.2f}s."
+        )
+        return web.json_response(
+            {"error": {"message": message, "type": "tokens", "code": "rate_limit_exceeded"}},
+            status=429,
+            headers=headers,
+        )
+
+    def _delay(self) -> float:
+        """Задержка ответа, секунд"""
+        return (self.latency_ms + (self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)) / 1000
+
+    async def _answer(self, prompt: str) -> Tuple[str, int]:
+        """Содержимое ответа и его токены (после задержки)"""
+        delay = self._delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._content(prompt)
+
+    def _content(self, prompt: str) -> Tuple[str, int]:
+        """Содержимое ответа и его токены"""
+        if "fair_price_usd" in prompt and "top_offers" not in prompt:
+            self.stats["valuations"] += 1
+            content = json.dumps(self.valuation(prompt), ensure_ascii=False)
+        else:
+            self.stats["selections"] += 1
+            content = json.dumps(self.selection(prompt), ensure_ascii=False)
+        self.stats["requests"] += 1
+        return content, count_tokens(content)
+
+    def _account(self, prompt_tokens: int, completion_tokens: int) -> dict:
+        """Учитывает запрос в окне и статистике; возвращает заголовки лимитов"""
+        now = time.monotonic()
+        self._window.append((now, prompt_tokens + completion_tokens))
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["completion_tokens"] += completion_tokens
+        self.stats["total_tokens"] += prompt_tokens + completion_tokens
+        return self._limit_headers(now)
+
+    @contextlib.contextmanager
+    def _track_in_flight(self):
+        """Учитывает запрос как обрабатываемый (stats["max_in_flight"])"""
+        self._in_flight += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+
+    # ---------- Обработка запросов ----------
+
+    async def _handle_completions(self, request: web.Request) -> web.Response:
+        with self._track_in_flight():
+            return await self._completions(request)
+
+    async def _completions(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        messages = payload.get("messages", [])
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+        prompt_tokens = sum(count_tokens(str(message.get("content", ""))) + 4 for message in messages)
+        limited = self._check_limits(prompt_tokens)
+        if limited is not None:
+            return limited
+        if payload.get("stream"):
+            return await self._stream_completion(request, payload, prompt, prompt_tokens)
+
+        content, completion_tokens = await self._answer(prompt)
+        headers = self._account(prompt_tokens, completion_tokens)
+        return web.json_response({
+            "id": f"chatcmpl-{self.stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", ""),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }, headers=headers)
+
+    async def _stream_completion(
+        self, request: web.Request, payload: dict, prompt: str, prompt_tokens: int
+    ) -> web.StreamResponse:
+        """Ответ чанками SSE, как stream=true у Groq/OpenAI"""
+        delay = self._delay()
+        content, completion_tokens = self._content(prompt)
+        headers = self._account(prompt_tokens, completion_tokens)
+        response = web.StreamResponse(headers={**headers, "Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        chunk_id = f"chatcmpl-{self.stats['requests']}"
+        size = max(1, math.ceil(len(content) / max(self.stream_chunks, 1)))
+        parts = [content[i:i + size] for i in range(0, len(content), size)]
+        first_delay = delay * self.first_chunk_share
+        step = (delay - first_delay) / max(len(parts) - 1, 1)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        for i, part in enumerate(parts):
+            await asyncio.sleep(first_delay if i == 0 else step)
+            chunk = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "model": payload.get("model", ""),
+                "choices": [{"index": 0, "delta": {"content": part}, "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        last = {
+            "id": chunk_id,
+            "object": "chat.completion.chunk",
+            "model": payload.get("model", ""),
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "x_groq": {"usage": usage},
+        }
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            last["usage"] = usage
+        await response.write(f"data: {json.dumps(last, ensure_ascii=False)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        await response.write_eof()
+        self.stats["streamed"] += 1
+        return response
+
+    async def _handle_ollama(self, request: web.Request) -> web.Response:
+        with self._track_in_flight():
+            return await self._ollama(request)
+
+    async def _ollama(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        prompt = str(payload.get("prompt", ""))
+        prompt_tokens = count_tokens(prompt)
+        limited = self._check_limits(prompt_tokens)
+        if limited is not None:
+            return limited
+
+        content, completion_tokens = await self._answer(prompt)
+        self._account(prompt_tokens, completion_tokens)
+        return web.json_response({
+            "model": payload.get("model", ""),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "response": content,
+            "done": True,
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": completion_tokens,
+        })
+
+    @staticmethod
+    def selection(prompt: str) -> dict:
+        """Первые ТОП-N объявлений промпта (в порядке появления, без повторов)"""
+        ids: List[str] = list(dict.fromkeys(marked or row for marked, row in _OFFER_ID_RE.findall(prompt)))
+        top = _TOP_RE.search(prompt)
+        chosen = ids[:int(top.group(1)) if top else 2]
+        offers = [
+            {
+                "offer_id": offer_id,
+                "title": f"Вариант {i}",
+                "reason": "Цена за м² ниже медианы по городу",
+                "final_score": max(10 - i, 1),
+                "critical_notes": [],
+            }
+            for i, offer_id in enumerate(chosen, 1)
+        ]
+        return {
+            "analysis_summary": f"Сравнено {len(ids)} вариантов",
+            "top_offers": offers,
+            "best_overall": {"offer_id": chosen[0], "main_advantage": "Лучшая цена за м²"} if chosen else {},
+        }
+
+    @staticmethod
+    def valuation(prompt: str) -> dict:
+        """Оценка по первой цене в долларах из промпта"""
+        match = _PRICE_RE.search(prompt)
+        price = int(re.sub(r"\D", "", match.group(1))) if match else 50000
+        return {
+            "fair_price_usd": price,
+            "is_overpriced": False,
+            "assessment": "Цена соответствует рынку",
+            "renovation_state": "",
+            "recommendations": "",
+            "value_score": 7,
+        }
+
+
+async def _serve(api: FakeLLMAPI) -> None:
+    await api.start()
+    print(f"Fake LLM API: {api.completions_url}, {api.ollama_url} (Ctrl+C - остановить)")
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await api.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0, help="запросов в окне (0 - без лимита)")
+    parser.add_argument("--tpm", type=int, default=0, help="токенов в окне (0 - без лимита)")
+    parser.add_argument("--window-seconds", type=float, default=60.0)
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="429 на каждый N-й запрос")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--stream-chunks", type=int, default=12, help="чанков потокового ответа")
+    args = parser.parse_args()
+    api = FakeLLMAPI(
+        host=args.host, port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        rpm=args.rpm, tpm=args.tpm, window_seconds=args.window_seconds,
+        rate_limit_every=args.rate_limit_every, retry_after=args.retry_after, seed=args.seed,
+        stream_chunks=args.stream_chunks,
+    )
+    try:
+        asyncio.run(_serve(api))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Локальная замена Telegram Bot API для бенчмарков и тестов доставки
+
+Сервер принимает запросы aiogram (POST /bot<token>/<method>) и отвечает как
+Bot API, ничего никому не отправляя. Поддерживаются sendMessage,
+sendMediaGroup, editMessageText и getMe.
+
+Имитация:
+- задержка ответа (latency_ms + случайная добавка 0..jitter_ms)
+- 429 Too Many Requests с retry_after при превышении rate_limit сообщений
+  в секунду (всего) или per_chat_limit (на один чат)
+- 403 Forbidden для chat_id из forbidden_chats ("бот заблокирован")
+- обрыв соединения без ответа с вероятностью error_rate
+- inject(chat_id, ...) - заданные исходы следующих запросов в чат (тесты)
+
+Бот направляется на сервер через TELEGRAM_API_URL (make_bot в
+bot/services/telegram_api.py).
+
+Использование:
+    python tools/fake_telegram_api.py --port 8081 --latency-ms 40 --rate-limit 30
+    TELEGRAM_API_URL=http://127.0.0.1:8081 python main.py
+
+    async with FakeTelegramAPI(rate_limit=30) as api:
+        telegram_api.TELEGRAM_API_URL = api.url
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+
+# Методы, которые создают сообщения в чате (учитываются в лимитах и доставках)
+SEND_METHODS = ("sendMessage", "sendMediaGroup")
+
+# Исходы для inject()
+OUTCOME_RETRY_AFTER = "429"
+OUTCOME_FORBIDDEN = "403"
+OUTCOME_NETWORK = "network"
+
+
+class FakeTelegramAPI:
+    """aiohttp-сервер с интерфейсом Telegram Bot API"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        rate_limit: int = 0,
+        per_chat_limit: int = 0,
+        retry_after: int = 1,
+        forbidden_chats: Iterable[int] = (),
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            host: Адрес сервера
+            port: Порт (0 - свободный порт, см. url после start())
+            latency_ms: Задержка каждого ответа
+            jitter_ms: Случайная добавка к задержке (0..jitter_ms)
+            rate_limit: Сообщений в секунду на всех (0 - без лимита)
+            per_chat_limit: Сообщений в секунду в один чат (0 - без лимита)
+            retry_after: retry_after в ответах 429, секунд
+            forbidden_chats: Чаты, заблокировавшие бота (403)
+            error_rate: Доля запросов с обрывом соединения
+            seed: Seed генератора задержек и ошибок
+        """
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit = rate_limit
+        self.per_chat_limit = per_chat_limit
+        self.retry_after = retry_after
+        self.forbidden_chats = {int(chat_id) for chat_id in forbidden_chats}
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+
+        self._sent: Deque[float] = deque()
+        self._sent_by_chat: Dict[int, Deque[float]] = defaultdict(deque)
+        self._injected: Dict[int, Deque[str]] = defaultdict(deque)
+        self._message_id = 0
+        self._runner: Optional[web.AppRunner] = None
+
+        self.stats: Counter = Counter()
+        # (chat_id, метод, время приема по time.perf_counter())
+        self.deliveries: List[Tuple[int, str, float]] = []
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def inject(self, chat_id: int, *outcomes: str) -> None:
+        """Задает исходы следующих запросов в чат: "429", "403" или "network" """
+        self._injected[int(chat_id)].extend(outcomes)
+
+    def reset(self) -> None:
+        """Сбрасывает статистику, доставки и окна лимитов"""
+        self.stats.clear()
+        self.deliveries.clear()
+        self._sent.clear()
+        self._sent_by_chat.clear()
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        return app
+
+    async def start(self) -> "FakeTelegramAPI":
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakeTelegramAPI":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    # ---------- Обработка запросов ----------
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        method = request.match_info["method"]
+        fields = dict(await request.post())
+        self.stats[method] += 1
+
+        seconds = (self.latency_ms + self._random.uniform(0, self.jitter_ms)) / 1000
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+        if method == "getMe":
+            return self._ok({"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"})
+
+        chat_id = int(fields.get("chat_id") or 0)
+        outcome = self._next_outcome(chat_id)
+        if outcome == OUTCOME_NETWORK:
+            self.stats["network_errors"] += 1
+            request.transport.close()
+            return web.Response(status=500)
+        if outcome == OUTCOME_FORBIDDEN:
+            self.stats["forbidden"] += 1
+            return self._error(403, "Forbidden: bot was blocked by the user")
+        if outcome == OUTCOME_RETRY_AFTER:
+            self.stats["retry_after"] += 1
+            return self._error(
+                429, f"Too Many Requests: retry after {self.retry_after}",
+                {"retry_after": self.retry_after},
+            )
+
+        if method == "sendMessage":
+            return self._ok(self._deliver(chat_id, method, text=fields.get("text", "")))
+        if method == "sendMediaGroup":
+            media = json.loads(fields.get("media") or "[]")
+            return self._ok([self._deliver(chat_id, method, photo=True) for _ in media])
+        if method == "editMessageText":
+            message = self._message(chat_id, text=fields.get("text", ""))
+            message["message_id"] = int(fields.get("message_id") or message["message_id"])
+            return self._ok(message)
+        return self._error(404, "Not Found: method not found")
+
+    def _next_outcome(self, chat_id: int) -> Optional[str]:
+        """Исход запроса: заданный через inject, 403, обрыв, 429 или None (успех)"""
+        if self._injected.get(chat_id):
+            return self._injected[chat_id].popleft()
+        if chat_id in self.forbidden_chats:
+            return OUTCOME_FORBIDDEN
+        if self.error_rate > 0 and self._random.random() < self.error_rate:
+            return OUTCOME_NETWORK
+        if self._is_limited(chat_id):
+            return OUTCOME_RETRY_AFTER
+        return None
+
+    def _is_limited(self, chat_id: int) -> bool:
+        """Скользящее окно в 1 секунду: всего и на чат"""
+        now = time.monotonic()
+        windows = []
+        if self.rate_limit:
+            windows.append((self._sent, self.rate_limit))
+        if self.per_chat_limit:
+            windows.append((self._sent_by_chat[chat_id], self.per_chat_limit))
+        for window, limit in windows:
+            while window and now - window[0] >= 1.0:
+                window.popleft()
+            if len(window) >= limit:
+                return True
+        for window, _ in windows:
+            window.append(now)
+        return False
+
+    def _deliver(self, chat_id: int, method: str, **content) -> dict:
+        self.stats["messages"] += 1
+        self.deliveries.append((chat_id, method, time.perf_counter()))
+        return self._message(chat_id, **content)
+
+    def _message(self, chat_id: int, text: Optional[str] = None, photo: bool = False) -> dict:
+        self._message_id += 1
+        message = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        if text is not None:
+            message["text"] = text
+        if photo:
+            message["photo"] = [{
+                "file_id": f"photo{self._message_id}",
+                "file_unique_id": f"u{self._message_id}",
+                "width": 800,
+                "height": 600,
+            }]
+        return message
+
+    @staticmethod
+    def _ok(result) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    def _error(code: int, description: str, parameters: Optional[dict] = None) -> web.Response:
+        payload = {"ok": False, "error_code": code, "description": description}
+        if parameters:
+            payload["parameters"] = parameters
+        return web.json_response(payload, status=code)
+
+
+async def _serve(api: FakeTelegramAPI) -> None:
+    await api.start()
+    print(f"Fake Bot API: {api.url} (Ctrl+C - остановить)")
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await api.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=30, help="сообщений в секунду на всех (0 - без лимита)")
+    parser.add_argument("--per-chat-limit", type=int, default=0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--forbidden", default="", help="chat_id через запятую, заблокировавшие бота")
+    args = parser.parse_args()
+
+    api = FakeTelegramAPI(
+        host=args.host, port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        rate_limit=args.rate_limit, per_chat_limit=args.per_chat_limit, retry_after=args.retry_after,
+        forbidden_chats=[int(chat_id) for chat_id in args.forbidden.split(",") if chat_id.strip()],
+        error_rate=args.error_rate,
+    )
+    try:
+        asyncio.run(_serve(api))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
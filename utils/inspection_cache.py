@@ -0,0 +1,174 @@
+"""
+In-process кэш инспекций страниц объявлений для ИИ (AIValuator._inspect_listing_page)
+
+Особенности:
+- Ключ - URL объявления; хранится результат разбора страницы
+  (extract_listing_page: описание, фото, параметры, детали адреса)
+- Запись свежая AI_INSPECT_CACHE_TTL_SECONDS и пока не изменилась версия
+  объявления (цена, площадь, комнаты, адрес); после этого страница
+  перепроверяется условным запросом (If-None-Match / If-Modified-Since),
+  ответ 304 продлевает запись без скачивания и разбора
+- Одна загрузка на URL: одновременные инспекции ждут первую
+- Не больше AI_INSPECT_PER_HOST_LIMIT одновременных загрузок на сайт
+- Ограничение числа записей (LRU), метрики (get_stats)
+
+Использование:
+    page = await inspection_cache.get_page(session, listing.url, inspection_version(listing), parse)
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from config import AI_INSPECT_CACHE_MAX_ENTRIES, AI_INSPECT_CACHE_TTL_SECONDS, AI_INSPECT_PER_HOST_LIMIT
+from scrapers.base import Listing
+
+ParseFn = Callable[[str], Awaitable[Dict[str, Any]]]
+
+_FETCH_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+
+def inspection_version(listing: Listing) -> str:
+    """
+    Версия объявления для кэша инспекций
+
+    Описание не входит: valuate_groq дополняет его текстом со страницы.
+    """
+    parts = (listing.price, listing.currency, listing.area, listing.rooms, listing.address)
+    return hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("page", "version", "checked_at", "etag", "last_modified")
+
+    def __init__(self, page: Dict[str, Any], version: str, etag: Optional[str], last_modified: Optional[str]):
+        self.page = page
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class InspectionCache:
+    """Кэш разобранных страниц объявлений с условной перепроверкой"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int, per_host: int):
+        """
+        Args:
+            ttl_seconds: Сколько запись используется без перепроверки
+            max_entries: Максимум записей (LRU)
+            per_host: Одновременных загрузок на один сайт
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.per_host = per_host
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Сколько запросов держат или ждут блокировку URL: удалить ее можно только при нуле
+        self._waiters: Dict[str, int] = {}
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "fetched": 0, "errors": 0, "evicted": 0}
+
+    def _fresh(self, url: str, version: str) -> Optional[_Entry]:
+        entry = self._entries.get(url)
+        if entry is None or entry.version != version:
+            return None
+        if time.monotonic() - entry.checked_at > self.ttl_seconds:
+            return None
+        self._entries.move_to_end(url)
+        return entry
+
+    async def get_page(self, session, url: str, version: str, parse: ParseFn) -> Optional[Dict[str, Any]]:
+        """
+        Разобранная страница объявления
+
+        Args:
+            session: aiohttp.ClientSession (или сессия кассет)
+            url: URL объявления
+            version: inspection_version(listing)
+            parse: Разбор HTML (в пуле процессов)
+
+        Returns:
+            Результат parse или None, если страница недоступна
+        """
+        entry = self._fresh(url, version)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry.page
+
+        lock = self._locks.setdefault(url, asyncio.Lock())
+        self._waiters[url] = self._waiters.get(url, 0) + 1
+        try:
+            async with lock:
+                # Пока ждали блокировку, страницу мог загрузить другой запрос
+                entry = self._fresh(url, version)
+                if entry is not None:
+                    self.stats["hits"] += 1
+                    return entry.page
+                self.stats["misses"] += 1
+                return await self._fetch(session, url, version, parse)
+        finally:
+            self._waiters[url] -= 1
+            if not self._waiters[url]:
+                del self._waiters[url]
+                self._locks.pop(url, None)
+
+    async def _fetch(self, session, url: str, version: str, parse: ParseFn) -> Optional[Dict[str, Any]]:
+        stale = self._entries.get(url)
+        headers = {}
+        if stale is not None and stale.etag:
+            headers["If-None-Match"] = stale.etag
+        if stale is not None and stale.last_modified:
+            headers["If-Modified-Since"] = stale.last_modified
+
+        host = urlsplit(url).hostname or ""
+        semaphore = self._hosts.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with semaphore:
+            async with session.get(url, headers=headers or None, timeout=_FETCH_TIMEOUT) as resp:
+                if resp.status == 304 and stale is not None:
+                    self.stats["revalidated"] += 1
+                    stale.version = version
+                    stale.checked_at = time.monotonic()
+                    self._entries.move_to_end(url)
+                    return stale.page
+                if resp.status != 200:
+                    self.stats["errors"] += 1
+                    return None
+                html = await resp.text()
+                etag = resp.headers.get("ETag")
+                last_modified = resp.headers.get("Last-Modified")
+
+        # Разбор - вне семафора сайта: он ограничивает только сетевые запросы
+        page = await parse(html)
+        self.stats["fetched"] += 1
+        self._entries[url] = _Entry(page, version, etag, last_modified)
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evicted"] += 1
+        return page
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+# Глобальный кэш процесса
+inspection_cache = InspectionCache(
+    ttl_seconds=AI_INSPECT_CACHE_TTL_SECONDS,
+    max_entries=AI_INSPECT_CACHE_MAX_ENTRIES,
+    per_host=AI_INSPECT_PER_HOST_LIMIT,
+)
+
+
+def get_inspection_cache_stats() -> Dict[str, Any]:
+    """Метрики кэша инспекций (для /debug cache)"""
+    return inspection_cache.get_stats()
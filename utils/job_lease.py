@@ -0,0 +1,111 @@
+"""
+Аренда плановых задач в БД (выбор ведущей реплики)
+
+Если запущено несколько экземпляров бота (две реплики или перекрытие при
+деплое), плановые задачи должны выполняться только на одном из них. Реплика,
+захватившая строку в job_leases, считается ведущей и обновляет heartbeat
+каждые ttl / 3 секунд. Если она упала, аренда истекает через ttl секунд и
+ее забирает другая реплика.
+
+Использование:
+    lease = JobLease("scheduler")
+    await lease.start()
+    scheduler.add_job(lease.guard(scheduled_check), ...)
+    ...
+    await lease.stop()
+"""
+import asyncio
+import functools
+import os
+import socket
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import JOB_LEASE_ENABLED, JOB_LEASE_TTL_SECONDS, USE_TURSO_CACHE, TURSO_DB_URL
+from database_turso import acquire_job_lease, release_job_lease
+from error_logger import log_info, log_warning
+
+
+class JobLease:
+    """
+    Аренда name в таблице job_leases
+
+    Args:
+        name: Имя аренды (одна на группу задач)
+        ttl_seconds: Через сколько секунд без heartbeat аренда истекает
+        owner: Идентификатор реплики (по умолчанию host:pid)
+        enabled: False - аренда не нужна (один экземпляр без Turso), задачи
+            выполняются всегда
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl_seconds: float = JOB_LEASE_TTL_SECONDS,
+        owner: Optional[str] = None,
+        enabled: Optional[bool] = None,
+    ):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        if enabled is None:
+            enabled = JOB_LEASE_ENABLED and USE_TURSO_CACHE and bool(TURSO_DB_URL)
+        self.enabled = enabled
+        self.is_leader = not enabled
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._stats = {"acquired": 0, "lost": 0, "skipped_runs": 0}
+
+    async def try_acquire(self) -> bool:
+        """Захватывает или продлевает аренду; обновляет is_leader"""
+        if not self.enabled:
+            return True
+        was_leader = self.is_leader
+        self.is_leader = await acquire_job_lease(self.name, self.owner, self.ttl_seconds)
+        if self.is_leader and not was_leader:
+            self._stats["acquired"] += 1
+            log_info("job_lease", f"[{self.name}] {self.owner} стал ведущим")
+        elif was_leader and not self.is_leader:
+            self._stats["lost"] += 1
+            log_warning("job_lease", f"[{self.name}] {self.owner} потерял аренду")
+        return self.is_leader
+
+    async def start(self) -> None:
+        """Первая попытка захвата и фоновый heartbeat"""
+        if not self.enabled or self._heartbeat is not None:
+            return
+        await self.try_acquire()
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop(), name=f"job_lease:{self.name}")
+
+    async def stop(self) -> None:
+        """Останавливает heartbeat и освобождает аренду, чтобы другая реплика не ждала ttl"""
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+        if self.enabled and self.is_leader:
+            await release_job_lease(self.name, self.owner)
+            self.is_leader = False
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl_seconds / 3)
+            await self.try_acquire()
+
+    def guard(self, job: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """
+        Обертка задачи планировщика: задача выполняется только на ведущей реплике.
+
+        Аренда продлевается прямо перед запуском, поэтому реплика, которая
+        потеряла аренду между heartbeat, задачу не запустит.
+        """
+        @functools.wraps(job)
+        async def _guarded(*args, **kwargs):
+            if not await self.try_acquire():
+                self._stats["skipped_runs"] += 1
+                log_info("job_lease", f"[{self.name}] {job.__name__} пропущена: ведущая реплика другая")
+                return None
+            return await job(*args, **kwargs)
+
+        return _guarded
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"owner": self.owner, "enabled": self.enabled, "is_leader": self.is_leader, **self._stats}
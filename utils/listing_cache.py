@@ -0,0 +1,292 @@
+"""
+In-process кэш объявлений города поверх cached_listings (Turso)
+
+Особенности:
+- Ключ (city, status): все активные объявления города одним запросом
+- Объявления хранятся уже сконвертированными в Listing и отсортированными
+  по цене; диапазон цен выбирается через bisect без запроса к БД
+- Любой поддиапазон (комнаты, цена, limit) обслуживается из одного снимка
+- TTL, ограничение числа городов (LRU) и размера снимка
+- cache_listings_batch / mark_listing_deleted обновляют снимок на месте
+- Метрики попаданий/промахов (get_stats)
+
+Использование:
+    listings = await get_listings_by_filters(city, min_rooms, max_rooms, min_price, max_price, limit=200)
+"""
+import asyncio
+import copy
+import logging
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    LISTING_CACHE_ENABLED,
+    LISTING_CACHE_TTL_SECONDS,
+    LISTING_CACHE_MAX_CITIES,
+    LISTING_CACHE_MAX_PER_CITY,
+)
+from scrapers.base import Listing
+
+logger = logging.getLogger(__name__)
+
+
+class CitySnapshot:
+    """Снимок объявлений одного (city, status), отсортированный по цене"""
+
+    def __init__(self, rows: List[Tuple[Listing, str]], complete: bool):
+        """
+        Args:
+            rows: Пары (Listing, updated_at)
+            complete: True если загружены все объявления города (не обрезано лимитом)
+        """
+        self.loaded_at = time.monotonic()
+        self.complete = complete
+        self._by_id: Dict[str, Tuple[Listing, str]] = {listing.id: (listing, updated_at) for listing, updated_at in rows}
+        self._dirty = True
+        self.prices: List[int] = []
+        self.entries: List[Tuple[Listing, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def _rebuild(self) -> None:
+        self.entries = sorted(self._by_id.values(), key=lambda e: e[0].price or 0)
+        self.prices = [e[0].price or 0 for e in self.entries]
+        self._dirty = False
+
+    def upsert(self, listing: Listing, updated_at: str) -> None:
+        self._by_id[listing.id] = (listing, updated_at)
+        self._dirty = True
+
+    def remove(self, listing_id: str) -> bool:
+        if self._by_id.pop(listing_id, None) is None:
+            return False
+        self._dirty = True
+        return True
+
+    def query(
+        self,
+        min_rooms: int,
+        max_rooms: int,
+        min_price: int,
+        max_price: int,
+        limit: int,
+    ) -> List[Listing]:
+        """
+        Выборка с той же семантикой, что и SQL в get_cached_listings_by_filters:
+        фильтр по комнатам и цене, ORDER BY updated_at DESC, LIMIT
+        """
+        if self._dirty:
+            self._rebuild()
+
+        lo = bisect_left(self.prices, min_price)
+        hi = bisect_right(self.prices, max_price)
+        matched = [
+            entry for entry in self.entries[lo:hi]
+            if min_rooms <= (entry[0].rooms or 0) <= max_rooms
+        ]
+        matched.sort(key=lambda e: e[1] or "", reverse=True)
+        return [listing for listing, _ in matched[:limit]]
+
+
+class ListingCache:
+    """LRU-кэш снимков городов с TTL"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = 300,
+        max_cities: int = 32,
+        max_per_city: int = 5000,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_cities = max_cities
+        self.max_per_city = max_per_city
+        self._snapshots: "OrderedDict[Tuple[str, str], CitySnapshot]" = OrderedDict()
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "partial": 0,  # снимок обрезан лимитом и не покрывает запрос - идем в БД
+            "loads": 0,
+            "load_errors": 0,
+            "evictions": 0,
+            "expired": 0,
+            "upserts": 0,
+            "removals": 0,
+        }
+
+    def _get_fresh(self, key: Tuple[str, str]) -> Optional[CitySnapshot]:
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return None
+        if time.monotonic() - snapshot.loaded_at > self.ttl_seconds:
+            del self._snapshots[key]
+            self.stats["expired"] += 1
+            return None
+        self._snapshots.move_to_end(key)
+        return snapshot
+
+    def _store(self, key: Tuple[str, str], snapshot: CitySnapshot) -> None:
+        self._snapshots[key] = snapshot
+        self._snapshots.move_to_end(key)
+        while len(self._snapshots) > self.max_cities:
+            self._snapshots.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    async def _load(self, city: str, status: str) -> Optional[CitySnapshot]:
+        """Загружает все объявления города из cached_listings"""
+        from database_turso import get_cached_listings_by_city, cached_listing_to_listing
+
+        rows = await get_cached_listings_by_city(city, status=status, limit=self.max_per_city + 1)
+        if rows is None:
+            self.stats["load_errors"] += 1
+            return None
+
+        self.stats["loads"] += 1
+        complete = len(rows) <= self.max_per_city
+        converted = []
+        for cached_dict in rows[:self.max_per_city]:
+            try:
+                converted.append((cached_listing_to_listing(cached_dict), cached_dict.get("updated_at") or ""))
+            except Exception as e:
+                logger.warning(f"[listing_cache] Ошибка конвертации объявления из кэша: {e}")
+        return CitySnapshot(converted, complete=complete)
+
+    async def get_listings(
+        self,
+        city: str,
+        min_rooms: int,
+        max_rooms: int,
+        min_price: int,
+        max_price: int,
+        limit: int = 100,
+        status: str = "active",
+    ) -> Optional[List[Listing]]:
+        """
+        Возвращает объявления из снимка города
+
+        Returns:
+            Копии Listing (вызывающий код может их менять) или None,
+            если снимок не удалось загрузить или он не покрывает запрос
+            (тогда нужно идти в БД напрямую)
+        """
+        key = (city, status)
+        snapshot = self._get_fresh(key)
+        if snapshot is not None:
+            self.stats["hits"] += 1
+        else:
+            self.stats["misses"] += 1
+            lock = self._locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                # Пока ждали блокировку, снимок мог загрузить другой пользователь
+                snapshot = self._get_fresh(key)
+                if snapshot is None:
+                    snapshot = await self._load(city, status)
+                    if snapshot is None:
+                        return None
+                    self._store(key, snapshot)
+
+        result = snapshot.query(min_rooms, max_rooms, min_price, max_price, limit)
+        if not snapshot.complete and len(result) < limit:
+            # В обрезанном снимке могут не оказаться более старые подходящие объявления
+            self.stats["partial"] += 1
+            return None
+        return [copy.copy(listing) for listing in result]
+
+    def apply_saved(self, listings: List[Listing], city_of) -> None:
+        """
+        Обновляет загруженные снимки после записи в cached_listings
+
+        Args:
+            listings: Сохраненные объявления (status='active')
+            city_of: Функция listing -> city (как при записи в БД)
+        """
+        if not self._snapshots:
+            return
+        from database_turso import cached_listing_to_listing
+
+        now = datetime.now().isoformat()
+        for listing in listings:
+            city = city_of(listing)
+            for (snap_city, status), snapshot in self._snapshots.items():
+                if snap_city == city and status == "active":
+                    # Храним ту же форму, что и после чтения из БД
+                    snapshot.upsert(cached_listing_to_listing(_listing_to_cached_dict(listing)), now)
+                    self.stats["upserts"] += 1
+                elif snapshot.remove(listing.id):
+                    self.stats["removals"] += 1
+
+    def remove(self, listing_id: str) -> None:
+        """Убирает объявление из всех снимков (например, при отметке deleted)"""
+        for snapshot in self._snapshots.values():
+            if snapshot.remove(listing_id):
+                self.stats["removals"] += 1
+
+    def invalidate(self, city: Optional[str] = None) -> None:
+        """Сбрасывает снимки города (или все)"""
+        if city is None:
+            self._snapshots.clear()
+            return
+        for key in [k for k in self._snapshots if k[0] == city]:
+            del self._snapshots[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "cities": len(self._snapshots),
+            "listings": sum(len(s) for s in self._snapshots.values()),
+        }
+
+
+def _listing_to_cached_dict(listing: Listing) -> Dict[str, Any]:
+    """Поля Listing, которые сохраняются в cached_listings"""
+    return {
+        "id": listing.id,
+        "source": listing.source,
+        "title": listing.title,
+        "price": listing.price,
+        "rooms": listing.rooms,
+        "area": listing.area,
+        "address": listing.address,
+        "url": listing.url,
+        "photos": list(listing.photos) if listing.photos else [],
+        "floor": listing.floor,
+        "description": listing.description,
+        "currency": listing.currency,
+        "price_usd": listing.price_usd,
+        "year_built": listing.year_built,
+        "is_company": listing.is_company,
+    }
+
+
+# Глобальный кэш процесса
+listing_cache = ListingCache(
+    ttl_seconds=LISTING_CACHE_TTL_SECONDS,
+    max_cities=LISTING_CACHE_MAX_CITIES,
+    max_per_city=LISTING_CACHE_MAX_PER_CITY,
+)
+
+
+async def get_listings_by_filters(
+    city: str,
+    min_rooms: int,
+    max_rooms: int,
+    min_price: int,
+    max_price: int,
+    limit: int = 100,
+    status: str = "active",
+) -> Optional[List[Listing]]:
+    """Read-through выборка из кэша города (None - кэш выключен или не покрывает запрос)"""
+    if not LISTING_CACHE_ENABLED:
+        return None
+    return await listing_cache.get_listings(city, min_rooms, max_rooms, min_price, max_price, limit, status)
+
+
+def get_listing_cache_stats() -> Dict[str, Any]:
+    """Метрики кэша объявлений (для /debug cache)"""
+    return listing_cache.get_stats()
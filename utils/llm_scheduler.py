@@ -0,0 +1,278 @@
+"""
+Планировщик запросов к LLM-провайдерам в рамках лимитов TPM/RPM
+
+Особенности:
+- Общий на процесс бюджет на провайдера/модель: скользящее окно 60 секунд
+  по запросам (RPM) и токенам (TPM)
+- Запрос резервирует оценку токенов (промпт + ожидаемый ответ) и уходит
+  сразу, как только она помещается в окно; после ответа резерв заменяется
+  фактическим usage.total_tokens. Ожидаемый ответ - max_tokens, пока нет
+  статистики, затем средний фактический ответ модели (не больше max_tokens)
+- Заголовки x-ratelimit-remaining-*/x-ratelimit-reset-* (Groq, OpenAI)
+  уточняют бюджет, retry-after из ответа 429 останавливает выдачу до срока
+- Очередь справедливая: пользователи обслуживаются по кругу, поэтому
+  большой ИИ-подбор одного пользователя не задерживает остальных
+- Метрики: запросов, ожиданий, 429 (get_stats)
+
+Использование:
+    scheduler = get_llm_scheduler("groq", GROQ_MODEL)
+    async with scheduler.slot(estimate_tokens(messages), max_tokens) as slot:
+        async with session.post(url, json=payload) as resp:
+            slot.observe(resp.status, resp.headers)
+            data = await resp.json()
+            slot.settle(usage_tokens(data, messages))
+"""
+import asyncio
+import contextvars
+import re
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Hashable, List, Mapping, Optional, Tuple
+
+from config import GROQ_RPM_LIMIT, GROQ_TPM_LIMIT
+from utils.tokens import count_message_tokens
+
+WINDOW_SECONDS = 60.0
+
+# Пользователь, от имени которого идут запросы (для справедливой очереди)
+current_llm_user: contextvars.ContextVar = contextvars.ContextVar("current_llm_user", default=None)
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Оценка токенов сообщений локальным счетчиком, калиброванным по usage (utils/tokens.py)"""
+    return count_message_tokens(messages)
+
+
+def usage_tokens(data: Dict[str, Any], messages: List[Dict[str, Any]]) -> int:
+    """Токены ответа chat completions: usage.total_tokens или оценка промпта и ответа"""
+    total = (data.get("usage") or {}).get("total_tokens")
+    if total:
+        return int(total)
+    choices = data.get("choices") or [{}]
+    return estimate_tokens(messages + [choices[0].get("message") or {}])
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Длительность из заголовков лимитов: "7.66s", "2m59.56s", "120ms", "1" (секунды)"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+class _Slot:
+    """Выданный запрос: резерв в окне и обратная связь от ответа провайдера"""
+
+    def __init__(self, scheduler: "LLMScheduler", entry: List[float], prompt_tokens: int):
+        self._scheduler = scheduler
+        self._entry = entry
+        self._prompt_tokens = prompt_tokens
+
+    def observe(self, status: int, headers: Mapping[str, str]) -> None:
+        """Учитывает заголовки лимитов ответа (и retry-after при 429)"""
+        self._scheduler.observe(status, headers)
+
+    def settle(self, total_tokens: Optional[int]) -> None:
+        """Заменяет оценку фактическим расходом токенов"""
+        if total_tokens:
+            self._entry[1] = float(total_tokens)
+            self._scheduler.record_completion(total_tokens - self._prompt_tokens)
+            self._scheduler.wake()
+
+
+class LLMScheduler:
+    """Бюджет RPM/TPM одной модели с круговой очередью по пользователям"""
+
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0):
+        """
+        Args:
+            name: Провайдер/модель (для логов и метрик)
+            rpm: Запросов в минуту (0 - без ограничения)
+            tpm: Токенов в минуту (0 - без ограничения)
+        """
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        # Окно: [время выдачи, токены] в порядке выдачи
+        self._window: Deque[List[float]] = deque()
+        self._queues: "OrderedDict[Hashable, Deque[Tuple[int, int, asyncio.Future]]]" = OrderedDict()
+        self._served_at: Dict[Hashable, float] = {}
+        self._blocked_until = 0.0
+        # Остаток токенов и запросов по данным провайдера: (остаток, до какого времени верен)
+        self._server_tokens: Optional[Tuple[float, float]] = None
+        self._server_requests: Optional[Tuple[float, float]] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Средний фактический ответ модели, токенов (None - еще не было ответов)
+        self._completion_avg: Optional[float] = None
+        self.stats = {"requests": 0, "queued": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0, "rate_limited": 0}
+
+    @asynccontextmanager
+    async def slot(self, prompt_tokens: int, max_tokens: int = 0, user: Hashable = None):
+        """
+        Ждет бюджет для запроса
+
+        Args:
+            prompt_tokens: Оценка токенов промпта (estimate_tokens)
+            max_tokens: max_tokens запроса (верхняя граница ответа)
+            user: Ключ справедливой очереди (по умолчанию current_llm_user)
+        """
+        if user is None:
+            user = current_llm_user.get()
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user, deque()).append((prompt_tokens, max_tokens, future))
+        self._dispatch()
+        if not future.done():
+            self.stats["queued"] += 1
+        try:
+            entry = await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Бюджет уже выдан, но запрос не состоится - освобождаем резерв
+                future.result()[1] = 0.0
+            self.wake()
+            raise
+        waited = time.monotonic() - started
+        self.stats["requests"] += 1
+        self.stats["wait_seconds"] += waited
+        self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+        try:
+            yield _Slot(self, entry, prompt_tokens)
+        finally:
+            self.wake()
+
+    def observe(self, status: int, headers: Mapping[str, str]) -> None:
+        now = time.monotonic()
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        reset_tokens = parse_duration(headers.get("x-ratelimit-reset-tokens"))
+        if remaining_tokens is not None and reset_tokens is not None:
+            self._server_tokens = (float(remaining_tokens), now + reset_tokens)
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        reset_requests = parse_duration(headers.get("x-ratelimit-reset-requests"))
+        if remaining_requests is not None and reset_requests is not None:
+            self._server_requests = (float(remaining_requests), now + reset_requests)
+        if status == 429:
+            self.stats["rate_limited"] += 1
+            retry_after = parse_duration(headers.get("retry-after")) or reset_tokens or 1.0
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+        self.wake()
+
+    def record_completion(self, tokens: float) -> None:
+        tokens = max(0.0, float(tokens))
+        if self._completion_avg is None:
+            self._completion_avg = tokens
+        else:
+            self._completion_avg = 0.8 * self._completion_avg + 0.2 * tokens
+
+    def wake(self) -> None:
+        """Пересчитывает очередь (после ответа, отмены или смены бюджета)"""
+        if self._queues:
+            self._dispatch()
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        """Через сколько секунд запрос на tokens поместится в бюджет (0 - сейчас)"""
+        while self._window and self._window[0][0] <= now - WINDOW_SECONDS:
+            self._window.popleft()
+        waits = [self._blocked_until - now]
+
+        if self.rpm and len(self._window) >= self.rpm:
+            waits.append(self._window[len(self._window) - self.rpm][0] + WINDOW_SECONDS - now)
+        if self.tpm and self._window:
+            used = sum(entry[1] for entry in self._window)
+            # Запрос больше всего бюджета пропускаем в пустое окно
+            excess = used + min(tokens, self.tpm) - self.tpm
+            for issued_at, spent in self._window:
+                if excess <= 0:
+                    break
+                excess -= spent
+                waits.append(issued_at + WINDOW_SECONDS - now)
+
+        if self._server_tokens and self._server_tokens[1] > now and self._server_tokens[0] < min(tokens, self.tpm or tokens):
+            waits.append(self._server_tokens[1] - now)
+        if self._server_requests and self._server_requests[1] > now and self._server_requests[0] < 1:
+            waits.append(self._server_requests[1] - now)
+        return max(0.0, *waits)
+
+    def _reserve(self, tokens: int, now: float) -> List[float]:
+        entry = [now, float(tokens)]
+        self._window.append(entry)
+        if len(self._served_at) > 10000:
+            self._served_at.clear()
+        # Остаток провайдера уменьшается на каждый выданный запрос до следующего ответа
+        if self._server_tokens:
+            self._server_tokens = (self._server_tokens[0] - tokens, self._server_tokens[1])
+        if self._server_requests:
+            self._server_requests = (self._server_requests[0] - 1, self._server_requests[1])
+        return entry
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queues:
+            # Первым обслуживается пользователь, дольше всех не получавший запросов
+            user = min(self._queues, key=lambda u: self._served_at.get(u, 0.0))
+            queue = self._queues[user]
+            while queue and queue[0][2].done():
+                queue.popleft()
+            if not queue:
+                del self._queues[user]
+                continue
+            prompt_tokens, max_tokens, future = queue[0]
+            # Ожидаемый ответ пересчитывается при каждой попытке: после первых ответов
+            # резерв max_tokens заменяется средней фактической длиной
+            expected = max_tokens if self._completion_avg is None else min(max_tokens, self._completion_avg)
+            tokens = int(prompt_tokens + expected)
+            now = time.monotonic()
+            wait = self._wait_time(tokens, now)
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            queue.popleft()
+            future.set_result(self._reserve(tokens, now))
+            # Следующий запрос этого пользователя - после запросов остальных
+            self._served_at[user] = now
+            if not queue:
+                del self._queues[user]
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        window = [entry for entry in self._window if entry[0] > now - WINDOW_SECONDS]
+        return {
+            **self.stats,
+            "wait_seconds": round(self.stats["wait_seconds"], 2),
+            "max_wait_seconds": round(self.stats["max_wait_seconds"], 2),
+            "window_requests": len(window),
+            "window_tokens": int(sum(entry[1] for entry in window)),
+            "waiting": sum(len(queue) for queue in self._queues.values()),
+        }
+
+
+_schedulers: Dict[Tuple[str, str], LLMScheduler] = {}
+
+
+def get_llm_scheduler(provider: str, model: str) -> LLMScheduler:
+    """Планировщик модели провайдера (лимиты Groq - GROQ_RPM_LIMIT/GROQ_TPM_LIMIT)"""
+    key = (provider, model)
+    if key not in _schedulers:
+        if provider == "groq":
+            _schedulers[key] = LLMScheduler(f"{provider}/{model}", rpm=GROQ_RPM_LIMIT, tpm=GROQ_TPM_LIMIT)
+        else:
+            _schedulers[key] = LLMScheduler(f"{provider}/{model}")
+    return _schedulers[key]
+
+
+def get_llm_scheduler_stats() -> Dict[str, Dict[str, Any]]:
+    """Метрики планировщиков по моделям"""
+    return {scheduler.name: scheduler.get_stats() for scheduler in _schedulers.values()}
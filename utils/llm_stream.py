@@ -0,0 +1,188 @@
+"""
+Потоковые ответы chat completions (SSE) и промежуточные результаты ИИ-режима
+
+Особенности:
+- read_completion читает ответ и в потоковом (text/event-stream), и в обычном
+  формате и возвращает его в форме обычного ответа chat completions
+  (choices[0].message.content, usage) - разбор и учет токенов не меняются
+- usage потокового ответа - из последнего чанка (usage или x_groq.usage)
+- TopOffersParser выделяет элементы массива "top_offers" из недописанного
+  JSON, как только закрывается очередной объект
+- Промежуточные результаты передаются обработчику current_llm_progress
+  (задает вызывающий код, например статус-сообщение в ai_service)
+- ThrottledProgress ограничивает частоту редактирования статус-сообщения;
+  последнее состояние показывается с задержкой, а не теряется
+
+Использование:
+    payload.update(stream=True, stream_options={"include_usage": True})
+    async with session.post(url, json=payload) as resp:
+        data = await read_completion(resp, on_text)
+"""
+import asyncio
+import contextvars
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from error_logger import log_warning
+
+# Обработчик промежуточных результатов ИИ (корутина от события) или None
+current_llm_progress: contextvars.ContextVar = contextvars.ContextVar("current_llm_progress", default=None)
+
+OnText = Callable[[str], Awaitable[None]]
+
+
+async def read_completion(resp, on_text: Optional[OnText] = None) -> Dict[str, Any]:
+    """
+    Ответ chat completions (потоковый или обычный) в форме обычного ответа
+
+    Args:
+        resp: Ответ aiohttp со статусом 200
+        on_text: Вызывается с каждым новым фрагментом текста ответа
+
+    Raises:
+        ValueError: Провайдер передал ошибку в потоке
+    """
+    if not resp.content_type.startswith("text/event-stream"):
+        data = await resp.json()
+        if on_text is not None:
+            await on_text(data["choices"][0]["message"]["content"])
+        return data
+
+    parts: List[str] = []
+    data: Dict[str, Any] = {}
+    async for raw_line in resp.content:
+        line = raw_line.decode("utf-8").strip()
+        if not line.startswith("data:"):
+            continue
+        event = line[5:].strip()
+        if event == "[DONE]":
+            break
+        chunk = json.loads(event)
+        if chunk.get("error"):
+            raise ValueError(f"Ошибка в потоке ответа: {chunk['error']}")
+        usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage")
+        if usage:
+            data["usage"] = usage
+        for choice in chunk.get("choices") or []:
+            text = (choice.get("delta") or {}).get("content")
+            if text:
+                parts.append(text)
+                if on_text is not None:
+                    await on_text(text)
+        data.setdefault("id", chunk.get("id"))
+        data.setdefault("model", chunk.get("model"))
+
+    data["choices"] = [{"index": 0, "message": {"role": "assistant", "content": "".join(parts)}}]
+    return data
+
+
+class TopOffersParser:
+    """Элементы массива "top_offers" из ответа, поступающего по частям"""
+
+    def __init__(self, key: str = "top_offers"):
+        self._marker = f'"{key}"'
+        self._buffer = ""
+        self._pos = -1
+        self._depth = 0
+        self._object_start = 0
+        self._in_string = False
+        self._escape = False
+        self._done = False
+        self.offers: List[Dict[str, Any]] = []
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Добавляет фрагмент ответа; возвращает объекты, закрытые в нем"""
+        self._buffer += text
+        if self._done:
+            return []
+        if self._pos < 0:
+            key = self._buffer.find(self._marker)
+            bracket = self._buffer.find("[", key) if key != -1 else -1
+            if bracket == -1:
+                return []
+            self._pos = bracket + 1
+
+        new = []
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._object_start = self._pos
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        new.append(json.loads(buffer[self._object_start:self._pos + 1]))
+                    except json.JSONDecodeError:
+                        pass
+            elif char == "]" and self._depth == 0:
+                self._done = True
+                break
+            self._pos += 1
+
+        self.offers.extend(new)
+        return new
+
+
+class ThrottledProgress:
+    """Вызывает render не чаще раза в interval секунд"""
+
+    def __init__(self, render: Callable[[], Awaitable[Any]], interval: float):
+        self._render = render
+        self.interval = interval
+        self._last = float("-inf")
+        self._timer: Optional[asyncio.Task] = None
+        self.renders = 0
+
+    async def update(self) -> None:
+        """Состояние изменилось: показать сейчас или по истечении интервала"""
+        if self._timer is not None:
+            return
+        wait = self._last + self.interval - time.monotonic()
+        if wait <= 0:
+            await self._render_now()
+        else:
+            self._timer = asyncio.ensure_future(self._render_later(wait))
+
+    async def _render_later(self, delay: float) -> None:
+        # Таймер сбрасывается после показа: close() отменяет и начатое редактирование
+        try:
+            await asyncio.sleep(delay)
+            await self._render_now()
+        finally:
+            if self._timer is asyncio.current_task():
+                self._timer = None
+
+    async def _render_now(self) -> None:
+        self._last = time.monotonic()
+        self.renders += 1
+        await self._render()
+
+    def close(self) -> None:
+        """Отменяет отложенный показ (перед итоговым сообщением)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+async def report_progress(event: Dict[str, Any]) -> None:
+    """Передает промежуточный результат обработчику текущего контекста (ошибки обработчика не мешают ИИ)"""
+    progress = current_llm_progress.get()
+    if progress is None:
+        return
+    try:
+        await progress(event)
+    except Exception as e:
+        log_warning("ai_stream", f"Ошибка показа промежуточного результата: {e}")
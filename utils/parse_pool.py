@@ -0,0 +1,128 @@
+"""
+Пул процессов для разбора HTML (BeautifulSoup/lxml) вне event loop
+
+Разбор страницы на 1-2 МБ занимает десятки миллисекунд CPU, и все это
+время бот не обрабатывает апдейты. Крупные документы отправляются в общий
+ProcessPoolExecutor: в процесс уходят байты HTML, обратно приходят
+компактные кортежи/словари (не дерево soup и не Listing целиком).
+
+Маленькие документы (< HTML_PARSE_INLINE_MAX_BYTES) разбираются прямо в
+event loop: пересылка между процессами для них дороже самого разбора.
+HTML_PARSE_POOL_SIZE=0 отключает пул. Если пул сломался (процесс убит),
+разбор выполняется в текущем процессе.
+
+Использование:
+    listings = await parse_listings(self, html, min_rooms, max_rooms, min_price, max_price)
+    data = await run_parse(extract_listing_page, html, url, address)
+"""
+import asyncio
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import fields
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Union
+
+from config import HTML_PARSE_POOL_SIZE, HTML_PARSE_INLINE_MAX_BYTES
+from error_logger import log_info, log_warning
+
+if TYPE_CHECKING:
+    from scrapers.base import Listing
+
+_pool: Optional[ProcessPoolExecutor] = None
+_stats = {"pool": 0, "inline": 0, "fallback": 0}
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    """Общий пул (создается при первом крупном документе)"""
+    global _pool
+    if HTML_PARSE_POOL_SIZE <= 0:
+        return None
+    if _pool is None:
+        # spawn: fork процесса с запущенным event loop и потоками логирования небезопасен
+        _pool = ProcessPoolExecutor(
+            max_workers=HTML_PARSE_POOL_SIZE,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        log_info("parse_pool", f"Запущен пул разбора HTML: {HTML_PARSE_POOL_SIZE} процессов")
+    return _pool
+
+
+def shutdown_parse_pool() -> None:
+    """Останавливает пул (при завершении бота)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+@lru_cache(maxsize=1)
+def _listing_fields() -> Tuple[str, ...]:
+    """Поля Listing, передаваемые из процесса разбора (в порядке конструктора)"""
+    # Импорт здесь: парсеры (scrapers/*) сами импортируют этот модуль
+    from scrapers.base import Listing
+
+    return tuple(f.name for f in fields(Listing) if f.init)
+
+
+def _decode(html: Union[bytes, str]) -> str:
+    return html.decode("utf-8", errors="replace") if isinstance(html, bytes) else html
+
+
+async def run_parse(func: Callable[..., Any], html: str, *args) -> Any:
+    """
+    Выполняет func(html, *args) в пуле или в текущем процессе.
+
+    func должна быть функцией уровня модуля (передается в процесс по имени)
+    и принимать HTML как bytes или str.
+    """
+    global _pool
+    data = html.encode("utf-8") if isinstance(html, str) else html
+    pool = _get_pool() if len(data) >= HTML_PARSE_INLINE_MAX_BYTES else None
+    if pool is None:
+        _stats["inline"] += 1
+        return func(html, *args)
+
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(pool, func, data, *args)
+        _stats["pool"] += 1
+        return result
+    except BrokenProcessPool as e:
+        _pool = None
+        _stats["fallback"] += 1
+        log_warning("parse_pool", f"Пул разбора HTML сломан ({e}), разбираю в текущем процессе")
+        return func(html, *args)
+
+
+def _parse_listings_worker(html: Union[bytes, str], scraper_path: Tuple[str, str], args: tuple) -> List[tuple]:
+    """Выполняется в процессе пула: scraper._parse_html -> кортежи полей Listing"""
+    module_name, class_name = scraper_path
+    scraper = getattr(importlib.import_module(module_name), class_name)()
+    listings = scraper._parse_html(_decode(html), *args)
+    names = _listing_fields()
+    return [tuple(getattr(listing, name) for name in names) for listing in listings]
+
+
+async def parse_listings(scraper, html: str, *args) -> List["Listing"]:
+    """
+    Разбирает страницу поиска через scraper._parse_html(html, *args).
+
+    Крупная страница разбирается в пуле новым экземпляром того же класса
+    парсера, поэтому _parse_html не должен зависеть от состояния экземпляра.
+    """
+    data = html.encode("utf-8")
+    if HTML_PARSE_POOL_SIZE <= 0 or len(data) < HTML_PARSE_INLINE_MAX_BYTES:
+        _stats["inline"] += 1
+        return scraper._parse_html(html, *args)
+
+    scraper_path = (type(scraper).__module__, type(scraper).__qualname__)
+    rows = await run_parse(_parse_listings_worker, data, scraper_path, args)
+    from scrapers.base import Listing
+
+    return [Listing(*row) for row in rows]
+
+
+def get_parse_pool_stats() -> Dict[str, Any]:
+    """Сколько документов разобрано в пуле, в event loop и после сбоя пула"""
+    return {"size": HTML_PARSE_POOL_SIZE, "running": _pool is not None, **_stats}
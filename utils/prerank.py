@@ -0,0 +1,231 @@
+"""
+Детерминированный пре-ранжировщик кандидатов для ИИ-подбора (select_best_listings)
+
+Особенности:
+- Оценка выгодности каждого кандидата по utils/scoring: цена за м²
+  относительно медианы рынка (по всем кандидатам), год постройки, площадь
+- Кандидаты, доминируемые по Парето (другой вариант не хуже по цене за м²,
+  году и площади и лучше хотя бы по одному), отбрасываются; если
+  недоминируемых меньше min_count, список добирается лучшими из доминируемых
+- В LLM уходят только AI_PRERANK_TOP_K лучших (0 - без пре-ранжирования)
+- Метрики (get_stats): сколько запросов к LLM и токенов промптов сэкономлено,
+  насколько выбор LLM совпадает с верхом пре-ранжирования
+
+Использование:
+    ranked = prerank_listings(candidates, min_count=max(max_results, AI_PRERANK_TOP_K))
+    selected = ranked[:AI_PRERANK_TOP_K]
+"""
+import math
+import re
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import AI_PRERANK_TOP_K
+from scrapers.base import Listing
+from utils.scoring import calc_market_median_ppm, calc_price_per_m2, safe_div
+
+# Веса оценки выгодности (price - цена за м² к медиане рынка, year - год, area - площадь)
+PRERANK_WEIGHTS = {
+    "price": 0.6,
+    "year": 0.25,
+    "area": 0.15,
+}
+
+# Год, с которого начинается шкала года постройки, и площадь с максимальной оценкой
+_OLDEST_YEAR = 1950
+_AREA_CAP = 100.0
+
+_YEAR_RE = re.compile(r"(?:18|19|20)\d{2}")
+
+
+def parse_year(value: Any) -> Optional[int]:
+    """Год постройки из строки объявления ("2010", "2010 г.", "") или None"""
+    match = _YEAR_RE.search(str(value or ""))
+    return int(match.group(0)) if match else None
+
+
+def value_score(listing: Listing, market_median_ppm: float) -> float:
+    """
+    Оценка выгодности объявления (чем больше - тем лучше)
+
+    Args:
+        listing: Объявление
+        market_median_ppm: Медианная цена за м² (calc_market_median_ppm)
+    """
+    ppm = calc_price_per_m2(listing)
+    price_score = safe_div(market_median_ppm, ppm) if ppm else 0.0
+
+    year = parse_year(listing.year_built)
+    year_score = 0.0
+    if year:
+        year_score = min(1.0, max(0.0, (year - _OLDEST_YEAR) / (date.today().year - _OLDEST_YEAR)))
+
+    area_score = min(listing.area or 0.0, _AREA_CAP) / _AREA_CAP
+
+    score = (
+        PRERANK_WEIGHTS["price"] * price_score +
+        PRERANK_WEIGHTS["year"] * year_score +
+        PRERANK_WEIGHTS["area"] * area_score
+    )
+    return round(score, 4)
+
+
+def _dominates(a: Tuple[float, int, float], b: Tuple[float, int, float]) -> bool:
+    """a = (цена за м², год, площадь) не хуже b по всем признакам и лучше хотя бы по одному"""
+    not_worse = a[0] <= b[0] and a[1] >= b[1] and a[2] >= b[2]
+    return not_worse and (a[0] < b[0] or a[1] > b[1] or a[2] > b[2])
+
+
+def pareto_front(listings: Sequence[Listing]) -> List[Listing]:
+    """
+    Недоминируемые объявления (порядок сохраняется)
+
+    Объявление без цены за м², года или площади сравнить нельзя - оно остается.
+    """
+    points: List[Optional[Tuple[float, int, float]]] = []
+    for listing in listings:
+        ppm = calc_price_per_m2(listing)
+        year = parse_year(listing.year_built)
+        points.append((ppm, year, listing.area) if ppm and year and listing.area else None)
+
+    front = []
+    for i, listing in enumerate(listings):
+        point = points[i]
+        if point is None or not any(
+            other is not None and _dominates(other, point) for j, other in enumerate(points) if j != i
+        ):
+            front.append(listing)
+    return front
+
+
+def prerank_listings(listings: Sequence[Listing], min_count: int = 0) -> List[Listing]:
+    """
+    Недоминируемые кандидаты по убыванию value_score
+
+    Медиана рынка считается по всем кандидатам (до отбрасывания доминируемых).
+
+    Args:
+        listings: Кандидаты
+        min_count: Сколько кандидатов должно остаться: если недоминируемых меньше,
+            добавляются лучшие по value_score из доминируемых
+    """
+    market_median_ppm = calc_market_median_ppm(list(listings))
+
+    def by_score(items: Sequence[Listing]) -> List[Listing]:
+        return sorted(items, key=lambda listing: value_score(listing, market_median_ppm), reverse=True)
+
+    front = pareto_front(listings)
+    ranked = by_score(front)
+    if len(ranked) < min_count:
+        front_ids = {id(listing) for listing in front}
+        dominated = [listing for listing in listings if id(listing) not in front_ids]
+        ranked.extend(by_score(dominated)[:min_count - len(ranked)])
+    return ranked
+
+
+def selection_llm_calls(candidates: int, max_results: int, batch_size: int = 12) -> int:
+    """
+    Сколько запросов к LLM делает select_best_listings для candidates объявлений
+
+    Повторяет схему турнира: батчи по batch_size (сколько вмещает бюджет токенов
+    промпта) с топ-2 из каждого, дополнительные раунды, пока вариантов больше 12,
+    и финальное сравнение.
+    """
+    if candidates <= 0:
+        return 0
+    batches = math.ceil(candidates / batch_size)
+    calls = batches
+    results = min(candidates, 2 * batches)
+    if results <= max_results:
+        return calls
+    while results > 12:
+        batches = math.ceil(results / batch_size)
+        calls += batches
+        results = min(results, 2 * batches)
+    return calls + 1
+
+
+class PrerankStats:
+    """Метрики пре-ранжирования за время жизни процесса"""
+
+    def __init__(self):
+        self.stats = {
+            "runs": 0,
+            "candidates": 0,
+            "dominated": 0,
+            "sent_to_llm": 0,
+            "llm_calls_avoided": 0,
+            "prompt_tokens_avoided": 0,
+            "llm_picks": 0,
+            "picks_in_prerank_top": 0,
+            "top1_runs": 0,
+            "top1_matches": 0,
+        }
+
+    def record_run(
+        self,
+        candidates: int,
+        dominated: int,
+        sent: int,
+        max_results: int,
+        tokens_avoided: int,
+        batch_size: int = 12,
+    ) -> Dict[str, int]:
+        """
+        Учитывает прогон подбора
+
+        Args:
+            candidates: Кандидатов до пре-ранжирования
+            dominated: Отброшено как доминируемые
+            sent: Отправлено в LLM
+            max_results: Запрошенное число вариантов (для оценки числа запросов)
+            tokens_avoided: Оценка токенов промптов отброшенных кандидатов
+            batch_size: Объявлений в батче подбора
+
+        Returns:
+            Сэкономленное за прогон: {"llm_calls": ..., "tokens": ...}
+        """
+        calls_avoided = (
+            selection_llm_calls(candidates, max_results, batch_size)
+            - selection_llm_calls(sent, max_results, batch_size)
+        )
+        self.stats["runs"] += 1
+        self.stats["candidates"] += candidates
+        self.stats["dominated"] += dominated
+        self.stats["sent_to_llm"] += sent
+        self.stats["llm_calls_avoided"] += calls_avoided
+        self.stats["prompt_tokens_avoided"] += tokens_avoided
+        return {"llm_calls": calls_avoided, "tokens": tokens_avoided}
+
+    def record_picks(self, prerank_ids: Sequence[str], picked_ids: Sequence[str]) -> None:
+        """
+        Сравнивает выбор LLM с пре-ранжированием
+
+        Выбранный вариант совпадает, если он в топ-N пре-ранжирования (N - сколько выбрала LLM).
+        """
+        if not picked_ids or not prerank_ids:
+            return
+        top = set(prerank_ids[:len(picked_ids)])
+        self.stats["llm_picks"] += len(picked_ids)
+        self.stats["picks_in_prerank_top"] += sum(1 for listing_id in picked_ids if listing_id in top)
+        self.stats["top1_runs"] += 1
+        self.stats["top1_matches"] += int(picked_ids[0] == prerank_ids[0])
+
+    def get_stats(self) -> Dict[str, Any]:
+        picks = self.stats["llm_picks"]
+        runs = self.stats["top1_runs"]
+        return {
+            **self.stats,
+            "top_k": AI_PRERANK_TOP_K,
+            "agreement": round(self.stats["picks_in_prerank_top"] / picks, 3) if picks else 0.0,
+            "top1_agreement": round(self.stats["top1_matches"] / runs, 3) if runs else 0.0,
+        }
+
+
+# Глобальные метрики процесса
+prerank_stats = PrerankStats()
+
+
+def get_prerank_stats() -> Dict[str, Any]:
+    """Метрики пре-ранжирования (для /debug cache)"""
+    return prerank_stats.get_stats()
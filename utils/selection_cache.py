@@ -0,0 +1,225 @@
+"""
+In-process кэш результатов ИИ-подбора (select_best_listings) для всех пользователей
+
+Особенности:
+- Ключ (хэш набора id кандидатов, нормализованный фильтр, max_results,
+  версия промпта подбора); хранится ранжированный выбор с объяснениями
+- Пользователи с тем же набором кандидатов и фильтром получают готовый
+  выбор; одновременные запросы ждут один турнир
+- Пересекающиеся пользователи (тот же город, часть кандидатов уже прошла
+  турнир другого пользователя) переиспользуют победителей этого турнира:
+  заново ранжируются только победители вместе с новыми кандидатами (дельта).
+  Проигравшие в прошлом турнире не возвращаются, если все его победители
+  есть среди кандидатов пользователя - они уже уступили этим победителям
+- TTL и ограничение числа записей (LRU), пустые результаты не кэшируются
+- Метрики (get_stats)
+
+Использование:
+    results = await selection_cache.get_or_select(candidates, user_filters, max_results, prompt_version, select)
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from config import AI_SELECTION_CACHE_ENABLED, AI_SELECTION_CACHE_MAX_ENTRIES, AI_SELECTION_CACHE_TTL_SECONDS
+from scrapers.base import Listing
+
+SelectFn = Callable[[List[Listing]], Awaitable[List[Dict[str, Any]]]]
+CacheKey = Tuple[str, Tuple[Any, ...], int, str]
+
+
+def normalize_filters(user_filters: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Поля фильтра, попадающие в промпт подбора (город, цена, комнаты)"""
+    city = str(user_filters.get("city") or "").strip().lower()
+    return (
+        city,
+        int(user_filters.get("min_price") or 0),
+        int(user_filters.get("max_price") or 0),
+        int(user_filters.get("min_rooms") or 0),
+        int(user_filters.get("max_rooms") or 0),
+    )
+
+
+def candidates_digest(listing_ids: Sequence[str]) -> str:
+    """Хэш набора id кандидатов (порядок не важен)"""
+    return hashlib.sha1("|".join(sorted(set(listing_ids))).encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("city", "max_results", "prompt_version", "listing_ids", "results", "created_at")
+
+    def __init__(self, key: CacheKey, listing_ids: FrozenSet[str], results: List[Dict[str, Any]]):
+        _, filters, self.max_results, self.prompt_version = key
+        self.city = filters[0]
+        self.listing_ids = listing_ids
+        self.results = results
+        self.created_at = time.monotonic()
+
+    @property
+    def winner_ids(self) -> List[str]:
+        return [result["listing"].id for result in self.results]
+
+
+class SelectionCache:
+    """Кэш турниров ИИ-подбора с переиспользованием победителей"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int, enabled: bool = True):
+        """
+        Args:
+            ttl_seconds: Срок жизни результата
+            max_entries: Максимум записей (LRU)
+            enabled: False - каждый подбор выполняется полностью
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Task] = {}
+        self.stats = {
+            "hits": 0,
+            "shared": 0,
+            "delta_runs": 0,
+            "misses": 0,
+            "reranked": 0,
+            "reused_winners": 0,
+            "evicted": 0,
+        }
+
+    def _fresh(self, key: CacheKey) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _find_base(self, key: CacheKey, listing_ids: FrozenSet[str]) -> Optional[_Entry]:
+        """Турнир с наибольшим пересечением кандидатов, все победители которого есть среди listing_ids"""
+        _, filters, max_results, prompt_version = key
+        now = time.monotonic()
+        best, best_overlap = None, 0
+        for entry in self._entries.values():
+            if now - entry.created_at > self.ttl_seconds:
+                continue
+            if (entry.city, entry.max_results, entry.prompt_version) != (filters[0], max_results, prompt_version):
+                continue
+            if not set(entry.winner_ids) <= listing_ids:
+                continue
+            overlap = len(entry.listing_ids & listing_ids)
+            if overlap > best_overlap:
+                best, best_overlap = entry, overlap
+        return best
+
+    async def get_or_select(
+        self,
+        candidates: List[Listing],
+        user_filters: Dict[str, Any],
+        max_results: int,
+        prompt_version: str,
+        select: SelectFn,
+    ) -> List[Dict[str, Any]]:
+        """
+        Выбор из кэша, по дельте к турниру другого пользователя или полным турниром
+
+        Args:
+            candidates: Кандидаты подбора (объявления с ценой)
+            user_filters: Фильтры пользователя
+            max_results: Сколько вариантов запрошено
+            prompt_version: Версия промпта подбора
+            select: Турнир ИИ по списку объявлений
+
+        Returns:
+            Копии результатов (вызывающий код может их менять)
+        """
+        if not self.enabled or not candidates:
+            return await select(candidates)
+
+        listing_ids = frozenset(listing.id for listing in candidates)
+        key = (candidates_digest(list(listing_ids)), normalize_filters(user_filters), max_results, prompt_version)
+
+        entry = self._fresh(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return self._copy(entry.results, candidates)
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["shared"] += 1
+            return self._copy(await asyncio.shield(task), candidates)
+
+        task = asyncio.ensure_future(self._select(key, candidates, listing_ids, select))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: отмена запроса одного пользователя не отменяет турнир для остальных
+        return self._copy(await asyncio.shield(task), candidates)
+
+    async def _select(
+        self,
+        key: CacheKey,
+        candidates: List[Listing],
+        listing_ids: FrozenSet[str],
+        select: SelectFn,
+    ) -> List[Dict[str, Any]]:
+        base = self._find_base(key, listing_ids)
+        if base is None:
+            self.stats["misses"] += 1
+            results = await select(candidates)
+        else:
+            winners = set(base.winner_ids)
+            delta = [listing for listing in candidates if listing.id not in base.listing_ids]
+            self.stats["reused_winners"] += len(winners)
+            if delta:
+                self.stats["delta_runs"] += 1
+                self.stats["reranked"] += len(delta)
+                pool = [listing for listing in candidates if listing.id in winners] + delta
+                results = await select(pool)
+            else:
+                # Все кандидаты уже были в турнире: его победители и есть результат
+                self.stats["hits"] += 1
+                results = base.results
+
+        if results:
+            self._entries[key] = _Entry(key, listing_ids, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evicted"] += 1
+        return results
+
+    @staticmethod
+    def _copy(results: List[Dict[str, Any]], candidates: List[Listing]) -> List[Dict[str, Any]]:
+        """Копии результатов с объектами объявлений текущего пользователя"""
+        by_id = {listing.id: listing for listing in candidates}
+        copies = []
+        for result in results:
+            item = dict(result)
+            listing = item.get("listing")
+            if listing is not None:
+                item["listing"] = by_id.get(listing.id, listing)
+            copies.append(item)
+        return copies
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["shared"] + self.stats["delta_runs"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round((self.stats["hits"] + self.stats["shared"]) / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+# Глобальный кэш процесса
+selection_cache = SelectionCache(
+    ttl_seconds=AI_SELECTION_CACHE_TTL_SECONDS,
+    max_entries=AI_SELECTION_CACHE_MAX_ENTRIES,
+    enabled=AI_SELECTION_CACHE_ENABLED,
+)
+
+
+def get_selection_cache_stats() -> Dict[str, Any]:
+    """Метрики кэша ИИ-подбора (для /debug cache)"""
+    return selection_cache.get_stats()
@@ -0,0 +1,62 @@
+"""
+Консистентное хеширование пользователей по воркерам уведомлений
+
+Каждый воркер (процесс) отвечает за свой шард telegram_id. При изменении
+числа шардов на другой шард переезжает примерно 1/N пользователей, а не все,
+как при telegram_id % N.
+"""
+import bisect
+import hashlib
+from functools import lru_cache
+from typing import Dict, List
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Кольцо консистентного хеширования
+
+    Args:
+        shards: Число шардов (узлы 0..shards-1)
+        vnodes: Виртуальных точек на шард (сглаживает распределение)
+    """
+
+    def __init__(self, shards: int, vnodes: int = 128):
+        if shards < 1:
+            raise ValueError("shards должно быть >= 1")
+        self.shards = shards
+        points = sorted(
+            (_hash(f"shard-{shard}#{v}"), shard)
+            for shard in range(shards)
+            for v in range(vnodes)
+        )
+        self._keys = [point for point, _ in points]
+        self._nodes = [shard for _, shard in points]
+
+    def shard_for(self, key) -> int:
+        """Шард для ключа (telegram_id)"""
+        if self.shards == 1:
+            return 0
+        index = bisect.bisect(self._keys, _hash(str(key))) % len(self._keys)
+        return self._nodes[index]
+
+    def split(self, keys) -> Dict[int, List]:
+        """Раскладывает ключи по шардам"""
+        result: Dict[int, List] = {shard: [] for shard in range(self.shards)}
+        for key in keys:
+            result[self.shard_for(key)].append(key)
+        return result
+
+
+@lru_cache(maxsize=8)
+def get_ring(shards: int) -> HashRing:
+    """Кольцо на shards шардов (кэшируется)"""
+    return HashRing(shards)
+
+
+def shard_for_user(telegram_id: int, shards: int) -> int:
+    """Шард пользователя при shards шардах"""
+    return get_ring(shards).shard_for(telegram_id)
@@ -0,0 +1,293 @@
+"""
+Локальное (без LLM) сравнение новых объявлений с вариантами, выбранными ИИ ранее
+
+Особенности:
+- Признаки объявления (listing_features) сохраняются вместе с выбранным
+  вариантом (ai_selected_listings.features): цена за м², комнаты, площадь,
+  этаж, год, тип дома и хэшированный TF-вектор слов и пар слов описания
+  (crc32 - номера корзин одинаковы во всех процессах)
+- Сходство: косинус TF-IDF векторов описаний (IDF по сравниваемому набору)
+  и близость нормированных числовых признаков
+- Для нового объявления берется самый похожий выбранный вариант: если новое
+  хуже него по локальной оценке выгодности больше чем на margin - оно не
+  отправляется в LLM; повтор выбранного варианта тоже пропускается, если
+  он не выгоднее выбранного больше чем на margin.
+  Непохожие на выбранные, близкие, лучшие и объявления без цены за м²
+  оцениваются LLM
+- Метрики (get_stats)
+
+Использование:
+    features = listing_features(listing)  # при сохранении выбора ИИ
+    decisions = local_comparator.triage(new_listings, previous_selected)
+    to_llm = [d["listing"] for d in decisions if d["decision"] == "escalate"]
+"""
+import math
+import re
+import statistics
+import zlib
+from collections import Counter
+from datetime import date
+from typing import Any, Dict, List, Sequence
+
+from config import (
+    AI_LOCAL_COMPARE_DUPLICATE_SIMILARITY,
+    AI_LOCAL_COMPARE_ENABLED,
+    AI_LOCAL_COMPARE_MARGIN,
+    AI_LOCAL_COMPARE_MIN_SIMILARITY,
+)
+from scrapers.base import Listing
+from utils.prerank import parse_year
+from utils.scoring import calc_price_per_m2, safe_div
+
+# Версия признаков: сохраненные признаки другой версии не сравниваются
+FEATURE_VERSION = 1
+
+# Корзин хэшированного вектора описания
+HASH_DIM = 2048
+
+# Веса локальной оценки выгодности
+VALUE_WEIGHTS = {
+    "price": 0.6,
+    "year": 0.15,
+    "area": 0.1,
+    "floor": 0.05,
+    "house": 0.1,
+}
+
+# Вклад описания и числовых признаков в сходство
+TEXT_WEIGHT = 0.4
+NUMERIC_WEIGHT = 0.6
+
+_OLDEST_YEAR = 1950
+_AREA_CAP = 150.0
+_ROOMS_CAP = 5
+
+_HOUSE_SCORES = (
+    ("монолит", 1.0),
+    ("кирпич", 0.9),
+    ("блоч", 0.6),
+    ("панел", 0.5),
+)
+_DEFAULT_HOUSE_SCORE = 0.6
+
+_WORD_RE = re.compile(r"[^\W\d_]{3,}")
+_FLOOR_RE = re.compile(r"\d+")
+
+
+def _bucket(term: str) -> str:
+    return str(zlib.crc32(term.encode("utf-8")) % HASH_DIM)
+
+
+def text_vector(text: str) -> Dict[str, float]:
+    """Хэшированный TF-вектор слов и пар слов (1 + log tf)"""
+    words = _WORD_RE.findall(text.lower())
+    terms = Counter(_bucket(word) for word in words)
+    terms.update(_bucket(f"{a} {b}") for a, b in zip(words, words[1:]))
+    return {bucket: round(1.0 + math.log(count), 4) for bucket, count in terms.items()}
+
+
+def _floor_score(floor: str, total_floors: str) -> float:
+    """Первый этаж - 0.3, последний - 0.6, средние - 1.0, неизвестно - 0.6"""
+    numbers = [int(n) for n in _FLOOR_RE.findall(f"{floor or ''} {total_floors or ''}")]
+    if not numbers:
+        return 0.6
+    current = numbers[0]
+    total = numbers[1] if len(numbers) > 1 else 0
+    if current <= 1:
+        return 0.3
+    if total and current >= total:
+        return 0.6
+    return 1.0
+
+
+def _house_score(house_type: str) -> float:
+    lower = (house_type or "").lower()
+    for word, score in _HOUSE_SCORES:
+        if word in lower:
+            return score
+    return _DEFAULT_HOUSE_SCORE
+
+
+def listing_features(listing: Listing) -> Dict[str, Any]:
+    """Признаки объявления для локального сравнения (сериализуются в JSON)"""
+    return {
+        "v": FEATURE_VERSION,
+        "ppm": round(calc_price_per_m2(listing) or 0.0, 2),
+        "rooms": listing.rooms or 0,
+        "area": listing.area or 0.0,
+        "floor": _floor_score(listing.floor, listing.total_floors),
+        "year": parse_year(listing.year_built) or 0,
+        "house": _house_score(listing.house_type),
+        "text": text_vector(f"{listing.title} {listing.description or ''}"),
+    }
+
+
+def _year_score(year: int) -> float:
+    if not year:
+        return 0.0
+    return min(1.0, max(0.0, (year - _OLDEST_YEAR) / (date.today().year - _OLDEST_YEAR)))
+
+
+def value_score(features: Dict[str, Any], median_ppm: float) -> float:
+    """Локальная оценка выгодности по признакам (чем больше - тем лучше)"""
+    price_score = safe_div(median_ppm, features["ppm"]) if features["ppm"] else 0.0
+    score = (
+        VALUE_WEIGHTS["price"] * price_score +
+        VALUE_WEIGHTS["year"] * _year_score(features["year"]) +
+        VALUE_WEIGHTS["area"] * min(features["area"], _AREA_CAP) / _AREA_CAP +
+        VALUE_WEIGHTS["floor"] * features["floor"] +
+        VALUE_WEIGHTS["house"] * features["house"]
+    )
+    return round(score, 4)
+
+
+def _numeric_vector(features: Dict[str, Any], median_ppm: float) -> List[float]:
+    ppm_rel = min(safe_div(features["ppm"], median_ppm), 2.0) / 2.0
+    return [
+        ppm_rel,
+        min(features["rooms"], _ROOMS_CAP) / _ROOMS_CAP,
+        min(features["area"], _AREA_CAP) / _AREA_CAP,
+        features["floor"],
+        _year_score(features["year"]),
+        features["house"],
+    ]
+
+
+def _idf(vectors: Sequence[Dict[str, float]]) -> Dict[str, float]:
+    df = Counter(bucket for vector in vectors for bucket in vector)
+    n = len(vectors)
+    return {bucket: math.log((1 + n) / (1 + count)) + 1.0 for bucket, count in df.items()}
+
+
+def _cosine(a: Dict[str, float], b: Dict[str, float], idf: Dict[str, float]) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(weight * b[bucket] * idf[bucket] ** 2 for bucket, weight in a.items() if bucket in b)
+    norm_a = math.sqrt(sum((weight * idf[bucket]) ** 2 for bucket, weight in a.items()))
+    norm_b = math.sqrt(sum((weight * idf[bucket]) ** 2 for bucket, weight in b.items()))
+    return safe_div(dot, norm_a * norm_b)
+
+
+def similarity(a: Dict[str, Any], b: Dict[str, Any], median_ppm: float, idf: Dict[str, float]) -> float:
+    """Сходство объявлений по признакам, 0..1"""
+    numeric_a = _numeric_vector(a, median_ppm)
+    numeric_b = _numeric_vector(b, median_ppm)
+    numeric = 1.0 - sum(abs(x - y) for x, y in zip(numeric_a, numeric_b)) / len(numeric_a)
+    return round(TEXT_WEIGHT * _cosine(a["text"], b["text"], idf) + NUMERIC_WEIGHT * numeric, 4)
+
+
+class LocalComparator:
+    """Решает, какие новые объявления стоит оценивать LLM"""
+
+    def __init__(
+        self,
+        margin: float,
+        min_similarity: float,
+        duplicate_similarity: float,
+        enabled: bool = True,
+    ):
+        """
+        Args:
+            margin: Допуск по оценке выгодности: хуже похожего выбранного больше чем
+                на margin - не отправлять в LLM
+            min_similarity: Минимальное сходство, при котором сравнение надежно
+            duplicate_similarity: Сходство, с которого объявление - повтор выбранного
+            enabled: False - все объявления идут в LLM
+        """
+        self.margin = margin
+        self.min_similarity = min_similarity
+        self.duplicate_similarity = duplicate_similarity
+        self.enabled = enabled
+        self.stats = {
+            "runs": 0,
+            "compared": 0,
+            "escalated": 0,
+            "skipped_worse": 0,
+            "skipped_duplicate": 0,
+            "no_features": 0,
+        }
+
+    def triage(self, new_listings: List[Listing], previous_selected: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Решение по каждому новому объявлению (порядок сохраняется)
+
+        Args:
+            new_listings: Новые объявления
+            previous_selected: Выбранные ранее (get_ai_selected_listings, с полем features)
+
+        Returns:
+            [{"listing", "decision": "escalate" | "worse" | "duplicate",
+              "similarity", "delta", "incumbent_id"}]
+        """
+        incumbents = [
+            (item["listing_id"], item["features"]) for item in previous_selected
+            if isinstance(item.get("features"), dict) and item["features"].get("v") == FEATURE_VERSION
+        ]
+        self.stats["runs"] += 1
+        if not self.enabled or not incumbents:
+            # Старые выборы без признаков: сравнивать не с чем, решает LLM
+            self.stats["no_features"] += len(new_listings)
+            self.stats["escalated"] += len(new_listings)
+            return [
+                {"listing": listing, "decision": "escalate", "similarity": 0.0, "delta": 0.0, "incumbent_id": None}
+                for listing in new_listings
+            ]
+
+        candidates = [(listing, listing_features(listing)) for listing in new_listings]
+        pool = [features for _, features in incumbents] + [features for _, features in candidates]
+        median_ppm = statistics.median([f["ppm"] for f in pool if f["ppm"]] or [1.0])
+        idf = _idf([f["text"] for f in pool])
+        incumbent_ids = {listing_id for listing_id, _ in incumbents}
+
+        decisions = []
+        for listing, features in candidates:
+            self.stats["compared"] += 1
+            best_id, best_features, best_similarity = None, None, -1.0
+            for incumbent_id, incumbent_features in incumbents:
+                score = similarity(features, incumbent_features, median_ppm, idf)
+                if score > best_similarity:
+                    best_id, best_features, best_similarity = incumbent_id, incumbent_features, score
+            delta = round(value_score(features, median_ppm) - value_score(best_features, median_ppm), 4)
+
+            # Почти та же квартира пропускается, только если она не заметно выгоднее
+            # выбранной (например, та же квартира, выставленная дешевле, идет в LLM)
+            if listing.id in incumbent_ids or (
+                best_similarity >= self.duplicate_similarity and delta <= self.margin
+            ):
+                decision = "duplicate"
+            elif features["ppm"] and best_similarity >= self.min_similarity and delta < -self.margin:
+                decision = "worse"
+            else:
+                decision = "escalate"
+            self.stats[{"duplicate": "skipped_duplicate", "worse": "skipped_worse"}.get(decision, "escalated")] += 1
+            decisions.append({
+                "listing": listing,
+                "decision": decision,
+                "similarity": best_similarity,
+                "delta": delta,
+                "incumbent_id": best_id,
+            })
+        return decisions
+
+    def get_stats(self) -> Dict[str, Any]:
+        compared = self.stats["compared"] + self.stats["no_features"]
+        skipped = self.stats["skipped_worse"] + self.stats["skipped_duplicate"]
+        return {
+            **self.stats,
+            "llm_calls_avoided_rate": round(skipped / compared, 3) if compared else 0.0,
+            "margin": self.margin,
+        }
+
+
+# Глобальный компаратор процесса
+local_comparator = LocalComparator(
+    margin=AI_LOCAL_COMPARE_MARGIN,
+    min_similarity=AI_LOCAL_COMPARE_MIN_SIMILARITY,
+    duplicate_similarity=AI_LOCAL_COMPARE_DUPLICATE_SIMILARITY,
+    enabled=AI_LOCAL_COMPARE_ENABLED,
+)
+
+
+def get_local_compare_stats() -> Dict[str, Any]:
+    """Метрики локального сравнения (для /debug cache)"""
+    return local_comparator.get_stats()
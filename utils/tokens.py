@@ -0,0 +1,103 @@
+"""
+Локальный подсчет токенов промптов LLM
+
+Особенности:
+- Текст разбивается на части так же, как пре-токенизатор llama-3/cl100k
+  (слова с ведущим пробелом, числа по 1-3 цифры, пунктуация, переводы строк);
+  часть - один токен, длинные слова - несколько (кириллица дробится мельче латиницы)
+- Подсчет калибруется по фактическому usage.prompt_tokens ответов провайдера
+  (observe_usage): коэффициент - скользящее среднее отношения к локальному счету
+- Сумма токенов строк, разделенных переводами строк, равна токенам их
+  объединения - батчи можно набирать построчно (см. _pack_batches в ai_valuator)
+
+Использование:
+    tokens = count_message_tokens(messages)
+    observe_usage(messages, data)  # после ответа chat completions
+"""
+import math
+import re
+from typing import Any, Dict, List
+
+# Слова, числа, пунктуация и пробелы - как в пре-токенизаторе llama-3/cl100k
+_PIECE_RE = re.compile(
+    r"'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|\s*[\r\n]+|\s+(?!\S)|\s+|_+"
+)
+
+# Служебные токены сообщения (роль, разделители) и начала ответа
+_MESSAGE_OVERHEAD = 4
+_REPLY_OVERHEAD = 3
+
+# Границы коэффициента калибровки (защита от выбросов usage)
+_MIN_RATIO = 0.5
+_MAX_RATIO = 2.0
+
+
+def _piece_tokens(piece: str) -> int:
+    word = piece.lstrip(" ")
+    if not word:
+        return 1
+    if word[0].isdigit() or word[0] in "\r\n" or word.isspace():
+        return 1
+    if word[0].isalpha() or word[0] == "_":
+        # Частые латинские слова - один токен, кириллические дробятся мельче
+        chars_per_token = 6 if word.isascii() else 3
+        return max(1, math.ceil(len(word) / chars_per_token))
+    if word.isascii():
+        return max(1, math.ceil(len(word) / 2))
+    # Эмодзи и прочие символы вне ASCII - по байтам UTF-8
+    return max(1, math.ceil(len(word.encode("utf-8")) / 3))
+
+
+def raw_token_count(text: str) -> int:
+    """Токены текста по локальному пре-токенизатору (без калибровки)"""
+    return sum(_piece_tokens(piece) for piece in _PIECE_RE.findall(text))
+
+
+class TokenCalibration:
+    """Коэффициент к локальному счету по фактическому usage провайдера"""
+
+    def __init__(self):
+        self.ratio = 1.0
+        self.samples = 0
+
+    def observe(self, local_tokens: int, provider_tokens: int) -> None:
+        if local_tokens <= 0 or provider_tokens <= 0:
+            return
+        ratio = min(_MAX_RATIO, max(_MIN_RATIO, provider_tokens / local_tokens))
+        self.ratio = ratio if self.samples == 0 else 0.8 * self.ratio + 0.2 * ratio
+        self.samples += 1
+
+    def apply(self, tokens: int) -> int:
+        return int(math.ceil(tokens * self.ratio))
+
+
+# Калибровка процесса (один провайдер - Groq)
+calibration = TokenCalibration()
+
+
+def count_tokens(text: str) -> int:
+    """Токены текста с учетом калибровки"""
+    return calibration.apply(raw_token_count(text))
+
+
+def _raw_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    return _REPLY_OVERHEAD + sum(
+        _MESSAGE_OVERHEAD + raw_token_count(str(message.get("content", ""))) for message in messages
+    )
+
+
+def count_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Токены промпта chat completions (содержимое и служебные токены сообщений)"""
+    return calibration.apply(_raw_message_tokens(messages))
+
+
+def observe_usage(messages: List[Dict[str, Any]], data: Dict[str, Any]) -> None:
+    """Калибрует подсчет по usage.prompt_tokens ответа"""
+    prompt_tokens = (data.get("usage") or {}).get("prompt_tokens")
+    if prompt_tokens:
+        calibration.observe(_raw_message_tokens(messages), int(prompt_tokens))
+
+
+def get_token_stats() -> Dict[str, Any]:
+    """Коэффициент калибровки (для /debug cache)"""
+    return {"calibration_ratio": round(calibration.ratio, 3), "calibration_samples": calibration.samples}
@@ -0,0 +1,232 @@
+"""
+Структурированная трассировка прогонов поиска
+
+Особенности:
+- API событий trace_event(name, **data) с семплированием
+- Ограниченный кольцевой буфер последних событий в памяти
+- Запись JSONL в фоновом потоке (QueueHandler/QueueListener)
+- Почти нулевая стоимость, когда трассировка выключена
+
+Использование:
+    start_trace()                       # например, из /debug run trace
+    trace_event("user.start", user_id=123)
+    summary = stop_trace()              # {"run_id": ..., "path": ..., "events": ...}
+"""
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import TRACE_LOG_PATH, TRACE_SAMPLE_RATE, TRACE_BUFFER_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class _TraceQueueHandler(QueueHandler):
+    """QueueHandler без форматирования: событие уходит в очередь как есть"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Записи не пересекают границу процесса, поэтому сериализацию
+        # оставляем фоновому потоку
+        return record
+
+
+class _JsonlFileHandler(logging.Handler):
+    """Пишет события трассировки в JSONL файл (работает в потоке QueueListener)"""
+
+    def __init__(self, path: Path):
+        super().__init__()
+        self.path = path
+        self._stream = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            if self._stream is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._stream = open(self.path, "a", encoding="utf-8")
+            self._stream.write(json.dumps(record.msg, ensure_ascii=False, default=str) + "\n")
+        except Exception:
+            self.handleError(record)
+
+    def flush(self) -> None:
+        if self._stream is not None:
+            self._stream.flush()
+
+    def close(self) -> None:
+        try:
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+        finally:
+            super().close()
+
+
+class Tracer:
+    """Трассировщик одного прогона"""
+
+    def __init__(
+        self,
+        run_id: str,
+        path: Path,
+        sample_rate: float = 1.0,
+        buffer_size: int = 2000,
+    ):
+        """
+        Args:
+            run_id: Идентификатор прогона (попадает в каждое событие)
+            path: Путь к JSONL файлу
+            sample_rate: Доля сохраняемых событий (0..1), кроме always=True
+            buffer_size: Размер кольцевого буфера последних событий
+        """
+        self.run_id = run_id
+        self.path = path
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.buffer: deque = deque(maxlen=buffer_size)
+        self.started_at = time.time()
+        self.emitted = 0
+        self.sampled_out = 0
+
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._file_handler = _JsonlFileHandler(path)
+        self._listener = QueueListener(self._queue, self._file_handler)
+        # Отдельный логгер, не зарегистрированный в logging.manager:
+        # события трассировки не должны попадать в обычные логи
+        self._logger = logging.Logger(f"trace.{run_id}", logging.INFO)
+        self._logger.propagate = False
+        self._logger.addHandler(_TraceQueueHandler(self._queue))
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        self._listener.start()
+
+    def stop(self) -> None:
+        self._listener.stop()  # дожидается записи всех событий из очереди
+        self._file_handler.close()
+
+    def event(self, name: str, data: Dict[str, Any], always: bool = False) -> None:
+        """Регистрирует событие (с учетом семплирования)"""
+        if not always and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return
+
+        event = {
+            "ts": int(time.time() * 1000),
+            "run_id": self.run_id,
+            "event": name,
+            "data": data,
+        }
+        with self._lock:
+            self.buffer.append(event)
+            self.emitted += 1
+        self._logger.info(event)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "run_id": self.run_id,
+            "path": str(self.path),
+            "events": self.emitted,
+            "sampled_out": self.sampled_out,
+            "duration_s": round(time.time() - self.started_at, 3),
+        }
+
+
+# Активный трассировщик (None = трассировка выключена)
+_tracer: Optional[Tracer] = None
+
+
+def start_trace(
+    run_id: Optional[str] = None,
+    path: Optional[str] = None,
+    sample_rate: Optional[float] = None,
+    buffer_size: Optional[int] = None,
+) -> Tracer:
+    """
+    Включает трассировку для прогона
+
+    Если трассировка уже включена, предыдущий прогон завершается.
+
+    Args:
+        run_id: Идентификатор прогона (по умолчанию генерируется)
+        path: Путь к JSONL файлу (по умолчанию TRACE_LOG_PATH)
+        sample_rate: Доля сохраняемых событий (по умолчанию TRACE_SAMPLE_RATE)
+        buffer_size: Размер кольцевого буфера (по умолчанию TRACE_BUFFER_SIZE)
+
+    Returns:
+        Активный Tracer
+    """
+    global _tracer
+
+    if _tracer is not None:
+        stop_trace()
+
+    run_id = run_id or time.strftime("%Y%m%d_%H%M%S") + "_" + uuid.uuid4().hex[:6]
+    trace_path = Path((path or TRACE_LOG_PATH).format(run_id=run_id))
+    tracer = Tracer(
+        run_id=run_id,
+        path=trace_path,
+        sample_rate=TRACE_SAMPLE_RATE if sample_rate is None else sample_rate,
+        buffer_size=buffer_size or TRACE_BUFFER_SIZE,
+    )
+    tracer.start()
+    _tracer = tracer
+    logger.info(f"[trace] started run_id={run_id} path={trace_path} sample_rate={tracer.sample_rate}")
+    return tracer
+
+
+def stop_trace() -> Optional[Dict[str, Any]]:
+    """
+    Выключает трассировку и дожидается записи событий на диск
+
+    Returns:
+        Сводка прогона или None, если трассировка не была включена
+    """
+    global _tracer
+
+    tracer = _tracer
+    if tracer is None:
+        return None
+
+    _tracer = None
+    tracer.stop()
+    summary = tracer.summary()
+    logger.info(f"[trace] stopped {summary}")
+    return summary
+
+
+def is_tracing() -> bool:
+    """Включена ли трассировка (для защиты дорогих вычислений данных события)"""
+    return _tracer is not None
+
+
+def trace_event(name: str, always: bool = False, **data: Any) -> None:
+    """
+    Регистрирует событие трассировки
+
+    Когда трассировка выключена, функция сразу возвращается.
+
+    Args:
+        name: Имя события (например "listing.filtered")
+        always: Не применять семплирование (для сводных событий)
+        **data: Данные события (должны сериализоваться в JSON)
+    """
+    tracer = _tracer
+    if tracer is None:
+        return
+    tracer.event(name, data, always=always)
+
+
+def get_recent_events(limit: int = 100) -> List[Dict[str, Any]]:
+    """Возвращает последние события активного прогона из кольцевого буфера"""
+    tracer = _tracer
+    if tracer is None:
+        return []
+    with tracer._lock:
+        events = list(tracer.buffer)
+    return events[-limit:]
@@ -0,0 +1,122 @@
+"""
+Кэш ИИ-оценок объявлений (таблица ai_valuations в Turso)
+
+Особенности:
+- Ключ (id объявления, хэш цены/площади/описания, модель, версия промпта):
+  изменение цены или описания дает промах, новая оценка заменяет прежнюю
+- Одна оценка на версию объявления для всех пользователей и реплик
+- Одновременные запросы одного объявления в процессе ждут одну оценку
+- TTL; неудачные оценки (None) не кэшируются
+- Метрики попаданий/промахов и сэкономленных токенов (get_stats)
+
+Использование:
+    result = await valuation_cache.get_or_valuate(listing, model, prompt_version, valuate)
+"""
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config import AI_VALUATION_CACHE_ENABLED, AI_VALUATION_CACHE_TTL_SECONDS, USE_TURSO_CACHE
+from database_turso import get_ai_valuation, save_ai_valuation
+from scrapers.base import Listing
+
+ValuateFn = Callable[[Listing], Awaitable[Optional[Dict[str, Any]]]]
+CacheKey = Tuple[str, str, str, str]
+
+
+def content_hash(listing: Listing) -> str:
+    """Хэш полей, от которых зависит оценка (цена, площадь, описание)"""
+    parts = (
+        listing.price, listing.currency, listing.price_usd,
+        listing.area, listing.rooms, listing.description or "",
+    )
+    return hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+class ValuationCache:
+    """Read-through кэш оценок поверх ai_valuations"""
+
+    def __init__(self, ttl_seconds: float, enabled: bool = True, persistent: bool = True):
+        """
+        Args:
+            ttl_seconds: Срок жизни оценки
+            enabled: False - каждая оценка запрашивается у ИИ
+            persistent: False - без Turso, только общая оценка одновременных запросов
+        """
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.persistent = persistent
+        self._inflight: Dict[CacheKey, asyncio.Task] = {}
+        self.stats = {"hits": 0, "misses": 0, "shared": 0, "stored": 0, "tokens_spent": 0, "tokens_saved": 0}
+
+    async def get_or_valuate(
+        self,
+        listing: Listing,
+        model: str,
+        prompt_version: str,
+        valuate: ValuateFn,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Оценка из кэша или через valuate (с сохранением в кэш)
+
+        Returns:
+            Копия оценки (вызывающий код может ее менять) или None
+        """
+        if not self.enabled:
+            return await valuate(listing)
+
+        # Хэш считаем до оценки: valuate_groq дополняет описание со страницы
+        key = (listing.id, content_hash(listing), model, prompt_version)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["shared"] += 1
+            result = await asyncio.shield(task)
+            if result:
+                self.stats["tokens_saved"] += int(result.get("tokens_used") or 0)
+        else:
+            task = asyncio.ensure_future(self._load(key, listing, valuate))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            # shield: таймаут первого пользователя не отменяет оценку для остальных
+            result = await asyncio.shield(task)
+        return dict(result) if result else None
+
+    async def _load(self, key: CacheKey, listing: Listing, valuate: ValuateFn) -> Optional[Dict[str, Any]]:
+        if self.persistent:
+            cached = await get_ai_valuation(*key)
+            if cached is not None:
+                result, tokens = cached
+                self.stats["hits"] += 1
+                self.stats["tokens_saved"] += tokens
+                return result
+
+        self.stats["misses"] += 1
+        result = await valuate(listing)
+        if not result:
+            return result
+        tokens = int(result.get("tokens_used") or 0)
+        self.stats["tokens_spent"] += tokens
+        if self.persistent and await save_ai_valuation(*key, result, tokens, self.ttl_seconds):
+            self.stats["stored"] += 1
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["shared"]
+        return {
+            **self.stats,
+            "hit_rate": round((self.stats["hits"] + self.stats["shared"]) / lookups, 3) if lookups else 0.0,
+            "inflight": len(self._inflight),
+        }
+
+
+# Глобальный кэш процесса
+valuation_cache = ValuationCache(
+    ttl_seconds=AI_VALUATION_CACHE_TTL_SECONDS,
+    enabled=AI_VALUATION_CACHE_ENABLED,
+    persistent=USE_TURSO_CACHE,
+)
+
+
+def get_valuation_cache_stats() -> Dict[str, Any]:
+    """Метрики кэша ИИ-оценок (для /debug cache)"""
+    return valuation_cache.get_stats()